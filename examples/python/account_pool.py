@@ -0,0 +1,409 @@
+"""Pool of agent accounts for bulk runs (stdlib only).
+
+Each account has its own token, user_id, default address, buyer wallet
+and call budget. acquire() leases the least-loaded ready account; a 401 or
+token failure on release() evicts it, and it is re-bootstrapped in the
+background with backoff. Tokens are kept in the shared token store under
+a key scoped to the server and the credential from the accounts file, and
+per-account setup is cached in MCP_ACCOUNT_SETUP_PATH.
+
+Accounts file (JSON list or JSONL), one account per entry:
+- name (optional; defaults to the position in the file)
+- token or bootstrap_token (one is required)
+- user_id, buyer_wallet, shipping_address_id (all optional)
+- rate_per_sec, burst, max_in_flight (optional per-account overrides)
+
+Usage:
+from account_pool import open_account_pool
+pool = open_account_pool("accounts.jsonl", "bsc", "", "python-bulk-orders")
+pool.start()
+account = pool.acquire()
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set
+
+from disk_cache import JsonDiskCache
+from full_flow import (
+    McpClient,
+    derive_api_base_url,
+    endpoints_from_env,
+    ensure_buyer_setup,
+    exchange_bootstrap_token,
+    initialize_session,
+)
+from mcp_common import first_string, to_float, to_int
+from search_fanout import RateLimiter
+from token_store import (
+    TokenStore,
+    decode_jwt_exp_unsafe,
+    decode_jwt_sub_unsafe,
+    normalize_base_url,
+    open_token_store,
+    remember_token,
+)
+
+
+class AccountAuthError(RuntimeError):
+    pass
+
+
+def is_auth_error(exc: BaseException) -> bool:
+    if isinstance(exc, AccountAuthError):
+        return True
+    return isinstance(exc, urllib.error.HTTPError) and exc.code == 401
+
+
+def load_account_specs(path: str) -> List[Dict[str, Any]]:
+    # JSON list or JSONL of {"name", "token" | "bootstrap_token", "buyer_wallet", "shipping_address_id",
+    # "rate_per_sec", "burst", "max_in_flight"}; the name defaults to the position in the file.
+    with open(os.path.expanduser(path), "r", encoding="utf-8") as fh:
+        text = fh.read()
+    if text.lstrip().startswith("["):
+        specs = json.loads(text)
+    else:
+        specs = [json.loads(line) for line in text.splitlines() if line.strip() and not line.lstrip().startswith("#")]
+    out: List[Dict[str, Any]] = []
+    names: Set[str] = set()
+    for n, spec in enumerate(specs, start=1):
+        if not isinstance(spec, dict):
+            raise RuntimeError(f"{path}: account #{n} is not a JSON object")
+        name = first_string(spec.get("name"), f"account-{n}")
+        if name in names:
+            raise RuntimeError(f"{path}: duplicate account name {name!r}")
+        names.add(name)
+        out.append(dict(spec, name=name))
+    return out
+
+
+class AgentAccount:
+    # One authenticated agent: its own McpClient (token, session), user_id, default address,
+    # buyer wallet, and a token bucket that every tool call made through it draws from.
+    def __init__(self, spec: Dict[str, Any], rate_per_sec: float, burst: int, max_in_flight: int) -> None:
+        self.name = str(spec["name"])
+        self.spec = spec
+        self.limiter = RateLimiter(
+            to_float(spec.get("rate_per_sec"), rate_per_sec) or 0.0, to_int(spec.get("burst"), burst)
+        )
+        self.max_in_flight = max(1, to_int(spec.get("max_in_flight"), max_in_flight))
+        self.mcp: Optional[McpClient] = None
+        self.user_id = -1
+        self.shipping_address_id = -1
+        self.buyer_wallet = ""
+        self.state = "new"  # new -> bootstrapping -> ready -> evicted -> bootstrapping -> ...
+        self.in_flight = 0
+        self.failures = 0
+        self.retry_at = 0.0
+        self.last_error = ""
+        self._lock = threading.Lock()
+        self._stats = {"leases": 0, "calls": 0, "evictions": 0, "bootstraps": 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def call_tool(self, name: str, arguments: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+        if self.mcp is None:
+            raise AccountAuthError(f"account {self.name} is not bootstrapped")
+        self.limiter.acquire()
+        self._count("calls")
+        return self.mcp.call_tool(name, arguments, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+        out.update(state=self.state, user_id=self.user_id, in_flight=self.in_flight, last_error=self.last_error or None)
+        return out
+
+
+class AccountPool:
+    # Spreads work over several agent accounts. acquire() leases the least-loaded ready account
+    # (in-flight leases relative to its cap, then the fullest token bucket); release() with a 401 or
+    # token failure evicts the account, which is re-bootstrapped in the background with backoff.
+    # Setup (create_user, address, wallet) is cached per account in a JSON disk cache.
+    def __init__(
+        self,
+        endpoint: str,
+        exchange_url: str,
+        pay_method: str = "bsc",
+        default_buyer_wallet: str = "",
+        setup_cache: Optional[JsonDiskCache] = None,
+        token_store: Optional[TokenStore] = None,
+        rate_per_sec: float = 0.0,
+        burst: int = 1,
+        max_in_flight: int = 4,
+        access_ttl_sec: int = 0,
+        refresh_margin_sec: float = 300.0,
+        retry_sec: float = 30.0,
+        setup_ttl_sec: float = 7 * 86400.0,
+        spec_path: str = "",
+        client_name: str = "python-account-pool",
+    ) -> None:
+        self.endpoint = endpoint
+        self.exchange_url = exchange_url
+        self.pay_method = pay_method
+        self.default_buyer_wallet = default_buyer_wallet
+        self.setup_cache = setup_cache
+        self.token_store = token_store
+        self.rate_per_sec = float(rate_per_sec)
+        self.burst = max(1, int(burst))
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.access_ttl_sec = int(access_ttl_sec)
+        self.refresh_margin_sec = float(refresh_margin_sec)
+        self.retry_sec = max(0.1, float(retry_sec))
+        self.setup_ttl_sec = float(setup_ttl_sec)
+        self.spec_path = spec_path
+        self.client_name = client_name
+        self.accounts: Dict[str, AgentAccount] = {}
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="account")
+
+    def add(self, spec: Dict[str, Any]) -> AgentAccount:
+        account = AgentAccount(spec, self.rate_per_sec, self.burst, self.max_in_flight)
+        with self._cond:
+            self.accounts[account.name] = account
+        return account
+
+    def adopt(self, name: str, mcp: McpClient, user_id: int, shipping_address_id: int, buyer_wallet: str) -> AgentAccount:
+        # An account already authenticated and set up elsewhere (e.g. by authenticate_from_env).
+        account = self.add({"name": name, "token": mcp.token})
+        account.mcp, account.user_id = mcp, user_id
+        account.shipping_address_id, account.buyer_wallet = shipping_address_id, buyer_wallet
+        account.state = "ready"
+        return account
+
+    def _setup_key(self, account: AgentAccount) -> str:
+        return f"{self.endpoint}|{account.user_id}|{account.buyer_wallet.lower()}"
+
+    def _reload_spec(self, account: AgentAccount) -> None:
+        # Operators rotate tokens by editing the accounts file; pick the new entry up on re-bootstrap.
+        if not self.spec_path:
+            return
+        try:
+            specs = {s["name"]: s for s in load_account_specs(self.spec_path)}
+        except (OSError, ValueError, RuntimeError):
+            return
+        if account.name in specs:
+            account.spec = specs[account.name]
+
+    def _token_key(self, account: AgentAccount) -> str:
+        # Scoped to the server and to the credential from the accounts file, so another file that
+        # reuses an account name (or a rotated credential) never picks up a stored token.
+        credential = first_string(account.spec.get("bootstrap_token"), account.spec.get("token"))
+        if not credential:
+            return ""
+        digest = hashlib.sha256(credential.encode("utf-8")).hexdigest()[:16]
+        return f"{normalize_base_url(derive_api_base_url(self.endpoint))}|account:{digest}"
+
+    def _expected_user_id(self, account: AgentAccount) -> int:
+        return account.user_id if account.user_id >= 0 else to_int(account.spec.get("user_id"), -1)
+
+    def _new_token(self, account: AgentAccount, failed_token: str) -> str:
+        token = self._find_token(account, failed_token)
+        # Orders are pinned to accounts by name, so a replacement token must be for the same user.
+        sub = decode_jwt_sub_unsafe(token)
+        expected = self._expected_user_id(account)
+        if expected >= 0 and sub is not None and sub != expected:
+            raise AccountAuthError(f"account {account.name}: new token is for user {sub}, not {expected}")
+        return token
+
+    def _find_token(self, account: AgentAccount, failed_token: str) -> str:
+        key = self._token_key(account)
+        if self.token_store is not None and key:
+            token = self.token_store.get(key, min_ttl_sec=self.refresh_margin_sec)
+            expected = self._expected_user_id(account)
+            sub = decode_jwt_sub_unsafe(token) if token else None
+            if token and token != failed_token and (expected < 0 or sub is None or sub == expected):
+                return token
+        token = first_string(account.spec.get("token"))
+        expires_at = decode_jwt_exp_unsafe(token) if token else None
+        if token and token != failed_token and (expires_at is None or expires_at - time.time() > self.refresh_margin_sec):
+            return token
+        bootstrap_token = first_string(account.spec.get("bootstrap_token"))
+        if bootstrap_token:
+            try:
+                resp = exchange_bootstrap_token(self.exchange_url, bootstrap_token, self.access_ttl_sec)
+            except (urllib.error.URLError, RuntimeError, ValueError) as exc:
+                raise AccountAuthError(f"account {account.name}: bootstrap exchange failed: {exc}") from exc
+            token = resp["access_token"]
+            if key:
+                remember_token(self.token_store, derive_api_base_url(self.endpoint), [key], token, resp)
+            return token
+        raise AccountAuthError(f"account {account.name}: no usable token (set token or bootstrap_token)")
+
+    def _bootstrap(self, account: AgentAccount) -> None:
+        failed_token = account.mcp.token if account.mcp is not None else ""
+        if failed_token:
+            # Re-bootstrap after an eviction: nothing cached for the old token is trusted.
+            key = self._token_key(account)
+            if self.token_store is not None and key and self.token_store.get(key) == failed_token:
+                self.token_store.remove(key)
+            if self.setup_cache is not None:
+                self.setup_cache.delete(self._setup_key(account))
+        self._reload_spec(account)
+        token = self._new_token(account, failed_token)
+        user_id = decode_jwt_sub_unsafe(token)
+        if user_id is None:
+            user_id = to_int(account.spec.get("user_id"), -1)
+        if user_id < 0:
+            raise AccountAuthError(f"account {account.name}: token has no sub and no user_id is given")
+        buyer_wallet = first_string(account.spec.get("buyer_wallet"), self.default_buyer_wallet)
+        if self.pay_method.lower() == "bsc" and not buyer_wallet:
+            raise RuntimeError(f"account {account.name}: buyer_wallet is required for bsc flow")
+
+        mcp = account.mcp
+        if mcp is None:
+            mcp = McpClient(
+                self.endpoint,
+                token,
+                token_refresher=lambda: self._new_token(account, account.mcp.token if account.mcp else ""),
+                refresh_margin_sec=self.refresh_margin_sec,
+            )
+        else:
+            mcp.set_token(token)
+            mcp.session_id = ""
+        initialize_session(mcp, self.client_name)
+        account.mcp, account.user_id, account.buyer_wallet = mcp, user_id, buyer_wallet
+
+        cached = self.setup_cache.get(self._setup_key(account)) if self.setup_cache is not None else None
+        if isinstance(cached, dict) and to_int(cached.get("shipping_address_id"), -1) >= 0:
+            account.shipping_address_id = to_int(cached.get("shipping_address_id"), -1)
+            return
+        account.shipping_address_id = ensure_buyer_setup(
+            mcp, user_id, to_int(account.spec.get("shipping_address_id"), -1), self.pay_method, buyer_wallet
+        )
+        if self.setup_cache is not None:
+            self.setup_cache.put_many(
+                {
+                    self._setup_key(account): (
+                        {"shipping_address_id": account.shipping_address_id, "setup_at": time.time()},
+                        time.time() + self.setup_ttl_sec,
+                    )
+                }
+            )
+
+    def _run_bootstrap(self, account: AgentAccount) -> None:
+        account._count("bootstraps")
+        try:
+            self._bootstrap(account)
+        except Exception as exc:  # noqa: BLE001
+            with self._cond:
+                account.failures += 1
+                account.state = "evicted"
+                account.last_error = str(exc)
+                account.retry_at = time.monotonic() + min(600.0, self.retry_sec * 2 ** (account.failures - 1))
+                self._cond.notify_all()
+            print(f"[accounts] {account.name}: bootstrap failed: {exc}", file=sys.stderr)
+            return
+        with self._cond:
+            account.failures = 0
+            account.state = "ready"
+            account.last_error = ""
+            self._cond.notify_all()
+
+    def _schedule(self) -> None:
+        # Caller holds self._cond.
+        now = time.monotonic()
+        for account in self.accounts.values():
+            if account.state in ("new", "evicted") and account.retry_at <= now:
+                account.state = "bootstrapping"
+                self._executor.submit(self._run_bootstrap, account)
+
+    def start(self, timeout_sec: float = 120.0) -> None:
+        # Bootstraps every account in parallel; fails only if none becomes ready.
+        deadline = time.monotonic() + timeout_sec
+        with self._cond:
+            self._schedule()
+            while any(a.state == "bootstrapping" for a in self.accounts.values()):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if not any(a.state == "ready" for a in self.accounts.values()):
+                errors = "; ".join(f"{a.name}: {a.last_error or a.state}" for a in self.accounts.values())
+                raise RuntimeError(f"no account could be bootstrapped ({errors or 'pool is empty'})")
+
+    def acquire(self, name: str = "", timeout_sec: float = 60.0) -> AgentAccount:
+        # Waits as long as it takes for capacity, but at most timeout_sec while no account is usable.
+        waiting_since = time.monotonic()
+        with self._cond:
+            if name and name not in self.accounts:
+                raise RuntimeError(f"account {name!r} is not in the pool")
+            while True:
+                self._schedule()
+                ready = [a for a in ([self.accounts[name]] if name else self.accounts.values()) if a.state == "ready"]
+                candidates = [a for a in ready if a.in_flight < a.max_in_flight]
+                if candidates:
+                    account = min(candidates, key=lambda a: (a.in_flight / a.max_in_flight, -a.limiter.available()))
+                    account.in_flight += 1
+                    account._count("leases")
+                    return account
+                if ready:
+                    waiting_since = time.monotonic()
+                elif time.monotonic() - waiting_since >= timeout_sec:
+                    states = ", ".join(f"{a.name}={a.state}" for a in self.accounts.values())
+                    raise RuntimeError(f"no usable account for {timeout_sec:.0f}s ({states})")
+                # Wake up for releases, finished bootstraps and due retries.
+                self._cond.wait(1.0)
+
+    def release(self, account: AgentAccount, exc: Optional[BaseException] = None) -> None:
+        with self._cond:
+            account.in_flight -= 1
+            if exc is not None and is_auth_error(exc) and account.state == "ready":
+                self._evict(account, str(exc))
+            self._cond.notify_all()
+
+    def _evict(self, account: AgentAccount, reason: str) -> None:
+        # Caller holds self._cond. The cached token and setup are dropped and the account re-bootstrapped.
+        account.state = "evicted"
+        account.last_error = reason
+        account.retry_at = 0.0
+        account._count("evictions")
+        print(f"[accounts] {account.name}: evicted ({reason})", file=sys.stderr)
+        self._schedule()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._cond:
+            return {name: account.stats() for name, account in self.accounts.items()}
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def open_account_setup_cache() -> Optional[JsonDiskCache]:
+    path = os.getenv("MCP_ACCOUNT_SETUP_PATH", "~/.taopochta/account_setup.json")
+    if not first_string(path) or path.lower() in ("0", "off", "false"):
+        return None
+    return JsonDiskCache(path)
+
+
+def open_account_pool(path: str, pay_method: str, default_buyer_wallet: str, client_name: str) -> AccountPool:
+    endpoint, _, _, exchange_url = endpoints_from_env()
+    pool = AccountPool(
+        endpoint,
+        exchange_url,
+        pay_method=pay_method,
+        default_buyer_wallet=default_buyer_wallet,
+        setup_cache=open_account_setup_cache(),
+        token_store=open_token_store(),
+        rate_per_sec=to_float(os.getenv("MCP_ACCOUNT_RATE_PER_SEC"), 0.0) or 0.0,
+        burst=to_int(os.getenv("MCP_ACCOUNT_BURST", "1"), 1),
+        max_in_flight=to_int(os.getenv("MCP_ACCOUNT_MAX_IN_FLIGHT", "4"), 4),
+        access_ttl_sec=to_int(os.getenv("MCP_ACCESS_TOKEN_TTL_SEC", "0"), 0),
+        refresh_margin_sec=float(to_int(os.getenv("MCP_TOKEN_REFRESH_MARGIN_SEC", "300"), 300)),
+        retry_sec=to_float(os.getenv("MCP_ACCOUNT_RETRY_SEC"), 30.0) or 30.0,
+        spec_path=path,
+        client_name=client_name,
+    )
+    for spec in load_account_specs(path):
+        pool.add(spec)
+    return pool
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""Asyncio MCP client (stdlib only).
+
+AsyncMcpClient mirrors McpClient.rpc/call_tool from full_flow.py on top of a
+non-blocking HTTP/1.1 keep-alive layer built on asyncio streams, so many
+agent flows can share one event loop instead of one thread each.
+
+Concurrency is bounded by a global cap (MCP_ASYNC_MAX_CONCURRENCY) and a
+per-host cap (MCP_ASYNC_MAX_PER_HOST); requests over the cap wait on a
+semaphore rather than opening more sockets.
+
+Demo:
+MCP_ASYNC_FLOWS=50 python async_client.py
+runs initialize once, then 50 concurrent search_products flows and prints
+the pick of each flow plus pool statistics.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import http.client
+import io
+import json
+import os
+import ssl
+import sys
+import time
+import urllib.error
+import urllib.parse
+from typing import Any, Dict, List, Optional, Tuple
+
+from full_flow import (
+    derive_api_base_url,
+    resolve_mcp_endpoint,
+)
+from http_pool import DEFAULT_HTTP_TIMEOUT_SEC, IDEMPOTENT_HTTP_METHODS
+from mcp_batch import format_rpc_error, tool_payload
+from mcp_common import first_string, json_dumps_bytes, json_loads, to_int, trim_slash
+from products import pick_cheapest_product
+from response_body import DEFAULT_MAX_RESPONSE_BYTES, RESPONSE_READ_CHUNK, BodyDecoder, ResponseTooLarge
+from retry_policy import is_read_only_rpc
+from shop_resolver import extract_detail_shop_id, product_detail_url
+
+
+HostKey = Tuple[str, str, int]
+StreamPair = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+async def _read_chunked(reader: asyncio.StreamReader, decoder: BodyDecoder) -> None:
+    while True:
+        size_line = await reader.readline()
+        size = int(size_line.split(b";", 1)[0].strip() or b"0", 16)
+        if size == 0:
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            return
+        while size > 0:
+            chunk = await reader.readexactly(min(size, RESPONSE_READ_CHUNK))
+            size -= len(chunk)
+            decoder.feed(chunk)
+        await reader.readexactly(2)
+
+
+async def _read_response(
+    reader: asyncio.StreamReader,
+    method: str,
+    max_body_bytes: int = DEFAULT_MAX_RESPONSE_BYTES,
+) -> Tuple[int, http.client.HTTPMessage, bytes, bool]:
+    while True:
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed before response")
+        parts = status_line.decode("latin-1").split(" ", 2)
+        version, status = parts[0], int(parts[1])
+        header_lines: List[bytes] = []
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            header_lines.append(line)
+        headers = http.client.parse_headers(io.BytesIO(b"".join(header_lines) + b"\r\n"))
+        # Interim responses (100 Continue, 103 Early Hints) precede the real one; 101 is final.
+        if not 100 <= status < 200 or status == 101:
+            break
+
+    will_close = version == "HTTP/1.0" or headers.get("connection", "").lower() == "close"
+    decoder = BodyDecoder(headers.get("content-encoding", ""), max_body_bytes)
+    if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+        pass
+    elif "chunked" in headers.get("transfer-encoding", "").lower():
+        await _read_chunked(reader, decoder)
+    elif headers.get("content-length") is not None:
+        remaining = int(headers["content-length"])
+        if decoder.encoding in ("", "identity") and remaining > max_body_bytes:
+            raise ResponseTooLarge(f"response body of {remaining} bytes exceeds {max_body_bytes} bytes")
+        while remaining > 0:
+            chunk = await reader.readexactly(min(remaining, RESPONSE_READ_CHUNK))
+            remaining -= len(chunk)
+            decoder.feed(chunk)
+    else:
+        while True:
+            chunk = await reader.read(RESPONSE_READ_CHUNK)
+            if not chunk:
+                break
+            decoder.feed(chunk)
+        will_close = True
+    return status, headers, decoder.finish(), will_close
+
+
+class AsyncHttpPool:
+    def __init__(
+        self,
+        max_concurrency: int = 100,
+        max_per_host: int = 32,
+        idle_timeout_sec: float = 30.0,
+        timeout_sec: float = DEFAULT_HTTP_TIMEOUT_SEC,
+        max_body_bytes: int = DEFAULT_MAX_RESPONSE_BYTES,
+        compression: bool = True,
+    ) -> None:
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_body_bytes = int(max_body_bytes)
+        self.compression = compression
+        self.max_per_host = max(1, int(max_per_host))
+        self.idle_timeout_sec = float(idle_timeout_sec)
+        self.timeout_sec = float(timeout_sec)
+        self._global = asyncio.Semaphore(self.max_concurrency)
+        self._per_host: Dict[HostKey, asyncio.Semaphore] = {}
+        self._idle: Dict[HostKey, List[Tuple[asyncio.StreamReader, asyncio.StreamWriter, float]]] = {}
+        self._ssl_context = ssl.create_default_context()
+        self._stats = {
+            "requests": 0,
+            "in_flight": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "connections_evicted": 0,
+        }
+
+    def _host_key(self, parsed: urllib.parse.SplitResult) -> HostKey:
+        scheme = (parsed.scheme or "http").lower()
+        port = parsed.port or (443 if scheme == "https" else 80)
+        return scheme, parsed.hostname or "", port
+
+    def _acquire_idle(self, key: HostKey) -> Optional[StreamPair]:
+        now = time.monotonic()
+        idle = self._idle.get(key, [])
+        while idle:
+            reader, writer, last_used = idle.pop()
+            if now - last_used > self.idle_timeout_sec or reader.at_eof() or writer.is_closing():
+                self._stats["connections_evicted"] += 1
+                writer.close()
+                continue
+            self._stats["connections_reused"] += 1
+            return reader, writer
+        return None
+
+    async def _connect(self, key: HostKey) -> StreamPair:
+        scheme, host, port = key
+        self._stats["connections_created"] += 1
+        ssl_context = self._ssl_context if scheme == "https" else None
+        return await asyncio.open_connection(host, port, ssl=ssl_context)
+
+    async def _exchange(
+        self,
+        key: HostKey,
+        request_bytes: bytes,
+        method: str,
+        idempotent: bool,
+    ) -> Tuple[int, http.client.HTTPMessage, bytes]:
+        conn = self._acquire_idle(key)
+        reused = conn is not None
+        while True:
+            if conn is None:
+                conn = await self._connect(key)
+            reader, writer = conn
+            sent = False
+            try:
+                writer.write(request_bytes)
+                await writer.drain()
+                sent = True
+                status, headers, body, will_close = await _read_response(reader, method, self.max_body_bytes)
+            except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError):
+                writer.close()
+                # Server closed a reused keep-alive socket: resend once on a fresh connection, but only
+                # if the request never went out or is safe to repeat (the server may have acted on it).
+                if not reused or (sent and not idempotent):
+                    raise
+                conn = None
+                reused = False
+                continue
+            except BaseException:
+                writer.close()
+                raise
+            break
+
+        if will_close:
+            writer.close()
+        else:
+            self._idle.setdefault(key, []).append((reader, writer, time.monotonic()))
+        return status, headers, body
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        idempotent: Optional[bool] = None,
+    ) -> Tuple[int, http.client.HTTPMessage, bytes]:
+        # idempotent: whether the request may be sent twice (default: by method).
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_HTTP_METHODS
+        parsed = urllib.parse.urlsplit(url)
+        key = self._host_key(parsed)
+        target = parsed.path or "/"
+        if parsed.query:
+            target = f"{target}?{parsed.query}"
+
+        lines = [f"{method.upper()} {target} HTTP/1.1", f"host: {parsed.netloc}", "connection: keep-alive"]
+        headers = headers or {}
+        if self.compression and not any(name.lower() == "accept-encoding" for name in headers):
+            lines.append("accept-encoding: gzip, deflate")
+        for name, value in headers.items():
+            lines.append(f"{name}: {value}")
+        if body is not None or method.upper() in ("POST", "PUT", "PATCH"):
+            lines.append(f"content-length: {len(body or b'')}")
+        request_bytes = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body or b"")
+
+        host_sem = self._per_host.get(key)
+        if host_sem is None:
+            host_sem = self._per_host[key] = asyncio.Semaphore(self.max_per_host)
+        async with self._global, host_sem:
+            self._stats["requests"] += 1
+            self._stats["in_flight"] += 1
+            try:
+                return await asyncio.wait_for(
+                    self._exchange(key, request_bytes, method.upper(), idempotent), self.timeout_sec
+                )
+            finally:
+                self._stats["in_flight"] -= 1
+
+    async def close(self) -> None:
+        idle_lists = list(self._idle.values())
+        self._idle = {}
+        for idle in idle_lists:
+            for _, writer, _ in idle:
+                writer.close()
+
+    def stats(self) -> Dict[str, int]:
+        out = dict(self._stats)
+        out["idle_connections"] = sum(len(v) for v in self._idle.values())
+        return out
+
+
+_default_async_pool: Optional[AsyncHttpPool] = None
+
+
+def get_default_async_pool() -> AsyncHttpPool:
+    global _default_async_pool
+    if _default_async_pool is None:
+        _default_async_pool = AsyncHttpPool(
+            max_concurrency=to_int(os.getenv("MCP_ASYNC_MAX_CONCURRENCY", "100"), 100),
+            max_per_host=to_int(os.getenv("MCP_ASYNC_MAX_PER_HOST", "32"), 32),
+            idle_timeout_sec=float(to_int(os.getenv("MCP_HTTP_IDLE_TIMEOUT_SEC", "30"), 30)),
+            max_body_bytes=to_int(os.getenv("MCP_HTTP_MAX_BODY_BYTES", ""), DEFAULT_MAX_RESPONSE_BYTES),
+            compression=os.getenv("MCP_HTTP_COMPRESSION", "on").strip().lower() not in ("0", "off", "false", "no"),
+        )
+    return _default_async_pool
+
+
+async def async_request_json(
+    url: str,
+    method: str,
+    body: Optional[Any],
+    headers: Dict[str, str],
+    pool: Optional[AsyncHttpPool] = None,
+    idempotent: Optional[bool] = None,
+) -> Any:
+    payload_bytes = None
+    if body is not None:
+        payload_bytes = json_dumps_bytes(body)
+    status, resp_headers, raw = await (pool or get_default_async_pool()).request(
+        method, url, payload_bytes, headers, idempotent
+    )
+    if 300 <= status < 400:
+        location = resp_headers.get("location", "")
+        raise urllib.error.HTTPError(url, status, f"redirect to {location or '?'} not followed", resp_headers, io.BytesIO(raw))
+    if status >= 400:
+        raise urllib.error.HTTPError(url, status, http.client.responses.get(status, ""), resp_headers, io.BytesIO(raw))
+    return json_loads(raw) if raw else {}
+
+
+async def async_request_bootstrap_by_email(
+    request_url: str,
+    email: str,
+    pool: Optional[AsyncHttpPool] = None,
+) -> Dict[str, Any]:
+    return await async_request_json(request_url, "POST", {"email": email}, {"content-type": "application/json"}, pool)
+
+
+async def async_exchange_bootstrap_token(
+    exchange_url: str,
+    bootstrap_token: str,
+    access_ttl_sec: int,
+    pool: Optional[AsyncHttpPool] = None,
+) -> Dict[str, Any]:
+    body: Dict[str, Any] = {"bootstrap_token": bootstrap_token}
+    if access_ttl_sec > 0:
+        body["ttl_sec"] = int(access_ttl_sec)
+
+    data = await async_request_json(exchange_url, "POST", body, {"content-type": "application/json"}, pool)
+
+    access_token = first_string(data.get("access_token"))
+    if not access_token:
+        raise RuntimeError(f"Bootstrap exchange returned no access_token: {data}")
+    return data
+
+
+async def async_resolve_shop_id_by_detail(
+    base_url: str,
+    token: str,
+    item_id: str,
+    item_resource: str,
+    language: str,
+    pool: Optional[AsyncHttpPool] = None,
+) -> str:
+    url = product_detail_url(base_url, item_id, item_resource, language)
+    data = await async_request_json(url, "GET", None, {"authorization": f"Bearer {token}"}, pool)
+    return extract_detail_shop_id(data)
+
+
+class AsyncMcpClient:
+    def __init__(self, endpoint: str, token: str, pool: Optional[AsyncHttpPool] = None) -> None:
+        self.endpoint = endpoint
+        self.token = token
+        self.id = 1
+        self.pool = pool or get_default_async_pool()
+
+    def next_id(self) -> int:
+        request_id = self.id
+        self.id += 1
+        return request_id
+
+    async def rpc(self, method: str, params: Dict[str, Any], with_id: bool = True) -> Dict[str, Any]:
+        if with_id:
+            body = {"jsonrpc": "2.0", "id": self.next_id(), "method": method, "params": params}
+        else:
+            body = {"jsonrpc": "2.0", "method": method, "params": params}
+        headers = {"content-type": "application/json", "authorization": f"Bearer {self.token}"}
+        result = await async_request_json(self.endpoint, "POST", body, headers, self.pool, is_read_only_rpc(body))
+        if not with_id:
+            return {}
+        if isinstance(result, dict) and isinstance(result.get("error"), dict):
+            raise RuntimeError(format_rpc_error(result["error"]))
+        return result.get("result", {})
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        raw = await self.rpc("tools/call", {"name": name, "arguments": arguments}, with_id=True)
+        return tool_payload(name, raw)
+
+
+async def run_search_flow(
+    mcp: AsyncMcpClient,
+    api_base_url: str,
+    keyword: str,
+    item_resource: str,
+    language: str,
+) -> Dict[str, Any]:
+    search_resp = await mcp.call_tool("search_products", {"keyword": keyword, "page_no": 1, "page_size": 10})
+    selected = pick_cheapest_product(search_resp.get("data", search_resp))
+    if not selected:
+        raise RuntimeError(f"No product found for {keyword!r}")
+    item_id = first_string(selected.get("item_id"), selected.get("itemId"))
+    shop_id = first_string(selected.get("shop_id"), selected.get("shopId"))
+    if item_id and not shop_id:
+        shop_id = await async_resolve_shop_id_by_detail(api_base_url, mcp.token, item_id, item_resource, language, mcp.pool)
+    return {"keyword": keyword, "item_id": item_id, "shop_id": shop_id, "price": selected.get("price")}
+
+
+async def async_main() -> None:
+    base_url_input = trim_slash(os.getenv("MCP_BASE_URL", "https://taopochta.ru/api/mcp"))
+    endpoint = resolve_mcp_endpoint(base_url_input, os.getenv("MCP_ENDPOINT", ""))
+    api_base_url = derive_api_base_url(base_url_input)
+    token = first_string(os.getenv("MCP_TOKEN"))
+    bootstrap_token = first_string(os.getenv("MCP_BOOTSTRAP_TOKEN"))
+    access_ttl = to_int(os.getenv("MCP_ACCESS_TOKEN_TTL_SEC", "0"), 0)
+    flows = max(1, to_int(os.getenv("MCP_ASYNC_FLOWS", "1"), 1))
+    keyword = os.getenv("MCP_KEYWORD", "watercup")
+    item_resource = os.getenv("MCP_ITEM_RESOURCE", "taobao")
+    detail_language = os.getenv("MCP_DETAIL_LANGUAGE", "ru")
+
+    pool = get_default_async_pool()
+    if not token:
+        if not bootstrap_token:
+            raise RuntimeError("MCP_TOKEN is not set. Provide MCP_TOKEN or MCP_BOOTSTRAP_TOKEN.")
+        exchange_url = first_string(
+            os.getenv("MCP_BOOTSTRAP_EXCHANGE_URL"),
+            f"{api_base_url}/api/mcp/bootstrap/email/exchange",
+        )
+        token = (await async_exchange_bootstrap_token(exchange_url, bootstrap_token, access_ttl, pool))["access_token"]
+        print("[auth] token issued by bootstrap exchange endpoint")
+
+    mcp = AsyncMcpClient(endpoint, token, pool)
+    await mcp.rpc(
+        "initialize",
+        {
+            "protocolVersion": "2025-03-26",
+            "capabilities": {},
+            "clientInfo": {"name": "python-async-flow", "version": "1.0.0"},
+        },
+    )
+    await mcp.rpc("notifications/initialized", {}, with_id=False)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(run_search_flow(mcp, api_base_url, keyword, item_resource, detail_language) for _ in range(flows)),
+        return_exceptions=True,
+    )
+    elapsed = time.perf_counter() - started
+    failures = [r for r in results if isinstance(r, BaseException)]
+    for result in results[:5]:
+        print(json.dumps(result if isinstance(result, dict) else {"error": str(result)}, ensure_ascii=False))
+    print(
+        json.dumps(
+            {
+                "flows": flows,
+                "failed": len(failures),
+                "elapsed_sec": round(elapsed, 3),
+                "http_pool": pool.stats(),
+            },
+            ensure_ascii=False,
+            indent=2,
+        )
+    )
+    await pool.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(async_main())
+    except Exception as exc:  # noqa: BLE001
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        sys.exit(1)
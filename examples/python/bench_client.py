@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""Client benchmark suite against the local stub server (stdlib only).
+
+Cases:
+- parse_tool_result_structured / parse_tool_result_text: decode a search_products
+  tools/call result (structuredContent vs. text-only content)
+- pick_cheapest_product: pick from a search payload of --items products
+- http_json_ping: one pooled _http_json round trip (JSON-RPC ping)
+- http_json_search: one pooled _http_json tools/call search_products round trip
+- full_flow_main: the complete full_flow.main() order flow, stdout discarded
+
+Each case reports p50/p95/p99/mean latency, throughput and the process peak
+RSS after the case. The stub runs in-process on a free port unless
+--base-url points at an external one (python stub_server.py); in-process
+numbers include the stub's own CPU time.
+
+For CI: --json writes the report, and --baseline compares each case's p95
+against an earlier report and exits 1 when one regressed by more than
+--max-regression.
+
+Usage:
+python bench_client.py [--iterations 2000] [--e2e-iterations 20] [--json report.json]
+python bench_client.py --baseline baseline.json --max-regression 0.25
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import full_flow
+from full_flow import _http_json
+from http_pool import HttpConnectionPool
+from mcp_common import parse_tool_result
+from products import pick_cheapest_product
+from stub_server import STUB_USER_ID, StubConfig, make_access_token, start_stub_server
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def percentile(sorted_samples: List[float], pct: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def run_case(name: str, fn: Callable[[], Any], iterations: int, warmup: int) -> Dict[str, Any]:
+    for _ in range(warmup):
+        fn()
+    samples: List[float] = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    return {
+        "case": name,
+        "iterations": iterations,
+        "p50_ms": round(percentile(samples, 50) * 1000, 4),
+        "p95_ms": round(percentile(samples, 95) * 1000, 4),
+        "p99_ms": round(percentile(samples, 99) * 1000, 4),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 4),
+        "throughput_per_sec": round(iterations / elapsed, 1) if elapsed > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare_to_baseline(report: Dict[str, Any], baseline_path: str, max_regression: float) -> List[str]:
+    with open(baseline_path, "r", encoding="utf-8") as fh:
+        baseline = {row["case"]: row for row in json.load(fh).get("cases", [])}
+    regressions = []
+    for row in report["cases"]:
+        before = baseline.get(row["case"])
+        if before and before.get("p95_ms") and row["p95_ms"] > before["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{row['case']}: p95 {before['p95_ms']:.3f} -> {row['p95_ms']:.3f} ms")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the Python MCP client against the stub server.")
+    parser.add_argument("--iterations", type=int, default=2000, help="iterations per micro case")
+    parser.add_argument("--e2e-iterations", type=int, default=20, help="full_flow.main() runs (0 to skip)")
+    parser.add_argument("--items", type=int, default=200, help="products per search page")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="in-process stub latency per request")
+    parser.add_argument("--base-url", default="", help="use a running stub_server.py instead of an in-process one")
+    parser.add_argument("--json", dest="json_path", default="", help="write the report to this file")
+    parser.add_argument("--baseline", default="", help="earlier --json report to compare p95 against")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="allowed p95 growth vs baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url.rstrip("/")
+    if not base_url:
+        server, base_url = start_stub_server(StubConfig(latency_ms=args.latency_ms, items=args.items))
+    endpoint = f"{base_url}/api/mcp"
+    token = make_access_token(STUB_USER_ID, 86400)
+    pool = HttpConnectionPool()
+
+    search_call = {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "tools/call",
+        "params": {"name": "search_products", "arguments": {"keyword": "bench", "page_no": 1, "page_size": args.items}},
+    }
+    search_raw = _http_json(endpoint, "POST", search_call, token, pool)["result"]
+    text_only_raw = {"content": search_raw["content"]}
+    search_payload = parse_tool_result(search_raw)
+    ping = {"jsonrpc": "2.0", "id": 1, "method": "ping", "params": {}}
+
+    micro = max(1, args.iterations)
+    network = max(1, args.iterations // 4)
+    cases = [
+        run_case("parse_tool_result_structured", lambda: parse_tool_result(search_raw), micro, micro // 10),
+        run_case("parse_tool_result_text", lambda: parse_tool_result(text_only_raw), micro, micro // 10),
+        run_case("pick_cheapest_product", lambda: pick_cheapest_product(search_payload), micro, micro // 10),
+        run_case("http_json_ping", lambda: _http_json(endpoint, "POST", ping, token, pool), network, 20),
+        run_case("http_json_search", lambda: _http_json(endpoint, "POST", search_call, token, pool), network, 20),
+    ]
+
+    if args.e2e_iterations > 0:
+        os.environ.update(
+            {
+                "MCP_BASE_URL": endpoint,
+                "MCP_TOKEN": token,
+                "MCP_BUYER_WALLET": os.getenv("MCP_BUYER_WALLET") or "0x6818384322B0B49adD9568Fc7Fa7A1eb2bD566F2",
+            }
+        )
+        for key in ("MCP_TOKEN_CACHE_PATH", "MCP_TOOLS_CACHE_PATH", "MCP_CATALOG_PATH"):
+            os.environ.setdefault(key, "off")
+
+        def run_flow() -> None:
+            with contextlib.redirect_stdout(io.StringIO()):
+                full_flow.main()
+
+        cases.append(run_case("full_flow_main", run_flow, args.e2e_iterations, 1))
+
+    report = {
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "stub": "external" if server is None else "in-process",
+        "items": args.items,
+        "cases": cases,
+    }
+    if server is not None:
+        server.shutdown()
+    pool.close()
+
+    print(f"{'case':<30} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'ops/s':>10} {'rss MB':>8}")
+    for row in cases:
+        print(
+            f"{row['case']:<30} {row['p50_ms']:>10.3f} {row['p95_ms']:>10.3f} {row['p99_ms']:>10.3f} "
+            f"{row['throughput_per_sec'] or 0:>10.1f} {row['peak_rss_mb'] or 0:>8.1f}"
+        )
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+            fh.write("\n")
+
+    if args.baseline:
+        regressions = compare_to_baseline(report, args.baseline, args.max_regression)
+        for line in regressions:
+            print(f"[REGRESSION] {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        sys.exit(1)
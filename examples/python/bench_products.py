@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Micro-benchmark for product extraction and ranking (stdlib only).
+
+Builds synthetic search_products payloads and compares the legacy
+collect_arrays + looks_like_product + linear min path with the streaming
+iter_products walker, choose_cheapest and the heap-based top_k_cheapest.
+The rerank_* rows repeat a filter + top-10 selection 20 times, once over
+raw dicts and once over a pre-normalized ProductColumns batch.
+
+Usage:
+python bench_products.py [items ...]    (default: 10000 50000)
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from products import (
+    ProductColumns,
+    choose_cheapest,
+    collect_arrays,
+    get_comparable_price,
+    iter_product_records,
+    iter_products,
+    looks_like_product,
+    more_inventory_first,
+    top_k_cheapest,
+)
+
+
+def build_payload(items: int, seed: int = 7) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    products = []
+    for i in range(items):
+        price = round(rng.uniform(1, 500), 2)
+        products.append(
+            {
+                "item_id": str(600000000000 + i),
+                "title": f"synthetic item {i}",
+                "shop_id": str(rng.randint(1, 5000)),
+                "price": f"{price:.2f}",
+                "coupon_price": f"{price * 0.9:.2f}" if i % 3 == 0 else None,
+                "inventory": rng.randint(0, 1000),
+                "skus": [{"sku_id": str(i * 10 + j), "properties": [{"k": "color", "v": "red"}]} for j in range(2)],
+            }
+        )
+    return {"success": True, "data": {"page": {"items": products, "total": items}, "facets": [[{"x": 1}]]}}
+
+
+def legacy_pick(payload: Any) -> Optional[Dict[str, Any]]:
+    arrays: List[list] = []
+    collect_arrays(payload, arrays)
+    products = [item for arr in arrays for item in arr if looks_like_product(item)]
+    best = None
+    best_price = float("inf")
+    for product in products:
+        p = get_comparable_price(product)
+        if p is not None and p < best_price:
+            best_price = p
+            best = product
+    return best if best is not None else (products[0] if products else None)
+
+
+def timed(fn: Callable[[], Any], repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def rerank_dicts(products: List[Dict[str, Any]], rounds: int = 20) -> None:
+    for _ in range(rounds):
+        cheap = [p for p in products if (get_comparable_price(p) or float("inf")) <= 100]
+        top_k_cheapest(cheap, 10)
+
+
+def rerank_columns(columns: ProductColumns, rounds: int = 20) -> None:
+    for _ in range(rounds):
+        columns.cheapest_rows(10, columns.select(max_price=100))
+
+
+def main() -> None:
+    sizes = [int(a) for a in sys.argv[1:]] or [10000, 50000]
+    for size in sizes:
+        payload = build_payload(size)
+        assert legacy_pick(payload) is choose_cheapest(iter_products(payload))
+        products = list(iter_products(payload))
+        columns = ProductColumns()
+        columns.extend(iter_product_records(payload))
+        assert columns.cheapest().raw is legacy_pick(payload)
+        rows = {
+            "legacy_pick": timed(lambda: legacy_pick(payload)),
+            "stream_pick": timed(lambda: choose_cheapest(iter_products(payload))),
+            "top_k_10": timed(lambda: top_k_cheapest(iter_products(payload), 10)),
+            "top_k_10_inventory": timed(lambda: top_k_cheapest(iter_products(payload), 10, [more_inventory_first])),
+            "build_columns": timed(lambda: ProductColumns().extend(iter_product_records(payload))),
+            "rerank_dicts_x20": timed(lambda: rerank_dicts(products), repeat=3),
+            "rerank_columns_x20": timed(lambda: rerank_columns(columns), repeat=3),
+        }
+        for name, seconds in rows.items():
+            print(f"items={size:<8} {name:<20} {seconds * 1000:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""Bulk order runner with crash-safe resume (stdlib only).
+
+Runs search_products -> estimate_shipping -> create_order -> create_escrow
+-> fund_escrow for every row of an order manifest on a worker pool.
+
+Manifest (JSONL or .csv), one order per row:
+- keyword (required unless item_id + shop_id are given)
+- sku_id, quantity, shipping_address_id (all optional)
+- item_id, shop_id (optional, skip search)
+- id (optional stable order key; defaults to a hash of the row plus which
+  identical copy it is, so adding or reordering rows keeps existing keys)
+
+Progress is appended to a write-ahead state file (JSONL, fsync'd per
+record). A rerun with the same manifest and state file resumes every order
+at its last completed step. create_order is logged as "started" before
+the call, so an order whose create_order outcome is unknown (crash or
+network error mid-call) is reported as "uncertain" and not re-sent unless
+--retry-uncertain is given. create_order, create_escrow and fund_escrow
+carry an idempotency key derived from the state file and order key, so a
+re-send is deduplicated by servers that honour it.
+
+With --accounts (or MCP_ACCOUNTS_FILE) orders are spread over a pool of
+agent accounts, each with its own token, user_id, default address, buyer
+wallet and call budget (AccountPool in account_pool.py). Every order is
+pinned to the account that started it, so a resumed order continues as
+the same user. Without it the single MCP_TOKEN account is used.
+
+Usage:
+python bulk_orders.py orders.jsonl --state bulk_state.jsonl --workers 8
+python bulk_orders.py orders.jsonl --accounts accounts.jsonl --workers 32
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+from account_pool import AccountPool, AgentAccount, open_account_pool
+from full_flow import (
+    DEFAULT_BUYER_WALLET,
+    authenticate_from_env,
+    endpoints_from_env,
+    ensure_buyer_setup,
+    get_order_no,
+    get_tx_request,
+    initialize_session,
+)
+from mcp_common import first_string, to_int
+from products import ProductColumns, iter_product_records
+from shipping_quotes import get_quote_expires_at, get_shipping_quote_id
+from shop_resolver import ShopIdResolver
+
+
+def load_manifest(path: str) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    with open(path, "r", encoding="utf-8", newline="") as fh:
+        if path.lower().endswith(".csv"):
+            raw_rows = list(csv.DictReader(fh))
+        else:
+            raw_rows = [json.loads(line) for line in fh if line.strip()]
+    seen: Dict[str, int] = {}
+    for line_no, row in enumerate(raw_rows, start=1):
+        row = {k: v for k, v in row.items() if v not in (None, "")}
+        digest = hashlib.sha1(json.dumps(row, sort_keys=True).encode("utf-8")).hexdigest()[:10]
+        # The n-th identical row is a separate order; its key must not depend on where it sits.
+        seen[digest] = seen.get(digest, 0) + 1
+        row["_key"] = first_string(row.get("id"), f"{digest}:{seen[digest]}")
+        if not first_string(row.get("id")):
+            row["_line_key"] = f"{line_no}:{digest}"
+        rows.append(row)
+    return rows
+
+
+def adopt_line_keys(rows: List[Dict[str, Any]], log: "OrderStateLog") -> None:
+    # State files from before keys stopped depending on line numbers use "<line>:<digest>".
+    for row in rows:
+        line_key = row.pop("_line_key", "")
+        if line_key and row["_key"] not in log.status and line_key in log.status:
+            row["_key"] = line_key
+
+
+class OrderStateLog:
+    # Append-only JSONL: {"key", "step", "status": started|done|failed|uncertain, "result", "at"}.
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self.status: Dict[str, Dict[str, str]] = {}
+        self.results: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a crash
+                    self._apply(record)
+        self._fh = open(path, "a", encoding="utf-8")
+        if self._fh.tell() > 0:
+            with open(path, "rb") as fh:
+                fh.seek(-1, os.SEEK_END)
+                if fh.read(1) != b"\n":
+                    self._fh.write("\n")  # terminate a torn record so the next one parses
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        key, step = str(record.get("key")), str(record.get("step"))
+        self.status.setdefault(key, {})[step] = str(record.get("status"))
+        if record.get("status") == "done":
+            self.results.setdefault(key, {})[step] = record.get("result") or {}
+
+    def append(self, key: str, step: str, status: str, result: Optional[Dict[str, Any]] = None) -> None:
+        record = {"key": key, "step": step, "status": status, "result": result or {}, "at": time.time()}
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._fh.write(line)
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self._apply(record)
+
+    def step_status(self, key: str, step: str) -> str:
+        with self._lock:
+            return self.status.get(key, {}).get(step, "")
+
+    def result(self, key: str, step: str) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.results.get(key, {}).get(step, {}))
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+def outcome_is_unknown(exc: BaseException) -> bool:
+    # Tool/JSON-RPC errors and 4xx mean the server rejected the call; anything else may have gone through,
+    # including a response whose body could not be read (too large, unknown encoding).
+    if isinstance(exc, urllib.error.HTTPError):
+        return exc.code >= 500
+    return not isinstance(exc, RuntimeError)
+
+
+class BulkRunner:
+    def __init__(
+        self,
+        pool: AccountPool,
+        log: OrderStateLog,
+        shop_resolver: ShopIdResolver,
+        pay_method: str,
+        token_symbol: str,
+        item_resource: str,
+        detail_language: str,
+        quote_ttl_sec: float,
+        retry_uncertain: bool = False,
+    ) -> None:
+        self.pool = pool
+        self.log = log
+        self.shop_resolver = shop_resolver
+        self.pay_method = pay_method
+        self.token_symbol = token_symbol
+        self.item_resource = item_resource
+        self.detail_language = detail_language
+        self.quote_ttl_sec = quote_ttl_sec
+        self.retry_uncertain = retry_uncertain
+
+    def _idempotency_key(self, key: str, step: str) -> str:
+        # Stable per (state file, order, step): a resumed or retried run replays instead of duplicating.
+        raw = f"{os.path.abspath(self.log.path)}|{key}|{step}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _step(self, key: str, step: str, fn: Any) -> Dict[str, Any]:
+        if self.log.step_status(key, step) == "done":
+            return self.log.result(key, step)
+        try:
+            result = fn()
+        except Exception as exc:  # noqa: BLE001
+            status = "uncertain" if step == "create_order" and outcome_is_unknown(exc) else "failed"
+            self.log.append(key, step, status, {"error": str(exc)})
+            raise
+        self.log.append(key, step, "done", result)
+        return result
+
+    def _search(self, account: AgentAccount, row: Dict[str, Any]) -> Dict[str, Any]:
+        item_id = first_string(row.get("item_id"))
+        shop_id = first_string(row.get("shop_id"))
+        sku_id = first_string(row.get("sku_id"))
+        if not item_id:
+            keyword = first_string(row.get("keyword"))
+            if not keyword:
+                raise RuntimeError("manifest row has neither keyword nor item_id")
+            resp = account.call_tool("search_products", {"keyword": keyword, "page_no": 1, "page_size": 10})
+            columns = ProductColumns()
+            columns.extend(iter_product_records(resp.get("data", resp)))
+            selected = columns.cheapest()
+            if selected is None or not selected.item_id:
+                raise RuntimeError(f"No product found for {keyword!r}")
+            item_id, shop_id, sku_id = selected.item_id, shop_id or selected.shop_id, sku_id or selected.sku_id
+        if not shop_id:
+            shop_id = self.shop_resolver.resolve(item_id, self.item_resource, self.detail_language)
+        if not shop_id:
+            raise RuntimeError(f"Cannot resolve shop_id for item {item_id}")
+        return {"item_id": item_id, "shop_id": shop_id, "sku_id": sku_id}
+
+    def _estimate(self, account: AgentAccount, key: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        previous = self.log.result(key, "estimate_shipping")
+        if previous and (previous.get("expires_at") or 0) > time.time():
+            return previous
+        resp = account.call_tool("estimate_shipping", args)
+        shipping_quote_id = get_shipping_quote_id(resp)
+        if not shipping_quote_id:
+            raise RuntimeError("estimate_shipping did not return shipping_quote_id")
+        result = {
+            "shipping_quote_id": shipping_quote_id,
+            "expires_at": get_quote_expires_at(resp) or time.time() + self.quote_ttl_sec,
+        }
+        self.log.append(key, "estimate_shipping", "done", result)
+        return result
+
+    def run(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        key = row["_key"]
+        order_status = self.log.step_status(key, "create_order")
+        if order_status in ("started", "uncertain") and not self.retry_uncertain:
+            return {
+                "key": key,
+                "status": "uncertain",
+                "error": "create_order outcome unknown; check the account before retrying",
+            }
+
+        # Addresses, orders and escrows belong to a user: a resumed order stays on its first account.
+        pinned = first_string(self.log.result(key, "account").get("name"))
+        account = self.pool.acquire(pinned)
+        try:
+            if not pinned:
+                self.log.append(key, "account", "done", {"name": account.name, "user_id": account.user_id})
+            summary = self._run(account, row, order_status)
+        except BaseException as exc:
+            self.pool.release(account, exc)
+            raise
+        self.pool.release(account)
+        return summary
+
+    def _run(self, account: AgentAccount, row: Dict[str, Any], order_status: str) -> Dict[str, Any]:
+        key = row["_key"]
+        summary: Dict[str, Any] = {"key": key, "account": account.name}
+        product = self._step(key, "search_products", lambda: self._search(account, row))
+        quantity = to_int(row.get("quantity", 1), 1)
+        address_id = to_int(row.get("shipping_address_id", row.get("address_id", account.shipping_address_id)), -1)
+        base_args = {
+            "shipping_address_id": address_id,
+            "shop_id": product["shop_id"],
+            "item_id": product["item_id"],
+            "sku_id": product.get("sku_id") or None,
+            "quantity": quantity,
+        }
+
+        if order_status == "done":
+            order = self.log.result(key, "create_order")
+        else:
+            quote = self._estimate(account, key, base_args)
+
+            def create_order() -> Dict[str, Any]:
+                resp = account.call_tool(
+                    "create_order",
+                    dict(base_args, shipping_quote_id=quote["shipping_quote_id"], pay_method=self.pay_method),
+                    idempotency_key=self._idempotency_key(key, "create_order"),
+                )
+                order_no = get_order_no(resp)
+                if not order_no:
+                    raise RuntimeError("create_order did not return order_no")
+                return {"order_no": order_no, "shipping_quote_id": quote["shipping_quote_id"]}
+
+            self.log.append(key, "create_order", "started", {"shipping_quote_id": quote["shipping_quote_id"]})
+            order = self._step(key, "create_order", create_order)
+        order_no = order["order_no"]
+        summary["order_no"] = order_no
+
+        escrow_args = {"order_no": order_no, "token_symbol": self.token_symbol}
+        escrow = self._step(
+            key,
+            "create_escrow",
+            lambda: {
+                "tx_request": get_tx_request(
+                    account.call_tool(
+                        "create_escrow",
+                        dict(escrow_args, buyer_wallet=account.buyer_wallet),
+                        idempotency_key=self._idempotency_key(key, "create_escrow"),
+                    )
+                )
+            },
+        )
+        fund = self._step(
+            key,
+            "fund_escrow",
+            lambda: {
+                "tx_request": get_tx_request(
+                    account.call_tool(
+                        "fund_escrow", escrow_args, idempotency_key=self._idempotency_key(key, "fund_escrow")
+                    )
+                )
+            },
+        )
+        summary.update(status="done", create_tx_request=escrow.get("tx_request"), fund_tx_request=fund.get("tx_request"))
+        return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run many orders from a manifest with checkpoint/resume.")
+    parser.add_argument("manifest", help="JSONL or CSV order manifest")
+    parser.add_argument("--state", default="bulk_state.jsonl", help="write-ahead state file (default: bulk_state.jsonl)")
+    parser.add_argument("--workers", type=int, default=to_int(os.getenv("MCP_BULK_WORKERS", "4"), 4))
+    parser.add_argument("--retry-uncertain", action="store_true", help="re-send create_order for uncertain orders")
+    parser.add_argument("--accounts", default=os.getenv("MCP_ACCOUNTS_FILE", ""), help="JSON/JSONL account pool")
+    args = parser.parse_args()
+
+    pay_method = os.getenv("MCP_PAY_METHOD", "bsc")
+    buyer_wallet = os.getenv("MCP_BUYER_WALLET", DEFAULT_BUYER_WALLET)
+    if pay_method.lower() == "bsc" and not buyer_wallet and not args.accounts:
+        raise RuntimeError("MCP_BUYER_WALLET is required for bsc flow")
+
+    rows = load_manifest(args.manifest)
+    if args.accounts:
+        pool = open_account_pool(args.accounts, pay_method, buyer_wallet, "python-bulk-orders")
+        pool.start()
+        _, api_base_url, _, _ = endpoints_from_env()
+        resolver_mcp = next((a.mcp for a in pool.accounts.values() if a.state == "ready" and a.mcp is not None), None)
+        if resolver_mcp is None:
+            pool.close()
+            raise RuntimeError("no ready agent account")
+    else:
+        mcp, api_base_url, user_id = authenticate_from_env()
+        initialize_session(mcp, "python-bulk-orders")
+        default_address_id = ensure_buyer_setup(
+            mcp, user_id, to_int(os.getenv("MCP_SHIPPING_ADDRESS_ID", ""), -1), pay_method, buyer_wallet
+        )
+        pool = AccountPool(mcp.endpoint, "", pay_method=pay_method, max_in_flight=args.workers)
+        pool.adopt(f"user:{user_id}", mcp, user_id, default_address_id, buyer_wallet)
+        resolver_mcp = mcp
+
+    log = OrderStateLog(args.state)
+    adopt_line_keys(rows, log)
+    runner = BulkRunner(
+        pool,
+        log,
+        ShopIdResolver(api_base_url, resolver_mcp, disk_path=os.getenv("MCP_SHOP_CACHE_PATH", "")),
+        pay_method,
+        os.getenv("MCP_TOKEN_SYMBOL", "USDT").upper(),
+        os.getenv("MCP_ITEM_RESOURCE", "taobao"),
+        os.getenv("MCP_DETAIL_LANGUAGE", "ru"),
+        float(to_int(os.getenv("MCP_QUOTE_CACHE_TTL_SEC", "300"), 300)),
+        retry_uncertain=args.retry_uncertain,
+    )
+
+    started = time.perf_counter()
+    counts: Dict[str, int] = {}
+    with ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="bulk") as executor:
+        futures = {executor.submit(runner.run, row): row["_key"] for row in rows}
+        for future in as_completed(futures):
+            try:
+                summary = future.result()
+            except Exception as exc:  # noqa: BLE001
+                summary = {"key": futures[future], "status": "failed", "error": str(exc)}
+            counts[summary["status"]] = counts.get(summary["status"], 0) + 1
+            print(json.dumps(summary, ensure_ascii=False))
+    log.close()
+    pool.close()
+
+    elapsed = time.perf_counter() - started
+    print(
+        json.dumps(
+            {
+                "orders": len(rows),
+                "by_status": counts,
+                "workers": args.workers,
+                "elapsed_sec": round(elapsed, 3),
+                "orders_per_sec": round(len(rows) / elapsed, 2) if elapsed > 0 else None,
+                "state_file": args.state,
+                "accounts": pool.stats(),
+            },
+            ensure_ascii=False,
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as exc:  # noqa: BLE001
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        sys.exit(1)
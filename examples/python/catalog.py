@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Query and warm the local product catalog (stdlib only).
+
+With MCP_CATALOG_PATH set (the catalog is opt-in), full_flow.py stores
+every search_products page in a SQLite catalog with an FTS5 index over
+title and shop_name, scoped to the MCP endpoint (MCP_BASE_URL). This tool
+reads that endpoint's part of the catalog without touching the network,
+or warms it by running searches through the same SearchFanout path.
+
+Usage:
+export MCP_CATALOG_PATH=~/.taopochta/catalog.sqlite3
+python catalog.py query "保温杯" --max-price 50 --limit 10
+python catalog.py warm "water cup" "保温杯" --pages 3
+python catalog.py stats
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from full_flow import (
+    authenticate_from_env,
+    endpoints_from_env,
+    initialize_session,
+)
+from mcp_common import to_float, to_int
+from product_catalog import get_default_catalog
+from search_fanout import RateLimiter, SearchFanout
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local product catalog built from search_products results.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    query = sub.add_parser("query", help="full-text search over cached products, cheapest first")
+    query.add_argument("text")
+    query.add_argument("--limit", type=int, default=20)
+    query.add_argument("--max-price", type=float, default=None)
+    warm = sub.add_parser("warm", help="search keywords remotely (or refresh stale pages) into the catalog")
+    warm.add_argument("keywords", nargs="+")
+    warm.add_argument("--pages", type=int, default=to_int(os.getenv("MCP_SEARCH_PAGES", "1"), 1))
+    warm.add_argument("--page-size", type=int, default=to_int(os.getenv("MCP_SEARCH_PAGE_SIZE", "10"), 10))
+    sub.add_parser("stats", help="row counts and tokenizer")
+    args = parser.parse_args()
+
+    endpoint, _, _, _ = endpoints_from_env()
+    catalog = get_default_catalog(endpoint)
+    if catalog is None:
+        raise RuntimeError("product catalog is off; set MCP_CATALOG_PATH to a file to enable it")
+
+    if args.command == "query":
+        started = time.perf_counter()
+        products = catalog.query(args.text, limit=args.limit, max_price=args.max_price)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        for p in products:
+            row = {
+                "item_id": p.item_id,
+                "sku_id": p.sku_id,
+                "shop_id": p.shop_id,
+                "title": p.raw.get("title"),
+                "price": p.price,
+                "coupon_price": p.coupon_price,
+            }
+            print(json.dumps(row, ensure_ascii=False))
+        print(f"{len(products)} products in {elapsed_ms:.2f} ms", file=sys.stderr)
+    elif args.command == "warm":
+        mcp, _, _ = authenticate_from_env()
+        initialize_session(mcp, "python-catalog")
+        fanout = SearchFanout(
+            mcp,
+            args.keywords,
+            pages=args.pages,
+            page_size=args.page_size,
+            concurrency=to_int(os.getenv("MCP_SEARCH_CONCURRENCY", "4"), 4),
+            rate_limiter=RateLimiter(to_float(os.getenv("MCP_SEARCH_RATE_PER_SEC", "0"), 0) or 0),
+            catalog=catalog,
+        )
+        seen = sum(1 for _ in fanout.stream())
+        catalog.close()  # waits for background refreshes
+        summary = {"products": seen, "requests": fanout.requests_sent, "local_pages": fanout.local_pages, "errors": fanout.errors}
+        print(json.dumps(summary, ensure_ascii=False))
+    else:
+        print(json.dumps(catalog.stats(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        sys.exit(1)
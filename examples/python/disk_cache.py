@@ -0,0 +1,109 @@
+"""Small JSON files on disk shared between runs and processes (stdlib only).
+
+read_json_file / write_json_file_atomic read and atomically replace a JSON
+file. JsonDiskCache keeps {key: {"value", "expires_at"}} entries in one such
+file; every write merges with what is on disk, so several processes can
+share it, and expired entries are dropped on write. announce_cache_file
+prints once per process where a default-on cache is being written.
+
+Usage:
+from disk_cache import JsonDiskCache
+cache = JsonDiskCache("~/.taopochta/tools_cache.json")
+cache.put_many({"key": ({"tools": []}, time.time() + 3600)})
+tools = cache.get("key")
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from mcp_common import to_float
+
+
+def read_json_file(path: str) -> Any:
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json_file_atomic(path: str, data: Any, mode: int = 0o644) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    with os.fdopen(fd, "w", encoding="utf-8") as fh:
+        json.dump(data, fh)
+    os.replace(tmp_path, path)
+
+
+_announced_paths: Set[str] = set()
+_announced_lock = threading.Lock()
+
+
+def announce_cache_file(path: str, what: str, env_name: str) -> None:
+    # Caches that are on by default say once where they write, so the file can be found and removed.
+    with _announced_lock:
+        if path in _announced_paths:
+            return
+        _announced_paths.add(path)
+    print(f"[cache] {what} written to {path} ({env_name}=off disables it)", file=sys.stderr)
+
+
+class JsonDiskCache:
+    # {key: {"value": ..., "expires_at": epoch_sec}}; writes merge with the file so processes can share it.
+    def __init__(self, path: str, what: str = "", env_name: str = "") -> None:
+        self.path = os.path.expanduser(path)
+        self.what = what
+        self.env_name = env_name
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            data = read_json_file(self.path)
+            self._entries = data if isinstance(data, dict) else {}
+        return self._entries
+
+    def get_with_expiry(self, key: str) -> Tuple[Any, float]:
+        with self._lock:
+            entry = self._load().get(key)
+        expires_at = (to_float(entry.get("expires_at"), 0) or 0) if isinstance(entry, dict) else 0
+        if expires_at > time.time():
+            return entry.get("value"), expires_at
+        return None, 0.0
+
+    def get(self, key: str) -> Any:
+        return self.get_with_expiry(key)[0]
+
+    def _write(self, update: Callable[[Dict[str, Dict[str, Any]]], None]) -> None:
+        now = time.time()
+        with self._lock:
+            on_disk = read_json_file(self.path)
+            entries = on_disk if isinstance(on_disk, dict) else {}
+            entries.update(self._load())
+            update(entries)
+            self._entries = {
+                k: v for k, v in entries.items() if isinstance(v, dict) and (to_float(v.get("expires_at"), 0) or 0) > now
+            }
+            try:
+                write_json_file_atomic(self.path, self._entries)
+            except OSError as exc:
+                print(f"[cache] {self.path} not written: {exc}", file=sys.stderr)
+                return
+        if self.what:
+            announce_cache_file(self.path, self.what, self.env_name)
+
+    def put_many(self, items: Dict[str, Tuple[Any, float]]) -> None:
+        if items:
+            self._write(lambda entries: entries.update({k: {"value": v, "expires_at": exp} for k, (v, exp) in items.items()}))
+
+    def delete(self, key: str) -> None:
+        self._write(lambda entries: entries.pop(key, None))
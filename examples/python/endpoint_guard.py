@@ -0,0 +1,267 @@
+"""Client-side overload protection for MCP endpoints (stdlib only).
+
+Each scheme://host:port gets one EndpointGuard, shared by every client in
+the process:
+- AdaptiveLimiter: AIMD limit on in-flight requests; shrinks on 429/5xx,
+  timeouts and latency spikes, grows on healthy responses, and waits out
+  Retry-After.
+- CircuitBreaker: after MCP_BREAKER_FAILURES consecutive failures calls
+  fail fast with CircuitOpenError for MCP_BREAKER_OPEN_SEC, then a single
+  probe decides whether it closes again.
+MCP_ADAPTIVE_LIMIT=off disables both.
+
+Usage:
+from endpoint_guard import get_endpoint_guard
+guard = get_endpoint_guard("https://taopochta.ru/api/mcp")
+guard.before(); ...; guard.after(exc, latency_sec)
+"""
+
+from __future__ import annotations
+
+import email.utils
+import http.client
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+from datetime import timezone
+from typing import Any, Dict, Optional
+
+from mcp_common import to_float, to_int
+from retry_policy import RequestAborted
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    # Retry-After is either delta-seconds or an HTTP-date.
+    text = str(value or "").strip()
+    if not text:
+        return None
+    if text.isdigit():
+        return float(text)
+    try:
+        when = email.utils.parsedate_to_datetime(text)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, when.timestamp() - time.time())
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class AdaptiveLimiter:
+    # AIMD concurrency limit: +1/limit per healthy response, x backoff_ratio on 429/5xx/timeouts or
+    # when latency exceeds latency_tolerance x the smoothed baseline. At most one decrease per baseline RTT.
+    def __init__(
+        self,
+        initial: int = 16,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        backoff_ratio: float = 0.5,
+        latency_tolerance: float = 2.0,
+        queue_timeout_sec: float = 60.0,
+    ) -> None:
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.limit = float(min(max(int(initial), self.min_limit), self.max_limit))
+        self.backoff_ratio = min(max(float(backoff_ratio), 0.1), 0.95)
+        self.latency_tolerance = max(1.0, float(latency_tolerance))
+        self.queue_timeout_sec = float(queue_timeout_sec)
+        self.in_flight = 0
+        self.waiting = 0
+        self.baseline_sec: Optional[float] = None
+        self.blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._stats = {"increases": 0, "decreases": 0, "retry_after_waits": 0, "queue_timeouts": 0}
+
+    def acquire(self) -> None:
+        deadline = time.monotonic() + self.queue_timeout_sec
+        with self._cond:
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    if now >= self.blocked_until and self.in_flight < int(self.limit):
+                        self.in_flight += 1
+                        return
+                    if now >= deadline:
+                        self._stats["queue_timeouts"] += 1
+                        raise TimeoutError(f"waited {self.queue_timeout_sec:.0f}s for a concurrency slot")
+                    wake = deadline if now >= self.blocked_until else min(deadline, self.blocked_until)
+                    self._cond.wait(timeout=max(0.001, wake - now))
+            finally:
+                self.waiting -= 1
+
+    def _decrease(self, now: float) -> None:
+        if now - self._last_decrease < max(self.baseline_sec or 0.0, 0.05):
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * self.backoff_ratio)
+        self._stats["decreases"] += 1
+
+    def release(self, outcome: str, latency_sec: float, retry_after_sec: Optional[float] = None) -> None:
+        # outcome: "ok" (healthy response), "overload" (429/5xx/timeout) or "neutral" (no signal).
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if retry_after_sec is not None and retry_after_sec > 0:
+                self.blocked_until = max(self.blocked_until, now + min(retry_after_sec, 60.0))
+                self._stats["retry_after_waits"] += 1
+            if outcome == "overload":
+                self._decrease(now)
+            elif outcome == "ok":
+                baseline = self.baseline_sec
+                if baseline is not None and latency_sec > baseline * self.latency_tolerance:
+                    self._decrease(now)
+                elif self.limit < self.max_limit:
+                    self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+                    self._stats["increases"] += 1
+                self.baseline_sec = latency_sec if baseline is None else baseline * 0.95 + latency_sec * 0.05
+            self._cond.notify_all()
+
+    def state(self) -> Dict[str, Any]:
+        with self._cond:
+            out: Dict[str, Any] = dict(self._stats)
+            out.update(
+                limit=round(self.limit, 2),
+                in_flight=self.in_flight,
+                waiting=self.waiting,
+                baseline_ms=round(self.baseline_sec * 1000, 2) if self.baseline_sec is not None else None,
+                blocked_for_sec=round(max(0.0, self.blocked_until - time.monotonic()), 2),
+            )
+        return out
+
+
+class CircuitBreaker:
+    # closed -> open after failure_threshold consecutive failures; open fails fast for open_sec,
+    # then half_open lets one probe through: success closes, failure re-opens, and a probe that
+    # never reached the server (abandon_probe) lets the next caller probe instead.
+    def __init__(self, failure_threshold: int = 5, open_sec: float = 10.0) -> None:
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.open_sec = float(open_sec)
+        self.status = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self._stats = {"opened": 0, "rejected": 0}
+
+    def allow(self) -> None:
+        with self._lock:
+            if self.status == "closed":
+                return
+            if self.status == "open" and time.monotonic() - self.opened_at >= self.open_sec:
+                self.status = "half_open"
+                self._probe_in_flight = False
+            if self.status == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self._stats["rejected"] += 1
+            retry_in = max(0.0, self.open_sec - (time.monotonic() - self.opened_at))
+        raise CircuitOpenError(f"MCP endpoint circuit is open; retry in {retry_in:.1f}s")
+
+    def record(self, failed: bool) -> None:
+        with self._lock:
+            if not failed:
+                self.status = "closed"
+                self.consecutive_failures = 0
+                self._probe_in_flight = False
+                return
+            self.consecutive_failures += 1
+            if self.status == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.status != "open":
+                    self._stats["opened"] += 1
+                self.status = "open"
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def abandon_probe(self) -> None:
+        # The call let through by allow() produced no verdict on the server; keep the state as is.
+        with self._lock:
+            self._probe_in_flight = False
+
+    def state(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out.update(status=self.status, consecutive_failures=self.consecutive_failures)
+        return out
+
+
+class EndpointGuard:
+    def __init__(self, limiter: AdaptiveLimiter, breaker: CircuitBreaker) -> None:
+        self.limiter = limiter
+        self.breaker = breaker
+
+    def before(self) -> None:
+        self.breaker.allow()
+        try:
+            self.limiter.acquire()
+        except TimeoutError:
+            # The breaker may be half-open with this call as its probe; don't leave it stuck, but a
+            # call that never went out is no evidence that the server recovered either.
+            self.breaker.abandon_probe()
+            raise
+
+    def after(self, exc: Optional[BaseException], latency_sec: float) -> None:
+        retry_after = None
+        if exc is None:
+            outcome, failed = "ok", False
+        elif isinstance(exc, RequestAborted):
+            # Cut off by the client (a hedge won): says nothing about the server.
+            outcome, failed = "neutral", None
+        elif isinstance(exc, urllib.error.HTTPError):
+            retry_after = parse_retry_after(exc.headers.get("retry-after") if exc.headers else None)
+            if exc.code == 429 or exc.code >= 500:
+                outcome, failed = "overload", True
+            else:
+                # Other 4xx: the server is up and answering.
+                outcome, failed = "neutral", False
+        elif isinstance(exc, (TimeoutError, ConnectionError, http.client.HTTPException)):
+            outcome, failed = "overload", True
+        else:
+            outcome, failed = "neutral", None
+        self.limiter.release(outcome, latency_sec, retry_after)
+        if failed is None:
+            self.breaker.abandon_probe()
+        else:
+            self.breaker.record(failed)
+
+    def state(self) -> Dict[str, Any]:
+        return {"limiter": self.limiter.state(), "breaker": self.breaker.state()}
+
+
+_endpoint_guards: Dict[str, EndpointGuard] = {}
+_endpoint_guards_lock = threading.Lock()
+
+
+def get_endpoint_guard(endpoint: str) -> Optional[EndpointGuard]:
+    # One limiter + breaker per scheme://host:port, shared by every McpClient in the process.
+    if os.getenv("MCP_ADAPTIVE_LIMIT", "on").strip().lower() in ("0", "off", "false", "no"):
+        return None
+    parsed = urllib.parse.urlsplit(endpoint)
+    key = f"{(parsed.scheme or 'http').lower()}://{parsed.netloc.lower()}"
+    with _endpoint_guards_lock:
+        guard = _endpoint_guards.get(key)
+        if guard is None:
+            guard = _endpoint_guards[key] = EndpointGuard(
+                AdaptiveLimiter(
+                    initial=to_int(os.getenv("MCP_LIMIT_INITIAL", "16"), 16),
+                    min_limit=to_int(os.getenv("MCP_LIMIT_MIN", "1"), 1),
+                    max_limit=to_int(os.getenv("MCP_LIMIT_MAX", "64"), 64),
+                ),
+                CircuitBreaker(
+                    failure_threshold=to_int(os.getenv("MCP_BREAKER_FAILURES", "5"), 5),
+                    open_sec=to_float(os.getenv("MCP_BREAKER_OPEN_SEC"), 10.0) or 10.0,
+                ),
+            )
+        return guard
+
+
+def endpoint_guard_states() -> Dict[str, Dict[str, Any]]:
+    with _endpoint_guards_lock:
+        guards = dict(_endpoint_guards)
+    return {key: guard.state() for key, guard in guards.items()}
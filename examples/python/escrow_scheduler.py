@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""Deadline-driven resolve_timeout / execute_dispute scheduler for escrows (stdlib only).
+
+Reads order numbers (same inputs as export_proofs.py: files of order_nos or
+JSONL / bulk_orders.py state files, and --range), learns each escrow's
+deadline from get_order_proof and keeps all of them in one min-heap:
+- funded/locked escrow with timeout_at (or deadline/expires_at/...) -> resolve_timeout
+- disputed escrow with dispute_deadline_at (or vote_deadline/...) -> execute_dispute
+- final escrow (released/refunded/resolved/...) -> dropped
+- anything else -> re-checked every --recheck-sec
+
+The scheduler sleeps until the earliest deadline plus --grace-sec and sends
+every action due by then as one JSON-RPC batch; each acted-on order is
+re-read --settle-sec later and rescheduled from its new state. Push/pop are
+O(log n) per escrow; superseded heap entries are skipped lazily.
+
+A rejected action is retried with exponential backoff. Rejections of calls
+sent less than --max-skew-sec after the deadline are counted as early (the
+server clock is behind) and do not use up --max-attempts. A batch that gets
+no reply at all (connection error, timeout, 5xx, open circuit) leaves the
+schedule untouched and is retried with backoff.
+
+The schedule is persisted as an append-only journal (--state, one record
+per change), so a restart resumes from it and only orders not yet in the
+journal are scanned.
+
+Usage:
+python escrow_scheduler.py orders.txt bulk_state.jsonl --state escrow_schedule.jsonl
+python escrow_scheduler.py --state escrow_schedule.jsonl --once --dry-run
+"""
+
+from __future__ import annotations
+
+import argparse
+import heapq
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from escrow_watch import ESCROW_TARGET_STATES, get_escrow_state
+from export_proofs import FINAL_ESCROW_STATES, iter_order_nos
+from full_flow import (
+    McpClient,
+    authenticate_from_env,
+    initialize_session,
+)
+from mcp_common import parse_timestamp, to_float, to_int
+
+DISPUTE_STATES = {"disputed", "dispute", "in_dispute", "dispute_open", "voting"}
+TIMEOUT_STATES = ESCROW_TARGET_STATES["fund"]
+TIMEOUT_KEYS = ("timeout_at", "timeout", "deadline_at", "deadline", "auto_release_at", "release_at", "expires_at")
+DISPUTE_KEYS = ("dispute_deadline_at", "dispute_deadline", "vote_deadline_at", "vote_deadline", "vote_end_at", "deadline_at")
+DEADLINE_ACTIONS = ("resolve_timeout", "execute_dispute")
+MAX_BACKOFF_SEC = 300.0
+
+
+def find_deadline(proof: Dict[str, Any], keys: Tuple[str, ...]) -> Optional[float]:
+    data = proof.get("data") if isinstance(proof.get("data"), dict) else {}
+    for scope in (proof, data, proof.get("escrow"), data.get("escrow")):
+        if isinstance(scope, dict):
+            for key in keys:
+                if scope.get(key) not in (None, ""):
+                    due_at = parse_timestamp(scope[key])
+                    if due_at is not None:
+                        return due_at
+    return None
+
+
+def next_action(proof: Dict[str, Any]) -> Tuple[str, str, Optional[float]]:
+    # (action, escrow_state, due_at): action is resolve_timeout, execute_dispute, check or done.
+    state = get_escrow_state(proof)
+    if state in FINAL_ESCROW_STATES:
+        return "done", state, None
+    if state in DISPUTE_STATES:
+        due_at = find_deadline(proof, DISPUTE_KEYS)
+        if due_at is not None:
+            return "execute_dispute", state, due_at
+    elif state in TIMEOUT_STATES:
+        due_at = find_deadline(proof, TIMEOUT_KEYS)
+        if due_at is not None:
+            return "resolve_timeout", state, due_at
+    return "check", state, None
+
+
+class ScheduleJournal:
+    # Append-only JSONL of {"order_no", "action", "due_at", "state", "attempts"}; the last record per
+    # order wins and action "done" removes it.
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.finished: Dict[str, str] = {}
+        self._records = 0
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a crash
+                    self._apply(record)
+                    self._records += 1
+        self._fh = open(path, "a", encoding="utf-8")
+        if self._fh.tell() > 0:
+            with open(path, "rb") as fh:
+                fh.seek(-1, os.SEEK_END)
+                if fh.read(1) != b"\n":
+                    self._fh.write("\n")
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        order_no = str(record.get("order_no"))
+        if record.get("action") == "done":
+            self.entries.pop(order_no, None)
+            self.finished[order_no] = str(record.get("state") or "")
+        else:
+            self.finished.pop(order_no, None)
+            self.entries[order_no] = record
+
+    def known(self, order_no: str) -> bool:
+        return order_no in self.entries or order_no in self.finished
+
+    def append(self, records: List[Dict[str, Any]]) -> None:
+        if not records:
+            return
+        lines = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        with self._lock:
+            self._fh.write(lines)
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            for record in records:
+                self._apply(record)
+            self._records += len(records)
+
+    def close(self) -> None:
+        self._fh.close()
+        live = len(self.entries) + len(self.finished)
+        if self._records > 2 * live + 1000:
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                for order_no, state in self.finished.items():
+                    fh.write(json.dumps({"order_no": order_no, "action": "done", "state": state}, ensure_ascii=False) + "\n")
+                for record in self.entries.values():
+                    fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp_path, self.path)
+
+
+class DeadlineScheduler:
+    def __init__(
+        self,
+        mcp: McpClient,
+        journal: ScheduleJournal,
+        batch_size: int = 50,
+        recheck_sec: float = 3600.0,
+        settle_sec: float = 5.0,
+        max_attempts: int = 5,
+        grace_sec: float = 2.0,
+        max_skew_sec: float = 60.0,
+        dry_run: bool = False,
+    ) -> None:
+        self.mcp = mcp
+        self.journal = journal
+        self.batch_size = max(1, int(batch_size))
+        self.recheck_sec = float(recheck_sec)
+        self.settle_sec = float(settle_sec)
+        self.max_attempts = max(1, int(max_attempts))
+        self.grace_sec = max(0.0, float(grace_sec))
+        self.max_skew_sec = max(0.0, float(max_skew_sec))
+        self.dry_run = dry_run
+        self._heap: List[Tuple[float, int, str]] = []
+        self._current: Dict[str, int] = {}
+        self._seq = 0
+        self._transport_failures = 0
+        self._stats = {
+            "scanned": 0,
+            "scheduled": 0,
+            "actions": 0,
+            "action_errors": 0,
+            "early_rejections": 0,
+            "transport_errors": 0,
+            "checks": 0,
+            "done": 0,
+            "batches": 0,
+        }
+        self.max_lag_ms = 0.0
+        for order_no, record in journal.entries.items():
+            self._push(order_no, self._wake_at(record))
+
+    def _wake_at(self, record: Dict[str, Any]) -> float:
+        # Deadline actions wait out the grace margin and any backoff after a rejection; checks run at due_at.
+        due_at = float(record.get("due_at") or 0.0)
+        if record.get("action") in DEADLINE_ACTIONS:
+            due_at = max(due_at + self.grace_sec, float(record.get("not_before") or 0.0))
+        return due_at
+
+    def _backoff(self, failures: int) -> float:
+        return min(max(self.settle_sec, 1.0) * 2 ** min(max(failures, 1) - 1, 16), MAX_BACKOFF_SEC)
+
+    def _push(self, order_no: str, due_at: float) -> None:
+        # A newer push supersedes older heap entries for the same order; they are skipped on pop.
+        self._seq += 1
+        self._current[order_no] = self._seq
+        heapq.heappush(self._heap, (due_at, self._seq, order_no))
+
+    def pending(self) -> int:
+        return len(self._current)
+
+    def next_due(self) -> Optional[float]:
+        while self._heap and self._current.get(self._heap[0][2]) != self._heap[0][1]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def _pop_due(self, now: float) -> List[str]:
+        due: List[str] = []
+        while len(due) < self.batch_size and self.next_due() is not None and self._heap[0][0] <= now:
+            _, seq, order_no = heapq.heappop(self._heap)
+            del self._current[order_no]
+            due.append(order_no)
+        return due
+
+    def _plan(self, order_no: str, proof: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        action, state, due_at = next_action(proof)
+        # Rejections count only while the same action stays due; a state change starts over.
+        same = bool(previous) and previous.get("pending_action") == action
+        attempts = int(previous.get("attempts") or 0) if same else 0
+        if action == "done":
+            self._stats["done"] += 1
+            return {"order_no": order_no, "action": "done", "state": state}
+        if action == "check":
+            due_at = time.time() + self.recheck_sec
+        record = {"order_no": order_no, "action": action, "due_at": due_at, "state": state, "attempts": attempts}
+        if same:
+            for key in ("early", "not_before"):
+                if previous.get(key):
+                    record[key] = previous[key]
+        self._stats["scheduled"] += 1
+        self._push(order_no, self._wake_at(record))
+        return record
+
+    def _fetch_proofs(self, order_nos: List[str]) -> Iterator[Tuple[str, Optional[Dict[str, Any]], str]]:
+        batch = self.mcp.batch()
+        entries = [(o, batch.call_tool("get_order_proof", {"order_no": o})) for o in order_nos]
+        batch.send()
+        self._stats["batches"] += 1
+        for order_no, entry in entries:
+            yield order_no, (entry.result if entry.ok and isinstance(entry.result, dict) else None), entry.error
+
+    def scan(self, order_nos: Iterator[str]) -> None:
+        # Orders already in the journal keep their schedule; only new ones are read.
+        chunk: List[str] = []
+        for order_no in order_nos:
+            if not self.journal.known(order_no):
+                chunk.append(order_no)
+            if len(chunk) >= self.batch_size:
+                self._scan_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._scan_chunk(chunk)
+
+    def _scan_chunk(self, order_nos: List[str]) -> None:
+        try:
+            proofs = list(self._fetch_proofs(order_nos))
+        except Exception as exc:
+            # Not journaled yet: the orders wait in the heap and tick() reads them like a due check.
+            self._defer(order_nos, exc)
+            return
+        self._transport_failures = 0
+        records = []
+        for order_no, proof, error in proofs:
+            self._stats["scanned"] += 1
+            if proof is None:
+                print(f"[WARN] get_order_proof {order_no}: {error}", file=sys.stderr)
+                continue
+            records.append(self._plan(order_no, proof))
+        self.journal.append(records)
+
+    def tick(self) -> int:
+        # Runs everything due now: deadline actions as one batch, checks as one proof batch.
+        now = time.time()
+        due = self._pop_due(now)
+        if not due:
+            return 0
+        actions = [o for o in due if self.journal.entries.get(o, {}).get("action") in DEADLINE_ACTIONS]
+        checks = [o for o in due if o not in actions]
+        records: List[Dict[str, Any]] = []
+        unanswered: List[str] = []
+        if actions:
+            try:
+                records.extend(self._act(actions))
+            except Exception as exc:
+                self._defer(actions, exc)
+                unanswered.extend(actions)
+        if checks:
+            try:
+                proofs = list(self._fetch_proofs(checks))
+            except Exception as exc:
+                self._defer(checks, exc)
+                unanswered.extend(checks)
+                proofs = []
+            self._stats["checks"] += len(proofs)
+            for order_no, proof, error in proofs:
+                previous = self.journal.entries.get(order_no)
+                if proof is None:
+                    print(f"[WARN] get_order_proof {order_no}: {error}", file=sys.stderr)
+                    self._push(order_no, time.time() + self.settle_sec)
+                    continue
+                record = self._plan(order_no, proof, previous)
+                if record["action"] != "done" and record["attempts"] >= self.max_attempts:
+                    # The server keeps rejecting a due action; stop hammering it and leave it to an operator.
+                    self._current.pop(order_no, None)
+                    print(f"[WARN] {order_no}: {record['action']} failed {record['attempts']} times; giving up", file=sys.stderr)
+                    record = {"order_no": order_no, "action": "done", "state": f"stuck:{record['state']}"}
+                records.append(record)
+        if not unanswered:
+            self._transport_failures = 0
+        self.journal.append(records)
+        return len(due)
+
+    def _defer(self, order_nos: List[str], exc: Exception) -> None:
+        # The batch got no reply (connection error, timeout, 5xx, open circuit): the journal keeps the
+        # orders as they were and the same calls go out again after a growing backoff.
+        self._transport_failures += 1
+        self._stats["transport_errors"] += 1
+        delay = self._backoff(self._transport_failures)
+        print(f"[WARN] batch of {len(order_nos)} calls failed: {exc}; retrying in {delay:.0f}s", file=sys.stderr)
+        retry_at = time.time() + delay
+        for order_no in order_nos:
+            self._push(order_no, retry_at)
+
+    def _act(self, order_nos: List[str]) -> List[Dict[str, Any]]:
+        batch = self.mcp.batch()
+        sent = []
+        for order_no in order_nos:
+            record = self.journal.entries[order_no]
+            lag_ms = max(0.0, (time.time() - float(record["due_at"])) * 1000)
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            if self.dry_run:
+                print(json.dumps({"order_no": order_no, "action": record["action"], "dry_run": True, "lag_ms": round(lag_ms, 1)}))
+                continue
+            sent.append((order_no, record, lag_ms, batch.call_tool(record["action"], {"order_no": order_no})))
+        if sent:
+            batch.send()
+            self._stats["batches"] += 1
+        out: List[Dict[str, Any]] = []
+        for order_no, record, lag_ms, entry in sent:
+            self._stats["actions"] += 1
+            # Rejected right after the deadline: most likely the server clock is behind ours, which is
+            # not a reason to give up on the order.
+            early = not entry.ok and lag_ms < self.max_skew_sec * 1000
+            attempts = int(record.get("attempts") or 0) + (0 if entry.ok or early else 1)
+            early_count = int(record.get("early") or 0) + (1 if early else 0)
+            if early:
+                self._stats["early_rejections"] += 1
+            elif not entry.ok:
+                self._stats["action_errors"] += 1
+            line = {"order_no": order_no, "action": record["action"], "ok": entry.ok, "lag_ms": round(lag_ms, 1)}
+            if not entry.ok:
+                line.update(error=entry.error, early=early)
+            print(json.dumps(line, ensure_ascii=False), flush=True)
+            # Re-read the order once the action had time to land, and reschedule from its new state.
+            check_at = time.time() + self.settle_sec
+            self._push(order_no, check_at)
+            check = {
+                "order_no": order_no,
+                "action": "check",
+                "due_at": check_at,
+                "state": record.get("state"),
+                "pending_action": record["action"],
+                "attempts": attempts,
+            }
+            if early_count:
+                check["early"] = early_count
+            if not entry.ok:
+                check["not_before"] = time.time() + self._backoff(attempts + early_count)
+            out.append(check)
+        if self.dry_run:
+            # Nothing was sent; look again after the recheck interval.
+            for order_no in order_nos:
+                self._push(order_no, time.time() + self.recheck_sec)
+        return out
+
+    def run(self, stop: threading.Event, once: bool = False) -> None:
+        while not stop.is_set():
+            self.tick()
+            next_due = self.next_due()
+            if next_due is None or (once and next_due > time.time()):
+                return
+            stop.wait(max(0.0, next_due - time.time()))
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats, pending=self.pending(), max_lag_ms=round(self.max_lag_ms, 1))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Call resolve_timeout / execute_dispute when escrow deadlines pass.")
+    parser.add_argument("sources", nargs="*", help="files of order_nos (plain lines or JSONL with order_no)")
+    parser.add_argument("--range", dest="ranges", action="append", default=[], help="PREFIX<start>..PREFIX<end>")
+    parser.add_argument("--state", default=os.getenv("MCP_SCHEDULER_STATE", "escrow_schedule.jsonl"), help="schedule journal")
+    parser.add_argument("--batch-size", type=int, default=to_int(os.getenv("MCP_SCHEDULER_BATCH_SIZE", "50"), 50))
+    parser.add_argument("--recheck-sec", type=float, default=to_float(os.getenv("MCP_SCHEDULER_RECHECK_SEC"), 3600.0) or 3600.0)
+    parser.add_argument("--settle-sec", type=float, default=to_float(os.getenv("MCP_SCHEDULER_SETTLE_SEC"), 5.0) or 5.0)
+    parser.add_argument("--max-attempts", type=int, default=5, help="give up on an order after this many rejected actions")
+    parser.add_argument(
+        "--grace-sec",
+        type=float,
+        default=to_float(os.getenv("MCP_SCHEDULER_GRACE_SEC"), 2.0),
+        help="act this long after a deadline, to absorb clock skew",
+    )
+    parser.add_argument(
+        "--max-skew-sec",
+        type=float,
+        default=to_float(os.getenv("MCP_SCHEDULER_MAX_SKEW_SEC"), 60.0),
+        help="rejections this soon after a deadline are early, not failed, attempts",
+    )
+    parser.add_argument("--once", action="store_true", help="handle what is due now, then exit")
+    parser.add_argument("--dry-run", action="store_true", help="print due actions without sending them")
+    args = parser.parse_args()
+
+    mcp, _, _ = authenticate_from_env()
+    initialize_session(mcp, "python-escrow-scheduler")
+    journal = ScheduleJournal(args.state)
+    scheduler = DeadlineScheduler(
+        mcp,
+        journal,
+        batch_size=args.batch_size,
+        recheck_sec=args.recheck_sec,
+        settle_sec=args.settle_sec,
+        max_attempts=args.max_attempts,
+        grace_sec=args.grace_sec,
+        max_skew_sec=args.max_skew_sec,
+        dry_run=args.dry_run,
+    )
+    stop = threading.Event()
+    try:
+        if args.sources or args.ranges:
+            scheduler.scan(iter_order_nos(args.sources, args.ranges))
+        next_due = scheduler.next_due()
+        print(
+            f"[scheduler] {scheduler.pending()} escrows scheduled"
+            + (f", next due in {max(0.0, next_due - time.time()):.1f}s" if next_due is not None else ""),
+            file=sys.stderr,
+        )
+        scheduler.run(stop, once=args.once)
+    except KeyboardInterrupt:
+        stop.set()
+    finally:
+        journal.close()
+    print(json.dumps(scheduler.stats(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Escrow / tx settlement tracker for many orders at once (stdlib only).
+
+Reads watch entries (JSONL), one per line:
+- order_no (required)
+- action: create | fund | confirm (required)
+- tx_hash (optional; when given, the tx status inside the order proof decides)
+
+All entries are polled by a single EscrowTracker: due orders are sent as one
+JSON-RPC batch of get_order_proof calls per tick, with per-order exponential
+backoff + jitter that resets whenever the observed state changes. With
+--submit, submit_tx is sent for every entry that has a tx_hash first.
+
+Each settled entry is printed as one JSON line as soon as it resolves.
+
+Usage:
+python escrow_tracker.py watches.jsonl --timeout 1800 [--submit]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import as_completed
+from typing import Any, Dict, List
+
+from escrow_watch import ESCROW_TARGET_STATES, EscrowTracker, find_tx_status, get_escrow_state
+from full_flow import (
+    authenticate_from_env,
+    initialize_session,
+)
+from mcp_common import to_float, to_int
+
+
+def load_watches(path: str) -> List[Dict[str, Any]]:
+    watches: List[Dict[str, Any]] = []
+    with open(path, "r", encoding="utf-8") as fh:
+        for line_no, line in enumerate(fh, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = json.loads(line)
+            order_no = str(entry.get("order_no") or "").strip()
+            action = str(entry.get("action") or "").strip().lower()
+            if not order_no or action not in ESCROW_TARGET_STATES:
+                raise RuntimeError(f"{path}:{line_no}: order_no and action (create|fund|confirm) are required")
+            watches.append({"order_no": order_no, "action": action, "tx_hash": str(entry.get("tx_hash") or "").strip()})
+    return watches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Track escrow/tx settlement for many orders with batched polling.")
+    parser.add_argument("watches", help="JSONL file of {order_no, action, tx_hash}")
+    parser.add_argument("--timeout", type=float, default=to_float(os.getenv("MCP_WAIT_TX_SEC"), 1800.0) or 1800.0)
+    parser.add_argument("--batch-size", type=int, default=to_int(os.getenv("MCP_TRACKER_BATCH_SIZE", "50"), 50))
+    parser.add_argument("--submit", action="store_true", help="send submit_tx for entries with a tx_hash first")
+    args = parser.parse_args()
+
+    watches = load_watches(args.watches)
+    mcp, _, _ = authenticate_from_env()
+    initialize_session(mcp, "python-escrow-tracker")
+
+    if args.submit:
+        batch = mcp.batch()
+        submitted = [
+            (w, batch.call_tool("submit_tx", {"order_no": w["order_no"], "action": w["action"], "tx_hash": w["tx_hash"]}))
+            for w in watches
+            if w["tx_hash"]
+        ]
+        if submitted:
+            batch.send()
+        for w, entry in submitted:
+            if not entry.ok:
+                print(f"[WARN] submit_tx({w['action']}) for {w['order_no']}: {entry.error}", file=sys.stderr)
+
+    tracker = EscrowTracker(
+        mcp,
+        batch_size=args.batch_size,
+        base_delay_sec=max(to_float(os.getenv("MCP_TRACKER_BASE_DELAY_SEC"), 2.0), 0.05),
+        max_delay_sec=max(to_float(os.getenv("MCP_TRACKER_MAX_DELAY_SEC"), 60.0), 0.1),
+    )
+    started = time.monotonic()
+    futures = {
+        tracker.watch(w["order_no"], w["action"], w["tx_hash"], timeout_sec=args.timeout): w for w in watches
+    }
+    counts: Dict[str, int] = {}
+    for future in as_completed(futures):
+        w = futures[future]
+        line: Dict[str, Any] = dict(w, elapsed_sec=round(time.monotonic() - started, 3))
+        try:
+            proof = future.result()
+            line["status"] = "settled"
+            line["escrow_state"] = get_escrow_state(proof) or None
+            if w["tx_hash"]:
+                line["tx_status"] = find_tx_status(proof, w["tx_hash"]) or None
+        except TimeoutError as exc:
+            line.update(status="timeout", error=str(exc))
+        except Exception as exc:  # noqa: BLE001
+            line.update(status="failed", error=str(exc))
+        counts[line["status"]] = counts.get(line["status"], 0) + 1
+        print(json.dumps(line, ensure_ascii=False), flush=True)
+    tracker.stop()
+
+    print(
+        json.dumps(
+            {"watches": len(watches), "by_status": counts, "tracker": tracker.stats(), "http_pool": mcp.pool.stats()},
+            ensure_ascii=False,
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,289 @@
+"""Escrow / tx settlement polling shared by the flow scripts (stdlib only).
+
+EscrowTracker keeps every watched order on one heap and polls them from a
+single background thread: the orders that are due go out as one JSON-RPC
+batch of get_order_proof calls per tick, rate limited, with per-order
+exponential backoff + jitter that resets whenever the observed escrow or
+tx state changes. Each watch resolves a Future with the final proof, or
+fails it on a failed tx or when its deadline passes.
+
+Usage:
+from escrow_watch import EscrowTracker
+tracker = EscrowTracker(mcp, batch_size=50)
+proof = tracker.watch(order_no, "fund", tx_hash=tx_hash, timeout_sec=600).result()
+tracker.stop()
+"""
+
+from __future__ import annotations
+
+import heapq
+import random
+import sys
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set, Tuple
+
+from mcp_batch import RpcResult
+from mcp_common import first_string
+from search_fanout import RateLimiter
+
+if TYPE_CHECKING:
+    from full_flow import McpClient
+
+
+TX_CONFIRMED_STATES = {"confirmed", "success", "succeeded", "mined", "finalized"}
+TX_FAILED_STATES = {"failed", "reverted", "dropped", "rejected"}
+ESCROW_TARGET_STATES = {
+    "create": {"created", "awaiting_fund", "pending_fund"},
+    "fund": {"funded", "locked"},
+    "confirm": {"released", "completed", "confirmed"},
+}
+
+
+def get_escrow_state(proof: Dict[str, Any]) -> str:
+    data = proof.get("data") if isinstance(proof.get("data"), dict) else {}
+    scopes = [proof, data, proof.get("escrow"), data.get("escrow")]
+    for scope in scopes:
+        if isinstance(scope, dict):
+            state = first_string(scope.get("escrow_state"), scope.get("escrow_status"), scope.get("state"), scope.get("status"))
+            if state:
+                return state.lower()
+    return ""
+
+
+def find_tx_status(proof: Any, tx_hash: str) -> str:
+    wanted = tx_hash.lower()
+    stack = [proof]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, dict):
+            if first_string(node.get("tx_hash"), node.get("hash"), node.get("transaction_hash")).lower() == wanted:
+                if node.get("confirmed") is True:
+                    return "confirmed"
+                return first_string(node.get("status"), node.get("state"), node.get("tx_status")).lower()
+            stack.extend(v for v in node.values() if isinstance(v, (list, dict)))
+    return ""
+
+
+class EscrowWatch:
+    __slots__ = ("order_no", "action", "tx_hash", "until", "deadline", "future", "callback", "attempt", "last_state")
+
+    def __init__(
+        self,
+        order_no: str,
+        action: str,
+        tx_hash: str,
+        until: Optional[Callable[[Dict[str, Any]], Optional[bool]]],
+        deadline: float,
+        callback: Optional[Callable[["EscrowWatch", Dict[str, Any]], None]],
+    ) -> None:
+        self.order_no = order_no
+        self.action = action
+        self.tx_hash = tx_hash
+        self.until = until
+        self.deadline = deadline
+        self.future: Future = Future()
+        self.callback = callback
+        self.attempt = 0
+        self.last_state = ""
+
+    def evaluate(self, proof: Dict[str, Any]) -> Optional[bool]:
+        # True = target reached, False = terminal failure, None = keep polling.
+        if self.until is not None:
+            return self.until(proof)
+        if self.tx_hash:
+            status = find_tx_status(proof, self.tx_hash)
+            if status in TX_CONFIRMED_STATES:
+                return True
+            if status in TX_FAILED_STATES:
+                return False
+        return True if get_escrow_state(proof) in ESCROW_TARGET_STATES.get(self.action, set()) else None
+
+
+class EscrowTracker:
+    # One background thread polls get_order_proof for all watched orders, one JSON-RPC batch per tick.
+    def __init__(
+        self,
+        mcp: "McpClient",
+        batch_size: int = 50,
+        base_delay_sec: float = 2.0,
+        max_delay_sec: float = 60.0,
+        jitter: float = 0.3,
+        max_batches_per_sec: float = 2.0,
+    ) -> None:
+        self.mcp = mcp
+        self.batch_size = max(1, int(batch_size))
+        self.base_delay_sec = float(base_delay_sec)
+        self.max_delay_sec = float(max_delay_sec)
+        self.jitter = min(max(float(jitter), 0.0), 0.9)
+        self.rate_limiter = RateLimiter(max_batches_per_sec)
+        self._heap: List[Tuple[float, int, EscrowWatch]] = []
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._stats = {"watches": 0, "reached": 0, "failed": 0, "timed_out": 0, "batches": 0, "polls": 0, "poll_errors": 0}
+
+    def _schedule(self, watch: EscrowWatch, delay_sec: float) -> None:
+        with self._cond:
+            self._seq += 1
+            heapq.heappush(self._heap, (time.monotonic() + delay_sec, self._seq, watch))
+            self._cond.notify()
+
+    def watch(
+        self,
+        order_no: str,
+        action: str,
+        tx_hash: str = "",
+        until: Optional[Callable[[Dict[str, Any]], Optional[bool]]] = None,
+        timeout_sec: float = 1800.0,
+        callback: Optional[Callable[[EscrowWatch, Dict[str, Any]], None]] = None,
+    ) -> Future:
+        watch = EscrowWatch(order_no, action, tx_hash, until, time.monotonic() + float(timeout_sec), callback)
+        with self._cond:
+            self._stats["watches"] += 1
+        self._schedule(watch, 0.0)
+        self.start()
+        return watch.future
+
+    def start(self) -> None:
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="escrow-tracker", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def _next_batch(self) -> List[EscrowWatch]:
+        with self._cond:
+            while self._running:
+                now = time.monotonic()
+                if self._heap and self._heap[0][0] <= now:
+                    break
+                self._cond.wait(timeout=self._heap[0][0] - now if self._heap else None)
+            due: List[EscrowWatch] = []
+            orders: Set[str] = set()
+            while self._running and self._heap and self._heap[0][0] <= time.monotonic():
+                watch = self._heap[0][2]
+                if watch.order_no not in orders and len(orders) >= self.batch_size:
+                    break
+                heapq.heappop(self._heap)
+                if not watch.future.done():
+                    orders.add(watch.order_no)
+                    due.append(watch)
+            return due
+
+    def _run(self) -> None:
+        while True:
+            due = self._next_batch()
+            if not due:
+                with self._cond:
+                    if not self._running:
+                        return
+                continue
+            self.rate_limiter.acquire()
+            try:
+                self._poll(due)
+            except Exception as exc:  # noqa: BLE001
+                with self._cond:
+                    self._stats["poll_errors"] += 1
+                print(f"[tracker] poll failed: {exc}", file=sys.stderr)
+                for watch in due:
+                    self._backoff(watch, progressed=False)
+
+    def _poll(self, due: List[EscrowWatch]) -> None:
+        batch = self.mcp.batch()
+        entries: Dict[str, RpcResult] = {}
+        for watch in due:
+            if watch.order_no not in entries:
+                entries[watch.order_no] = batch.call_tool("get_order_proof", {"order_no": watch.order_no})
+        batch.send()
+        with self._cond:
+            self._stats["batches"] += 1
+            self._stats["polls"] += len(entries)
+
+        for watch in due:
+            entry = entries[watch.order_no]
+            if not entry.ok:
+                with self._cond:
+                    self._stats["poll_errors"] += 1
+                self._backoff(watch, progressed=False)
+                continue
+            proof = entry.result
+            try:
+                outcome = watch.evaluate(proof)
+            except Exception as exc:  # noqa: BLE001
+                # A broken until() predicate fails its own watch, not the poller.
+                with self._cond:
+                    self._stats["failed"] += 1
+                self._resolve(watch, error=exc)
+                continue
+            if outcome is None:
+                state = f"{get_escrow_state(proof)}|{find_tx_status(proof, watch.tx_hash) if watch.tx_hash else ''}"
+                progressed = state != watch.last_state
+                watch.last_state = state
+                self._backoff(watch, progressed)
+                continue
+            with self._cond:
+                self._stats["reached" if outcome else "failed"] += 1
+            if outcome:
+                self._resolve(watch, proof)
+            else:
+                status = find_tx_status(proof, watch.tx_hash) if watch.tx_hash else get_escrow_state(proof)
+                self._resolve(watch, error=RuntimeError(f"{watch.action} tx for {watch.order_no} failed: {status}"))
+            if watch.callback is not None:
+                try:
+                    watch.callback(watch, proof)
+                except Exception as exc:  # noqa: BLE001
+                    print(f"[tracker] callback for {watch.order_no} failed: {exc}", file=sys.stderr)
+
+    @staticmethod
+    def _resolve(watch: EscrowWatch, proof: Optional[Dict[str, Any]] = None, error: Optional[BaseException] = None) -> None:
+        # The caller may have cancelled the future meanwhile; a late outcome must not kill the poller thread.
+        if watch.future.done():
+            return
+        try:
+            if error is None:
+                watch.future.set_result(proof)
+            else:
+                watch.future.set_exception(error)
+        except InvalidStateError:
+            pass
+
+    def _backoff(self, watch: EscrowWatch, progressed: bool) -> None:
+        if watch.future.done():
+            return  # cancelled by the caller: stop polling for it
+        # A state change means the chain/escrow is moving, so poll sooner; otherwise back off exponentially.
+        watch.attempt = 0 if progressed else watch.attempt + 1
+        delay = min(self.max_delay_sec, self.base_delay_sec * (2 ** min(watch.attempt, 16)))
+        delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        if time.monotonic() + delay > watch.deadline:
+            remaining = watch.deadline - time.monotonic()
+            if remaining <= 0:
+                with self._cond:
+                    self._stats["timed_out"] += 1
+                self._resolve(watch, error=TimeoutError(f"{watch.action} for {watch.order_no} not settled in time"))
+                return
+            delay = remaining
+        self._schedule(watch, delay)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            out = dict(self._stats)
+            out["pending"] = len(self._heap)
+        return out
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""Incremental bulk export of order proofs to NDJSON (stdlib only).
+
+Order numbers come from any mix of:
+- files with one order_no per line, or JSONL with an order_no field
+  (bulk_orders.py state files work as-is: result.order_no is picked up)
+- --range T1700000000000001..T1700000000000500 (same prefix, numeric suffix)
+
+get_order_proof is sent as JSON-RPC batches of --batch-size calls on
+--workers threads, with at most 2 x workers batches in flight, so memory
+stays bounded by the batch window and the order_no set, not by the export.
+Each proof is appended to the output as one compact JSON line:
+{"order_no", "escrow_state", "fetched_at", "proof"}.
+
+A watermark index (JSONL, one record per exported order, fsync'd per batch)
+keeps the hash and escrow state of every exported proof. Later runs skip
+orders whose escrow already reached a final state and only write proofs
+that are new or whose content changed. --full ignores the index.
+
+Usage:
+python export_proofs.py orders.txt bulk_state.jsonl --out proofs.ndjson --index proofs.index.jsonl
+python export_proofs.py --range T1700000000000001..T1700000005000000 --out - --batch-size 100
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Set, TextIO, Tuple
+
+from escrow_watch import ESCROW_TARGET_STATES, get_escrow_state
+from full_flow import (
+    McpClient,
+    authenticate_from_env,
+    initialize_session,
+)
+from mcp_common import to_int
+
+# Escrow states after which a proof no longer changes; such orders are not fetched again.
+FINAL_ESCROW_STATES = ESCROW_TARGET_STATES["confirm"] | {"refunded", "cancelled", "canceled", "resolved", "closed"}
+
+
+def parse_range(spec: str) -> Iterator[str]:
+    start, sep, end = spec.partition("..")
+    m_start = re.fullmatch(r"(.*?)(\d+)", start.strip())
+    m_end = re.fullmatch(r"(.*?)(\d+)", end.strip())
+    if not sep or not m_start or not m_end or m_start.group(1) != m_end.group(1):
+        raise RuntimeError(f"--range {spec!r}: expected PREFIX<digits>..PREFIX<digits>")
+    prefix, width = m_start.group(1), len(m_start.group(2))
+    for n in range(int(m_start.group(2)), int(m_end.group(2)) + 1):
+        yield f"{prefix}{n:0{width}d}"
+
+
+def iter_order_file(path: str) -> Iterator[str]:
+    with open(path, "r", encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if not line.startswith("{"):
+                yield line
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn last line of a state file
+            result = record.get("result") if isinstance(record.get("result"), dict) else {}
+            order_no = str(record.get("order_no") or result.get("order_no") or "").strip()
+            if order_no:
+                yield order_no
+
+
+def iter_order_nos(paths: List[str], ranges: List[str]) -> Iterator[str]:
+    seen: Set[str] = set()
+    sources: List[Iterator[str]] = [iter_order_file(p) for p in paths] + [parse_range(r) for r in ranges]
+    for source in sources:
+        for order_no in source:
+            if order_no not in seen:
+                seen.add(order_no)
+                yield order_no
+
+
+def proof_hash(proof: Any) -> str:
+    return hashlib.sha1(json.dumps(proof, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+class WatermarkIndex:
+    # Append-only JSONL of {"order_no", "hash", "escrow_state", "at"}; the last record per order wins.
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.entries: Dict[str, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+        self._records = 0
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a crash
+                    self.entries[str(record.get("order_no"))] = (str(record.get("hash")), str(record.get("escrow_state") or ""))
+                    self._records += 1
+        self._fh = open(path, "a", encoding="utf-8")
+        if self._fh.tell() > 0:
+            with open(path, "rb") as fh:
+                fh.seek(-1, os.SEEK_END)
+                if fh.read(1) != b"\n":
+                    self._fh.write("\n")
+
+    def is_final(self, order_no: str) -> bool:
+        entry = self.entries.get(order_no)
+        return entry is not None and entry[1] in FINAL_ESCROW_STATES
+
+    def changed(self, order_no: str, digest: str) -> bool:
+        entry = self.entries.get(order_no)
+        return entry is None or entry[0] != digest
+
+    def record(self, rows: List[Tuple[str, str, str]]) -> None:
+        if not rows:
+            return
+        now = time.time()
+        lines = "".join(
+            json.dumps({"order_no": o, "hash": h, "escrow_state": s, "at": now}, ensure_ascii=False) + "\n" for o, h, s in rows
+        )
+        with self._lock:
+            self._fh.write(lines)
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            for order_no, digest, state in rows:
+                self.entries[order_no] = (digest, state)
+            self._records += len(rows)
+
+    def close(self) -> None:
+        self._fh.close()
+        # Rewrite without superseded records once they make up most of the file.
+        if self._records > 2 * len(self.entries) + 1000:
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                for order_no, (digest, state) in self.entries.items():
+                    fh.write(json.dumps({"order_no": order_no, "hash": digest, "escrow_state": state}, ensure_ascii=False) + "\n")
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp_path, self.path)
+
+
+class ProofExporter:
+    def __init__(self, mcp: McpClient, index: WatermarkIndex, out: TextIO, full: bool = False) -> None:
+        self.mcp = mcp
+        self.index = index
+        self.out = out
+        self.full = full
+        self._out_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requested": 0, "skipped_final": 0, "fetched": 0, "written": 0, "unchanged": 0, "failed": 0, "batches": 0}
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def wanted(self, order_nos: Iterator[str]) -> Iterator[str]:
+        for order_no in order_nos:
+            self._count("requested")
+            if not self.full and self.index.is_final(order_no):
+                self._count("skipped_final")
+                continue
+            yield order_no
+
+    def export_batch(self, order_nos: List[str]) -> None:
+        batch = self.mcp.batch()
+        entries = [(o, batch.call_tool("get_order_proof", {"order_no": o})) for o in order_nos]
+        try:
+            batch.send()
+        except Exception as exc:  # noqa: BLE001
+            # Transport-level failure of the whole batch; its orders are retried on the next run.
+            self._count("failed", len(order_nos))
+            print(f"[WARN] get_order_proof batch of {len(order_nos)} failed: {exc}", file=sys.stderr)
+            return
+        fetched_at = time.time()
+        lines: List[str] = []
+        rows: List[Tuple[str, str, str]] = []
+        for order_no, entry in entries:
+            if not entry.ok:
+                self._count("failed")
+                print(f"[WARN] get_order_proof {order_no}: {entry.error}", file=sys.stderr)
+                continue
+            proof = entry.result
+            digest = proof_hash(proof)
+            if not self.full and not self.index.changed(order_no, digest):
+                self._count("unchanged")
+                continue
+            state = get_escrow_state(proof) if isinstance(proof, dict) else ""
+            record = {"order_no": order_no, "escrow_state": state or None, "fetched_at": fetched_at, "proof": proof}
+            lines.append(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+            rows.append((order_no, digest, state))
+        # Output first, index second: a crash in between re-exports the batch rather than losing it.
+        if lines:
+            with self._out_lock:
+                self.out.write("".join(lines))
+                self.out.flush()
+        self.index.record(rows)
+        self._count("batches")
+        self._count("fetched", len(entries) - sum(1 for _, e in entries if not e.ok))
+        self._count("written", len(lines))
+
+    def run(self, order_nos: Iterator[str], batch_size: int, workers: int) -> None:
+        # Sliding window of in-flight batches keeps memory flat however long the input is.
+        max_in_flight = max(1, workers) * 2
+        in_flight: Set[Future] = set()
+
+        def drain(until: int) -> None:
+            nonlocal in_flight
+            while len(in_flight) > until:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="export") as executor:
+            chunk: List[str] = []
+            for order_no in self.wanted(order_nos):
+                chunk.append(order_no)
+                if len(chunk) >= batch_size:
+                    drain(max_in_flight - 1)
+                    in_flight.add(executor.submit(self.export_batch, chunk))
+                    chunk = []
+            if chunk:
+                in_flight.add(executor.submit(self.export_batch, chunk))
+            drain(0)
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export get_order_proof for many orders to NDJSON, incrementally.")
+    parser.add_argument("sources", nargs="*", help="files of order_nos (plain lines or JSONL with order_no)")
+    parser.add_argument("--range", dest="ranges", action="append", default=[], help="PREFIX<start>..PREFIX<end>")
+    parser.add_argument("--out", default="proofs.ndjson", help="NDJSON output, appended to ('-' for stdout)")
+    parser.add_argument("--index", default="", help="watermark index (default: <out>.index.jsonl)")
+    parser.add_argument("--batch-size", type=int, default=to_int(os.getenv("MCP_EXPORT_BATCH_SIZE", "50"), 50))
+    parser.add_argument("--workers", type=int, default=to_int(os.getenv("MCP_EXPORT_WORKERS", "4"), 4))
+    parser.add_argument("--full", action="store_true", help="ignore the index: fetch and write every order")
+    args = parser.parse_args()
+
+    if not args.sources and not args.ranges:
+        raise RuntimeError("give at least one order_no file or --range")
+    index_path = args.index or ("proofs.index.jsonl" if args.out == "-" else f"{args.out}.index.jsonl")
+    # With --out - stdout carries the export; status lines from the shared helpers go to stderr.
+    with contextlib.redirect_stdout(sys.stderr if args.out == "-" else sys.stdout):
+        mcp, _, _ = authenticate_from_env()
+        initialize_session(mcp, "python-export-proofs")
+
+    index = WatermarkIndex(index_path)
+    out = sys.stdout if args.out == "-" else open(args.out, "a", encoding="utf-8")
+    exporter = ProofExporter(mcp, index, out, full=args.full)
+    started = time.perf_counter()
+    try:
+        exporter.run(iter_order_nos(args.sources, args.ranges), max(1, args.batch_size), args.workers)
+    finally:
+        if out is not sys.stdout:
+            os.fsync(out.fileno())
+            out.close()
+        index.close()
+
+    elapsed = time.perf_counter() - started
+    stats = exporter.stats()
+    print(
+        json.dumps(
+            dict(
+                stats,
+                elapsed_sec=round(elapsed, 3),
+                proofs_per_sec=round(stats["fetched"] / elapsed, 1) if elapsed > 0 else None,
+                out=args.out,
+                index=index_path,
+                http_pool=mcp.pool.stats(),
+            ),
+            ensure_ascii=False,
+            indent=2,
+        ),
+        file=sys.stderr if args.out == "-" else sys.stdout,
+    )
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        sys.exit(1)
@@ -2,36 +2,105 @@
 """One-click MCP full flow example (stdlib only).
 
 Flow:
-initialize -> tools/list -> create_user -> create_address -> set_buyer_wallet
--> search_products (pick cheapest by coupon_price/price)
--> estimate_shipping -> create_order -> create_escrow -> fund_escrow
--> confirm_receipt -> get_order_proof
+initialize -> [notifications/initialized + tools/list]
+-> create_user -> [set_buyer_wallet + list_addresses] (-> create_address when none exists)
+   | search_products (pages x keyword variants in parallel, pick cheapest by coupon_price/price)
+-> landed cost (optional: estimate_shipping for the top-N candidates in parallel)
+-> estimate_shipping (reused from the quote cache while valid)
+-> create_order -> create_escrow -> fund_escrow -> confirm_receipt -> get_order_proof
+
+Steps in brackets are sent together as one JSON-RPC batch request. Up to
+create_order the steps run as a dependency graph (StepGraph): steps separated
+by | overlap, each step's output is printed in one block when it finishes,
+and the summary reports the critical path and the time the overlap saved
+(MCP_STEP_WORKERS=1 runs the steps in sequence).
 
 Optional tx submission:
 - CREATE_TX_HASH
 - FUND_TX_HASH
 - CONFIRM_TX_HASH
+With MCP_WAIT_TX_SEC > 0 each submitted tx is tracked (get_order_proof polling) until it settles.
+MCP_TRACE / MCP_TRACE_NDJSON / MCP_TRACE_PROM enable per-tool latency tracing.
+Requests accept streamable-HTTP (SSE) responses; escrow steps print progress notifications as they arrive.
+With MCP_CATALOG_PATH set, search_products pages are kept in a local SQLite catalog and
+answered from it while fresh; stale pages are served while they refresh in the background.
 """
 
 from __future__ import annotations
 
+import io
 import json
 import os
 import sys
 import time
-import base64
+import threading
+import http.client
+import urllib.error
 import urllib.parse
 import urllib.request
-from typing import Any, Dict, List, Optional
+import uuid
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from endpoint_guard import get_endpoint_guard
+from escrow_watch import EscrowTracker, get_escrow_state
+from http_pool import (
+    HttpConnectionPool,
+    PooledResponse,
+    get_default_pool,
+    request_json,
+)
+from mcp_batch import McpBatch, format_rpc_error, tool_payload
+from mcp_common import (
+    first_string,
+    json_dumps_bytes,
+    json_loads,
+    to_float,
+    to_int,
+    trim_slash,
+)
+from product_catalog import get_default_catalog
+from products import ProductColumns, collect_arrays
+from retry_policy import (
+    KEYED_MUTATING_TOOLS,
+    AbortHandle,
+    RetryPolicy,
+    default_retry_policies,
+    get_hedge_executor,
+    get_hedge_timer,
+    is_read_only_rpc,
+    is_retryable_error,
+    mutating_retry_mode,
+    mutating_retry_policies,
+    server_supports_idempotency,
+)
+from search_fanout import RateLimiter, SearchFanout, SearchStopRule
+from shipping_quotes import (
+    compare_landed_costs,
+    create_order_with_quote,
+    estimate_shipping_cached,
+    get_default_quote_cache,
+    get_shipping_quote_id,
+)
+from shop_resolver import ShopIdResolver
+from sse import SseEvent, SseParser
+from step_graph import StepGraph
+from token_store import (
+    TokenStore,
+    decode_jwt_exp_unsafe,
+    decode_jwt_sub_unsafe,
+    open_token_store,
+    remember_token,
+    token_cache_keys,
+)
+from tool_schema import open_tools_cache, server_fingerprint, validate_json_schema
+from tracing import Span, Tracer, get_default_tracer, write_prometheus_textfile
 
 
 DEFAULT_BUYER_WALLET = ""
 
 
-def trim_slash(value: str) -> str:
-    return str(value or "").rstrip("/")
-
-
 def derive_api_base_url(raw_base_url: str) -> str:
     base = trim_slash(raw_base_url)
     if base.endswith("/api/mcp"):
@@ -60,153 +129,6 @@ def resolve_mcp_endpoint(raw_base_url: str, explicit_endpoint: str) -> str:
     return f"{base}/api/mcp"
 
 
-def first_string(*values: Any) -> str:
-    for value in values:
-        s = str("" if value is None else value).strip()
-        if s:
-            return s
-    return ""
-
-
-def to_int(value: Any, fallback: int) -> int:
-    try:
-        return int(float(value))
-    except Exception:
-        return fallback
-
-
-def decode_jwt_sub_unsafe(token: str) -> Optional[int]:
-    try:
-        parts = str(token or "").split(".")
-        if len(parts) < 2:
-            return None
-        payload_part = parts[1]
-        padding = "=" * ((4 - len(payload_part) % 4) % 4)
-        payload_json = base64.urlsafe_b64decode((payload_part + padding).encode("utf-8")).decode("utf-8")
-        payload = json.loads(payload_json)
-        sub = payload.get("sub")
-        if sub is None:
-            return None
-        return int(sub)
-    except Exception:
-        return None
-
-
-def parse_tool_result(raw: Dict[str, Any]) -> Any:
-    if isinstance(raw, dict) and isinstance(raw.get("structuredContent"), dict):
-        return raw["structuredContent"]
-
-    content = raw.get("content") if isinstance(raw, dict) else None
-    text = None
-    if isinstance(content, list):
-        for item in content:
-            if isinstance(item, dict) and item.get("type") == "text" and isinstance(item.get("text"), str):
-                text = item["text"]
-                break
-    if not text:
-        return raw
-    try:
-        return json.loads(text)
-    except Exception:
-        return {"success": not bool(raw.get("isError")), "message": text}
-
-
-def ensure_tool_success(step: str, payload: Any) -> None:
-    if isinstance(payload, dict) and payload.get("success") is False:
-        raise RuntimeError(f"{step} failed: {payload.get('error') or payload.get('message') or 'unknown error'}")
-
-
-def collect_arrays(node: Any, out: List[list], depth: int = 0) -> None:
-    if depth > 6 or node is None:
-        return
-    if isinstance(node, list):
-        out.append(node)
-        for item in node:
-            collect_arrays(item, out, depth + 1)
-        return
-    if isinstance(node, dict):
-        for value in node.values():
-            collect_arrays(value, out, depth + 1)
-
-
-def to_price_number(raw: Any) -> Optional[float]:
-    if raw is None:
-        return None
-    s = str(raw).strip().replace(",", "")
-    if not s:
-        return None
-    try:
-        n = float(s)
-        if n >= 0:
-            return n
-    except Exception:
-        return None
-    return None
-
-
-def get_comparable_price(product: Dict[str, Any]) -> Optional[float]:
-    coupon = to_price_number(product.get("coupon_price", product.get("couponPrice")))
-    price = to_price_number(product.get("price"))
-    if coupon is not None and price is not None:
-        return min(coupon, price)
-    if coupon is not None:
-        return coupon
-    if price is not None:
-        return price
-    return None
-
-
-def looks_like_product(item: Any) -> bool:
-    if not isinstance(item, dict):
-        return False
-    item_id = first_string(item.get("item_id"), item.get("itemId"), item.get("id"))
-    if not item_id:
-        return False
-    hints = [
-        item.get("title"),
-        item.get("shop_name"),
-        item.get("price"),
-        item.get("main_image_url"),
-        item.get("coupon_price"),
-        item.get("inventory"),
-    ]
-    has_product_hint = any(v is not None for v in hints)
-    return has_product_hint or bool(first_string(item.get("shop_id"), item.get("shopId"), item.get("seller_id"), item.get("sellerId")))
-
-
-def get_sku_id(product: Dict[str, Any]) -> str:
-    return first_string(
-        product.get("sku_id"),
-        product.get("skuId"),
-        product.get("default_sku_id"),
-        product.get("defaultSkuId"),
-        product.get("sku"),
-    )
-
-
-def pick_cheapest_product(payload: Any) -> Optional[Dict[str, Any]]:
-    arrays: List[list] = []
-    collect_arrays(payload, arrays)
-    products: List[Dict[str, Any]] = []
-    for arr in arrays:
-        for item in arr:
-            if looks_like_product(item):
-                products.append(item)
-
-    best = None
-    best_price = float("inf")
-    for product in products:
-        p = get_comparable_price(product)
-        if p is None:
-            continue
-        if p < best_price:
-            best_price = p
-            best = product
-    if best is not None:
-        return best
-    return products[0] if products else None
-
-
 def extract_addresses(payload: Any) -> List[Dict[str, Any]]:
     arrays: List[list] = []
     collect_arrays(payload, arrays)
@@ -227,11 +149,6 @@ def get_order_no(payload: Dict[str, Any]) -> str:
     )
 
 
-def get_shipping_quote_id(payload: Dict[str, Any]) -> str:
-    data = payload.get("data") if isinstance(payload, dict) else {}
-    return first_string(payload.get("shipping_quote_id"), data.get("shipping_quote_id") if isinstance(data, dict) else None)
-
-
 def get_tx_request(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     if not isinstance(payload, dict):
         return None
@@ -243,51 +160,43 @@ def get_tx_request(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     return None
 
 
-def _http_json(url: str, method: str, body: Optional[Dict[str, Any]], token: str) -> Dict[str, Any]:
-    payload_bytes = None
+def _http_json(
+    url: str,
+    method: str,
+    body: Optional[Any],
+    token: str,
+    pool: Optional[HttpConnectionPool] = None,
+    span: Optional["Span"] = None,
+    timeout_sec: Optional[float] = None,
+    extra_headers: Optional[Dict[str, str]] = None,
+    idempotent: Optional[bool] = None,
+) -> Any:
     headers = {"content-type": "application/json", "authorization": f"Bearer {token}"}
-    if body is not None:
-        payload_bytes = json.dumps(body).encode("utf-8")
-    req = urllib.request.Request(url, data=payload_bytes, method=method.upper(), headers=headers)
-    with urllib.request.urlopen(req, timeout=60) as resp:
-        text = resp.read().decode("utf-8")
-        return json.loads(text) if text else {}
+    if extra_headers:
+        headers.update(extra_headers)
+    return request_json(url, method, body, headers, pool, span, timeout_sec, idempotent)
 
 
-def request_bootstrap_by_email(request_url: str, email: str) -> Dict[str, Any]:
+def request_bootstrap_by_email(
+    request_url: str,
+    email: str,
+    pool: Optional[HttpConnectionPool] = None,
+) -> Dict[str, Any]:
     body = {"email": email}
-    payload_bytes = json.dumps(body).encode("utf-8")
-    req = urllib.request.Request(
-        request_url,
-        data=payload_bytes,
-        method="POST",
-        headers={"content-type": "application/json"},
-    )
-    with urllib.request.urlopen(req, timeout=60) as resp:
-        text = resp.read().decode("utf-8")
-        data = json.loads(text) if text else {}
-    return data
+    return request_json(request_url, "POST", body, {"content-type": "application/json"}, pool)
 
 
 def exchange_bootstrap_token(
     exchange_url: str,
     bootstrap_token: str,
     access_ttl_sec: int,
+    pool: Optional[HttpConnectionPool] = None,
 ) -> Dict[str, Any]:
     body: Dict[str, Any] = {"bootstrap_token": bootstrap_token}
     if access_ttl_sec > 0:
         body["ttl_sec"] = int(access_ttl_sec)
 
-    payload_bytes = json.dumps(body).encode("utf-8")
-    req = urllib.request.Request(
-        exchange_url,
-        data=payload_bytes,
-        method="POST",
-        headers={"content-type": "application/json"},
-    )
-    with urllib.request.urlopen(req, timeout=60) as resp:
-        text = resp.read().decode("utf-8")
-        data = json.loads(text) if text else {}
+    data = request_json(exchange_url, "POST", body, {"content-type": "application/json"}, pool)
 
     access_token = first_string(data.get("access_token"))
     if not access_token:
@@ -308,62 +217,509 @@ def ask_bootstrap_token() -> str:
 
 
 class McpClient:
-    def __init__(self, endpoint: str, token: str) -> None:
+    def __init__(
+        self,
+        endpoint: str,
+        token: str,
+        pool: Optional[HttpConnectionPool] = None,
+        token_refresher: Optional[Callable[[], str]] = None,
+        refresh_margin_sec: float = 300.0,
+        tracer: Optional[Tracer] = None,
+        retry_policies: Optional[Dict[str, RetryPolicy]] = None,
+        streamable: Optional[bool] = None,
+    ) -> None:
         self.endpoint = endpoint
-        self.token = token
+        # Streamable HTTP: accept SSE responses, keep the Mcp-Session-Id, resume dropped streams.
+        if streamable is None:
+            streamable = os.getenv("MCP_STREAMABLE_HTTP", "on").strip().lower() not in ("0", "off", "false", "no")
+        self.streamable = streamable
+        self.session_id = ""
+        self.max_stream_resumes = max(0, to_int(os.getenv("MCP_SSE_MAX_RESUMES", "3"), 3))
+        self._notification_hooks: List[Callable[[Dict[str, Any]], None]] = []
+        self._progress: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        self._stream_stats = {"event_streams": 0, "events": 0, "notifications": 0, "resumes": 0}
+        self.tracer = tracer if tracer is not None else get_default_tracer()
+        self.retry_policies = retry_policies if retry_policies is not None else default_retry_policies()
+        self._default_policies = retry_policies is None
+        self._latency: Dict[str, deque] = {}
+        self._retry_lock = threading.Lock()
+        self._retry_stats = {"retries": 0, "hedges": 0, "hedge_wins": 0}
+        self.guard = get_endpoint_guard(endpoint)
         self.id = 1
+        self._id_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.pool = pool or get_default_pool()
+        self.token_refresher = token_refresher
+        self.refresh_margin_sec = float(refresh_margin_sec)
+        self.tool_schemas: Dict[str, Dict[str, Any]] = {}
+        self.set_token(token)
+
+    def set_server_capabilities(self, init_result: Dict[str, Any]) -> None:
+        # Mutating retries are safe only where the server deduplicates on the idempotency key.
+        if self._default_policies and mutating_retry_mode() == "auto":
+            for name in KEYED_MUTATING_TOOLS:
+                self.retry_policies.pop(name, None)
+            if server_supports_idempotency(init_result):
+                self.retry_policies.update(mutating_retry_policies())
+
+    def set_tools(self, tools: List[Dict[str, Any]]) -> None:
+        self.tool_schemas = {
+            str(t["name"]): t.get("inputSchema") if isinstance(t.get("inputSchema"), dict) else {}
+            for t in tools
+            if isinstance(t, dict) and t.get("name")
+        }
 
-    def rpc(self, method: str, params: Dict[str, Any], with_id: bool = True) -> Dict[str, Any]:
-        if with_id:
-            body = {"jsonrpc": "2.0", "id": self.id, "method": method, "params": params}
+    def validate_arguments(self, name: str, arguments: Dict[str, Any]) -> None:
+        errors = validate_json_schema(self.tool_schemas.get(name), arguments)
+        if errors:
+            raise RuntimeError(f"{name} arguments invalid: {'; '.join(errors)}")
+
+    def set_token(self, token: str) -> None:
+        self.token = token
+        self.token_expires_at = decode_jwt_exp_unsafe(token)
+        self._expiry_warned = False
+
+    def _refresh_token(self, stale_token: str) -> None:
+        with self._refresh_lock:
+            # Another thread may have refreshed while this one waited.
+            if self.token == stale_token and self.token_refresher is not None:
+                self.set_token(self.token_refresher())
+
+    def _ensure_fresh_token(self) -> None:
+        if self.token_expires_at is None:
+            return
+        remaining = self.token_expires_at - time.time()
+        if remaining > self.refresh_margin_sec:
+            return
+        if self.token_refresher is not None:
+            self._refresh_token(self.token)
+        elif not self._expiry_warned:
+            self._expiry_warned = True
+            print(f"[auth] warning: access token expires in {int(remaining)}s", file=sys.stderr)
+
+    def post(
+        self,
+        body: Any,
+        span: Optional[Span] = None,
+        timeout_sec: Optional[float] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Any:
+        guard = self.guard
+        if guard is None:
+            return self._post(body, span, timeout_sec, headers)
+        guard.before()
+        started = time.perf_counter()
+        try:
+            result = self._post(body, span, timeout_sec, headers)
+        except BaseException as exc:
+            guard.after(exc, time.perf_counter() - started)
+            raise
+        guard.after(None, time.perf_counter() - started)
+        return result
+
+    def _post(
+        self,
+        body: Any,
+        span: Optional[Span],
+        timeout_sec: Optional[float],
+        headers: Optional[Dict[str, str]],
+    ) -> Any:
+        self._ensure_fresh_token()
+        token = self.token
+        try:
+            return self._exchange(body, token, span, timeout_sec, headers)
+        except urllib.error.HTTPError as exc:
+            if exc.code != 401 or self.token_refresher is None:
+                raise
+        self._refresh_token(token)
+        if span is not None and self.tracer is not None:
+            self.tracer.retry(span, "401: token refreshed")
+        return self._exchange(body, self.token, span, timeout_sec, headers)
+
+    def _exchange(
+        self,
+        body: Any,
+        token: str,
+        span: Optional[Span],
+        timeout_sec: Optional[float],
+        headers: Optional[Dict[str, str]],
+    ) -> Any:
+        # Only read-only calls may be re-sent after the server drops a reused connection.
+        idempotent = is_read_only_rpc(body)
+        if not self.streamable:
+            return _http_json(self.endpoint, "POST", body, token, self.pool, span, timeout_sec, headers, idempotent)
+        request_headers = {
+            "content-type": "application/json",
+            "accept": "application/json, text/event-stream",
+            "authorization": f"Bearer {token}",
+        }
+        if self.session_id:
+            request_headers["mcp-session-id"] = self.session_id
+        if headers:
+            request_headers.update(headers)
+        payload = json_dumps_bytes(body)
+        resp = self.pool.open("POST", self.endpoint, payload, request_headers, timeout_sec=timeout_sec, idempotent=idempotent)
+        try:
+            session_id = resp.headers.get("mcp-session-id")
+            if session_id:
+                self.session_id = session_id
+            if span is not None:
+                span.request_bytes += len(payload)
+                span.http_status = resp.status
+            if resp.status < 400 and resp.content_type == "text/event-stream":
+                return self._read_event_stream(resp, body, span, timeout_sec)
+            raw = resp.read()
+        finally:
+            resp.close()
+        if span is not None:
+            span.response_bytes += len(raw)
+        if resp.status >= 300:
+            if resp.status == 404 and self.session_id and request_headers.get("mcp-session-id"):
+                # The server dropped our session; the next initialize starts a new one.
+                self.session_id = ""
+            reason = http.client.responses.get(resp.status, "")
+            if resp.status < 400:
+                reason = f"redirect to {resp.headers.get('location') or '?'} not followed"
+            raise urllib.error.HTTPError(self.endpoint, resp.status, reason, resp.headers, io.BytesIO(raw))
+        return json_loads(raw) if raw else {}
+
+    def _read_event_stream(
+        self,
+        resp: PooledResponse,
+        body: Any,
+        span: Optional[Span],
+        timeout_sec: Optional[float],
+    ) -> Any:
+        # Server messages arrive as SSE events; notifications and server requests are handled as
+        # they come, and the call returns once every request id in the body has its response.
+        requests = body if isinstance(body, list) else [body]
+        wanted = {r["id"] for r in requests if isinstance(r, dict) and r.get("id") is not None}
+        responses: Dict[Any, Dict[str, Any]] = {}
+        parser = SseParser(self.pool.max_body_bytes)
+        resumes = 0
+        with self._retry_lock:
+            self._stream_stats["event_streams"] += 1
+        while True:
+            try:
+                for chunk in resp.iter_decoded():
+                    if span is not None:
+                        span.response_bytes += len(chunk)
+                    for event in parser.feed(chunk):
+                        self._handle_event(event, responses)
+                    if wanted and wanted <= responses.keys():
+                        break
+            except (http.client.IncompleteRead, ConnectionError) as exc:
+                dropped: Optional[BaseException] = exc
+            else:
+                dropped = None
+            finally:
+                resp.close()
+            if wanted <= responses.keys():
+                break
+            # The stream ended before all responses arrived: resume it from the last event id.
+            if not parser.last_event_id or resumes >= self.max_stream_resumes:
+                missing = ", ".join(str(i) for i in sorted(wanted - responses.keys(), key=str))
+                raise ConnectionResetError(f"event stream closed before responses for id {missing}") from dropped
+            resumes += 1
+            with self._retry_lock:
+                self._stream_stats["resumes"] += 1
+            if span is not None and self.tracer is not None:
+                self.tracer.retry(span, f"SSE resumed after event {parser.last_event_id}")
+            time.sleep((parser.retry_ms or 0) / 1000.0)
+            headers = {
+                "accept": "text/event-stream",
+                "authorization": f"Bearer {self.token}",
+                "last-event-id": parser.last_event_id,
+            }
+            if self.session_id:
+                headers["mcp-session-id"] = self.session_id
+            resp = self.pool.open("GET", self.endpoint, None, headers, timeout_sec=timeout_sec)
+            if resp.status >= 400 or resp.content_type != "text/event-stream":
+                raw = resp.read()
+                raise urllib.error.HTTPError(self.endpoint, resp.status, "SSE resume rejected", resp.headers, io.BytesIO(raw))
+            parser = SseParser(self.pool.max_body_bytes, parser.last_event_id)
+        if isinstance(body, list):
+            return list(responses.values())
+        return responses.get(body.get("id"), {}) if isinstance(body, dict) else {}
+
+    def _handle_event(self, event: SseEvent, responses: Dict[Any, Dict[str, Any]]) -> None:
+        if event.event != "message" or not event.data.strip():
+            return
+        message = json_loads(event.data)
+        with self._retry_lock:
+            self._stream_stats["events"] += 1
+        for msg in message if isinstance(message, list) else [message]:
+            if not isinstance(msg, dict):
+                continue
+            if "method" not in msg:
+                if msg.get("id") is not None:
+                    responses[msg["id"]] = msg
+            elif msg.get("id") is not None:
+                self._answer_server_request(msg)
+            else:
+                self._notify(msg)
+
+    def _notify(self, msg: Dict[str, Any]) -> None:
+        with self._retry_lock:
+            self._stream_stats["notifications"] += 1
+        params = msg.get("params") if isinstance(msg.get("params"), dict) else {}
+        if msg.get("method") == "notifications/progress":
+            callback = self._progress.get(str(params.get("progressToken")))
+            if callback is not None:
+                callback(params)
+        for hook in self._notification_hooks:
+            hook(msg)
+
+    def _answer_server_request(self, msg: Dict[str, Any]) -> None:
+        # Requests the server sends over the stream are answered with a separate POST.
+        if msg.get("method") == "ping":
+            reply: Dict[str, Any] = {"jsonrpc": "2.0", "id": msg["id"], "result": {}}
+        else:
+            error = {"code": -32601, "message": f"Method not found: {msg.get('method')}"}
+            reply = {"jsonrpc": "2.0", "id": msg["id"], "error": error}
+        headers = {"mcp-session-id": self.session_id} if self.session_id else None
+        try:
+            _http_json(self.endpoint, "POST", reply, self.token, self.pool, extra_headers=headers)
+        except (OSError, RuntimeError, ValueError) as exc:
+            print(f"[sse] reply to server request {msg.get('method')} failed: {exc}", file=sys.stderr)
+
+    def add_notification_hook(self, hook: Callable[[Dict[str, Any]], None]) -> None:
+        self._notification_hooks.append(hook)
+
+    def stream_stats(self) -> Dict[str, Any]:
+        with self._retry_lock:
+            out: Dict[str, Any] = dict(self._stream_stats)
+        out["session"] = bool(self.session_id)
+        return out
+
+    def _count(self, key: str) -> None:
+        with self._retry_lock:
+            self._retry_stats[key] += 1
+
+    def _hedge_delay(self, name: str, policy: RetryPolicy) -> float:
+        # p95 of recent un-hedged latencies for this call; the policy default until 20 samples exist.
+        with self._retry_lock:
+            samples = sorted(self._latency.get(name, ()))
+        if len(samples) < 20:
+            return policy.hedge_default_delay_sec
+        return max(policy.hedge_min_delay_sec, samples[int(len(samples) * 0.95) - 1])
+
+    def _timed_post(self, name: str, body: Any, span: Optional[Span], policy: RetryPolicy, headers: Optional[Dict[str, str]]) -> Any:
+        started = time.perf_counter()
+        result = self.post(body, span, policy.timeout_sec, headers)
+        with self._retry_lock:
+            window = self._latency.get(name)
+            if window is None:
+                window = self._latency[name] = deque(maxlen=256)
+            window.append(time.perf_counter() - started)
+        return result
+
+    def _hedged_post(self, name: str, body: Any, span: Optional[Span], policy: RetryPolicy, headers: Optional[Dict[str, str]]) -> Any:
+        # The primary attempt runs on the caller's thread. If it is slower than the recent p95, a
+        # duplicate goes out on the hedge executor; a duplicate that succeeds first aborts the
+        # primary's socket, which releases the caller.
+        handle = AbortHandle()
+        lock = threading.Lock()
+        backup: List[Future] = []
+        primary_done = False
+
+        def on_backup_done(future: Future) -> None:
+            if future.exception() is None:
+                handle.abort()
+
+        def send_backup() -> None:
+            with lock:
+                if primary_done:
+                    return
+                self._count("hedges")
+                if span is not None and self.tracer is not None:
+                    self.tracer.retry(span, "hedged")
+                backup.append(get_hedge_executor().submit(self.post, body, None, policy.timeout_sec, headers))
+            backup[0].add_done_callback(on_backup_done)
+
+        timer = get_hedge_timer()
+        entry = timer.call_later(self._hedge_delay(name, policy), send_backup)
+        primary_error: Optional[Exception] = None
+        try:
+            with self.pool.abortable(handle):
+                result = self._timed_post(name, body, span, policy, headers)
+        except Exception as exc:
+            primary_error = exc
+        finally:
+            timer.cancel(entry)
+            with lock:
+                primary_done = True
+        if primary_error is None:
+            return result
+        if not backup:
+            raise primary_error
+        try:
+            result = backup[0].result()
+        except Exception:
+            raise primary_error
+        self._count("hedge_wins")
+        return result
+
+    def post_with_policy(
+        self,
+        name: str,
+        body: Any,
+        span: Optional[Span] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Any:
+        policy = self.retry_policies.get(name)
+        if policy is None:
+            return self.post(body, span, None, headers)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                if policy.hedge:
+                    return self._hedged_post(name, body, span, policy, headers)
+                return self._timed_post(name, body, span, policy, headers)
+            except Exception as exc:
+                if attempt >= policy.max_attempts or not is_retryable_error(exc):
+                    raise
+                delay = policy.backoff(attempt)
+                self._count("retries")
+                if span is not None and self.tracer is not None:
+                    self.tracer.retry(span, f"{type(exc).__name__}: {exc}")
+                print(f"[retry] {name} attempt {attempt} failed ({exc}); retrying in {delay:.2f}s", file=sys.stderr)
+                time.sleep(delay)
+
+    def retry_stats(self) -> Dict[str, int]:
+        with self._retry_lock:
+            return dict(self._retry_stats)
+
+    def next_id(self) -> int:
+        with self._id_lock:
+            request_id = self.id
             self.id += 1
+        return request_id
+
+    def rpc(
+        self,
+        method: str,
+        params: Dict[str, Any],
+        with_id: bool = True,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
+        if with_id:
+            body = {"jsonrpc": "2.0", "id": self.next_id(), "method": method, "params": params}
         else:
             body = {"jsonrpc": "2.0", "method": method, "params": params}
-        result = _http_json(self.endpoint, "POST", body, self.token)
+        name = str(params.get("name") or method) if method == "tools/call" else method
+        if self.tracer is not None:
+            return self._traced_rpc(name, method, body, with_id, headers)
+        result = self.post_with_policy(name, body, None, headers)
         if not with_id:
             return {}
         if isinstance(result, dict) and isinstance(result.get("error"), dict):
-            err = result["error"]
-            raise RuntimeError(f"JSON-RPC {err.get('code')}: {err.get('message')}")
+            raise RuntimeError(format_rpc_error(result["error"]))
         return result.get("result", {})
 
-    def call_tool(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
-        raw = self.rpc("tools/call", {"name": name, "arguments": arguments}, with_id=True)
-        payload = parse_tool_result(raw)
-        ensure_tool_success(name, payload)
-        if isinstance(payload, dict):
-            return payload
-        return {"success": True, "data": payload}
-
-
-def resolve_shop_id_by_detail(base_url: str, token: str, item_id: str, item_resource: str, language: str) -> str:
-    query = urllib.parse.urlencode(
-        {
-            "item_resource": item_resource,
-            "item_id": item_id,
-            "language": language,
-        }
+    def _traced_rpc(
+        self,
+        name: str,
+        method: str,
+        body: Dict[str, Any],
+        with_id: bool,
+        headers: Optional[Dict[str, str]],
+    ) -> Dict[str, Any]:
+        tracer = self.tracer
+        assert tracer is not None
+        span = tracer.start(name, method)
+        try:
+            result = self.post_with_policy(name, body, span, headers)
+        except urllib.error.HTTPError as exc:
+            tracer.finish(span, f"http_{exc.code}", str(exc))
+            raise
+        except Exception as exc:
+            tracer.finish(span, "error", str(exc))
+            raise
+        if not with_id:
+            tracer.finish(span)
+            return {}
+        if isinstance(result, dict) and isinstance(result.get("error"), dict):
+            message = format_rpc_error(result["error"])
+            tracer.finish(span, "rpc_error", message)
+            raise RuntimeError(message)
+        payload = result.get("result", {})
+        tool_failed = isinstance(payload, dict) and payload.get("isError") is True
+        tracer.finish(span, "tool_error" if tool_failed else "ok")
+        return payload
+
+    def call_tool_raw(
+        self,
+        name: str,
+        arguments: Dict[str, Any],
+        idempotency_key: str = "",
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        # The tools/call result as sent by the server (content/structuredContent/isError).
+        self.validate_arguments(name, arguments)
+        headers = None
+        if name in KEYED_MUTATING_TOOLS:
+            # Same key on every retry, so the server can dedupe a create that landed before a timeout.
+            key = idempotency_key or str(arguments.get("idempotency_key") or "") or uuid.uuid4().hex
+            arguments = dict(arguments, idempotency_key=key)
+            headers = {"idempotency-key": key}
+        params: Dict[str, Any] = {"name": name, "arguments": arguments}
+        if on_progress is None or not self.streamable:
+            return self.rpc("tools/call", params, with_id=True, headers=headers)
+        # notifications/progress for this token are passed to on_progress while the call runs.
+        progress_token = uuid.uuid4().hex
+        params["_meta"] = {"progressToken": progress_token}
+        self._progress[progress_token] = on_progress
+        try:
+            return self.rpc("tools/call", params, with_id=True, headers=headers)
+        finally:
+            self._progress.pop(progress_token, None)
+
+    def call_tool(
+        self,
+        name: str,
+        arguments: Dict[str, Any],
+        idempotency_key: str = "",
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        return tool_payload(name, self.call_tool_raw(name, arguments, idempotency_key, on_progress))
+
+    def batch(self) -> McpBatch:
+        return McpBatch(self)
+
+
+def bootstrap_via_email(
+    request_url: str,
+    exchange_url: str,
+    email: str,
+    access_ttl_sec: int,
+    token_store: Optional[TokenStore] = None,
+    api_base_url: str = "",
+) -> str:
+    request_resp = request_bootstrap_by_email(
+        request_url=request_url,
+        email=email,
     )
-    url = f"{trim_slash(base_url)}/api/products/detail?{query}"
-    req = urllib.request.Request(url, method="GET", headers={"authorization": f"Bearer {token}"})
-    with urllib.request.urlopen(req, timeout=60) as resp:
-        text = resp.read().decode("utf-8")
-        data = json.loads(text) if text else {}
-    return first_string(
-        data.get("shop_id"),
-        data.get("shopId"),
-        data.get("data", {}).get("shop_id") if isinstance(data.get("data"), dict) else None,
-        data.get("data", {}).get("shopId") if isinstance(data.get("data"), dict) else None,
-        data.get("data", {}).get("data", {}).get("shop_id")
-        if isinstance(data.get("data"), dict) and isinstance(data.get("data", {}).get("data"), dict)
-        else None,
-        data.get("data", {}).get("data", {}).get("shopId")
-        if isinstance(data.get("data"), dict) and isinstance(data.get("data", {}).get("data"), dict)
-        else None,
+    print("[auth] bootstrap request response:", json.dumps(request_resp, ensure_ascii=False, indent=2))
+    bootstrap_token = ask_bootstrap_token()
+    if not bootstrap_token:
+        raise RuntimeError(
+            "Bootstrap token required. Set MCP_BOOTSTRAP_TOKEN or run in TTY and paste token from email."
+        )
+    exchange_resp = exchange_bootstrap_token(
+        exchange_url=exchange_url,
+        bootstrap_token=bootstrap_token,
+        access_ttl_sec=access_ttl_sec,
     )
+    token = exchange_resp["access_token"]
+    if api_base_url:
+        remember_token(token_store, api_base_url, token_cache_keys(api_base_url, email, ""), token, exchange_resp)
+    return token
 
 
-def main() -> None:
+def endpoints_from_env() -> Tuple[str, str, str, str]:
+    # (MCP endpoint, API base URL, bootstrap request URL, bootstrap exchange URL)
     base_url_input = trim_slash(os.getenv("MCP_BASE_URL", "https://taopochta.ru/api/mcp"))
     endpoint = resolve_mcp_endpoint(base_url_input, os.getenv("MCP_ENDPOINT", ""))
     api_base_url = derive_api_base_url(base_url_input)
@@ -375,6 +731,11 @@ def main() -> None:
         os.getenv("MCP_BOOTSTRAP_EXCHANGE_URL"),
         f"{api_base_url}/api/mcp/bootstrap/email/exchange",
     )
+    return endpoint, api_base_url, bootstrap_request_url, bootstrap_exchange_url
+
+
+def authenticate_from_env() -> Tuple["McpClient", str, int]:
+    endpoint, api_base_url, bootstrap_request_url, bootstrap_exchange_url = endpoints_from_env()
 
     user_id_env = first_string(os.getenv("MCP_USER_ID"))
     user_id = to_int(user_id_env, int(time.time() * 1000))
@@ -387,6 +748,16 @@ def main() -> None:
     if provided_sub is not None:
         user_id = provided_sub
 
+    token_store = open_token_store()
+    cache_keys = token_cache_keys(api_base_url, bootstrap_email, user_id_env)
+    refresh_margin = float(to_int(os.getenv("MCP_TOKEN_REFRESH_MARGIN_SEC", "300"), 300))
+    if not token and token_store is not None:
+        for key in cache_keys:
+            token = token_store.get(key, min_ttl_sec=refresh_margin)
+            if token:
+                print(f"[auth] reusing cached access token ({key})")
+                break
+
     if not token:
         if bootstrap_token:
             exchange_resp = exchange_bootstrap_token(
@@ -395,24 +766,12 @@ def main() -> None:
                 access_ttl_sec=access_ttl,
             )
             token = exchange_resp["access_token"]
+            remember_token(token_store, api_base_url, cache_keys, token, exchange_resp)
             print("[auth] token issued by bootstrap exchange endpoint")
         elif bootstrap_email:
-            request_resp = request_bootstrap_by_email(
-                request_url=bootstrap_request_url,
-                email=bootstrap_email,
-            )
-            print("[auth] bootstrap request response:", json.dumps(request_resp, ensure_ascii=False, indent=2))
-            bootstrap_token = ask_bootstrap_token()
-            if not bootstrap_token:
-                raise RuntimeError(
-                    "Bootstrap token required. Set MCP_BOOTSTRAP_TOKEN or run in TTY and paste token from email."
-                )
-            exchange_resp = exchange_bootstrap_token(
-                exchange_url=bootstrap_exchange_url,
-                bootstrap_token=bootstrap_token,
-                access_ttl_sec=access_ttl,
+            token = bootstrap_via_email(
+                bootstrap_request_url, bootstrap_exchange_url, bootstrap_email, access_ttl, token_store, api_base_url
             )
-            token = exchange_resp["access_token"]
             print("[auth] bootstrap token exchanged in current run")
         else:
             raise RuntimeError(
@@ -423,152 +782,339 @@ def main() -> None:
     if final_sub is not None:
         user_id = final_sub
 
-    keyword = os.getenv("MCP_KEYWORD", "watercup")
-    pay_method = os.getenv("MCP_PAY_METHOD", "bsc")
-    token_symbol = os.getenv("MCP_TOKEN_SYMBOL", "USDT").upper()
-    buyer_wallet = os.getenv("MCP_BUYER_WALLET", DEFAULT_BUYER_WALLET)
-    quantity = to_int(os.getenv("MCP_QUANTITY", "1"), 1)
-    item_resource = os.getenv("MCP_ITEM_RESOURCE", "taobao")
-    detail_language = os.getenv("MCP_DETAIL_LANGUAGE", "ru")
-
-    create_tx_hash = first_string(os.getenv("CREATE_TX_HASH"))
-    fund_tx_hash = first_string(os.getenv("FUND_TX_HASH"))
-    confirm_tx_hash = first_string(os.getenv("CONFIRM_TX_HASH"))
-
-    if pay_method.lower() == "bsc" and not buyer_wallet:
-        raise RuntimeError("MCP_BUYER_WALLET is required for bsc flow")
+    token_refresher = None
+    if bootstrap_email and sys.stdin.isatty():
+        token_refresher = lambda: bootstrap_via_email(
+            bootstrap_request_url, bootstrap_exchange_url, bootstrap_email, access_ttl, token_store, api_base_url
+        )
+    mcp = McpClient(endpoint, token, token_refresher=token_refresher, refresh_margin_sec=refresh_margin)
+    return mcp, api_base_url, user_id
 
-    mcp = McpClient(endpoint, token)
 
-    print("== initialize ==")
+def initialize_session(mcp: "McpClient", client_name: str = "python-full-flow") -> Dict[str, Any]:
+    # initialize must complete before anything else is sent; the server may not accept other
+    # messages in the same request as the one that opens the session.
     init = mcp.rpc(
         "initialize",
         {
             "protocolVersion": "2025-03-26",
             "capabilities": {},
-            "clientInfo": {"name": "python-full-flow", "version": "1.0.0"},
+            "clientInfo": {"name": client_name, "version": "1.0.0"},
         },
     )
-    print(json.dumps(init, ensure_ascii=False, indent=2))
-    mcp.rpc("notifications/initialized", {}, with_id=False)
-
-    tools_result = mcp.rpc("tools/list", {})
-    tool_names = [t.get("name") for t in tools_result.get("tools", []) if isinstance(t, dict) and t.get("name")]
-    print("tools:", tool_names)
-    has = lambda name: name in tool_names
-
+    mcp.set_server_capabilities(init)
+
+    fingerprint = server_fingerprint(init)
+    tools_cache = open_tools_cache()
+    cached_tools = tools_cache.get(mcp.endpoint) if tools_cache is not None else None
+    if not (isinstance(cached_tools, dict) and isinstance(cached_tools.get("tools"), list)):
+        cached_tools = None
+    # tools/list rides along with notifications/initialized unless the cache matches this server.
+    handshake = mcp.batch()
+    handshake.add("notifications/initialized", {}, with_id=False)
+    fresh = cached_tools is None or cached_tools.get("fingerprint") != fingerprint
+    tools_entry = handshake.tools_list() if fresh else None
+    handshake.send()
+    if tools_entry is not None:
+        tools = tools_entry.unwrap().get("tools", [])
+        if cached_tools is not None:
+            print("[tools] server fingerprint changed, tools/list refreshed")
+    else:
+        tools = cached_tools["tools"]
+        print("[tools] reusing cached tools/list for server", fingerprint)
+    if tools_cache is not None and fresh:
+        tools_ttl = float(to_int(os.getenv("MCP_TOOLS_CACHE_TTL_SEC", "86400"), 86400))
+        tools_cache.put_many({mcp.endpoint: ({"fingerprint": fingerprint, "tools": tools}, time.time() + tools_ttl)})
+    mcp.set_tools(tools)
+    return init
+
+
+def ensure_buyer_setup(
+    mcp: "McpClient",
+    user_id: int,
+    shipping_address_id: int,
+    pay_method: str,
+    buyer_wallet: str,
+) -> int:
+    has = lambda name: name in mcp.tool_schemas
+    # The user must exist before anything is attached to it, so create_user goes out on its own.
     if has("create_user"):
-        mcp.call_tool("create_user", {"user_id": user_id, "user_name": f"mcp_user_{user_id}"})
-
-    shipping_address_id = to_int(os.getenv("MCP_SHIPPING_ADDRESS_ID", ""), -1)
+        mcp.call_tool("create_user", create_user_args(user_id))
+    setup = mcp.batch()
+    listed_entry = None
     if shipping_address_id < 0 and has("list_addresses"):
-        listed = mcp.call_tool("list_addresses", {})
-        addresses = extract_addresses(listed.get("data", listed))
-        default_addr = next((a for a in addresses if a.get("is_default") is True), None)
-        shipping_address_id = to_int((default_addr or {}).get("id", (addresses[0] if addresses else {}).get("id")), -1)
+        listed_entry = setup.call_tool("list_addresses", {})
+    if pay_method.lower() == "bsc" and has("set_buyer_wallet"):
+        setup.call_tool("set_buyer_wallet", buyer_wallet_args(buyer_wallet))
+    for entry in setup.send():
+        entry.unwrap()
 
+    if listed_entry is not None:
+        shipping_address_id = pick_address_id(listed_entry.unwrap())
     if shipping_address_id < 0 and has("create_address"):
-        addr = mcp.call_tool(
-            "create_address",
-            {
-                "country_code": "RU",
-                "country_name": "Russia",
-                "state": "Moscow",
-                "city": "Moscow",
-                "street_line1": "Tverskaya 1",
-                "recipient_name": f"MCP User {user_id}",
-                "recipient_phone": "+79990000000",
-                "is_default": True,
-            },
-        )
-        shipping_address_id = to_int(first_string(addr.get("shipping_address_id"), addr.get("data", {}).get("id")), -1)
-
+        shipping_address_id = create_default_address(mcp, user_id)
     if shipping_address_id < 0:
         raise RuntimeError("Cannot resolve shipping_address_id")
-    print("shipping_address_id:", shipping_address_id)
+    return shipping_address_id
 
-    if pay_method.lower() == "bsc" and has("set_buyer_wallet"):
-        mcp.call_tool(
-            "set_buyer_wallet",
-            {
-                "address": buyer_wallet,
-                "chain_id": 56,
-                "is_primary": True,
-                "bind_method": "injected",
-            },
-        )
 
-    print("== search_products ==")
-    search_resp = mcp.call_tool("search_products", {"keyword": keyword, "page_no": 1, "page_size": 10})
-    search_payload = search_resp.get("data", search_resp)
-    selected = pick_cheapest_product(search_payload)
-    if not selected:
-        raise RuntimeError("No product found")
-
-    item_id = first_string(selected.get("item_id"), selected.get("itemId"))
-    shop_id = first_string(selected.get("shop_id"), selected.get("shopId"), os.getenv("MCP_SHOP_ID"))
-    sku_id = first_string(os.getenv("MCP_SKU_ID"), get_sku_id(selected))
-    if not item_id:
-        raise RuntimeError("No item_id in selected product")
-    if not shop_id:
-        shop_id = resolve_shop_id_by_detail(api_base_url, token, item_id, item_resource, detail_language)
-    if not shop_id:
-        raise RuntimeError("Cannot resolve shop_id")
-    print(
-        json.dumps(
-            {
-                "item_id": item_id,
-                "shop_id": shop_id,
-                "sku_id": sku_id or None,
-                "coupon_price": selected.get("coupon_price"),
-                "price": selected.get("price"),
-            },
-            ensure_ascii=False,
-            indent=2,
-        )
-    )
+def create_user_args(user_id: int) -> Dict[str, Any]:
+    return {"user_id": user_id, "user_name": f"mcp_user_{user_id}"}
 
-    print("== estimate_shipping ==")
-    estimate_resp = mcp.call_tool(
-        "estimate_shipping",
+
+def buyer_wallet_args(buyer_wallet: str) -> Dict[str, Any]:
+    return {"address": buyer_wallet, "chain_id": 56, "is_primary": True, "bind_method": "injected"}
+
+
+def pick_address_id(listed: Dict[str, Any]) -> int:
+    # The default address, else the first one, else -1.
+    addresses = extract_addresses(listed.get("data", listed))
+    default_addr = next((a for a in addresses if a.get("is_default") is True), None)
+    return to_int((default_addr or {}).get("id", (addresses[0] if addresses else {}).get("id")), -1)
+
+
+def create_default_address(mcp: "McpClient", user_id: int) -> int:
+    addr = mcp.call_tool(
+        "create_address",
         {
-            "shipping_address_id": shipping_address_id,
-            "shop_id": shop_id,
-            "item_id": item_id,
-            "sku_id": sku_id or None,
-            "quantity": quantity,
+            "country_code": "RU",
+            "country_name": "Russia",
+            "state": "Moscow",
+            "city": "Moscow",
+            "street_line1": "Tverskaya 1",
+            "recipient_name": f"MCP User {user_id}",
+            "recipient_phone": "+79990000000",
+            "is_default": True,
         },
     )
-    shipping_quote_id = get_shipping_quote_id(estimate_resp)
-    if not shipping_quote_id:
-        raise RuntimeError("estimate_shipping did not return shipping_quote_id")
-    print("shipping_quote_id:", shipping_quote_id)
-    print(
-        "payment_quote:",
-        json.dumps(
-            estimate_resp.get("payment_quote") or estimate_resp.get("data", {}).get("payment_quote"),
-            ensure_ascii=False,
-            indent=2,
-        ),
-    )
+    return to_int(first_string(addr.get("shipping_address_id"), addr.get("data", {}).get("id")), -1)
 
-    print("== create_order ==")
-    create_order_resp = mcp.call_tool(
-        "create_order",
-        {
-            "shipping_address_id": shipping_address_id,
-            "shop_id": shop_id,
-            "item_id": item_id,
-            "sku_id": sku_id or None,
+
+def main() -> None:
+    mcp, api_base_url, user_id = authenticate_from_env()
+
+    keyword = os.getenv("MCP_KEYWORD", "watercup")
+    pay_method = os.getenv("MCP_PAY_METHOD", "bsc")
+    token_symbol = os.getenv("MCP_TOKEN_SYMBOL", "USDT").upper()
+    buyer_wallet = os.getenv("MCP_BUYER_WALLET", DEFAULT_BUYER_WALLET)
+    quantity = to_int(os.getenv("MCP_QUANTITY", "1"), 1)
+    item_resource = os.getenv("MCP_ITEM_RESOURCE", "taobao")
+    detail_language = os.getenv("MCP_DETAIL_LANGUAGE", "ru")
+
+    create_tx_hash = first_string(os.getenv("CREATE_TX_HASH"))
+    fund_tx_hash = first_string(os.getenv("FUND_TX_HASH"))
+    confirm_tx_hash = first_string(os.getenv("CONFIRM_TX_HASH"))
+
+    if pay_method.lower() == "bsc" and not buyer_wallet:
+        raise RuntimeError("MCP_BUYER_WALLET is required for bsc flow")
+
+    # The flow up to create_order as a step graph: buyer setup (with address resolution) and the
+    # product search overlap; estimate_shipping waits for both the address and the product.
+    # MCP_STEP_WORKERS=1 runs the same steps one after another.
+    graph = StepGraph(max_workers=to_int(os.getenv("MCP_STEP_WORKERS", "8"), 8))
+    shop_resolver = ShopIdResolver(api_base_url, mcp, disk_path=os.getenv("MCP_SHOP_CACHE_PATH", ""))
+    quote_cache = get_default_quote_cache()
+    landed_top_n = to_int(os.getenv("MCP_LANDED_COST_TOP_N", "0"), 0)
+    use_landed_cost = landed_top_n > 1 and not os.getenv("MCP_SKU_ID")
+
+    def initialize(_: Dict[str, Any]) -> Dict[str, Any]:
+        print("== initialize ==")
+        init = initialize_session(mcp)
+        print(json.dumps(init, ensure_ascii=False, indent=2))
+        print("tools:", list(mcp.tool_schemas))
+        return {"session": init}
+
+    def buyer_setup(_: Dict[str, Any]) -> Dict[str, Any]:
+        # One step, so create_user stays ahead of the batched set_buyer_wallet + list_addresses.
+        address_id = ensure_buyer_setup(
+            mcp, user_id, to_int(os.getenv("MCP_SHIPPING_ADDRESS_ID", ""), -1), pay_method, buyer_wallet
+        )
+        print("shipping_address_id:", address_id)
+        return {"user_ready": True, "wallet_ready": True, "shipping_address_id": address_id}
+
+    def search(_: Dict[str, Any]) -> Dict[str, Any]:
+        fanout = SearchFanout(
+            mcp,
+            [keyword] + os.getenv("MCP_KEYWORD_VARIANTS", "").split(","),
+            pages=to_int(os.getenv("MCP_SEARCH_PAGES", "1"), 1),
+            page_size=to_int(os.getenv("MCP_SEARCH_PAGE_SIZE", "10"), 10),
+            concurrency=to_int(os.getenv("MCP_SEARCH_CONCURRENCY", "4"), 4),
+            rate_limiter=RateLimiter(to_float(os.getenv("MCP_SEARCH_RATE_PER_SEC", "0"), 0) or 0),
+            stop_rule=SearchStopRule(
+                max_price=to_float(os.getenv("MCP_SEARCH_MAX_PRICE"), None),
+                min_candidates=to_int(os.getenv("MCP_SEARCH_MIN_CANDIDATES", "0"), 0),
+                deadline_sec=to_float(os.getenv("MCP_SEARCH_DEADLINE_SEC"), None),
+            ),
+            catalog=get_default_catalog(mcp.endpoint),
+            serve_stale=False,
+        )
+        candidates = ProductColumns()
+        candidates.extend(fanout.stream())
+        print(
+            "search:",
+            json.dumps(
+                {
+                    "requests": fanout.requests_sent,
+                    "local_pages": fanout.local_pages,
+                    "candidates": len(candidates),
+                    "stop_reason": fanout.stop_reason,
+                    "errors": fanout.errors,
+                },
+                ensure_ascii=False,
+            ),
+        )
+        prefetch_count = to_int(os.getenv("MCP_SHOP_PREFETCH", "0"), 0)
+        if prefetch_count > 0:
+            rows = candidates.cheapest_rows(prefetch_count)
+            missing = [candidates.item_ids[i] for i in rows if not candidates.shop_ids[i]]
+            candidates.fill_shop_ids(shop_resolver.prefetch(missing, item_resource, detail_language))
+        if not len(candidates):
+            if fanout.errors:
+                raise RuntimeError(f"search_products failed: {fanout.errors[0]}")
+            raise RuntimeError("No product found")
+        return {"candidates": candidates}
+
+    def select_product(inputs: Dict[str, Any]) -> Dict[str, Any]:
+        candidates: ProductColumns = inputs["candidates"]
+        selected = candidates.cheapest()
+        if not selected:
+            raise RuntimeError("No product found")
+        if use_landed_cost:
+            print("== landed cost ==")
+            shortlist = [candidates.records[i] for i in candidates.cheapest_rows(landed_top_n)]
+            missing = [p.item_id for p in shortlist if not p.shop_id]
+            candidates.fill_shop_ids(shop_resolver.prefetch(missing, item_resource, detail_language))
+            ranked = compare_landed_costs(
+                mcp,
+                shortlist,
+                inputs["shipping_address_id"],
+                quantity,
+                quote_cache,
+                concurrency=to_int(os.getenv("MCP_LANDED_COST_CONCURRENCY", "4"), 4),
+                deadline_sec=float(to_float(os.getenv("MCP_LANDED_COST_DEADLINE_SEC", "10"), 10.0) or 10.0),
+            )
+            for entry in ranked:
+                print(f"  item {entry.product.item_id}: price={entry.product.comparable_price} landed={entry.total}")
+            if ranked:
+                selected = ranked[0].product
+
+        item_id = selected.item_id
+        shop_id = first_string(selected.shop_id, os.getenv("MCP_SHOP_ID"))
+        sku_id = first_string(os.getenv("MCP_SKU_ID"), selected.sku_id)
+        if not item_id:
+            raise RuntimeError("No item_id in selected product")
+        if not shop_id:
+            shop_id = shop_resolver.resolve(item_id, item_resource, detail_language)
+        if not shop_id:
+            raise RuntimeError("Cannot resolve shop_id")
+        print(
+            json.dumps(
+                {
+                    "item_id": item_id,
+                    "shop_id": shop_id,
+                    "sku_id": sku_id or None,
+                    "coupon_price": selected.raw.get("coupon_price"),
+                    "price": selected.raw.get("price"),
+                },
+                ensure_ascii=False,
+                indent=2,
+            )
+        )
+        return {"item_id": item_id, "shop_id": shop_id, "sku_id": sku_id}
+
+    def estimate_shipping(inputs: Dict[str, Any]) -> Dict[str, Any]:
+        print("== estimate_shipping ==")
+        estimate_args = {
+            "shipping_address_id": inputs["shipping_address_id"],
+            "shop_id": inputs["shop_id"],
+            "item_id": inputs["item_id"],
+            "sku_id": inputs["sku_id"] or None,
             "quantity": quantity,
-            "shipping_quote_id": shipping_quote_id,
-            "pay_method": pay_method,
-        },
+        }
+        estimate_resp, quote_from_cache = estimate_shipping_cached(mcp, estimate_args, quote_cache)
+        shipping_quote_id = get_shipping_quote_id(estimate_resp)
+        if not shipping_quote_id:
+            raise RuntimeError("estimate_shipping did not return shipping_quote_id")
+        print("shipping_quote_id:", shipping_quote_id, "(cached)" if quote_from_cache else "")
+        print(
+            "payment_quote:",
+            json.dumps(
+                estimate_resp.get("payment_quote") or estimate_resp.get("data", {}).get("payment_quote"),
+                ensure_ascii=False,
+                indent=2,
+            ),
+        )
+        return {"shipping_quote_id": shipping_quote_id, "estimate_args": estimate_args, "quote_from_cache": quote_from_cache}
+
+    def create_order(inputs: Dict[str, Any]) -> Dict[str, Any]:
+        print("== create_order ==")
+        estimate_args = inputs["estimate_args"]
+        shipping_quote_id = inputs["shipping_quote_id"]
+        order_args = dict(estimate_args, sku_id=inputs["sku_id"] or None, shipping_quote_id=shipping_quote_id, pay_method=pay_method)
+        create_order_resp, shipping_quote_id = create_order_with_quote(
+            mcp, order_args, estimate_args, quote_cache, inputs["quote_from_cache"]
+        )
+        order_no = get_order_no(create_order_resp)
+        if not order_no:
+            raise RuntimeError("create_order did not return order_no")
+        print("order_no:", order_no)
+        return {"order_no": order_no, "final_quote_id": shipping_quote_id}
+
+    graph.add("initialize", initialize, provides=["session"])
+    graph.add("buyer_setup", buyer_setup, needs=["session"], provides=["user_ready", "wallet_ready", "shipping_address_id"])
+    graph.add("search_products", search, needs=["session"], provides=["candidates"])
+    graph.add(
+        "select_product",
+        select_product,
+        needs=["candidates", "shipping_address_id"] if use_landed_cost else ["candidates"],
+        provides=["item_id", "shop_id", "sku_id"],
+    )
+    graph.add(
+        "estimate_shipping",
+        estimate_shipping,
+        needs=["shipping_address_id", "item_id", "shop_id", "sku_id"],
+        provides=["shipping_quote_id", "estimate_args", "quote_from_cache"],
+    )
+    graph.add(
+        "create_order",
+        create_order,
+        needs=["estimate_args", "shipping_quote_id", "quote_from_cache", "sku_id", "user_ready", "wallet_ready"],
+        provides=["order_no", "final_quote_id"],
     )
-    order_no = get_order_no(create_order_resp)
-    if not order_no:
-        raise RuntimeError("create_order did not return order_no")
-    print("order_no:", order_no)
+    values = graph.run()
+    order_no = values["order_no"]
+    shipping_quote_id = values["final_quote_id"]
+    item_id, shop_id, sku_id = values["item_id"], values["shop_id"], values["sku_id"]
+
+    wait_tx_sec = max(to_float(os.getenv("MCP_WAIT_TX_SEC"), 0.0), 0.0)
+    tracker: Optional[EscrowTracker] = None
+    if wait_tx_sec > 0:
+        tracker = EscrowTracker(
+            mcp,
+            base_delay_sec=max(to_float(os.getenv("MCP_TRACKER_BASE_DELAY_SEC"), 2.0), 0.05),
+            max_delay_sec=max(to_float(os.getenv("MCP_TRACKER_MAX_DELAY_SEC"), 60.0), 0.1),
+        )
+
+    def wait_for_tx(action: str, tx_hash: str) -> None:
+        if tracker is None:
+            return
+        started = time.monotonic()
+        try:
+            proof = tracker.watch(order_no, action, tx_hash, timeout_sec=wait_tx_sec).result()
+        except TimeoutError as exc:
+            print(f"[WARN] {exc}; continuing", file=sys.stderr)
+            return
+        print(f"{action} settled in {time.monotonic() - started:.1f}s, escrow_state={get_escrow_state(proof) or '-'}")
+
+    def show_progress(step: str) -> Callable[[Dict[str, Any]], None]:
+        # Progress notifications of long-running calls (streamable HTTP servers only).
+        def report(params: Dict[str, Any]) -> None:
+            total = params.get("total")
+            done = f"{params.get('progress')}/{total}" if total is not None else str(params.get("progress"))
+            message = params.get("message")
+            print(f"[progress] {step} {done}" + (f": {message}" if message else ""), flush=True)
+
+        return report
 
     print("== create_escrow ==")
     create_escrow_resp = mcp.call_tool(
@@ -578,6 +1124,7 @@ def main() -> None:
             "token_symbol": token_symbol,
             "buyer_wallet": buyer_wallet,
         },
+        on_progress=show_progress("create_escrow"),
     )
     print(json.dumps(create_escrow_resp, ensure_ascii=False, indent=2))
     create_tx_request = get_tx_request(create_escrow_resp)
@@ -588,25 +1135,33 @@ def main() -> None:
             "submit_tx", {"order_no": order_no, "action": "create", "tx_hash": create_tx_hash}
         )
         print("submit_tx(create):", json.dumps(submit_create, ensure_ascii=False, indent=2))
+        wait_for_tx("create", create_tx_hash)
 
     print("== fund_escrow ==")
-    fund_resp = mcp.call_tool("fund_escrow", {"order_no": order_no, "token_symbol": token_symbol})
+    fund_resp = mcp.call_tool(
+        "fund_escrow", {"order_no": order_no, "token_symbol": token_symbol}, on_progress=show_progress("fund_escrow")
+    )
     print(json.dumps(fund_resp, ensure_ascii=False, indent=2))
     if fund_tx_hash:
         submit_fund = mcp.call_tool("submit_tx", {"order_no": order_no, "action": "fund", "tx_hash": fund_tx_hash})
         print("submit_tx(fund):", json.dumps(submit_fund, ensure_ascii=False, indent=2))
+        wait_for_tx("fund", fund_tx_hash)
 
     print("== confirm_receipt ==")
-    confirm_resp = mcp.call_tool("confirm_receipt", {"order_no": order_no})
+    confirm_resp = mcp.call_tool("confirm_receipt", {"order_no": order_no}, on_progress=show_progress("confirm_receipt"))
     print(json.dumps(confirm_resp, ensure_ascii=False, indent=2))
     if confirm_tx_hash:
         submit_confirm = mcp.call_tool(
             "submit_tx", {"order_no": order_no, "action": "confirm", "tx_hash": confirm_tx_hash}
         )
         print("submit_tx(confirm):", json.dumps(submit_confirm, ensure_ascii=False, indent=2))
+        wait_for_tx("confirm", confirm_tx_hash)
+
+    if tracker is not None:
+        tracker.stop()
 
     print("== get_order_proof ==")
-    proof = mcp.call_tool("get_order_proof", {"order_no": order_no})
+    proof = mcp.call_tool("get_order_proof", {"order_no": order_no}, on_progress=show_progress("get_order_proof"))
     print(json.dumps(proof, ensure_ascii=False, indent=2))
 
     print("== summary ==")
@@ -621,11 +1176,23 @@ def main() -> None:
                 "create_submitted": bool(create_tx_hash),
                 "fund_submitted": bool(fund_tx_hash),
                 "confirm_submitted": bool(confirm_tx_hash),
+                "http_pool": mcp.pool.stats(),
+                "shop_id_cache": shop_resolver.stats(),
+                "quote_cache": quote_cache.stats(),
+                "escrow_tracker": tracker.stats() if tracker is not None else None,
+                "retries": mcp.retry_stats(),
+                "endpoint_guard": mcp.guard.state() if mcp.guard is not None else None,
+                "streaming": mcp.stream_stats() if mcp.streamable else None,
+                "steps": graph.report(),
+                "trace": mcp.tracer.summary() if mcp.tracer is not None else None,
             },
             ensure_ascii=False,
             indent=2,
         )
     )
+    prom_path = os.getenv("MCP_TRACE_PROM", "").strip()
+    if prom_path and mcp.tracer is not None:
+        write_prometheus_textfile(mcp.tracer, prom_path)
 
 
 if __name__ == "__main__":
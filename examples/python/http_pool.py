@@ -0,0 +1,409 @@
+"""Keep-alive HTTP/1.1 connection pool for the MCP examples (stdlib only).
+
+One pool of persistent connections per scheme://host:port, shared across
+threads. Response bodies are read incrementally with a size cap
+(MCP_HTTP_MAX_BODY_BYTES) and gzip/deflate decoding. Proxies come from the
+usual http_proxy / https_proxy / no_proxy environment (https through a
+CONNECT tunnel). A request whose kept-alive socket turns out to be dropped
+is resent on a fresh connection only when resending cannot repeat a side
+effect: nothing had been sent yet, or the request is idempotent.
+Redirects are returned, never followed. request_json sends a JSON body
+and decodes the JSON answer, raising urllib's HTTPError for 3xx/4xx/5xx.
+
+Usage:
+from http_pool import get_default_pool, request_json
+status, headers, body = get_default_pool().request("GET", "https://taopochta.ru/api/products/detail?id=1")
+data = request_json("https://taopochta.ru/api/mcp/bootstrap/email/request", "POST", {"email": "agent@example.com"}, {})
+"""
+
+from __future__ import annotations
+
+import base64
+import http.client
+import io
+import os
+import select
+import ssl
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from mcp_common import json_dumps_bytes, json_loads, to_int
+from response_body import DEFAULT_MAX_RESPONSE_BYTES, RESPONSE_READ_CHUNK, BodyDecoder, ResponseTooLarge
+from retry_policy import AbortHandle, RequestAborted
+from tracing import Span
+
+
+DEFAULT_HTTP_TIMEOUT_SEC = 60.0
+IDEMPOTENT_HTTP_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class PooledResponse:
+    # An open response whose body the caller reads, either whole (read) or as it arrives
+    # (iter_decoded). The connection returns to the pool only if the body was read to the end.
+    def __init__(
+        self,
+        pool: "HttpConnectionPool",
+        key: Tuple[str, str, int],
+        conn: http.client.HTTPConnection,
+        resp: http.client.HTTPResponse,
+        max_body_bytes: int,
+        abort: Optional[AbortHandle] = None,
+    ) -> None:
+        self.pool = pool
+        self.status = resp.status
+        self.headers = resp.msg
+        self.content_type = (resp.getheader("content-type", "") or "").split(";", 1)[0].strip().lower()
+        self._key = key
+        self._conn: Optional[http.client.HTTPConnection] = conn
+        self._resp = resp
+        self._max_body_bytes = max_body_bytes
+        self._abort = abort
+        self._complete = False
+
+    def _check_aborted(self, exc: Optional[BaseException] = None) -> None:
+        # A body cut short by AbortHandle.abort() is reported as such, not as a server error.
+        if self._abort is not None and self._abort.aborted:
+            self.close()
+            raise RequestAborted("request aborted") from exc
+
+    def read(self) -> bytes:
+        try:
+            decoder = self.pool._read_body(self._resp, self._max_body_bytes)
+            data = decoder.finish()
+        except Exception as exc:
+            self.close()
+            self._check_aborted(exc)
+            raise
+        self._check_aborted()
+        self._complete = True
+        self.pool._count_body(decoder, len(data))
+        self.close()
+        return data
+
+    def iter_decoded(self) -> Iterator[bytes]:
+        # read1 returns whatever one chunk/segment holds, so events are seen as soon as they arrive.
+        decoder = BodyDecoder(self._resp.getheader("content-encoding", ""), self._max_body_bytes)
+        decoded = 0
+        try:
+            while True:
+                chunk = self._resp.read1(RESPONSE_READ_CHUNK)
+                if not chunk:
+                    break
+                data = decoder.decode(chunk)
+                decoded += len(data)
+                if data:
+                    yield data
+            tail = decoder.flush()
+            if tail:
+                decoded += len(tail)
+                yield tail
+            self._check_aborted()
+            self._complete = True
+        except (OSError, http.client.HTTPException) as exc:
+            self._check_aborted(exc)
+            raise
+        finally:
+            self.pool._count_body(decoder, decoded)
+
+    def close(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        if self._complete and not self._resp.will_close:
+            self.pool._release(self._key, conn)
+        else:
+            conn.close()
+
+
+class HttpConnectionPool:
+    # Keep-alive connections per scheme://host:port. HTTPS_PROXY / HTTP_PROXY / NO_PROXY are honoured
+    # as urllib does (CONNECT tunnel for https, absolute-URI requests for http). Redirects are not
+    # followed: a 3xx comes back to the caller as is (request_json raises it as an HTTPError).
+    def __init__(
+        self,
+        pool_size: int = 4,
+        idle_timeout_sec: float = 30.0,
+        timeout_sec: float = DEFAULT_HTTP_TIMEOUT_SEC,
+        max_body_bytes: int = DEFAULT_MAX_RESPONSE_BYTES,
+        compression: bool = True,
+    ) -> None:
+        self.pool_size = max(1, int(pool_size))
+        self.idle_timeout_sec = float(idle_timeout_sec)
+        self.timeout_sec = float(timeout_sec)
+        self.max_body_bytes = int(max_body_bytes)
+        self.compression = compression
+        self._idle: Dict[Tuple[str, str, int], List[Tuple[http.client.HTTPConnection, float]]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._proxies: Dict[Tuple[str, str, int], Optional[urllib.parse.SplitResult]] = {}
+        self._ssl_context = ssl.create_default_context()
+        self._stats = {
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "connections_evicted": 0,
+            "compressed_responses": 0,
+            "bytes_received": 0,
+            "bytes_decoded": 0,
+        }
+
+    def _host_key(self, parsed: urllib.parse.SplitResult) -> Tuple[str, str, int]:
+        scheme = (parsed.scheme or "http").lower()
+        port = parsed.port or (443 if scheme == "https" else 80)
+        return scheme, parsed.hostname or "", port
+
+    def _proxy_for(self, key: Tuple[str, str, int]) -> Optional[urllib.parse.SplitResult]:
+        with self._lock:
+            if key in self._proxies:
+                return self._proxies[key]
+        scheme, host, _ = key
+        proxy = None
+        url = urllib.request.getproxies_environment().get(scheme, "")
+        if url and not urllib.request.proxy_bypass_environment(host):
+            proxy = urllib.parse.urlsplit(url if "://" in url else f"http://{url}")
+        with self._lock:
+            self._proxies[key] = proxy
+        return proxy
+
+    @staticmethod
+    def _proxy_headers(proxy: urllib.parse.SplitResult) -> Dict[str, str]:
+        if proxy.username is None:
+            return {}
+        user = urllib.parse.unquote(proxy.username)
+        password = urllib.parse.unquote(proxy.password or "")
+        credentials = base64.b64encode(f"{user}:{password}".encode("utf-8")).decode("ascii")
+        return {"proxy-authorization": f"Basic {credentials}"}
+
+    def _new_connection(self, key: Tuple[str, str, int]) -> http.client.HTTPConnection:
+        scheme, host, port = key
+        with self._lock:
+            self._stats["connections_created"] += 1
+        proxy = self._proxy_for(key)
+        if proxy is not None:
+            # Plain http:// proxies: https targets go through a CONNECT tunnel (TLS with the target's
+            # hostname inside it), http targets are sent to the proxy as absolute-URI requests.
+            proxy_host, proxy_port = proxy.hostname or "", proxy.port or 80
+            if scheme == "https":
+                conn = http.client.HTTPSConnection(proxy_host, proxy_port, timeout=self.timeout_sec, context=self._ssl_context)
+                conn.set_tunnel(host, port, headers=self._proxy_headers(proxy))
+                return conn
+            return http.client.HTTPConnection(proxy_host, proxy_port, timeout=self.timeout_sec)
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout_sec, context=self._ssl_context)
+        return http.client.HTTPConnection(host, port, timeout=self.timeout_sec)
+
+    @staticmethod
+    def _is_dropped(conn: http.client.HTTPConnection) -> bool:
+        # An idle keep-alive socket is readable only if the server closed it (or sent garbage).
+        sock = conn.sock
+        if sock is None:
+            return True
+        try:
+            return bool(select.select([sock], [], [], 0)[0])
+        except (OSError, ValueError):
+            return True
+
+    def _acquire(self, key: Tuple[str, str, int]) -> Optional[http.client.HTTPConnection]:
+        now = time.monotonic()
+        stale: List[http.client.HTTPConnection] = []
+        conn = None
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                candidate, last_used = idle.pop()
+                if now - last_used > self.idle_timeout_sec or self._is_dropped(candidate):
+                    stale.append(candidate)
+                    continue
+                conn = candidate
+                self._stats["connections_reused"] += 1
+                break
+            self._stats["connections_evicted"] += len(stale)
+        for candidate in stale:
+            candidate.close()
+        return conn
+
+    def _release(self, key: Tuple[str, str, int], conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.pool_size:
+                idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    @contextmanager
+    def abortable(self, handle: AbortHandle) -> Iterator[AbortHandle]:
+        # Requests this thread opens inside the block can be cut off by handle.abort().
+        previous = getattr(self._local, "abort", None)
+        self._local.abort = handle
+        try:
+            yield handle
+        finally:
+            self._local.abort = previous
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        max_body_bytes: Optional[int] = None,
+        timeout_sec: Optional[float] = None,
+        idempotent: Optional[bool] = None,
+    ) -> Tuple[int, http.client.HTTPMessage, bytes]:
+        resp = self.open(method, url, body, headers, max_body_bytes, timeout_sec, idempotent)
+        return resp.status, resp.headers, resp.read()
+
+    def open(
+        self,
+        method: str,
+        url: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        max_body_bytes: Optional[int] = None,
+        timeout_sec: Optional[float] = None,
+        idempotent: Optional[bool] = None,
+    ) -> PooledResponse:
+        # idempotent: whether the request may be sent twice (default: by method). A POST that is safe
+        # to repeat (a read-only tool call) passes True.
+        parsed = urllib.parse.urlsplit(url)
+        key = self._host_key(parsed)
+        target = parsed.path or "/"
+        if parsed.query:
+            target = f"{target}?{parsed.query}"
+        headers = dict(headers or {})
+        proxy = self._proxy_for(key)
+        if proxy is not None and key[0] == "http":
+            target = urllib.parse.urlunsplit((key[0], parsed.netloc, target, "", ""))
+            headers.update(self._proxy_headers(proxy))
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_HTTP_METHODS
+        if self.compression and not any(name.lower() == "accept-encoding" for name in headers):
+            headers["accept-encoding"] = "gzip, deflate"
+        limit = self.max_body_bytes if max_body_bytes is None else int(max_body_bytes)
+        timeout = self.timeout_sec if timeout_sec is None else float(timeout_sec)
+        with self._lock:
+            self._stats["requests"] += 1
+
+        abort: Optional[AbortHandle] = getattr(self._local, "abort", None)
+        conn = self._acquire(key)
+        reused = conn is not None
+        while True:
+            if conn is None:
+                conn = self._new_connection(key)
+            # Per-request timeout: applies to connect on a new connection and to reads on a reused one.
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            sent = False
+            try:
+                if abort is not None:
+                    abort.attach(conn)
+                conn.request(method.upper(), target, body=body, headers=headers)
+                sent = True
+                resp = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as exc:
+                conn.close()
+                if abort is not None and abort.aborted:
+                    raise RequestAborted("request aborted") from exc
+                # The server closed a reused keep-alive socket. Resend once on a fresh connection, but
+                # only if the request was never fully written or is safe to repeat: otherwise the server
+                # may have acted on it (create_order) and the outcome is unknown.
+                if not reused or (sent and not idempotent):
+                    raise
+                conn = None
+                reused = False
+                continue
+            except Exception as exc:
+                conn.close()
+                if abort is not None and abort.aborted and not isinstance(exc, RequestAborted):
+                    raise RequestAborted("request aborted") from exc
+                raise
+            break
+        return PooledResponse(self, key, conn, resp, limit, abort)
+
+    def _count_body(self, decoder: BodyDecoder, decoded_bytes: int) -> None:
+        with self._lock:
+            self._stats["bytes_received"] += decoder.wire_bytes
+            self._stats["bytes_decoded"] += decoded_bytes
+            self._stats["compressed_responses"] += decoder.encoding not in ("", "identity")
+
+    def _read_body(self, resp: http.client.HTTPResponse, max_body_bytes: int) -> BodyDecoder:
+        decoder = BodyDecoder(resp.getheader("content-encoding", ""), max_body_bytes)
+        declared = resp.getheader("content-length", "")
+        if decoder.encoding in ("", "identity") and declared.isdigit() and int(declared) > max_body_bytes:
+            raise ResponseTooLarge(f"response body of {declared} bytes exceeds {max_body_bytes} bytes")
+        while True:
+            chunk = resp.read(RESPONSE_READ_CHUNK)
+            if not chunk:
+                return decoder
+            decoder.feed(chunk)
+
+    def close(self) -> None:
+        with self._lock:
+            idle_lists = list(self._idle.values())
+            self._idle = {}
+        for idle in idle_lists:
+            for conn, _ in idle:
+                conn.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            out = dict(self._stats)
+            out["idle_connections"] = sum(len(v) for v in self._idle.values())
+        return out
+
+
+_default_pool: Optional[HttpConnectionPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool() -> HttpConnectionPool:
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = HttpConnectionPool(
+                pool_size=to_int(os.getenv("MCP_HTTP_POOL_SIZE", "4"), 4),
+                idle_timeout_sec=float(to_int(os.getenv("MCP_HTTP_IDLE_TIMEOUT_SEC", "30"), 30)),
+                max_body_bytes=to_int(os.getenv("MCP_HTTP_MAX_BODY_BYTES", ""), DEFAULT_MAX_RESPONSE_BYTES),
+                compression=os.getenv("MCP_HTTP_COMPRESSION", "on").strip().lower() not in ("0", "off", "false", "no"),
+            )
+        return _default_pool
+
+
+def request_json(
+    url: str,
+    method: str,
+    body: Optional[Any],
+    headers: Dict[str, str],
+    pool: Optional[HttpConnectionPool] = None,
+    span: Optional[Span] = None,
+    timeout_sec: Optional[float] = None,
+    idempotent: Optional[bool] = None,
+) -> Any:
+    payload_bytes = None
+    if body is not None:
+        payload_bytes = json_dumps_bytes(body)
+    status, resp_headers, raw = (pool or get_default_pool()).request(
+        method, url, payload_bytes, headers, timeout_sec=timeout_sec, idempotent=idempotent
+    )
+    if span is not None:
+        span.request_bytes += len(payload_bytes or b"")
+        span.response_bytes += len(raw)
+        span.http_status = status
+    if 300 <= status < 400:
+        # Redirects are not followed (a POST would have to be re-sent); point the URL at the final location.
+        location = resp_headers.get("location", "")
+        raise urllib.error.HTTPError(url, status, f"redirect to {location or '?'} not followed", resp_headers, io.BytesIO(raw))
+    if status >= 400:
+        raise urllib.error.HTTPError(url, status, http.client.responses.get(status, ""), resp_headers, io.BytesIO(raw))
+    if span is None:
+        return json_loads(raw) if raw else {}
+    started = time.perf_counter()
+    data = json_loads(raw) if raw else {}
+    span.decode_sec += time.perf_counter() - started
+    return data
@@ -0,0 +1,631 @@
+#!/usr/bin/env python3
+"""Open-loop load generator / soak test for the MCP flow (stdlib only).
+
+Requests are started on a fixed schedule, whether or not earlier ones have
+finished, so server saturation shows up as queueing delay instead of
+silently lowering the offered load (the closed-loop trap of bench_client.py
+and repeated full_flow.py runs).
+
+Schedule: --rps R --duration S, or --ramp "10..100:60,100:300,100..0:30"
+(stages of START[..END]:SECONDS; the rate moves linearly inside a stage).
+
+Operations are drawn from --mix (weights, default
+search_products=60,estimate_shipping=25,create_order=10,get_order_proof=5);
+"flow" is one search -> estimate_shipping -> create_order user flow.
+create_order always sends a fresh estimate_shipping first, and its latency
+includes it.
+
+Latency is measured from each request's intended start time, which
+corrects for coordinated omission: a request that waited for a free
+worker or sat behind a slow one is charged for the wait. Service time
+(actual start to finish) is reported next to it. Both go into log-bucketed
+histograms (1% precision), so a long soak stays small in memory.
+
+Every --interval seconds a row with offered/achieved rate, errors,
+in-flight requests, p50/p99 and client CPU%/RSS is printed to stderr and
+kept for the report. The final JSON report (--out) has per-operation
+histograms, error kinds and these rows.
+
+Target: --base-url (with the usual MCP_TOKEN / bootstrap env), or --stub
+to spawn stub_server.py as a separate process so its CPU is not counted
+as the client's. create_order against anything but --stub needs
+--allow-orders.
+
+The client runs raw by default: no retries, no hedged requests and no
+adaptive concurrency limit (MCP_RETRY_MAX_ATTEMPTS=1, MCP_HEDGE=off,
+MCP_ADAPTIVE_LIMIT=off), so the numbers describe the server and not the
+client's recovery from it. --client-resilience keeps them as configured and
+the report's client_mode says which was measured. create_order is never
+retried in either mode (MCP_RETRY_MUTATING=off), so a run cannot place an
+order twice.
+
+Usage:
+python load_test.py --stub --stub-args "--latency-ms 20 --jitter-ms 10" --rps 200 --duration 60
+python load_test.py --stub --ramp "50..800:120" --workers 128 --out ramp_report.json
+python load_test.py --base-url https://taopochta.ru/api/mcp --rps 5 --duration 600 --mix search_products=1
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import random
+import shlex
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from bench_client import peak_rss_mb, resource
+from endpoint_guard import CircuitOpenError
+from export_proofs import iter_order_file
+from full_flow import (
+    DEFAULT_BUYER_WALLET,
+    McpClient,
+    authenticate_from_env,
+    ensure_buyer_setup,
+    get_order_no,
+    initialize_session,
+)
+from mcp_common import first_string, to_int
+from products import ProductColumns, iter_product_records
+from response_body import ResponseBodyError
+from shipping_quotes import get_shipping_quote_id
+from stub_server import STUB_USER_ID, make_access_token
+
+DEFAULT_MIX = "search_products=60,estimate_shipping=25,create_order=10,get_order_proof=5"
+ORDER_OPS = {"create_order", "flow"}
+# Retries turn errors into extra latency and extra requests, hedging sends duplicates and the
+# adaptive limit queues requests inside the client: all of it would blur what the server does.
+RAW_CLIENT_ENV = {"MCP_RETRY_MAX_ATTEMPTS": "1", "MCP_HEDGE": "off", "MCP_ADAPTIVE_LIMIT": "off"}
+
+
+def parse_schedule(rps: float, duration_sec: float, ramp: str) -> List[Tuple[float, float, float]]:
+    # [(start_rps, end_rps, seconds)]
+    if not ramp:
+        if rps <= 0 or duration_sec <= 0:
+            raise RuntimeError("give --rps and --duration, or --ramp")
+        return [(rps, rps, duration_sec)]
+    stages = []
+    for part in ramp.split(","):
+        rates, sep, seconds = part.strip().rpartition(":")
+        start, _, end = rates.partition("..")
+        try:
+            stage = (float(start), float(end or start), float(seconds))
+        except ValueError:
+            stage = (-1.0, -1.0, -1.0)
+        if not sep or min(stage) < 0 or stage[2] == 0:
+            raise RuntimeError(f"--ramp stage {part!r}: expected START[..END]:SECONDS")
+        stages.append(stage)
+    return stages
+
+
+def rate_at(stages: List[Tuple[float, float, float]], t: float) -> float:
+    for start, end, seconds in stages:
+        if t <= seconds:
+            return start + (end - start) * t / seconds
+        t -= seconds
+    return 0.0
+
+
+def iter_arrivals(stages: List[Tuple[float, float, float]]) -> Iterator[float]:
+    # Intended send offsets (seconds from start) for a piecewise-linear rate: the n-th request goes
+    # out when the integral of the rate reaches n. Fractional arrivals carry over between stages.
+    offset = 0.0
+    owed = 1.0
+    for r0, r1, seconds in stages:
+        k = (r1 - r0) / seconds
+        integrated = 0.0
+        while True:
+            target = integrated + owed
+            if k == 0:
+                t = target / r0 if r0 > 0 else math.inf
+            else:
+                disc = r0 * r0 + 2 * k * target
+                t = (-r0 + math.sqrt(disc)) / k if disc >= 0 else math.inf
+            if t > seconds:
+                owed -= r0 * seconds + k * seconds * seconds / 2 - integrated
+                break
+            yield offset + t
+            integrated, owed = target, 1.0
+        offset += seconds
+
+
+class LogHistogram:
+    # Log-bucketed latencies with fixed relative precision (HdrHistogram-style); bucket i holds
+    # values in (base^i, base^(i+1)] microseconds.
+    def __init__(self, precision: float = 0.01) -> None:
+        self.log_base = math.log1p(precision)
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, sec: float) -> None:
+        index = int(math.log(max(sec * 1e6, 1.0)) / self.log_base)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.sum += sec
+        self.max = max(self.max, sec)
+
+    def merge(self, other: "LogHistogram") -> None:
+        for index, n in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + n
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def _upper_sec(self, index: int) -> float:
+        return math.exp((index + 1) * self.log_base) / 1e6
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self._upper_sec(index), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        def ms(value: Optional[float]) -> Optional[float]:
+            return round(value * 1000, 3) if value is not None else None
+
+        return {
+            "count": self.count,
+            "mean_ms": ms(self.sum / self.count) if self.count else None,
+            "p50_ms": ms(self.quantile(0.5)),
+            "p90_ms": ms(self.quantile(0.9)),
+            "p99_ms": ms(self.quantile(0.99)),
+            "p999_ms": ms(self.quantile(0.999)),
+            "max_ms": ms(self.max) if self.count else None,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = self.summary()
+        out["buckets"] = [[round(self._upper_sec(i) * 1000, 4), self.buckets[i]] for i in sorted(self.buckets)]
+        return out
+
+
+class OpStats:
+    def __init__(self) -> None:
+        self.latency = LogHistogram()
+        self.service = LogHistogram()
+        self.errors = 0
+        self.dropped = 0
+        self.error_kinds: Dict[str, int] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Dropped requests never completed but count as errors of the offered load.
+        offered = self.latency.count + self.dropped
+        return {
+            "completed": self.latency.count,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "error_rate": round(self.errors / offered, 5) if offered else None,
+            "error_kinds": dict(self.error_kinds),
+            "latency": self.latency.to_dict(),
+            "service": self.service.to_dict(),
+        }
+
+
+def error_kind(exc: BaseException) -> str:
+    if isinstance(exc, urllib.error.HTTPError):
+        return f"http_{exc.code}"
+    if isinstance(exc, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(exc, (TimeoutError, socket.timeout)):
+        return "timeout"
+    if isinstance(exc, ResponseBodyError):
+        return "bad_response"
+    if isinstance(exc, RuntimeError):
+        return "tool_error"
+    return type(exc).__name__
+
+
+def current_rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as fh:
+            pages = int(fh.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return peak_rss_mb()
+
+
+def cpu_seconds() -> Optional[float]:
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class FlowTarget:
+    # The operations of the mix, against one warm McpClient. Products come from a setup search;
+    # orders created during the run feed get_order_proof.
+    def __init__(
+        self,
+        mcp: McpClient,
+        address_id: int,
+        keywords: List[str],
+        pay_method: str,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.mcp = mcp
+        self.address_id = address_id
+        self.keywords = keywords
+        self.pay_method = pay_method
+        self.rng = random.Random(seed)
+        self.products: List[Any] = []
+        self.order_nos: Deque[str] = deque(maxlen=10000)
+
+    def setup(self, need_orders: bool) -> None:
+        for keyword in self.keywords:
+            resp = self.mcp.call_tool("search_products", {"keyword": keyword, "page_no": 1, "page_size": 20})
+            self.products.extend(p for p in iter_product_records(resp.get("data", resp)) if p.item_id and p.shop_id)
+        if not self.products:
+            raise RuntimeError("setup search returned no products with item_id and shop_id")
+        if need_orders and not self.order_nos:
+            self.create_order()
+
+    def _estimate(self, product: Any) -> Dict[str, Any]:
+        args = {
+            "shipping_address_id": self.address_id,
+            "shop_id": product.shop_id,
+            "item_id": product.item_id,
+            "sku_id": product.sku_id or None,
+            "quantity": 1,
+        }
+        resp = self.mcp.call_tool("estimate_shipping", args)
+        quote_id = get_shipping_quote_id(resp)
+        if not quote_id:
+            raise RuntimeError("estimate_shipping did not return shipping_quote_id")
+        return dict(args, shipping_quote_id=quote_id, pay_method=self.pay_method)
+
+    def _order(self, order_args: Dict[str, Any]) -> None:
+        order_no = get_order_no(self.mcp.call_tool("create_order", order_args))
+        if not order_no:
+            raise RuntimeError("create_order did not return order_no")
+        self.order_nos.append(order_no)
+
+    def search_products(self) -> None:
+        keyword = self.rng.choice(self.keywords)
+        self.mcp.call_tool("search_products", {"keyword": keyword, "page_no": self.rng.randint(1, 5), "page_size": 10})
+
+    def estimate_shipping(self) -> None:
+        self._estimate(self.rng.choice(self.products))
+
+    def create_order(self) -> None:
+        self._order(self._estimate(self.rng.choice(self.products)))
+
+    def get_order_proof(self) -> None:
+        if not self.order_nos:
+            raise RuntimeError("no order_no to query (add create_order to the mix or pass --order-nos)")
+        self.mcp.call_tool("get_order_proof", {"order_no": self.rng.choice(self.order_nos)})
+
+    def flow(self) -> None:
+        resp = self.mcp.call_tool("search_products", {"keyword": self.rng.choice(self.keywords), "page_no": 1, "page_size": 10})
+        columns = ProductColumns()
+        columns.extend(p for p in iter_product_records(resp.get("data", resp)) if p.shop_id)
+        product = columns.cheapest() or self.rng.choice(self.products)
+        self._order(self._estimate(product))
+
+    def op(self, name: str) -> Callable[[], None]:
+        if name not in ("search_products", "estimate_shipping", "create_order", "get_order_proof", "flow"):
+            raise RuntimeError(f"unknown operation {name!r} in --mix")
+        return getattr(self, name)
+
+
+class LoadGenerator:
+    def __init__(
+        self,
+        ops: Dict[str, Callable[[], None]],
+        weights: Dict[str, float],
+        stages: List[Tuple[float, float, float]],
+        workers: int,
+        max_in_flight: int,
+        interval_sec: float,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.ops = ops
+        self.names = list(weights)
+        self.cum_weights = []
+        total = 0.0
+        for name in self.names:
+            total += weights[name]
+            self.cum_weights.append(total)
+        self.stages = stages
+        self.workers = max(1, int(workers))
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.interval_sec = max(0.1, float(interval_sec))
+        self.rng = random.Random(seed)
+        self.stats: Dict[str, OpStats] = {name: OpStats() for name in self.names}
+        self.intervals: List[Dict[str, Any]] = []
+        self.sent = 0
+        self.dropped = 0
+        self.in_flight = 0
+        self.max_lag_sec = 0.0
+        self._window = LogHistogram()
+        self._window_done = 0
+        self._window_errors = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _record(self, name: str, intended: float, started: float, exc: Optional[BaseException]) -> None:
+        finished = time.perf_counter()
+        stats = self.stats[name]
+        with self._lock:
+            self.in_flight -= 1
+            stats.latency.observe(finished - intended)
+            stats.service.observe(finished - started)
+            self._window.observe(finished - intended)
+            self._window_done += 1
+            if exc is not None:
+                kind = error_kind(exc)
+                stats.errors += 1
+                stats.error_kinds[kind] = stats.error_kinds.get(kind, 0) + 1
+                self._window_errors += 1
+
+    def _run(self, name: str, intended: float) -> None:
+        started = time.perf_counter()
+        try:
+            self.ops[name]()
+        except Exception as exc:  # noqa: BLE001
+            self._record(name, intended, started, exc)
+            return
+        self._record(name, intended, started, None)
+
+    def _report_loop(self, start: float) -> None:
+        last_t, last_cpu, last_sent = start, cpu_seconds(), 0
+        while not self._stop.wait(max(0.0, last_t + self.interval_sec - time.perf_counter())):
+            now = time.perf_counter()
+            cpu = cpu_seconds()
+            with self._lock:
+                window, self._window = self._window, LogHistogram()
+                done, errors = self._window_done, self._window_errors
+                self._window_done = self._window_errors = 0
+                sent, in_flight = self.sent, self.in_flight
+            elapsed = now - last_t
+            row = {
+                "t_sec": round(now - start, 1),
+                "target_rps": round(rate_at(self.stages, now - start), 1),
+                "sent_rps": round((sent - last_sent) / elapsed, 1),
+                "done_rps": round(done / elapsed, 1),
+                "errors": errors,
+                "in_flight": in_flight,
+                "p50_ms": window.summary()["p50_ms"],
+                "p99_ms": window.summary()["p99_ms"],
+                "cpu_percent": round((cpu - last_cpu) / elapsed * 100, 1) if cpu is not None and last_cpu is not None else None,
+                "rss_mb": current_rss_mb(),
+            }
+            self.intervals.append(row)
+            print(json.dumps(row), file=sys.stderr, flush=True)
+            last_t, last_cpu, last_sent = now, cpu, sent
+
+    def run(self, drain_sec: float) -> float:
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="load")
+        start = time.perf_counter() + 0.05
+        reporter = threading.Thread(target=self._report_loop, args=(start,), name="load-report", daemon=True)
+        reporter.start()
+        try:
+            for offset in iter_arrivals(self.stages):
+                intended = start + offset
+                delay = intended - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    self.max_lag_sec = max(self.max_lag_sec, -delay)
+                name = self.rng.choices(self.names, cum_weights=self.cum_weights)[0]
+                with self._lock:
+                    self.sent += 1
+                    if self.in_flight >= self.max_in_flight:
+                        # Shed instead of queueing without bound; counted as a client-side error.
+                        self.dropped += 1
+                        stats = self.stats[name]
+                        stats.dropped += 1
+                        stats.errors += 1
+                        stats.error_kinds["client_overload"] = stats.error_kinds.get("client_overload", 0) + 1
+                        continue
+                    self.in_flight += 1
+                executor.submit(self._run, name, intended)
+            deadline = time.perf_counter() + drain_sec
+            while self.in_flight > 0 and time.perf_counter() < deadline:
+                time.sleep(0.05)
+        finally:
+            self._stop.set()
+            reporter.join()
+            executor.shutdown(wait=False, cancel_futures=True)
+        return time.perf_counter() - start
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        overall = OpStats()
+        for stats in self.stats.values():
+            overall.latency.merge(stats.latency)
+            overall.service.merge(stats.service)
+            overall.errors += stats.errors
+            overall.dropped += stats.dropped
+            for kind, n in stats.error_kinds.items():
+                overall.error_kinds[kind] = overall.error_kinds.get(kind, 0) + n
+        completed = overall.latency.count
+        return {
+            "elapsed_sec": round(elapsed, 3),
+            "sent": self.sent,
+            "completed": completed,
+            "dropped": self.dropped,
+            "unfinished": self.in_flight,
+            "offered_rps": round(self.sent / sum(s for _, _, s in self.stages), 2),
+            "achieved_rps": round(completed / elapsed, 2) if elapsed > 0 else None,
+            "max_dispatch_lag_ms": round(self.max_lag_sec * 1000, 3),
+            "overall": overall.to_dict(),
+            "ops": {name: stats.to_dict() for name, stats in self.stats.items()},
+            "intervals": self.intervals,
+        }
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    weights: Dict[str, float] = {}
+    for part in spec.split(","):
+        name, _, weight = part.strip().partition("=")
+        if not name:
+            continue
+        try:
+            weights[name.strip()] = float(weight or 1)
+        except ValueError:
+            raise RuntimeError(f"--mix entry {part!r}: expected name=weight") from None
+    weights = {k: v for k, v in weights.items() if v > 0}
+    if not weights:
+        raise RuntimeError("--mix has no operation with a positive weight")
+    return weights
+
+
+def spawn_stub(stub_args: List[str]) -> Tuple[subprocess.Popen, str]:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_server.py")
+    proc = subprocess.Popen(
+        [sys.executable, script, "--port", str(port)] + stub_args,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            with urllib.request.urlopen(f"{base_url}/__stats", timeout=1):
+                return proc, base_url
+        except OSError:
+            if proc.poll() is not None or time.monotonic() > deadline:
+                proc.kill()
+                raise RuntimeError("stub_server.py did not start") from None
+            time.sleep(0.1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Open-loop load generator for the MCP flow.")
+    parser.add_argument("--rps", type=float, default=0.0, help="constant target rate")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds at --rps")
+    parser.add_argument("--ramp", default="", help='stages "START[..END]:SECONDS,..." (overrides --rps)')
+    parser.add_argument("--mix", default=os.getenv("MCP_LOAD_MIX", DEFAULT_MIX))
+    parser.add_argument("--workers", type=int, default=to_int(os.getenv("MCP_LOAD_WORKERS", "64"), 64))
+    parser.add_argument("--max-in-flight", type=int, default=10000, help="shed (and count) requests beyond this")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds per time-series row")
+    parser.add_argument("--drain-sec", type=float, default=30.0, help="wait this long for in-flight requests at the end")
+    parser.add_argument("--keywords", default="water cup,phone case,t-shirt")
+    parser.add_argument("--order-nos", default="", help="file of order_nos for get_order_proof")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--base-url", default="", help="MCP base URL (default: MCP_BASE_URL)")
+    parser.add_argument("--stub", action="store_true", help="run against a stub_server.py child process")
+    parser.add_argument("--stub-args", default="", help='extra stub_server.py flags, e.g. "--latency-ms 20"')
+    parser.add_argument("--allow-orders", action="store_true", help="allow create_order against a real server")
+    parser.add_argument(
+        "--client-resilience",
+        action="store_true",
+        help="keep client retries, hedging and the adaptive limit on (measures the client, not just the server)",
+    )
+    parser.add_argument("--out", default="load_report.json", help="JSON report path")
+    args = parser.parse_args()
+
+    stages = parse_schedule(args.rps, args.duration, args.ramp)
+    weights = parse_mix(args.mix)
+    if weights.keys() & ORDER_OPS and not (args.stub or args.allow_orders):
+        raise RuntimeError("the mix creates orders; pass --allow-orders to do that against a real server")
+    # Every worker may hold a connection; keep them all reusable.
+    os.environ.setdefault("MCP_HTTP_POOL_SIZE", str(max(1, args.workers)))
+    # Set before any client is built; create_order is never resent, whatever the mode.
+    if not args.client_resilience:
+        os.environ.update(RAW_CLIENT_ENV)
+    os.environ["MCP_RETRY_MUTATING"] = "off"
+
+    stub_proc = None
+    if args.stub:
+        stub_proc, base_url = spawn_stub(shlex.split(args.stub_args))
+        os.environ.update({"MCP_BASE_URL": f"{base_url}/api/mcp", "MCP_TOKEN": make_access_token(STUB_USER_ID, 86400)})
+        for key in ("MCP_TOKEN_CACHE_PATH", "MCP_TOOLS_CACHE_PATH"):
+            os.environ.setdefault(key, "off")
+    elif args.base_url:
+        os.environ["MCP_BASE_URL"] = args.base_url
+    try:
+        pay_method = os.getenv("MCP_PAY_METHOD", "bsc")
+        mcp, _, user_id = authenticate_from_env()
+        initialize_session(mcp, "python-load-test")
+        needs_address = bool(weights.keys() & (ORDER_OPS | {"estimate_shipping"}))
+        address_id = to_int(os.getenv("MCP_SHIPPING_ADDRESS_ID", ""), -1)
+        if needs_address:
+            address_id = ensure_buyer_setup(
+                mcp, user_id, address_id, pay_method, os.getenv("MCP_BUYER_WALLET", DEFAULT_BUYER_WALLET)
+            )
+        keywords = [k for k in (first_string(k) for k in args.keywords.split(",")) if k]
+        target = FlowTarget(mcp, address_id, keywords, pay_method, args.seed)
+        if args.order_nos:
+            target.order_nos.extend(iter_order_file(args.order_nos))
+        target.setup(need_orders="get_order_proof" in weights and (args.stub or args.allow_orders))
+
+        generator = LoadGenerator(
+            {name: target.op(name) for name in weights},
+            weights,
+            stages,
+            args.workers,
+            args.max_in_flight,
+            args.interval,
+            args.seed,
+        )
+        cpu_before = cpu_seconds()
+        elapsed = generator.run(args.drain_sec)
+        cpu_after = cpu_seconds()
+        report = generator.report(elapsed)
+    finally:
+        if stub_proc is not None:
+            stub_proc.terminate()
+            stub_proc.wait(timeout=10)
+
+    report = {
+        "target": "stub" if args.stub else os.getenv("MCP_BASE_URL", ""),
+        "schedule": [{"start_rps": a, "end_rps": b, "seconds": s} for a, b, s in stages],
+        "mix": weights,
+        "workers": args.workers,
+        "client_mode": "resilient" if args.client_resilience else "raw",
+        **report,
+        "client": {
+            "cpu_sec": round(cpu_after - cpu_before, 3) if cpu_after is not None and cpu_before is not None else None,
+            "cpu_percent": round((cpu_after - cpu_before) / elapsed * 100, 1)
+            if cpu_after is not None and cpu_before is not None and elapsed > 0
+            else None,
+            "rss_mb": current_rss_mb(),
+            "peak_rss_mb": peak_rss_mb(),
+            "http_pool": mcp.pool.stats(),
+            "retries": mcp.retry_stats(),
+        },
+    }
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+        fh.write("\n")
+
+    print(f"{'op':<20} {'done':>8} {'err %':>7} {'p50 ms':>9} {'p99 ms':>9} {'p99.9 ms':>9} {'svc p99':>9}")
+    for name, row in list(report["ops"].items()) + [("overall", report["overall"])]:
+        lat, svc = row["latency"], row["service"]
+        print(
+            f"{name:<20} {row['completed']:>8} {(row['error_rate'] or 0) * 100:>7.2f} {lat['p50_ms'] or 0:>9.2f} "
+            f"{lat['p99_ms'] or 0:>9.2f} {lat['p999_ms'] or 0:>9.2f} {svc['p99_ms'] or 0:>9.2f}"
+        )
+    print(
+        f"offered {report['offered_rps']} rps, achieved {report['achieved_rps']} rps ({report['client_mode']} client), "
+        f"dropped {report['dropped']}, client CPU {report['client']['cpu_percent']}%, report: {args.out}"
+    )
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        sys.exit(1)
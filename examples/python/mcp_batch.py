@@ -0,0 +1,131 @@
+"""JSON-RPC batch requests for McpClient (stdlib only).
+
+McpBatch collects calls (tools/call, tools/list, ping, notifications) and
+sends them as one JSON-RPC batch in a single HTTP round trip; each call
+gets an RpcResult that is filled in when the batch returns, so one failed
+entry does not fail the others. A batch made only of read-only calls is
+retried like a single read; any other batch is sent once.
+
+Usage:
+from mcp_batch import McpBatch
+batch = McpBatch(mcp)
+user = batch.call_tool("create_user", {"user_id": 42})
+addresses = batch.call_tool("list_addresses", {})
+batch.send()
+print(addresses.unwrap())
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from mcp_common import ensure_tool_success, parse_tool_result
+from retry_policy import READ_ONLY_CALLS
+
+if TYPE_CHECKING:
+    from full_flow import McpClient
+
+
+def format_rpc_error(err: Dict[str, Any]) -> str:
+    return f"JSON-RPC {err.get('code')}: {err.get('message')}"
+
+
+def tool_payload(name: str, raw: Dict[str, Any]) -> Dict[str, Any]:
+    payload = parse_tool_result(raw)
+    ensure_tool_success(name, payload)
+    if isinstance(payload, dict):
+        return payload
+    return {"success": True, "data": payload}
+
+
+class RpcResult:
+    def __init__(self, request_id: int, method: str, tool_name: str = "") -> None:
+        self.id = request_id
+        self.method = method
+        self.tool_name = tool_name
+        self.result: Any = None
+        self.error = ""
+
+    @property
+    def ok(self) -> bool:
+        return not self.error
+
+    def unwrap(self) -> Any:
+        if self.error:
+            raise RuntimeError(self.error)
+        return self.result
+
+
+class McpBatch:
+    def __init__(self, client: "McpClient") -> None:
+        self.client = client
+        self._requests: List[Dict[str, Any]] = []
+        self._entries: List[RpcResult] = []
+
+    def __len__(self) -> int:
+        return len(self._requests)
+
+    def add(self, method: str, params: Dict[str, Any], with_id: bool = True) -> Optional[RpcResult]:
+        if not with_id:
+            self._requests.append({"jsonrpc": "2.0", "method": method, "params": params})
+            return None
+        request_id = self.client.next_id()
+        self._requests.append({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params})
+        tool_name = str(params.get("name", "")) if method == "tools/call" else ""
+        entry = RpcResult(request_id, method, tool_name)
+        self._entries.append(entry)
+        return entry
+
+    def call_tool(self, name: str, arguments: Dict[str, Any]) -> RpcResult:
+        self.client.validate_arguments(name, arguments)
+        return self.add("tools/call", {"name": name, "arguments": arguments})  # type: ignore[return-value]
+
+    def tools_list(self) -> RpcResult:
+        return self.add("tools/list", {})  # type: ignore[return-value]
+
+    def ping(self) -> RpcResult:
+        return self.add("ping", {})  # type: ignore[return-value]
+
+    def send(self) -> List[RpcResult]:
+        if not self._requests:
+            return []
+        requests, entries = self._requests, self._entries
+        self._requests, self._entries = [], []
+
+        # A batch made only of read-only calls is retried like one; anything else is sent once.
+        calls = {e.tool_name or e.method for e in entries}
+        policy_name = "batch:read_only" if calls and calls <= READ_ONLY_CALLS and len(entries) == len(requests) else "batch"
+        tracer = self.client.tracer
+        if tracer is None:
+            response = self.client.post_with_policy(policy_name, requests)
+        else:
+            span = tracer.start(f"batch:{'+'.join(sorted(calls))}" if calls else "batch", "batch", len(requests))
+            try:
+                response = self.client.post_with_policy(policy_name, requests, span)
+            except Exception as exc:
+                tracer.finish(span, "error", str(exc))
+                raise
+            failed = sum(1 for item in response if isinstance(item, dict) and "error" in item) if isinstance(response, list) else 0
+            tracer.finish(span, "rpc_error" if failed else "ok", f"{failed} entries failed" if failed else "")
+        if isinstance(response, dict):
+            # Some servers answer a single-entry batch with a bare response object.
+            response = [response] if response else []
+        by_id: Dict[Any, Dict[str, Any]] = {}
+        for item in response if isinstance(response, list) else []:
+            if isinstance(item, dict) and item.get("id") is not None:
+                by_id[item["id"]] = item
+
+        for entry in entries:
+            item = by_id.get(entry.id)
+            if item is None:
+                entry.error = f"JSON-RPC batch: no response for id {entry.id} ({entry.method})"
+            elif isinstance(item.get("error"), dict):
+                entry.error = format_rpc_error(item["error"])
+            elif entry.method == "tools/call":
+                try:
+                    entry.result = tool_payload(entry.tool_name, item.get("result", {}))
+                except RuntimeError as exc:
+                    entry.error = str(exc)
+            else:
+                entry.result = item.get("result", {})
+        return entries
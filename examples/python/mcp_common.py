@@ -0,0 +1,109 @@
+"""Small helpers shared by the Python examples (stdlib only; orjson is used when installed).
+
+JSON encode/decode with the optional orjson backend (MCP_JSON_BACKEND),
+lenient scalar and timestamp conversion, and tools/call result decoding.
+
+Usage:
+from mcp_common import first_string, json_loads, to_int
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Union
+
+try:
+    import orjson  # optional faster JSON backend; the stdlib json module is the fallback
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+
+JSON_BACKEND = "orjson" if orjson is not None and os.getenv("MCP_JSON_BACKEND", "auto").lower() != "stdlib" else "stdlib"
+
+
+def json_loads(data: Union[bytes, str]) -> Any:
+    # Both backends decode UTF-8 bytes directly, so response bodies skip the intermediate str.
+    if JSON_BACKEND == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps_bytes(obj: Any) -> bytes:
+    if JSON_BACKEND == "orjson":
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass  # e.g. ints beyond 64 bits; the stdlib encoder handles them
+    return json.dumps(obj).encode("utf-8")
+
+
+def trim_slash(value: str) -> str:
+    return str(value or "").rstrip("/")
+
+
+def first_string(*values: Any) -> str:
+    for value in values:
+        s = str("" if value is None else value).strip()
+        if s:
+            return s
+    return ""
+
+
+def to_int(value: Any, fallback: int) -> int:
+    try:
+        return int(float(value))
+    except Exception:
+        return fallback
+
+
+def to_float(value: Any, fallback: Optional[float]) -> Optional[float]:
+    try:
+        return float(value)
+    except Exception:
+        return fallback
+
+
+def parse_timestamp(value: Any) -> Optional[float]:
+    number = to_float(value, None)
+    if number is not None:
+        return number / 1000.0 if number > 1e12 else number
+    try:
+        parsed = datetime.fromisoformat(first_string(value).replace("Z", "+00:00"))
+    except Exception:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def parse_tool_result(raw: Dict[str, Any]) -> Any:
+    if isinstance(raw, dict) and isinstance(raw.get("structuredContent"), dict):
+        return raw["structuredContent"]
+
+    content = raw.get("content") if isinstance(raw, dict) else None
+    text = None
+    if isinstance(content, list):
+        for item in content:
+            if isinstance(item, dict) and item.get("type") == "text" and isinstance(item.get("text"), str):
+                text = item["text"]
+                break
+    if not text:
+        return raw
+    try:
+        return json_loads(text)
+    except Exception:
+        return {"success": not bool(raw.get("isError")), "message": text}
+
+
+class ToolError(RuntimeError):
+    # The tool ran and answered success: false; payload is its decoded result.
+    def __init__(self, message: str, payload: Dict[str, Any]) -> None:
+        super().__init__(message)
+        self.payload = payload
+
+
+def ensure_tool_success(step: str, payload: Any) -> None:
+    if isinstance(payload, dict) and payload.get("success") is False:
+        raise ToolError(f"{step} failed: {payload.get('error') or payload.get('message') or 'unknown error'}", payload)
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""Long-lived local MCP proxy (stdlib only).
+
+Holds one authenticated upstream McpClient session (token, warm connection
+pool, retry/hedge policies, adaptive limit) and serves many short-lived
+agents locally, either over localhost HTTP (same JSON-RPC surface as
+/api/mcp, plus /api/products/detail) or over stdio (newline-delimited
+JSON-RPC, for MCP hosts that spawn their servers).
+
+Answered locally:
+- initialize, notifications/*, ping, tools/list (from the upstream handshake)
+- list_addresses / list_wallets (TTL cache, dropped on create_address / set_buyer_wallet)
+- create_user / set_buyer_wallet with arguments already applied (TTL cache)
+- /api/products/detail (TTL cache)
+
+Everything else is forwarded. Identical concurrent read-only calls
+(search_products, get_order_proof, ...) are coalesced into one upstream
+request.
+
+Agents authenticate with a local token printed at startup (JWT-shaped, its
+sub is the upstream user id, so full_flow.py derives the right user_id):
+
+python mcp_proxy.py --port 18765 --token-file ~/.taopochta/proxy_token
+MCP_BASE_URL=http://127.0.0.1:18765/api/mcp MCP_TOKEN=$(cat ~/.taopochta/proxy_token) python full_flow.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import hmac
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+from endpoint_guard import endpoint_guard_states
+from full_flow import (
+    McpClient,
+    authenticate_from_env,
+    _http_json,
+    initialize_session,
+)
+from mcp_common import json_dumps_bytes, json_loads, to_float, to_int
+from retry_policy import READ_ONLY_CALLS
+from ttl_cache import SingleFlight, TtlLruCache
+
+# Setup calls whose effect is idempotent: the same arguments within the TTL are answered from cache.
+SETUP_TOOLS = {"create_user", "set_buyer_wallet"}
+LISTING_TOOLS = {"list_addresses", "list_wallets"}
+INVALIDATES = {"create_address": "list_addresses", "set_buyer_wallet": "list_wallets"}
+
+
+def make_local_token(sub: int, secret: str, ttl_sec: int = 30 * 86400) -> str:
+    def part(obj: Dict[str, Any]) -> str:
+        return base64.urlsafe_b64encode(json.dumps(obj).encode("utf-8")).decode("ascii").rstrip("=")
+
+    claims = {"sub": sub, "exp": int(time.time()) + ttl_sec, "iss": "mcp-proxy"}
+    return f"{part({'alg': 'none', 'typ': 'JWT'})}.{part(claims)}.{secret}"
+
+
+def rpc_error(request_id: Any, code: int, message: str) -> Dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+class McpProxy:
+    def __init__(
+        self,
+        mcp: McpClient,
+        api_base_url: str,
+        init: Dict[str, Any],
+        listing_ttl_sec: float = 60.0,
+        setup_ttl_sec: float = 3600.0,
+        detail_ttl_sec: float = 3600.0,
+        workers: int = 32,
+    ) -> None:
+        self.mcp = mcp
+        self.api_base_url = api_base_url
+        self.init = init
+        self.tools = [{"name": name, "inputSchema": schema} for name, schema in mcp.tool_schemas.items()]
+        self.listing_ttl_sec = listing_ttl_sec
+        self.setup_ttl_sec = setup_ttl_sec
+        self.detail_ttl_sec = detail_ttl_sec
+        self.cache = TtlLruCache(max_entries=4096, ttl_sec=listing_ttl_sec)
+        self.flight = SingleFlight()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="proxy")
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "local": 0, "cache_hits": 0, "forwarded": 0, "upstream_errors": 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+        out["coalesced"] = self.flight.coalesced
+        out["cache"] = self.cache.stats()
+        out["http_pool"] = self.mcp.pool.stats()
+        out["retries"] = self.mcp.retry_stats()
+        out["endpoint_guard"] = endpoint_guard_states()
+        return out
+
+    def _cached_call(self, cache_key: str, ttl_sec: float, fn: Any) -> Any:
+        found, value = self.cache.get(cache_key)
+        if found:
+            self._count("cache_hits")
+            return value
+        value = self.flight.do(cache_key, fn)
+        if not (isinstance(value, dict) and value.get("isError")):
+            self.cache.set(cache_key, value, ttl_sec=ttl_sec)
+        return value
+
+    def call_tool(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        canonical = json.dumps(arguments, sort_keys=True, separators=(",", ":"))
+        cache_key = f"tool:{name}:{canonical}"
+
+        def forward() -> Dict[str, Any]:
+            self._count("forwarded")
+            return self.mcp.call_tool_raw(name, arguments)
+
+        if name in LISTING_TOOLS:
+            return self._cached_call(cache_key, self.listing_ttl_sec, forward)
+        if name in SETUP_TOOLS:
+            result = self._cached_call(cache_key, self.setup_ttl_sec, forward)
+        elif name in READ_ONLY_CALLS:
+            result = self.flight.do(cache_key, forward)
+        else:
+            result = forward()
+        if name in INVALIDATES and not result.get("isError"):
+            prefix = f"tool:{INVALIDATES[name]}:"
+            for key in [k for k in self.cache.keys() if k.startswith(prefix)]:
+                self.cache.pop(key)
+        return result
+
+    def handle(self, req: Any) -> Optional[Dict[str, Any]]:
+        if not isinstance(req, dict) or not isinstance(req.get("method"), str):
+            return rpc_error(None, -32600, "Invalid Request")
+        self._count("requests")
+        method = req["method"]
+        request_id = req.get("id")
+        params = req.get("params") if isinstance(req.get("params"), dict) else {}
+        if "id" not in req:
+            # Notifications (notifications/initialized, ...) concern the local session only.
+            self._count("local")
+            return None
+        try:
+            if method == "initialize":
+                self._count("local")
+                result: Any = self.init
+            elif method == "ping":
+                self._count("local")
+                result = {}
+            elif method == "tools/list":
+                self._count("local")
+                result = {"tools": self.tools}
+            elif method == "tools/call":
+                name = str(params.get("name") or "")
+                arguments = params.get("arguments") if isinstance(params.get("arguments"), dict) else {}
+                result = self.call_tool(name, arguments)
+            else:
+                self._count("forwarded")
+                result = self.mcp.rpc(method, params)
+        except urllib.error.HTTPError as exc:
+            self._count("upstream_errors")
+            return rpc_error(request_id, -32000, f"upstream HTTP {exc.code}: {exc.reason}")
+        except Exception as exc:  # noqa: BLE001
+            self._count("upstream_errors")
+            return rpc_error(request_id, -32000, str(exc))
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def handle_payload(self, payload: Any) -> Any:
+        if isinstance(payload, list):
+            if not payload:
+                return rpc_error(None, -32600, "Invalid Request")
+            out = [resp for resp in self.executor.map(self.handle, payload) if resp is not None]
+            return out or None
+        return self.handle(payload)
+
+    def product_detail(self, query: str) -> Dict[str, Any]:
+        url = f"{self.api_base_url}/api/products/detail?{query}"
+        ordered = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(query)))
+
+        def fetch() -> Dict[str, Any]:
+            self._count("forwarded")
+            return _http_json(url, "GET", None, self.mcp.token, self.mcp.pool)
+
+        return self._cached_call(f"detail:{ordered}", self.detail_ttl_sec, fetch)
+
+
+def make_handler(proxy: McpProxy, local_token: str) -> type:
+    class ProxyHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, fmt: str, *args: Any) -> None:
+            pass
+
+        def send_body(self, status: int, obj: Any) -> None:
+            body = json_dumps_bytes(obj) if obj is not None else b""
+            self.send_response(status)
+            if body:
+                self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def authorized(self) -> bool:
+            supplied = self.headers.get("authorization", "")
+            if hmac.compare_digest(supplied.encode("utf-8"), f"Bearer {local_token}".encode("utf-8")):
+                return True
+            self.send_body(401, rpc_error(None, -32001, "Unauthorized"))
+            return False
+
+        def do_GET(self) -> None:
+            parsed = urllib.parse.urlsplit(self.path)
+            if not self.authorized():
+                return
+            if parsed.path == "/__proxy/stats":
+                return self.send_body(200, proxy.stats())
+            if parsed.path == "/api/products/detail":
+                try:
+                    return self.send_body(200, proxy.product_detail(parsed.query))
+                except urllib.error.HTTPError as exc:
+                    return self.send_body(exc.code, {"success": False, "message": str(exc)})
+                except Exception as exc:  # noqa: BLE001
+                    return self.send_body(502, {"success": False, "message": str(exc)})
+            self.send_body(404, {"error": "not found"})
+
+        def do_POST(self) -> None:
+            path = urllib.parse.urlsplit(self.path).path
+            length = to_int(self.headers.get("content-length", "0"), 0)
+            raw = self.rfile.read(length) if length > 0 else b""
+            if not self.authorized():
+                return
+            if path not in ("/api/mcp", "/api/mcp/rpc"):
+                return self.send_body(404, {"error": "not found"})
+            try:
+                payload = json_loads(raw) if raw else None
+            except ValueError:
+                return self.send_body(200, rpc_error(None, -32700, "Parse error"))
+            response = proxy.handle_payload(payload)
+            self.send_body(200 if response is not None else 204, response)
+
+    return ProxyHandler
+
+
+def serve_stdio(proxy: McpProxy) -> None:
+    # MCP stdio transport: one JSON-RPC message (or batch) per line in, one per line out.
+    write_lock = threading.Lock()
+
+    def reply(line: str) -> None:
+        try:
+            payload = json_loads(line)
+        except ValueError:
+            response: Any = rpc_error(None, -32700, "Parse error")
+        else:
+            response = proxy.handle_payload(payload)
+        if response is None:
+            return
+        data = json.dumps(response, ensure_ascii=False)
+        with write_lock:
+            sys.stdout.write(data + "\n")
+            sys.stdout.flush()
+
+    # Lines are served concurrently so one slow upstream call doesn't block the next request.
+    with ThreadPoolExecutor(max_workers=16, thread_name_prefix="stdio") as executor:
+        for line in sys.stdin:
+            if line.strip():
+                executor.submit(reply, line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local MCP proxy with session reuse, caching and coalescing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=to_int(os.getenv("MCP_PROXY_PORT", "18765"), 18765))
+    parser.add_argument("--stdio", action="store_true", help="serve MCP over stdin/stdout instead of HTTP")
+    parser.add_argument("--token-file", default=os.getenv("MCP_PROXY_TOKEN_FILE", ""), help="write the local agent token here (0600)")
+    args = parser.parse_args()
+
+    if args.stdio:
+        # stdout carries the protocol; status lines from the shared helpers go to stderr.
+        sys.stdout, protocol_out = sys.stderr, sys.stdout
+    mcp, api_base_url, user_id = authenticate_from_env()
+    init = initialize_session(mcp, "python-mcp-proxy")
+    proxy = McpProxy(
+        mcp,
+        api_base_url,
+        init,
+        listing_ttl_sec=to_float(os.getenv("MCP_PROXY_LIST_TTL_SEC"), 60.0) or 60.0,
+        setup_ttl_sec=to_float(os.getenv("MCP_PROXY_SETUP_TTL_SEC"), 3600.0) or 3600.0,
+        detail_ttl_sec=to_float(os.getenv("MCP_PROXY_DETAIL_TTL_SEC"), 3600.0) or 3600.0,
+        workers=to_int(os.getenv("MCP_PROXY_WORKERS", "32"), 32),
+    )
+
+    if args.stdio:
+        sys.stdout = protocol_out
+        serve_stdio(proxy)
+        return
+
+    local_token = make_local_token(user_id, os.getenv("MCP_PROXY_SECRET", "") or secrets.token_urlsafe(24))
+    if args.token_file:
+        path = os.path.expanduser(args.token_file)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            fh.write(local_token + "\n")
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(proxy, local_token))
+    server.daemon_threads = True
+    print(f"[proxy] serving {mcp.endpoint} for user {user_id} on http://{args.host}:{args.port}/api/mcp", file=sys.stderr)
+    if not args.token_file:
+        print(f"MCP_TOKEN={local_token}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(proxy.stats(), ensure_ascii=False, indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,336 @@
+"""Local SQLite catalog of search_products pages (stdlib only).
+
+Every search page the examples fetch is stored per MCP endpoint, with an
+FTS5 index over titles for offline queries. A page younger than
+MCP_CATALOG_FRESH_SEC is answered from the catalog without a request;
+older pages up to MCP_CATALOG_MAX_STALE_SEC can still be served while they
+refresh. Rows from one endpoint are never returned for another.
+The catalog is opt-in: it is used only when MCP_CATALOG_PATH names a file.
+
+Usage:
+from product_catalog import get_default_catalog
+catalog = get_default_catalog("https://taopochta.ru/api/mcp")
+cheapest = catalog.query("water cup", max_price=10.0) if catalog is not None else []
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from mcp_common import first_string, json_loads, to_float
+from products import Product
+from token_store import normalize_base_url
+from ttl_cache import TtlLruCache
+
+
+# Bumped whenever a table changes; the catalog is a cache, so an older file is rebuilt empty.
+CATALOG_SCHEMA_VERSION = 2
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    endpoint TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    sku_id TEXT NOT NULL DEFAULT '',
+    shop_id TEXT NOT NULL DEFAULT '',
+    title TEXT NOT NULL DEFAULT '',
+    shop_name TEXT NOT NULL DEFAULT '',
+    price REAL,
+    coupon_price REAL,
+    comparable_price REAL,
+    inventory INTEGER NOT NULL DEFAULT -1,
+    raw TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (endpoint, item_id, sku_id)
+);
+CREATE INDEX IF NOT EXISTS products_by_price ON products (endpoint, comparable_price);
+CREATE TABLE IF NOT EXISTS searches (
+    endpoint TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    page_no INTEGER NOT NULL,
+    page_size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    items TEXT NOT NULL,
+    PRIMARY KEY (endpoint, keyword, page_no, page_size)
+);
+CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+    INSERT INTO products_fts (rowid, title, shop_name) VALUES (new.rowid, new.title, new.shop_name);
+END;
+CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+    INSERT INTO products_fts (products_fts, rowid, title, shop_name) VALUES ('delete', old.rowid, old.title, old.shop_name);
+END;
+CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF title, shop_name ON products BEGIN
+    INSERT INTO products_fts (products_fts, rowid, title, shop_name) VALUES ('delete', old.rowid, old.title, old.shop_name);
+    INSERT INTO products_fts (rowid, title, shop_name) VALUES (new.rowid, new.title, new.shop_name);
+END;
+"""
+
+
+def normalize_keyword(keyword: str) -> str:
+    return " ".join(first_string(keyword).lower().split())
+
+
+class ProductCatalog:
+    # SQLite catalog of every search_products page seen: products (FTS5 over title/shop_name) plus
+    # keyword pages with their fetch time, both scoped to one MCP endpoint. Pages younger than
+    # fresh_sec are served as-is; older ones up to max_stale_sec are served (if the caller allows
+    # stale data) while a background refresh replaces them.
+    def __init__(
+        self,
+        path: str,
+        endpoint: str,
+        fresh_sec: float = 600.0,
+        max_stale_sec: float = 21600.0,
+        refresh_workers: int = 2,
+        memory_entries: int = 1024,
+    ) -> None:
+        self.path = os.path.expanduser(path)
+        self.endpoint = normalize_base_url(endpoint)
+        self.fresh_sec = float(fresh_sec)
+        self.max_stale_sec = max(self.fresh_sec, float(max_stale_sec))
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        self.tokenizer = self._create_fts()
+        self._db.executescript(CATALOG_SCHEMA)
+        self._lock = threading.Lock()
+        # Hot pages stay decoded in memory; the database is the source of truth across processes.
+        self._pages = TtlLruCache(max_entries=memory_entries, ttl_sec=self.max_stale_sec)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(refresh_workers)), thread_name_prefix="catalog")
+        self._refreshing: Set[Tuple[str, int, int]] = set()
+        self._stats = {"fresh_hits": 0, "stale_hits": 0, "misses": 0, "ingested": 0, "refreshes": 0, "refresh_errors": 0, "errors": 0}
+
+    def _migrate(self) -> None:
+        if self._db.execute("PRAGMA user_version").fetchone()[0] == CATALOG_SCHEMA_VERSION:
+            return
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated while this one waited for the write lock.
+            if self._db.execute("PRAGMA user_version").fetchone()[0] != CATALOG_SCHEMA_VERSION:
+                for table in ("products_fts", "searches", "products"):
+                    self._db.execute(f"DROP TABLE IF EXISTS {table}")
+                self._db.execute(f"PRAGMA user_version = {CATALOG_SCHEMA_VERSION}")
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def _create_fts(self) -> str:
+        # trigram matches substrings of CJK titles; older SQLite builds fall back to unicode61 words.
+        row = self._db.execute("SELECT sql FROM sqlite_master WHERE name = 'products_fts'").fetchone()
+        if row:
+            return "trigram" if "trigram" in row[0] else "unicode61"
+        for tokenizer in ("trigram", "unicode61"):
+            try:
+                self._db.execute(
+                    "CREATE VIRTUAL TABLE products_fts USING fts5"
+                    f"(title, shop_name, content='products', content_rowid='rowid', tokenize='{tokenizer}')"
+                )
+                return tokenizer
+            except sqlite3.OperationalError:
+                continue
+        raise RuntimeError("SQLite FTS5 is not available in this Python build")
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += n
+
+    @staticmethod
+    def page_key(keyword: str, page_no: int, page_size: int) -> Tuple[str, int, int]:
+        return normalize_keyword(keyword), int(page_no), int(page_size)
+
+    def ingest(self, keyword: str, page_no: int, page_size: int, products: List[Product]) -> None:
+        key = self.page_key(keyword, page_no, page_size)
+        now = time.time()
+        rows = []
+        for p in products:
+            item_id = p.dedupe_key[0]
+            if not item_id:
+                continue
+            raw = p.raw
+            rows.append(
+                (
+                    self.endpoint,
+                    item_id,
+                    p.sku_id,
+                    p.shop_id,
+                    first_string(raw.get("title"), raw.get("name"), raw.get("subject")),
+                    first_string(raw.get("shop_name"), raw.get("shopName"), raw.get("seller_nick"), raw.get("nick")),
+                    p.price,
+                    p.coupon_price,
+                    p.comparable_price,
+                    p.inventory,
+                    json.dumps(raw, ensure_ascii=False, separators=(",", ":")),
+                    now,
+                )
+            )
+        items = json.dumps([[r[1], r[2]] for r in rows], separators=(",", ":"))
+        try:
+            with self._lock:
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    self._db.executemany(
+                        "INSERT INTO products (endpoint, item_id, sku_id, shop_id, title, shop_name, price, coupon_price,"
+                        " comparable_price, inventory, raw, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                        " ON CONFLICT (endpoint, item_id, sku_id) DO UPDATE SET shop_id = excluded.shop_id, title = excluded.title,"
+                        " shop_name = excluded.shop_name, price = excluded.price, coupon_price = excluded.coupon_price,"
+                        " comparable_price = excluded.comparable_price, inventory = excluded.inventory,"
+                        " raw = excluded.raw, updated_at = excluded.updated_at",
+                        rows,
+                    )
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?, ?, ?)", (self.endpoint,) + key + (now, items)
+                    )
+                    self._db.execute("COMMIT")
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+                self._stats["ingested"] += len(rows)
+        except sqlite3.Error as exc:
+            self._count("errors")
+            print(f"[WARN] catalog ingest '{key[0]}' page {key[1]}: {exc}", file=sys.stderr)
+            return
+        self._pages.set(key, (now, [p for p in products if p.dedupe_key[0]]))
+
+    def _load_page(self, key: Tuple[str, int, int]) -> Optional[Tuple[float, List[Product]]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT fetched_at, items FROM searches WHERE endpoint = ? AND keyword = ? AND page_no = ? AND page_size = ?",
+                (self.endpoint,) + key,
+            ).fetchone()
+            if row is None:
+                return None
+            keys = [tuple(k) for k in json.loads(row[1])]
+            raws: Dict[Tuple[str, str], str] = {}
+            ids = list({k[0] for k in keys})
+            for start in range(0, len(ids), 500):
+                chunk = ids[start : start + 500]
+                marks = ",".join("?" * len(chunk))
+                for item_id, sku_id, raw in self._db.execute(
+                    f"SELECT item_id, sku_id, raw FROM products WHERE endpoint = ? AND item_id IN ({marks})",
+                    [self.endpoint] + chunk,
+                ):
+                    raws[(item_id, sku_id)] = raw
+        # Page order is kept; each product carries the latest data any keyword brought in.
+        products = [Product.from_dict(json_loads(raws[k])) for k in keys if k in raws]
+        return float(row[0]), products
+
+    def lookup(
+        self, keyword: str, page_no: int, page_size: int, allow_stale: bool = True
+    ) -> Optional[Tuple[List[Product], bool]]:
+        key = self.page_key(keyword, page_no, page_size)
+        found, entry = self._pages.get(key)
+        # A page gone stale in memory may have been refreshed on disk by another process.
+        if not found or time.time() - entry[0] > self.fresh_sec:
+            try:
+                entry = self._load_page(key)
+            except (sqlite3.Error, ValueError) as exc:
+                self._count("errors")
+                print(f"[WARN] catalog lookup '{key[0]}' page {key[1]}: {exc}", file=sys.stderr)
+                entry = None
+            if entry is not None:
+                self._pages.set(key, entry)
+        age = time.time() - entry[0] if entry is not None else self.max_stale_sec + 1
+        if entry is None or age > (self.max_stale_sec if allow_stale else self.fresh_sec):
+            self._count("misses")
+            return None
+        fresh = age <= self.fresh_sec
+        self._count("fresh_hits" if fresh else "stale_hits")
+        return list(entry[1]), fresh
+
+    def refresh(self, keyword: str, page_no: int, page_size: int, fetch: Callable[[], Any]) -> bool:
+        # At most one background refresh per page; fetch is expected to ingest what it gets.
+        key = self.page_key(keyword, page_no, page_size)
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self._stats["refreshes"] += 1
+
+        def run() -> None:
+            try:
+                fetch()
+            except Exception as exc:  # noqa: BLE001
+                self._count("refresh_errors")
+                print(f"[WARN] catalog refresh '{key[0]}' page {key[1]}: {exc}", file=sys.stderr)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._executor.submit(run)
+        return True
+
+    def query(self, text: str, limit: int = 20, max_price: Optional[float] = None) -> List[Product]:
+        # Every whitespace-separated term must match title or shop_name; cheapest first.
+        terms = [t for t in first_string(text).split() if t]
+        min_len = 3 if self.tokenizer == "trigram" else 1
+        fts_terms = [t for t in terms if len(t) >= min_len]
+        like_terms = [t for t in terms if len(t) < min_len]
+        where: List[str] = ["p.endpoint = ?"]
+        params: List[Any] = [self.endpoint]
+        if fts_terms:
+            where.append("p.rowid IN (SELECT rowid FROM products_fts WHERE products_fts MATCH ?)")
+            params.append(" ".join('"' + t.replace('"', '""') + '"' for t in fts_terms))
+        for term in like_terms:
+            where.append("(p.title LIKE ? OR p.shop_name LIKE ?)")
+            params.extend([f"%{term}%"] * 2)
+        if max_price is not None:
+            where.append("p.comparable_price <= ?")
+            params.append(max_price)
+        sql = "SELECT p.raw FROM products p WHERE " + " AND ".join(where)
+        sql += " ORDER BY p.comparable_price IS NULL, p.comparable_price LIMIT ?"
+        params.append(max(1, int(limit)))
+        with self._lock:
+            raws = [row[0] for row in self._db.execute(sql, params)]
+        return [Product.from_dict(json_loads(raw)) for raw in raws]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["products"] = self._db.execute("SELECT count(*) FROM products WHERE endpoint = ?", (self.endpoint,)).fetchone()[0]
+            out["pages"] = self._db.execute("SELECT count(*) FROM searches WHERE endpoint = ?", (self.endpoint,)).fetchone()[0]
+        out["endpoint"] = self.endpoint
+        out["tokenizer"] = self.tokenizer
+        out["memory"] = self._pages.stats()
+        return out
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            self._db.close()
+
+
+def open_catalog(endpoint: str) -> Optional[ProductCatalog]:
+    path = os.getenv("MCP_CATALOG_PATH", "")
+    if not first_string(path) or path.lower() in ("0", "off", "false"):
+        return None
+    return ProductCatalog(
+        path,
+        endpoint,
+        fresh_sec=to_float(os.getenv("MCP_CATALOG_FRESH_SEC"), 600.0) or 0.0,
+        max_stale_sec=to_float(os.getenv("MCP_CATALOG_MAX_STALE_SEC"), 21600.0) or 0.0,
+    )
+
+
+_default_catalogs: Dict[str, Optional[ProductCatalog]] = {}
+_default_catalog_lock = threading.Lock()
+
+
+def get_default_catalog(endpoint: str) -> Optional[ProductCatalog]:
+    key = normalize_base_url(endpoint)
+    with _default_catalog_lock:
+        if key not in _default_catalogs:
+            _default_catalogs[key] = None
+            try:
+                _default_catalogs[key] = open_catalog(endpoint)
+            except (sqlite3.Error, OSError, RuntimeError) as exc:
+                print(f"[WARN] product catalog disabled: {exc}", file=sys.stderr)
+        return _default_catalogs[key]
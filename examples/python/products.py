@@ -0,0 +1,273 @@
+"""Product records parsed from search_products payloads (stdlib only).
+
+Payload shapes differ between server versions, so products are found by
+walking the payload for lists of product-like dicts. Product normalizes ids
+and prices (comparable_price = min(coupon_price, price)); ProductColumns
+keeps many of them in typed arrays for fast cheapest-first selection.
+
+Usage:
+from products import iter_product_records, pick_cheapest_product
+cheapest = pick_cheapest_product(search_products_response)
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+from array import array
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from mcp_common import first_string, to_int
+
+
+# array("q") holds signed 64-bit values; a bogus inventory such as "1e30" is clamped into range.
+INVENTORY_MAX = (1 << 63) - 1
+INVENTORY_MIN = -(1 << 63)
+
+
+def collect_arrays(node: Any, out: List[list], depth: int = 0) -> None:
+    if depth > 6 or node is None:
+        return
+    if isinstance(node, list):
+        out.append(node)
+        for item in node:
+            collect_arrays(item, out, depth + 1)
+        return
+    if isinstance(node, dict):
+        for value in node.values():
+            collect_arrays(value, out, depth + 1)
+
+
+def to_price_number(raw: Any) -> Optional[float]:
+    if raw is None:
+        return None
+    s = str(raw).strip().replace(",", "")
+    if not s:
+        return None
+    try:
+        n = float(s)
+        if n >= 0:
+            return n
+    except Exception:
+        return None
+    return None
+
+
+def get_comparable_price(product: Dict[str, Any]) -> Optional[float]:
+    coupon = to_price_number(product.get("coupon_price", product.get("couponPrice")))
+    price = to_price_number(product.get("price"))
+    if coupon is not None and price is not None:
+        return min(coupon, price)
+    if coupon is not None:
+        return coupon
+    if price is not None:
+        return price
+    return None
+
+
+def looks_like_product(item: Any) -> bool:
+    if not isinstance(item, dict):
+        return False
+    item_id = first_string(item.get("item_id"), item.get("itemId"), item.get("id"))
+    if not item_id:
+        return False
+    hints = [
+        item.get("title"),
+        item.get("shop_name"),
+        item.get("price"),
+        item.get("main_image_url"),
+        item.get("coupon_price"),
+        item.get("inventory"),
+    ]
+    has_product_hint = any(v is not None for v in hints)
+    return has_product_hint or bool(first_string(item.get("shop_id"), item.get("shopId"), item.get("seller_id"), item.get("sellerId")))
+
+
+def get_sku_id(product: Dict[str, Any]) -> str:
+    return first_string(
+        product.get("sku_id"),
+        product.get("skuId"),
+        product.get("default_sku_id"),
+        product.get("defaultSkuId"),
+        product.get("sku"),
+    )
+
+
+def iter_products(payload: Any, max_depth: int = 6) -> Iterator[Dict[str, Any]]:
+    # Iterative pre-order walk over decoded JSON (a tree, so each container is seen once).
+    # Yields product-like list elements in the same order as collect_arrays + looks_like_product.
+    stack: List[Iterator[Any]] = [iter((payload,))]
+    while stack:
+        depth = len(stack) - 1
+        for node in stack[-1]:
+            if isinstance(node, list):
+                for item in node:
+                    if looks_like_product(item):
+                        yield item
+                children: Iterator[Any] = iter(node)
+            elif isinstance(node, dict):
+                children = iter(node.values())
+            else:
+                continue
+            if depth < max_depth:
+                stack.append(children)
+                break
+        else:
+            stack.pop()
+
+
+def extract_products(payload: Any) -> List[Dict[str, Any]]:
+    return list(iter_products(payload))
+
+
+def pick_cheapest_product(payload: Any) -> Optional[Dict[str, Any]]:
+    return choose_cheapest(iter_products(payload))
+
+
+def choose_cheapest(products: Iterable[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    first = None
+    best = None
+    best_price = float("inf")
+    for product in products:
+        if first is None:
+            first = product
+        p = get_comparable_price(product)
+        if p is None:
+            continue
+        if p < best_price:
+            best_price = p
+            best = product
+    if best is not None:
+        return best
+    return first
+
+
+def top_k_cheapest(
+    products: Iterable[Dict[str, Any]],
+    k: int,
+    secondary_keys: Sequence[Callable[[Dict[str, Any]], Any]] = (),
+) -> List[Dict[str, Any]]:
+    # heapq.nsmallest keeps a k-sized heap and is stable, so ties keep arrival order.
+    def ranked() -> Iterator[Tuple[Tuple[Any, ...], Dict[str, Any]]]:
+        for product in products:
+            price = get_comparable_price(product)
+            if price is not None:
+                yield (price, *(key(product) for key in secondary_keys)), product
+
+    return [product for _, product in heapq.nsmallest(max(0, int(k)), ranked(), key=lambda pair: pair[0])]
+
+
+def more_inventory_first(product: Dict[str, Any]) -> float:
+    return -(to_price_number(product.get("inventory")) or 0)
+
+
+class Product:
+    __slots__ = ("item_id", "shop_id", "sku_id", "coupon_price", "price", "comparable_price", "inventory", "raw")
+
+    def __init__(
+        self,
+        item_id: str,
+        shop_id: str,
+        sku_id: str,
+        coupon_price: Optional[float],
+        price: Optional[float],
+        inventory: int,
+        raw: Dict[str, Any],
+    ) -> None:
+        self.item_id = item_id
+        self.shop_id = shop_id
+        self.sku_id = sku_id
+        self.coupon_price = coupon_price
+        self.price = price
+        if coupon_price is not None and price is not None:
+            self.comparable_price: Optional[float] = min(coupon_price, price)
+        else:
+            self.comparable_price = coupon_price if coupon_price is not None else price
+        self.inventory = inventory
+        self.raw = raw
+
+    @classmethod
+    def from_dict(cls, item: Dict[str, Any]) -> "Product":
+        return cls(
+            item_id=first_string(item.get("item_id"), item.get("itemId")),
+            shop_id=first_string(item.get("shop_id"), item.get("shopId")),
+            sku_id=get_sku_id(item),
+            coupon_price=to_price_number(item.get("coupon_price", item.get("couponPrice"))),
+            price=to_price_number(item.get("price")),
+            inventory=to_int(item.get("inventory"), -1),
+            raw=item,
+        )
+
+    @property
+    def dedupe_key(self) -> Tuple[str, str]:
+        return self.item_id or first_string(self.raw.get("id")), self.sku_id
+
+
+def iter_product_records(payload: Any) -> Iterator[Product]:
+    for item in iter_products(payload):
+        yield Product.from_dict(item)
+
+
+class ProductColumns:
+    # Column-per-field batch; prices are NaN and inventory is -1 when missing.
+    def __init__(self) -> None:
+        self.item_ids: List[str] = []
+        self.shop_ids: List[str] = []
+        self.sku_ids: List[str] = []
+        self.coupon_prices = array("d")
+        self.prices = array("d")
+        self.comparable_prices = array("d")
+        self.inventory = array("q")
+        self.records: List[Product] = []
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def append(self, product: Product) -> None:
+        self.item_ids.append(product.item_id)
+        self.shop_ids.append(product.shop_id)
+        self.sku_ids.append(product.sku_id)
+        self.coupon_prices.append(math.nan if product.coupon_price is None else product.coupon_price)
+        self.prices.append(math.nan if product.price is None else product.price)
+        self.comparable_prices.append(math.nan if product.comparable_price is None else product.comparable_price)
+        self.inventory.append(min(max(product.inventory, INVENTORY_MIN), INVENTORY_MAX))
+        self.records.append(product)
+
+    def extend(self, products: Iterable[Product]) -> None:
+        for product in products:
+            self.append(product)
+
+    def select(
+        self,
+        max_price: Optional[float] = None,
+        min_inventory: Optional[int] = None,
+        require_shop_id: bool = False,
+    ) -> List[int]:
+        # NaN compares False, so unpriced rows drop out of any price filter.
+        rows = range(len(self.records))
+        if max_price is not None:
+            prices = self.comparable_prices
+            rows = [i for i in rows if prices[i] <= max_price]
+        if min_inventory is not None:
+            inventory = self.inventory
+            rows = [i for i in rows if inventory[i] >= min_inventory]
+        if require_shop_id:
+            shop_ids = self.shop_ids
+            rows = [i for i in rows if shop_ids[i]]
+        return list(rows)
+
+    def cheapest_rows(self, k: int, rows: Optional[Iterable[int]] = None) -> List[int]:
+        prices = self.comparable_prices
+        candidates = (i for i in (range(len(self.records)) if rows is None else rows) if prices[i] == prices[i])
+        return heapq.nsmallest(max(0, int(k)), candidates, key=prices.__getitem__)
+
+    def fill_shop_ids(self, shop_ids: Dict[str, str]) -> None:
+        for row, product in enumerate(self.records):
+            if not product.shop_id and shop_ids.get(product.item_id):
+                product.shop_id = self.shop_ids[row] = shop_ids[product.item_id]
+
+    def cheapest(self) -> Optional[Product]:
+        rows = self.cheapest_rows(1)
+        if rows:
+            return self.records[rows[0]]
+        return self.records[0] if self.records else None
@@ -0,0 +1,91 @@
+"""Size-bounded, incrementally decoded HTTP response bodies (stdlib only).
+
+BodyDecoder undoes a gzip/deflate Content-Encoding chunk by chunk and stops
+as soon as the decoded body passes a byte cap, so an oversized (or
+decompression-bomb) response fails after at most one extra chunk. A body
+that cannot be read raises ResponseBodyError: the request was sent, so
+whether it took effect is unknown.
+
+Usage:
+from response_body import BodyDecoder
+decoder = BodyDecoder(headers.get("content-encoding", ""), 64 * 1024 * 1024)
+decoder.feed(chunk)
+body = decoder.finish()
+"""
+
+from __future__ import annotations
+
+import zlib
+from typing import Any, List, Optional
+
+
+DEFAULT_MAX_RESPONSE_BYTES = 64 * 1024 * 1024
+RESPONSE_READ_CHUNK = 64 * 1024
+
+
+class ResponseBodyError(OSError):
+    # The server answered but its body could not be read, so whether the call took effect is unknown.
+    # An OSError like any other transport failure: handlers that treat a RuntimeError as "the call was
+    # rejected" (and retry it with new arguments) must not catch it.
+    pass
+
+
+class ResponseTooLarge(ResponseBodyError):
+    pass
+
+
+class UnsupportedContentEncoding(ResponseBodyError):
+    pass
+
+
+class BodyDecoder:
+    # Incremental Content-Encoding decoder with a cap on the decoded size, so a runaway
+    # (or decompression-bomb) response is aborted after at most max_bytes + one chunk.
+    def __init__(self, content_encoding: str, max_bytes: int) -> None:
+        encoding = (content_encoding or "").strip().lower()
+        self.max_bytes = int(max_bytes)
+        self.encoding = encoding
+        self.wire_bytes = 0
+        self.size = 0
+        self._chunks: List[bytes] = []
+        if encoding in ("gzip", "x-gzip"):
+            self._zlib: Optional[Any] = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == "deflate":
+            self._zlib = zlib.decompressobj()
+        elif encoding in ("", "identity"):
+            self._zlib = None
+        else:
+            raise UnsupportedContentEncoding(f"unsupported content-encoding: {encoding}")
+
+    def _append(self, data: bytes) -> None:
+        if not data:
+            return
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise ResponseTooLarge(f"response body exceeds {self.max_bytes} bytes")
+        self._chunks.append(data)
+
+    def decode(self, chunk: bytes) -> bytes:
+        # Decoded bytes for one wire chunk, without buffering them (streamed bodies).
+        self.wire_bytes += len(chunk)
+        if self._zlib is None:
+            return chunk
+        limit = self.max_bytes - self.size + 1
+        try:
+            return self._zlib.decompress(chunk, limit)
+        except zlib.error:
+            if self.encoding != "deflate" or self.size or self.wire_bytes != len(chunk):
+                raise
+            # Some servers send raw deflate without the zlib header.
+            self._zlib = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self._zlib.decompress(chunk, limit)
+
+    def feed(self, chunk: bytes) -> None:
+        self._append(self.decode(chunk))
+
+    def flush(self) -> bytes:
+        return self._zlib.flush() if self._zlib is not None else b""
+
+    def finish(self) -> bytes:
+        self._append(self.flush())
+        return self._chunks[0] if len(self._chunks) == 1 else b"".join(self._chunks)
@@ -0,0 +1,207 @@
+"""Retry and hedging policy for MCP calls (stdlib only).
+
+A RetryPolicy says how often a call may be retried (full-jitter backoff),
+its per-attempt timeout, and whether a read may be hedged: after the
+endpoint's p95 latency a backup request is sent and the first answer wins,
+the loser being cut off through its AbortHandle. Read-only tools get such a
+policy by default; keyed mutating tools (create_order, create_escrow,
+submit_tx) are retried only when the server deduplicates on their
+idempotency key (MCP_RETRY_MUTATING=auto|on|off).
+
+Usage:
+from retry_policy import default_retry_policies, is_read_only_rpc
+policies = default_retry_policies()
+policy = policies.get("search_products")
+"""
+
+from __future__ import annotations
+
+import heapq
+import http.client
+import itertools
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from mcp_common import to_float, to_int
+
+
+class RequestAborted(ConnectionError):
+    pass
+
+
+class AbortHandle:
+    # Lets another thread cut off a request blocked on this thread's socket (the losing attempt of a
+    # hedged call). Requests opened inside HttpConnectionPool.abortable(handle) attach to it.
+    def __init__(self) -> None:
+        self.aborted = False
+        self._conn: Optional[http.client.HTTPConnection] = None
+        self._lock = threading.Lock()
+
+    def attach(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._conn = conn
+            aborted = self.aborted
+        if aborted:
+            raise RequestAborted("request aborted before it was sent")
+
+    def abort(self) -> None:
+        with self._lock:
+            self.aborted = True
+            conn = self._conn
+        sock = conn.sock if conn is not None else None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+READ_ONLY_CALLS = {"search_products", "list_addresses", "list_wallets", "get_order_proof", "tools/list", "ping"}
+# Mutating tools that carry a client-generated idempotency key; they are retried only when the
+# server advertises that it deduplicates on it (see mutating_retry_mode).
+KEYED_MUTATING_TOOLS = {"create_order", "create_escrow", "fund_escrow", "submit_tx"}
+RETRYABLE_HTTP_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+def is_read_only_rpc(body: Any) -> bool:
+    # True if every request in a (batch) JSON-RPC body is a READ_ONLY_CALLS method or tool.
+    requests = body if isinstance(body, list) else [body]
+    for req in requests:
+        if not isinstance(req, dict):
+            return False
+        method = str(req.get("method") or "")
+        params = req.get("params") if isinstance(req.get("params"), dict) else {}
+        if (str(params.get("name") or "") if method == "tools/call" else method) not in READ_ONLY_CALLS:
+            return False
+    return bool(requests)
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    if isinstance(exc, urllib.error.HTTPError):
+        return exc.code in RETRYABLE_HTTP_STATUSES
+    return isinstance(exc, (TimeoutError, ConnectionError, http.client.HTTPException))
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay_sec: float = 0.2,
+        max_delay_sec: float = 5.0,
+        timeout_sec: Optional[float] = None,
+        hedge: bool = False,
+        hedge_default_delay_sec: float = 1.0,
+        hedge_min_delay_sec: float = 0.05,
+    ) -> None:
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay_sec = float(base_delay_sec)
+        self.max_delay_sec = float(max_delay_sec)
+        self.timeout_sec = timeout_sec
+        self.hedge = hedge
+        self.hedge_default_delay_sec = float(hedge_default_delay_sec)
+        self.hedge_min_delay_sec = float(hedge_min_delay_sec)
+
+    def backoff(self, attempt: int) -> float:
+        # Full jitter: uniform in [0, min(cap, base * 2^(attempt-1))].
+        return random.uniform(0, min(self.max_delay_sec, self.base_delay_sec * (2 ** (attempt - 1))))
+
+
+def mutating_retry_mode() -> str:
+    # MCP_RETRY_MUTATING: "auto" (default) retries keyed mutating tools only if initialize advertised
+    # idempotency support, "on" always, "off" never.
+    mode = os.getenv("MCP_RETRY_MUTATING", "auto").strip().lower()
+    if mode in ("0", "off", "false", "no"):
+        return "off"
+    if mode in ("1", "on", "true", "yes"):
+        return "on"
+    return "auto"
+
+
+def server_supports_idempotency(init_result: Dict[str, Any]) -> bool:
+    capabilities = init_result.get("capabilities") if isinstance(init_result, dict) else None
+    experimental = capabilities.get("experimental") if isinstance(capabilities, dict) else None
+    return isinstance(experimental, dict) and bool(experimental.get("idempotency"))
+
+
+def mutating_retry_policies() -> Dict[str, RetryPolicy]:
+    mutating = RetryPolicy(to_int(os.getenv("MCP_RETRY_MAX_ATTEMPTS", "3"), 3))
+    return {name: mutating for name in KEYED_MUTATING_TOOLS}
+
+
+def default_retry_policies() -> Dict[str, RetryPolicy]:
+    max_attempts = to_int(os.getenv("MCP_RETRY_MAX_ATTEMPTS", "3"), 3)
+    hedge = os.getenv("MCP_HEDGE", "on").strip().lower() not in ("0", "off", "false", "no")
+    read_timeout = to_float(os.getenv("MCP_READ_TIMEOUT_SEC"), 15.0) or None
+    policies: Dict[str, RetryPolicy] = {}
+    read_only = RetryPolicy(max_attempts, timeout_sec=read_timeout, hedge=hedge)
+    for name in READ_ONLY_CALLS:
+        policies[name] = read_only
+    policies["batch:read_only"] = RetryPolicy(max_attempts, timeout_sec=read_timeout)
+    if mutating_retry_mode() == "on":
+        policies.update(mutating_retry_policies())
+    return policies
+
+
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+_hedge_executor_lock = threading.Lock()
+
+
+def get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            workers = to_int(os.getenv("MCP_HEDGE_WORKERS", "16"), 16)
+            _hedge_executor = ThreadPoolExecutor(max_workers=max(2, workers), thread_name_prefix="mcp-hedge")
+        return _hedge_executor
+
+
+class TimerQueue:
+    # One daemon thread that runs callbacks at their due time; cancel() turns a pending entry into a no-op.
+    def __init__(self) -> None:
+        self._heap: List[list] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def call_later(self, delay_sec: float, fn: Callable[[], None]) -> list:
+        entry = [time.monotonic() + delay_sec, next(self._seq), fn]
+        with self._cond:
+            heapq.heappush(self._heap, entry)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="mcp-timer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return entry
+
+    def cancel(self, entry: list) -> None:
+        entry[2] = None
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                fn = heapq.heappop(self._heap)[2]
+            if fn is not None:
+                try:
+                    fn()
+                except Exception as exc:  # noqa: BLE001
+                    print(f"[timer] callback failed: {exc}", file=sys.stderr)
+
+
+_hedge_timer: Optional[TimerQueue] = None
+
+
+def get_hedge_timer() -> TimerQueue:
+    global _hedge_timer
+    with _hedge_executor_lock:
+        if _hedge_timer is None:
+            _hedge_timer = TimerQueue()
+        return _hedge_timer
@@ -0,0 +1,188 @@
+"""Parallel search_products fan-out over pages and keyword variants (stdlib only).
+
+SearchFanout sends every (keyword, page) search through a small thread pool,
+page 1 of every keyword first, and streams de-duplicated Product records as
+pages arrive. A short page cancels the later pages of its keyword that have
+not started, a SearchStopRule ends the stream early (enough candidates under
+a price, or a deadline), and a RateLimiter token bucket spaces the requests.
+With a ProductCatalog, fresh pages are answered locally and stale ones are
+served while they refresh in the background.
+
+Usage:
+from search_fanout import RateLimiter, SearchFanout, SearchStopRule
+fanout = SearchFanout(mcp, ["phone case", "iphone case"], pages=3, rate_limiter=RateLimiter(5, burst=5))
+for product in fanout.stream():
+    print(product.item_id, product.comparable_price)
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Set, Tuple
+
+from mcp_common import first_string
+from product_catalog import ProductCatalog
+from products import Product, iter_product_records
+
+if TYPE_CHECKING:
+    from full_flow import McpClient
+
+
+class RateLimiter:
+    def __init__(self, rate_per_sec: float, burst: int = 1) -> None:
+        self.rate_per_sec = float(rate_per_sec)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_sec)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        # 0.0 when a token was taken, else the seconds until one is available.
+        if self.rate_per_sec <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate_per_sec
+
+    def available(self) -> float:
+        if self.rate_per_sec <= 0:
+            return float("inf")
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def acquire(self) -> None:
+        while True:
+            wait_sec = self.try_acquire()
+            if wait_sec <= 0:
+                return
+            time.sleep(wait_sec)
+
+
+class SearchStopRule:
+    def __init__(
+        self,
+        max_price: Optional[float] = None,
+        min_candidates: int = 0,
+        deadline_sec: Optional[float] = None,
+    ) -> None:
+        self.max_price = max_price
+        self.min_candidates = max(0, int(min_candidates))
+        self.deadline_sec = deadline_sec
+
+    def counts(self, product: Product) -> bool:
+        price = product.comparable_price
+        if price is None:
+            return False
+        return self.max_price is None or price <= self.max_price
+
+
+class SearchFanout:
+    def __init__(
+        self,
+        mcp: McpClient,
+        keywords: List[str],
+        pages: int = 1,
+        page_size: int = 10,
+        concurrency: int = 4,
+        rate_limiter: Optional[RateLimiter] = None,
+        stop_rule: Optional[SearchStopRule] = None,
+        catalog: Optional[ProductCatalog] = None,
+        serve_stale: bool = True,
+    ) -> None:
+        self.mcp = mcp
+        self.keywords = [k for k in dict.fromkeys(first_string(k) for k in keywords) if k]
+        self.pages = max(1, int(pages))
+        self.page_size = max(1, int(page_size))
+        self.concurrency = max(1, int(concurrency))
+        self.rate_limiter = rate_limiter or RateLimiter(0)
+        self.stop_rule = stop_rule or SearchStopRule()
+        self.errors: List[str] = []
+        self.catalog = catalog
+        self.serve_stale = serve_stale
+        self.requests_sent = 0
+        self.local_pages = 0
+        self.stop_reason = ""
+        self._lock = threading.Lock()
+
+    def _fetch_remote(self, keyword: str, page_no: int) -> List[Product]:
+        self.rate_limiter.acquire()
+        with self._lock:
+            self.requests_sent += 1
+        resp = self.mcp.call_tool("search_products", {"keyword": keyword, "page_no": page_no, "page_size": self.page_size})
+        products = list(iter_product_records(resp.get("data", resp)))
+        if self.catalog is not None:
+            self.catalog.ingest(keyword, page_no, self.page_size, products)
+        return products
+
+    def _fetch(self, keyword: str, page_no: int) -> List[Product]:
+        # Catalog first: a fresh page costs no request. A stale one is served while it refreshes in the
+        # background, unless serve_stale is off (results that feed create_order), then it is refetched.
+        if self.catalog is not None:
+            cached = self.catalog.lookup(keyword, page_no, self.page_size, allow_stale=self.serve_stale)
+            if cached is not None:
+                products, fresh = cached
+                if not fresh:
+                    self.catalog.refresh(keyword, page_no, self.page_size, lambda: self._fetch_remote(keyword, page_no))
+                with self._lock:
+                    self.local_pages += 1
+                return products
+        return self._fetch_remote(keyword, page_no)
+
+    def stream(self) -> Iterator[Product]:
+        started = time.monotonic()
+        rule = self.stop_rule
+        seen: Set[Tuple[str, str]] = set()
+        matched = 0
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="search")
+        pending: Dict[Future, Tuple[str, int]] = {}
+        try:
+            # Page 1 of every keyword goes first so variants are compared before deep pages.
+            for page_no in range(1, self.pages + 1):
+                for keyword in self.keywords:
+                    pending[executor.submit(self._fetch, keyword, page_no)] = (keyword, page_no)
+
+            while pending:
+                timeout = None
+                if rule.deadline_sec is not None:
+                    timeout = rule.deadline_sec - (time.monotonic() - started)
+                    if timeout <= 0:
+                        self.stop_reason = "deadline"
+                        return
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    keyword, page_no = pending.pop(future)
+                    try:
+                        products = future.result()
+                    except Exception as exc:  # noqa: BLE001
+                        self.errors.append(f"{keyword} page {page_no}: {exc}")
+                        continue
+                    if len(products) < self.page_size:
+                        # Short page: later pages of this keyword are empty, skip the ones not started yet.
+                        for other, (other_keyword, other_page) in list(pending.items()):
+                            if other_keyword == keyword and other_page > page_no and other.cancel():
+                                pending.pop(other)
+                    for product in products:
+                        key = product.dedupe_key
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                        yield product
+                        if rule.min_candidates and rule.counts(product):
+                            matched += 1
+                            if matched >= rule.min_candidates:
+                                self.stop_reason = "enough_candidates"
+                                return
+            self.stop_reason = "exhausted"
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
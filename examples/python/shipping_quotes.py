@@ -0,0 +1,244 @@
+"""Shipping quotes: estimate_shipping caching and landed-cost comparison (stdlib only).
+
+ShippingQuoteCache keeps estimate_shipping responses per (address, shop,
+item, sku, quantity) in memory and optionally on disk (MCP_QUOTE_CACHE_PATH)
+until a safety margin before the quote's own expiry, so a repeated run can
+go straight to create_order. compare_landed_costs quotes several candidate
+products in parallel and ranks them by the payment_quote total, dropping
+the ones that fail or answer after the deadline.
+
+Usage:
+from shipping_quotes import compare_landed_costs, get_default_quote_cache
+ranked = compare_landed_costs(mcp, products, shipping_address_id, 1, get_default_quote_cache())
+cheapest = ranked[0].product if ranked else None
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from disk_cache import JsonDiskCache
+from mcp_common import ToolError, first_string, parse_timestamp, to_float, to_int
+from products import Product, to_price_number
+from ttl_cache import TtlLruCache
+
+if TYPE_CHECKING:
+    from full_flow import McpClient
+
+
+def get_shipping_quote_id(payload: Dict[str, Any]) -> str:
+    data = payload.get("data") if isinstance(payload, dict) else {}
+    return first_string(payload.get("shipping_quote_id"), data.get("shipping_quote_id") if isinstance(data, dict) else None)
+
+
+def get_payment_quote(payload: Dict[str, Any]) -> Dict[str, Any]:
+    data = payload.get("data") if isinstance(payload, dict) else {}
+    for candidate in (payload.get("payment_quote") if isinstance(payload, dict) else None, data.get("payment_quote") if isinstance(data, dict) else None):
+        if isinstance(candidate, dict):
+            return candidate
+    return {}
+
+
+def get_quote_total(payload: Dict[str, Any]) -> Optional[float]:
+    quote = get_payment_quote(payload)
+    for field in ("total_amount", "total", "total_price", "pay_amount", "amount"):
+        total = to_price_number(quote.get(field))
+        if total is not None:
+            return total
+    return None
+
+
+def get_quote_expires_at(payload: Dict[str, Any]) -> Optional[float]:
+    data = payload.get("data") if isinstance(payload, dict) else None
+    scopes = [s for s in (get_payment_quote(payload), data, payload) if isinstance(s, dict)]
+    for scope in scopes:
+        for field in ("expires_at", "quote_expires_at", "valid_until"):
+            expires_at = parse_timestamp(scope.get(field)) if scope.get(field) is not None else None
+            if expires_at is not None:
+                return expires_at
+        for field in ("expires_in", "ttl_sec", "valid_for_sec"):
+            ttl = to_float(scope.get(field), None)
+            if ttl is not None:
+                return time.time() + ttl
+    return None
+
+
+class ShippingQuoteCache:
+    # Keyed on (address, shop, item, sku, quantity); entries expire a safety margin before the server quote does.
+    def __init__(
+        self,
+        cache: Optional[TtlLruCache] = None,
+        disk_path: str = "",
+        default_ttl_sec: float = 300.0,
+        safety_margin_sec: float = 30.0,
+    ) -> None:
+        self.cache = cache if cache is not None else TtlLruCache(max_entries=1024, ttl_sec=default_ttl_sec)
+        self.disk = JsonDiskCache(disk_path) if disk_path else None
+        self.default_ttl_sec = float(default_ttl_sec)
+        self.safety_margin_sec = float(safety_margin_sec)
+
+    @staticmethod
+    def key(args: Dict[str, Any]) -> str:
+        return "|".join(
+            str(args.get(field) or "") for field in ("shipping_address_id", "shop_id", "item_id", "sku_id", "quantity")
+        )
+
+    def get(self, args: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        key = self.key(args)
+        found, resp = self.cache.get(key)
+        if found:
+            return resp
+        if self.disk is None:
+            return None
+        resp, expires_at = self.disk.get_with_expiry(key)
+        if isinstance(resp, dict):
+            self.cache.set(key, resp, expires_at - time.time())
+            return resp
+        return None
+
+    def put(self, args: Dict[str, Any], resp: Dict[str, Any]) -> None:
+        if not get_shipping_quote_id(resp):
+            return
+        expires_at = (get_quote_expires_at(resp) or time.time() + self.default_ttl_sec) - self.safety_margin_sec
+        ttl = expires_at - time.time()
+        if ttl <= 0:
+            return
+        key = self.key(args)
+        self.cache.set(key, resp, ttl)
+        if self.disk is not None:
+            self.disk.put_many({key: (resp, expires_at)})
+
+    def invalidate(self, args: Dict[str, Any]) -> None:
+        key = self.key(args)
+        self.cache.pop(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def stats(self) -> Dict[str, int]:
+        return self.cache.stats()
+
+
+_default_quote_cache: Optional[ShippingQuoteCache] = None
+_default_quote_cache_lock = threading.Lock()
+
+
+def get_default_quote_cache() -> ShippingQuoteCache:
+    global _default_quote_cache
+    with _default_quote_cache_lock:
+        if _default_quote_cache is None:
+            _default_quote_cache = ShippingQuoteCache(
+                disk_path=os.getenv("MCP_QUOTE_CACHE_PATH", ""),
+                default_ttl_sec=float(to_int(os.getenv("MCP_QUOTE_CACHE_TTL_SEC", "300"), 300)),
+            )
+        return _default_quote_cache
+
+
+def estimate_shipping_cached(
+    mcp: "McpClient",
+    args: Dict[str, Any],
+    quote_cache: Optional[ShippingQuoteCache] = None,
+) -> Tuple[Dict[str, Any], bool]:
+    if quote_cache is not None:
+        cached = quote_cache.get(args)
+        if cached is not None:
+            return cached, True
+    resp = mcp.call_tool("estimate_shipping", args)
+    if quote_cache is not None:
+        quote_cache.put(args, resp)
+    return resp, False
+
+
+def is_quote_rejection(exc: BaseException) -> bool:
+    # create_order answered and refused the shipping quote itself (expired, used, unknown). Any other
+    # failure, and above all a timeout or transport error, may mean the order was placed anyway.
+    return isinstance(exc, ToolError) and "quote" in str(exc).lower()
+
+
+def create_order_with_quote(
+    mcp: "McpClient",
+    order_args: Dict[str, Any],
+    estimate_args: Dict[str, Any],
+    quote_cache: Optional[ShippingQuoteCache] = None,
+    quote_from_cache: bool = False,
+) -> Tuple[Dict[str, Any], str]:
+    # Returns (create_order response, the shipping_quote_id it was placed with). A quote taken from the
+    # cache may have been consumed or revoked server-side; if create_order rejects it, quote again once.
+    # Both attempts carry the same idempotency key, so a server that dedupes never books two orders.
+    key = first_string(order_args.get("idempotency_key")) or uuid.uuid4().hex
+    try:
+        return mcp.call_tool("create_order", order_args, idempotency_key=key), order_args["shipping_quote_id"]
+    except ToolError as exc:
+        if not (quote_from_cache and quote_cache is not None and is_quote_rejection(exc)):
+            raise
+    quote_cache.invalidate(estimate_args)
+    estimate_resp, _ = estimate_shipping_cached(mcp, estimate_args, quote_cache)
+    shipping_quote_id = get_shipping_quote_id(estimate_resp)
+    if not shipping_quote_id:
+        raise RuntimeError("estimate_shipping did not return shipping_quote_id")
+    print("shipping_quote_id (re-quoted):", shipping_quote_id)
+    resp = mcp.call_tool("create_order", dict(order_args, shipping_quote_id=shipping_quote_id), idempotency_key=key)
+    return resp, shipping_quote_id
+
+
+class LandedCost:
+    __slots__ = ("product", "args", "response", "total", "error")
+
+    def __init__(self, product: Product, args: Dict[str, Any]) -> None:
+        self.product = product
+        self.args = args
+        self.response: Dict[str, Any] = {}
+        self.total: Optional[float] = None
+        self.error = ""
+
+
+def compare_landed_costs(
+    mcp: "McpClient",
+    products: List[Product],
+    shipping_address_id: int,
+    quantity: int,
+    quote_cache: Optional[ShippingQuoteCache] = None,
+    concurrency: int = 4,
+    deadline_sec: float = 10.0,
+) -> List[LandedCost]:
+    # Quotes every product concurrently and returns the ones that answered in time, cheapest total first.
+    entries = [
+        LandedCost(
+            product,
+            {
+                "shipping_address_id": shipping_address_id,
+                "shop_id": product.shop_id,
+                "item_id": product.item_id,
+                "sku_id": product.sku_id or None,
+                "quantity": quantity,
+            },
+        )
+        for product in products
+        if product.item_id and product.shop_id
+    ]
+    if not entries:
+        return []
+
+    def quote(entry: LandedCost) -> LandedCost:
+        try:
+            entry.response, _ = estimate_shipping_cached(mcp, entry.args, quote_cache)
+            entry.total = get_quote_total(entry.response)
+        except Exception as exc:  # noqa: BLE001
+            entry.error = str(exc)
+        return entry
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(int(concurrency), len(entries))), thread_name_prefix="landed")
+    try:
+        futures = [executor.submit(quote, entry) for entry in entries]
+        done, _ = wait(futures, timeout=max(0.0, float(deadline_sec)))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    answered = [f.result() for f in futures if f in done]
+    return sorted(
+        (e for e in answered if not e.error and get_shipping_quote_id(e.response)),
+        key=lambda e: float("inf") if e.total is None else e.total,
+    )
@@ -0,0 +1,169 @@
+"""shop_id lookups for search hits that do not carry one (stdlib only).
+
+create_order needs the seller's shop_id; when a search_products item lacks
+it, /api/products/detail is asked. ShopIdResolver puts an in-memory TTL +
+LRU cache (shared per process, MCP_SHOP_CACHE_SIZE / MCP_SHOP_CACHE_TTL_SEC)
+and an optional JSON disk tier in front of that endpoint. Concurrent lookups
+for one item share a single request, failed lookups are not cached, and
+prefetch() resolves a whole candidate list in parallel.
+
+Usage:
+from shop_resolver import ShopIdResolver
+resolver = ShopIdResolver(api_base_url, mcp, disk_path="~/.taopochta/shop_ids.json")
+shop_id = resolver.resolve(item_id, "taobao", "en")
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Optional, Tuple
+
+from disk_cache import JsonDiskCache
+from http_pool import HttpConnectionPool, request_json
+from mcp_common import first_string, to_int, trim_slash
+from ttl_cache import SingleFlight, TtlLruCache
+
+if TYPE_CHECKING:
+    from full_flow import McpClient
+
+
+def product_detail_url(base_url: str, item_id: str, item_resource: str, language: str) -> str:
+    query = urllib.parse.urlencode(
+        {
+            "item_resource": item_resource,
+            "item_id": item_id,
+            "language": language,
+        }
+    )
+    return f"{trim_slash(base_url)}/api/products/detail?{query}"
+
+
+def extract_detail_shop_id(data: Dict[str, Any]) -> str:
+    return first_string(
+        data.get("shop_id"),
+        data.get("shopId"),
+        data.get("data", {}).get("shop_id") if isinstance(data.get("data"), dict) else None,
+        data.get("data", {}).get("shopId") if isinstance(data.get("data"), dict) else None,
+        data.get("data", {}).get("data", {}).get("shop_id")
+        if isinstance(data.get("data"), dict) and isinstance(data.get("data", {}).get("data"), dict)
+        else None,
+        data.get("data", {}).get("data", {}).get("shopId")
+        if isinstance(data.get("data"), dict) and isinstance(data.get("data", {}).get("data"), dict)
+        else None,
+    )
+
+
+def resolve_shop_id_by_detail(
+    base_url: str,
+    token: str,
+    item_id: str,
+    item_resource: str,
+    language: str,
+    pool: Optional[HttpConnectionPool] = None,
+) -> str:
+    url = product_detail_url(base_url, item_id, item_resource, language)
+    data = request_json(url, "GET", None, {"authorization": f"Bearer {token}"}, pool)
+    return extract_detail_shop_id(data)
+
+
+class ShopIdResolver:
+    # Memory LRU+TTL in front of an optional JSON disk tier in front of /api/products/detail.
+    def __init__(
+        self,
+        api_base_url: str,
+        mcp: "McpClient",
+        cache: Optional[TtlLruCache] = None,
+        disk_path: str = "",
+        disk_ttl_sec: float = 7 * 86400.0,
+        prefetch_concurrency: int = 8,
+    ) -> None:
+        self.api_base_url = api_base_url
+        self.mcp = mcp
+        self.cache = cache if cache is not None else get_default_shop_cache()
+        self.disk = JsonDiskCache(disk_path) if disk_path else None
+        self.disk_ttl_sec = float(disk_ttl_sec)
+        self.prefetch_concurrency = max(1, int(prefetch_concurrency))
+        self._flight = SingleFlight()
+        self._stats_lock = threading.Lock()
+        self._stats = {"disk_hits": 0, "remote_fetches": 0}
+
+    def _disk_put(self, resolved: Dict[str, str]) -> None:
+        if self.disk is not None:
+            expires_at = time.time() + self.disk_ttl_sec
+            self.disk.put_many({k: (v, expires_at) for k, v in resolved.items()})
+
+    def _lookup(self, item_id: str, item_resource: str, language: str, persist: bool) -> Tuple[str, str]:
+        key = (item_resource, item_id)
+        found, shop_id = self.cache.get(key)
+        if found:
+            return shop_id, ""
+        disk_key = f"{item_resource}:{item_id}"
+        shop_id = first_string(self.disk.get(disk_key)) if self.disk is not None else ""
+        if shop_id:
+            with self._stats_lock:
+                self._stats["disk_hits"] += 1
+            self.cache.set(key, shop_id)
+            return shop_id, ""
+
+        def fetch() -> str:
+            with self._stats_lock:
+                self._stats["remote_fetches"] += 1
+            return resolve_shop_id_by_detail(self.api_base_url, self.mcp.token, item_id, item_resource, language, self.mcp.pool)
+
+        shop_id = self._flight.do(key, fetch)
+        if shop_id:
+            self.cache.set(key, shop_id)
+            if persist:
+                self._disk_put({disk_key: shop_id})
+            return shop_id, disk_key
+        return "", ""
+
+    def resolve(self, item_id: str, item_resource: str, language: str) -> str:
+        return self._lookup(item_id, item_resource, language, persist=True)[0]
+
+    def prefetch(self, item_ids: Iterable[str], item_resource: str, language: str) -> Dict[str, str]:
+        unique = [i for i in dict.fromkeys(first_string(i) for i in item_ids) if i]
+        out: Dict[str, str] = {}
+        fresh: Dict[str, str] = {}
+        with ThreadPoolExecutor(max_workers=min(self.prefetch_concurrency, max(1, len(unique)))) as executor:
+            futures = {executor.submit(self._lookup, i, item_resource, language, False): i for i in unique}
+            for future in as_completed(futures):
+                item_id = futures[future]
+                try:
+                    shop_id, disk_key = future.result()
+                except Exception as exc:  # noqa: BLE001
+                    print(f"[shop_id] prefetch {item_id} failed: {exc}", file=sys.stderr)
+                    continue
+                if shop_id:
+                    out[item_id] = shop_id
+                if disk_key:
+                    fresh[disk_key] = shop_id
+        self._disk_put(fresh)
+        return out
+
+    def stats(self) -> Dict[str, int]:
+        out = self.cache.stats()
+        with self._stats_lock:
+            out.update(self._stats)
+        out["coalesced"] = self._flight.coalesced
+        return out
+
+
+_default_shop_cache: Optional[TtlLruCache] = None
+_default_shop_cache_lock = threading.Lock()
+
+
+def get_default_shop_cache() -> TtlLruCache:
+    global _default_shop_cache
+    with _default_shop_cache_lock:
+        if _default_shop_cache is None:
+            _default_shop_cache = TtlLruCache(
+                max_entries=to_int(os.getenv("MCP_SHOP_CACHE_SIZE", "4096"), 4096),
+                ttl_sec=float(to_int(os.getenv("MCP_SHOP_CACHE_TTL_SEC", "86400"), 86400)),
+            )
+        return _default_shop_cache
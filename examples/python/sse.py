@@ -0,0 +1,74 @@
+"""Incremental text/event-stream parser for streamable-HTTP MCP responses (stdlib only).
+
+Raw bytes go in as they arrive and completed events come out, so progress
+notifications can be shown before the final JSON-RPC result. The field
+rules follow the WHATWG EventSource spec; the parser keeps the last event
+id (for resuming with Last-Event-ID) and the server's retry hint, and
+bounds a single event's size.
+
+Usage:
+from sse import SseParser
+parser = SseParser()
+for event in parser.feed(chunk):
+    print(event.event, event.id, event.data)
+"""
+
+from __future__ import annotations
+
+from typing import List, Optional
+
+from response_body import DEFAULT_MAX_RESPONSE_BYTES, ResponseTooLarge
+
+
+class SseEvent:
+    __slots__ = ("event", "data", "id")
+
+    def __init__(self, event: str, data: str, event_id: str) -> None:
+        self.event = event
+        self.data = data
+        self.id = event_id
+
+
+class SseParser:
+    # Incremental text/event-stream parser: feed raw bytes, get back the events completed so far.
+    # Field rules follow the WHATWG EventSource spec (data lines joined with \n, comments skipped).
+    def __init__(self, max_event_bytes: int = DEFAULT_MAX_RESPONSE_BYTES, last_event_id: str = "") -> None:
+        self.max_event_bytes = int(max_event_bytes)
+        self.last_event_id = last_event_id
+        self.retry_ms: Optional[int] = None
+        self._buf = b""
+        self._event = ""
+        self._data: List[str] = []
+        self._size = 0
+
+    def feed(self, chunk: bytes) -> List[SseEvent]:
+        events: List[SseEvent] = []
+        lines = (self._buf + chunk).splitlines(keepends=True)
+        # An unterminated last line, or one ending in a \r that may be half of \r\n, waits for more data.
+        self._buf = lines.pop() if lines and not lines[-1].endswith(b"\n") else b""
+        if len(self._buf) + self._size > self.max_event_bytes:
+            raise ResponseTooLarge(f"SSE event exceeds {self.max_event_bytes} bytes")
+        for raw in lines:
+            line = raw.rstrip(b"\r\n").decode("utf-8", errors="replace")
+            if not line:
+                if self._data:
+                    events.append(SseEvent(self._event or "message", "\n".join(self._data), self.last_event_id))
+                self._event, self._data, self._size = "", [], 0
+                continue
+            if line.startswith(":"):
+                continue
+            name, _, value = line.partition(":")
+            if value.startswith(" "):
+                value = value[1:]
+            if name == "data":
+                self._data.append(value)
+                self._size += len(value)
+                if self._size > self.max_event_bytes:
+                    raise ResponseTooLarge(f"SSE event exceeds {self.max_event_bytes} bytes")
+            elif name == "event":
+                self._event = value
+            elif name == "id" and "\0" not in value:
+                self.last_event_id = value
+            elif name == "retry" and value.isdigit():
+                self.retry_ms = int(value)
+        return events
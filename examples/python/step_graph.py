@@ -0,0 +1,238 @@
+"""Dependency graph runner for flow steps (stdlib only).
+
+Each FlowStep names the inputs it needs and the outputs it provides; a
+StepGraph starts every step as soon as its inputs are ready, so independent
+steps overlap on a small thread pool. While steps run, StepOutput stands in
+for sys.stdout so each step's prints come out in one block when it ends.
+The summary reports the critical path and the time the overlap saved.
+
+Usage:
+from step_graph import StepGraph
+graph = StepGraph(max_workers=4)
+graph.add("login", login_fn, provides=["session"])
+graph.add("search", search_fn, needs=["session"], provides=["products"])
+values = graph.run()
+print(graph.report()["critical_path"])
+"""
+
+from __future__ import annotations
+
+import io
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
+
+
+class StepOutput(io.TextIOBase):
+    # sys.stdout stand-in while steps run concurrently: a step thread writes into its own buffer,
+    # printed in one piece when the step finishes; every other thread writes straight through.
+    def __init__(self, target: Any) -> None:
+        self.target = target
+        self._local = threading.local()
+
+    def writable(self) -> bool:
+        return True
+
+    def capture(self) -> None:
+        self._local.buffer = io.StringIO()
+
+    def release(self) -> str:
+        buffer, self._local.buffer = getattr(self._local, "buffer", None), None
+        return buffer.getvalue() if buffer is not None else ""
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self._local, "buffer", None)
+        return (buffer if buffer is not None else self.target).write(text)
+
+    def flush(self) -> None:
+        if getattr(self._local, "buffer", None) is None:
+            self.target.flush()
+
+
+class FlowStep:
+    __slots__ = ("name", "fn", "needs", "provides", "status", "error", "started", "finished", "output")
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Dict[str, Any]], Dict[str, Any]],
+        needs: Sequence[str],
+        provides: Sequence[str],
+    ) -> None:
+        self.name = name
+        self.fn = fn
+        self.needs = tuple(needs)
+        self.provides = tuple(provides)
+        self.status = "pending"
+        self.error = ""
+        self.started = 0.0
+        self.finished = 0.0
+        self.output = ""
+
+
+class StepGraph:
+    # Declarative step DAG: each step names the values it needs and the values it provides.
+    # Steps whose inputs are all available run concurrently; when a step fails, every step
+    # depending on it (directly or not) is cancelled, the running ones finish, and run()
+    # re-raises the first failure. max_workers=1 runs the same graph strictly in sequence.
+    # With more workers, what a step prints is held back and printed whole when it finishes.
+    def __init__(self, max_workers: int = 8) -> None:
+        self.max_workers = max(1, int(max_workers))
+        self.steps: Dict[str, FlowStep] = {}
+        self.values: Dict[str, Any] = {}
+        self._producer: Dict[str, str] = {}
+        self._output: Optional[StepOutput] = None
+        self._started = 0.0
+        self._finished = 0.0
+
+    def add(
+        self,
+        name: str,
+        fn: Callable[[Dict[str, Any]], Dict[str, Any]],
+        needs: Sequence[str] = (),
+        provides: Sequence[str] = (),
+    ) -> None:
+        if name in self.steps:
+            raise RuntimeError(f"step {name} added twice")
+        for value in provides:
+            if value in self._producer:
+                raise RuntimeError(f"{value} is provided by both {self._producer[value]} and {name}")
+            self._producer[value] = name
+        self.steps[name] = FlowStep(name, fn, needs, provides)
+
+    def _deps(self) -> Dict[str, Set[str]]:
+        deps: Dict[str, Set[str]] = {}
+        for step in self.steps.values():
+            missing = [v for v in step.needs if v not in self._producer]
+            if missing:
+                raise RuntimeError(f"step {step.name} needs {', '.join(missing)}, which no step provides")
+            deps[step.name] = {self._producer[v] for v in step.needs}
+        # Kahn's algorithm, only to reject cycles before anything runs.
+        indegree = {name: len(d) for name, d in deps.items()}
+        ready = [name for name, n in indegree.items() if n == 0]
+        seen = 0
+        while ready:
+            done = ready.pop()
+            seen += 1
+            for name, d in deps.items():
+                if done in d:
+                    indegree[name] -= 1
+                    if indegree[name] == 0:
+                        ready.append(name)
+        if seen != len(deps):
+            raise RuntimeError("step graph has a cycle")
+        return deps
+
+    def _run_step(self, step: FlowStep, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        if self._output is not None:
+            self._output.capture()
+        step.started = time.perf_counter()
+        try:
+            return step.fn(inputs) or {}
+        finally:
+            step.finished = time.perf_counter()
+            if self._output is not None:
+                step.output = self._output.release()
+
+    def _emit(self, step: FlowStep) -> None:
+        if self._output is not None and step.output:
+            self._output.target.write(step.output)
+            self._output.target.flush()
+
+    def run(self) -> Dict[str, Any]:
+        if self.max_workers == 1 or isinstance(sys.stdout, StepOutput):
+            return self._run()
+        self._output = StepOutput(sys.stdout)
+        sys.stdout = self._output
+        try:
+            return self._run()
+        finally:
+            sys.stdout = self._output.target
+            self._output = None
+
+    def _run(self) -> Dict[str, Any]:
+        deps = self._deps()
+        dependents: Dict[str, List[str]] = {name: [] for name in deps}
+        for name, d in deps.items():
+            for dep in d:
+                dependents[dep].append(name)
+        pending = list(self.steps)
+        running: Dict[Future, FlowStep] = {}
+        first_error: Optional[BaseException] = None
+        self._started = time.perf_counter()
+
+        def cancel_dependents(name: str) -> None:
+            for child in dependents[name]:
+                step = self.steps[child]
+                if step.status == "pending":
+                    step.status = "cancelled"
+                    step.error = f"{name} failed"
+                    pending.remove(child)
+                    cancel_dependents(child)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="step") as executor:
+            while pending or running:
+                for name in [n for n in pending if all(self.steps[d].status == "done" for d in deps[n])]:
+                    step = self.steps[name]
+                    step.status = "running"
+                    pending.remove(name)
+                    inputs = {v: self.values[v] for v in step.needs}
+                    running[executor.submit(self._run_step, step, inputs)] = step
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step = running.pop(future)
+                    self._emit(step)
+                    exc = future.exception()
+                    if exc is None:
+                        outputs = future.result()
+                        missing = [v for v in step.provides if v not in outputs]
+                        if missing:
+                            exc = RuntimeError(f"step {step.name} did not provide {', '.join(missing)}")
+                    if exc is not None:
+                        step.status = "failed"
+                        step.error = str(exc)
+                        first_error = first_error or exc
+                        cancel_dependents(step.name)
+                        continue
+                    step.status = "done"
+                    self.values.update({v: outputs[v] for v in step.provides})
+        self._finished = time.perf_counter()
+        if first_error is not None:
+            raise first_error
+        return self.values
+
+    def report(self) -> Dict[str, Any]:
+        # Wall time vs. the sum of step times (what a strictly sequential run would take),
+        # and the critical path: the chain of dependencies that ended last.
+        ran = [s for s in self.steps.values() if s.finished]
+        wall = (self._finished or time.perf_counter()) - self._started if self._started else 0.0
+        total = sum(s.finished - s.started for s in ran)
+        path: List[FlowStep] = []
+        step = max(ran, key=lambda s: s.finished) if ran else None
+        while step is not None:
+            path.append(step)
+            parents = [self.steps[self._producer[v]] for v in step.needs]
+            step = max((p for p in parents if p.finished), key=lambda p: p.finished, default=None)
+        path.reverse()
+        ms = lambda sec: round(sec * 1000, 2)
+        return {
+            "workers": self.max_workers,
+            "wall_ms": ms(wall),
+            "sum_of_steps_ms": ms(total),
+            "overlap_saved_ms": ms(max(0.0, total - wall)),
+            "critical_path": [s.name for s in path],
+            "critical_path_ms": ms(sum(s.finished - s.started for s in path)),
+            "steps": {
+                s.name: {
+                    "status": s.status,
+                    "start_ms": ms(s.started - self._started) if s.started else None,
+                    "duration_ms": ms(s.finished - s.started) if s.finished else None,
+                    **({"error": s.error} if s.error else {}),
+                }
+                for s in self.steps.values()
+            },
+        }
@@ -0,0 +1,695 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Taopochta MCP server (stdlib only).
+
+Implements the surface described in openapi.yaml closely enough to run the
+Python examples and benchmarks without touching taopochta.ru:
+- POST /api/mcp and /api/mcp/rpc: JSON-RPC 2.0 (single, batch, notifications)
+  with initialize, ping, tools/list and tools/call for every documented tool
+- POST /api/mcp/bootstrap/email/request and /api/mcp/bootstrap/email/exchange
+- GET  /api/mcp with Last-Event-ID: replay of a dropped SSE stream (--sse only)
+- GET  /api/products/detail
+- GET  /__stats (request counters, stub only)
+
+Tool arguments are checked against the openapi.yaml *Args schemas and
+rejected with an isError tool result, like the real server does.
+
+Knobs (flags or env):
+- --latency-ms / STUB_LATENCY_MS, --jitter-ms / STUB_JITTER_MS: delay per HTTP request
+- --items / STUB_SEARCH_ITEMS: items per search page (default: requested page_size)
+- --pad-bytes / STUB_PAD_BYTES: extra description bytes per search item
+- --rpc-error-rate / STUB_RPC_ERROR_RATE: share of tools/call answered with a JSON-RPC error
+- --http-error-rate / STUB_HTTP_ERROR_RATE: share of requests answered with HTTP 503
+- --no-gzip / STUB_GZIP=off: never gzip (by default bodies >= 1 KiB are gzipped when accepted)
+- --sse / STUB_SSE: answer escrow/proof tools/call with a text/event-stream (streamable HTTP)
+  when the client accepts it, with --sse-steps progress notifications --sse-step-ms apart
+- --sse-drop-rate / STUB_SSE_DROP_RATE: share of SSE streams cut before the response event
+- --escrow-timeout-sec / STUB_ESCROW_TIMEOUT_SEC: funded escrows get timeout_at = fund time + this;
+  resolve_timeout before then is rejected
+- --dispute-window-sec / STUB_DISPUTE_WINDOW_SEC: open_dispute sets dispute_deadline_at = now + this;
+  execute_dispute before then is rejected
+- --user-rate-per-sec / STUB_USER_RATE_PER_SEC: per-user (JWT sub) request budget; excess requests
+  get HTTP 429. Expired JWTs are always rejected with 401, and bootstrap token mbt_<digits>
+  is exchanged for a token of user <digits>, so several accounts can be simulated.
+- --idempotency / STUB_IDEMPOTENCY: stub-only extension, off by default like the real server:
+  replay the first response for a repeated create_order/create_escrow/submit_tx
+  idempotency_key and advertise it as capabilities.experimental.idempotency
+
+Usage:
+python stub_server.py --port 18080 --latency-ms 20
+MCP_BASE_URL=http://127.0.0.1:18080/api/mcp MCP_TOKEN=stub MCP_BUYER_WALLET=0xabc python full_flow.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import gzip
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from mcp_common import to_float, to_int
+from token_store import decode_jwt_claims_unsafe
+from tool_schema import validate_json_schema
+
+PROTOCOL_VERSION = "2025-03-26"
+STUB_USER_ID = 42
+GZIP_MIN_BYTES = 1024
+# Tools answered over SSE (with progress notifications) when --sse is on.
+STREAMED_TOOLS = {"create_escrow", "fund_escrow", "confirm_receipt", "get_order_proof"}
+MAX_STORED_STREAMS = 1000
+
+
+def _obj(required: List[str], **properties: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": "object", "required": required, "properties": properties, "additionalProperties": True}
+
+
+_STR = {"type": "string"}
+_INT = {"type": "integer"}
+_QTY = {"type": "integer", "minimum": 1}
+
+# Mirrors components/schemas/*Args in openapi.yaml.
+TOOL_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "create_user": _obj(["user_id", "user_name"], user_id=_INT, user_name=_STR),
+    "list_addresses": _obj([]),
+    "create_address": _obj(
+        ["country_code", "country_name", "state", "city", "street_line1", "recipient_name", "recipient_phone"],
+        country_code=_STR,
+        country_name=_STR,
+        state=_STR,
+        city=_STR,
+        street_line1=_STR,
+        recipient_name=_STR,
+        recipient_phone=_STR,
+        is_default={"type": "boolean"},
+    ),
+    "set_buyer_wallet": _obj(["address", "chain_id"], address=_STR, chain_id=_INT, is_primary={"type": "boolean"}),
+    "list_wallets": _obj([], chain_id=_INT),
+    "search_products": _obj(
+        ["keyword"], keyword=_STR, page_no={"type": "integer", "minimum": 1}, page_size={"type": "integer", "minimum": 1}
+    ),
+    "estimate_shipping": _obj(
+        ["shipping_address_id", "shop_id", "item_id", "quantity"],
+        shipping_address_id=_INT,
+        shop_id=_STR,
+        item_id=_STR,
+        sku_id=_STR,
+        quantity=_QTY,
+    ),
+    "create_order": _obj(
+        ["shipping_address_id", "shop_id", "item_id", "quantity", "shipping_quote_id", "pay_method"],
+        shipping_address_id=_INT,
+        shop_id=_STR,
+        item_id=_STR,
+        sku_id=_STR,
+        quantity=_QTY,
+        shipping_quote_id=_STR,
+        pay_method=_STR,
+    ),
+    "create_escrow": _obj(["order_no", "token_symbol"], order_no=_STR, token_symbol=_STR, buyer_wallet=_STR),
+    "fund_escrow": _obj(["order_no", "token_symbol"], order_no=_STR, token_symbol=_STR),
+    "confirm_receipt": _obj(["order_no"], order_no=_STR),
+    "open_dispute": _obj([], order_no=_STR, escrow_id=_STR, reason=_STR),
+    "vote_dispute": _obj([], order_no=_STR, escrow_id=_STR, decision=_STR),
+    "execute_dispute": _obj([], order_no=_STR, escrow_id=_STR),
+    "resolve_timeout": _obj([], order_no=_STR, escrow_id=_STR),
+    "submit_tx": _obj(
+        ["order_no", "action", "tx_hash"],
+        order_no=_STR,
+        action={"type": "string", "enum": ["create", "fund", "confirm", "dispute", "release", "refund"]},
+        tx_hash={"type": "string", "pattern": "^0x[a-fA-F0-9]{64}$"},
+    ),
+    "get_order_proof": _obj(["order_no"], order_no=_STR),
+}
+
+ESCROW_STATE_AFTER = {"create_escrow": "created", "fund_escrow": "funded", "confirm_receipt": "released"}
+DEADLINE_TOOLS = {"open_dispute", "vote_dispute", "execute_dispute", "resolve_timeout"}
+
+
+class StubConfig:
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        items: int = 0,
+        pad_bytes: int = 0,
+        rpc_error_rate: float = 0.0,
+        http_error_rate: float = 0.0,
+        require_auth: bool = True,
+        gzip: bool = True,
+        sse: bool = False,
+        sse_steps: int = 3,
+        sse_step_ms: float = 50.0,
+        sse_drop_rate: float = 0.0,
+        escrow_timeout_sec: float = 3600.0,
+        dispute_window_sec: float = 3600.0,
+        user_rate_per_sec: float = 0.0,
+        idempotency: bool = False,
+    ) -> None:
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.items = items
+        self.pad_bytes = pad_bytes
+        self.rpc_error_rate = rpc_error_rate
+        self.http_error_rate = http_error_rate
+        self.require_auth = require_auth
+        self.gzip = gzip
+        self.sse = sse
+        self.sse_steps = sse_steps
+        self.sse_step_ms = sse_step_ms
+        self.sse_drop_rate = sse_drop_rate
+        self.escrow_timeout_sec = escrow_timeout_sec
+        self.dispute_window_sec = dispute_window_sec
+        self.user_rate_per_sec = user_rate_per_sec
+        self.idempotency = idempotency
+
+    @classmethod
+    def from_env(cls) -> "StubConfig":
+        return cls(
+            latency_ms=to_float(os.getenv("STUB_LATENCY_MS"), 0.0),
+            jitter_ms=to_float(os.getenv("STUB_JITTER_MS"), 0.0),
+            items=to_int(os.getenv("STUB_SEARCH_ITEMS", "0"), 0),
+            pad_bytes=to_int(os.getenv("STUB_PAD_BYTES", "0"), 0),
+            rpc_error_rate=to_float(os.getenv("STUB_RPC_ERROR_RATE"), 0.0),
+            http_error_rate=to_float(os.getenv("STUB_HTTP_ERROR_RATE"), 0.0),
+            gzip=os.getenv("STUB_GZIP", "on").strip().lower() not in ("0", "off", "false", "no"),
+            sse=os.getenv("STUB_SSE", "off").strip().lower() in ("1", "on", "true", "yes"),
+            sse_steps=to_int(os.getenv("STUB_SSE_STEPS", "3"), 3),
+            sse_step_ms=to_float(os.getenv("STUB_SSE_STEP_MS"), 50.0) or 0.0,
+            sse_drop_rate=to_float(os.getenv("STUB_SSE_DROP_RATE"), 0.0) or 0.0,
+            escrow_timeout_sec=to_float(os.getenv("STUB_ESCROW_TIMEOUT_SEC"), 3600.0) or 0.0,
+            dispute_window_sec=to_float(os.getenv("STUB_DISPUTE_WINDOW_SEC"), 3600.0) or 0.0,
+            user_rate_per_sec=to_float(os.getenv("STUB_USER_RATE_PER_SEC"), 0.0) or 0.0,
+            idempotency=os.getenv("STUB_IDEMPOTENCY", "off").strip().lower() in ("1", "on", "true", "yes"),
+        )
+
+
+def make_access_token(sub: int, ttl_sec: int) -> str:
+    def part(obj: Dict[str, Any]) -> str:
+        return base64.urlsafe_b64encode(json.dumps(obj).encode("utf-8")).decode("ascii").rstrip("=")
+
+    return f"{part({'alg': 'none', 'typ': 'JWT'})}.{part({'sub': sub, 'exp': int(time.time()) + ttl_sec})}.stub"
+
+
+class StubBackend:
+    # In-memory state behind the tools: addresses, orders and escrow states.
+    def __init__(self, config: StubConfig) -> None:
+        self.config = config
+        self.rng = random.Random()
+        self.lock = threading.Lock()
+        self.addresses: List[Dict[str, Any]] = []
+        self.orders: Dict[str, Dict[str, Any]] = {}
+        self.idempotent: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.counters: Dict[str, int] = {}
+        self.sessions: Set[str] = set()
+        # sub -> (tokens, updated) for the per-user request budget.
+        self.user_buckets: Dict[str, Tuple[float, float]] = {}
+        # stream id -> SSE events (id, data) sent so far, for Last-Event-ID replay.
+        self.streams: "OrderedDict[str, List[Tuple[str, str]]]" = OrderedDict()
+
+    def new_stream(self) -> str:
+        stream_id = uuid.uuid4().hex[:16]
+        with self.lock:
+            self.streams[stream_id] = []
+            while len(self.streams) > MAX_STORED_STREAMS:
+                self.streams.popitem(last=False)
+        return stream_id
+
+    def record_event(self, stream_id: str, data: str) -> str:
+        with self.lock:
+            events = self.streams.setdefault(stream_id, [])
+            event_id = f"{stream_id}-{len(events) + 1}"
+            events.append((event_id, data))
+        return event_id
+
+    def replay(self, last_event_id: str) -> Optional[List[Tuple[str, str]]]:
+        stream_id, _, seq = last_event_id.rpartition("-")
+        with self.lock:
+            events = self.streams.get(stream_id)
+            if events is None or not seq.isdigit():
+                return None
+            return list(events[int(seq):])
+
+    def count(self, key: str) -> None:
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def allow_user(self, sub: str) -> bool:
+        rate = self.config.user_rate_per_sec
+        if rate <= 0:
+            return True
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.user_buckets.get(sub, (rate, now))
+            tokens = min(rate, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            self.user_buckets[sub] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"counters": dict(self.counters), "orders": len(self.orders), "addresses": len(self.addresses)}
+
+    def search(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        page_size = self.config.items or to_int(args.get("page_size"), 20)
+        pad = "x" * self.config.pad_bytes
+        items = []
+        for i in range(page_size):
+            price = round(self.rng.uniform(5, 500), 2)
+            item = {
+                "item_id": str(self.rng.randint(10**11, 10**12 - 1)),
+                "title": f"{args['keyword']} #{i}",
+                "price": f"{price:.2f}",
+                "coupon_price": f"{price * 0.9:.2f}" if i % 3 == 0 else None,
+                "inventory": self.rng.randint(0, 500),
+                "pic_url": "https://img.example/stub.jpg",
+            }
+            # Every fifth item leaves shop_id out, so clients exercise the product-detail lookup.
+            if i % 5:
+                item["shop_id"] = str(self.rng.randint(10**7, 10**8 - 1))
+            if pad:
+                item["desc"] = pad
+            items.append(item)
+        return {"success": True, "data": {"items": items, "page_no": to_int(args.get("page_no"), 1), "total": 1000}}
+
+    def call(self, name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        if name == "create_user":
+            return {"success": True, "data": {"user_id": args["user_id"], "created": False}}
+        if name == "list_addresses":
+            with self.lock:
+                return {"success": True, "data": {"list": list(self.addresses)}}
+        if name == "create_address":
+            with self.lock:
+                address = dict(args, id=len(self.addresses) + 1, is_default=not self.addresses)
+                self.addresses.append(address)
+            return {"success": True, "data": address}
+        if name in ("set_buyer_wallet", "list_wallets"):
+            return {"success": True, "data": {"wallets": [{"address": args.get("address", "0x0"), "chain_id": 56}]}}
+        if name == "search_products":
+            return self.search(args)
+        if name == "estimate_shipping":
+            total = round(8 + 2.5 * to_int(args.get("quantity"), 1) + self.rng.random() * 10, 2)
+            return {
+                "success": True,
+                "shipping_quote_id": "%032x" % self.rng.getrandbits(128),
+                "payment_quote": {"total_amount": f"{total:.2f}", "token_symbol": "USDT", "expires_in": 600},
+            }
+        if name == "create_order":
+            order_no = "T%d%06d" % (int(time.time()), self.rng.randint(0, 999999))
+            with self.lock:
+                self.orders[order_no] = {"order_no": order_no, "escrow_state": "none", "txs": []}
+            return {"success": True, "order_no": order_no, "data": {"order_no": order_no}}
+
+        order_no = str(args.get("order_no") or "")
+        with self.lock:
+            order = self.orders.get(order_no)
+            if order is None:
+                return {"success": False, "message": f"order {order_no} not found"}
+            if name in DEADLINE_TOOLS:
+                return self.deadline_action(name, order, args)
+            if name in ESCROW_STATE_AFTER:
+                order["escrow_state"] = ESCROW_STATE_AFTER[name]
+                if name == "fund_escrow":
+                    order["timeout_at"] = round(time.time() + self.config.escrow_timeout_sec, 3)
+                tx_request = {"to": "0x" + "0" * 40, "data": "0x", "value": "0", "chain_id": 56}
+                return {"success": True, "data": {"order_no": order_no, "tx_request": tx_request}}
+            if name == "submit_tx":
+                order["txs"].append({"action": args["action"], "tx_hash": args["tx_hash"], "status": "confirmed"})
+                return {"success": True, "data": {"order_no": order_no, "status": "accepted"}}
+            if name == "get_order_proof":
+                return {"success": True, "data": json.loads(json.dumps(order))}
+        return {"success": True, "data": {"order_no": order_no}}
+
+    def deadline_action(self, name: str, order: Dict[str, Any], args: Dict[str, Any]) -> Dict[str, Any]:
+        # Dispute/timeout tools; the caller holds self.lock. Calls before a deadline are rejected
+        # and counted, so schedulers can be checked for firing early.
+        now = time.time()
+        state = order["escrow_state"]
+        if name == "open_dispute":
+            if state != "funded":
+                return {"success": False, "message": f"cannot open a dispute in state {state}"}
+            order.update(escrow_state="disputed", dispute_deadline_at=round(now + self.config.dispute_window_sec, 3))
+        elif name == "vote_dispute":
+            if state != "disputed":
+                return {"success": False, "message": f"no open dispute (state {state})"}
+            order.setdefault("votes", []).append(str(args.get("decision") or ""))
+        else:
+            required, deadline_key, final = {
+                "resolve_timeout": ("funded", "timeout_at", "refunded"),
+                "execute_dispute": ("disputed", "dispute_deadline_at", "resolved"),
+            }[name]
+            if state != required:
+                return {"success": False, "message": f"{name} not applicable in state {state}"}
+            if now < order.get(deadline_key, 0):
+                self.counters[f"early:{name}"] = self.counters.get(f"early:{name}", 0) + 1
+                return {"success": False, "message": f"{deadline_key} not reached ({order[deadline_key] - now:.3f}s left)"}
+            order["escrow_state"] = final
+            order[f"{name}_lag_sec"] = round(now - order[deadline_key], 3)
+        return {"success": True, "data": {"order_no": order["order_no"], "escrow_state": order["escrow_state"]}}
+
+    def call_idempotent(self, name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        # Stub-only (--idempotency): the real server has no idempotency support. When enabled, a
+        # repeated idempotency_key replays the first response instead of acting twice.
+        key = str(args.get("idempotency_key") or "")
+        if not key or not self.config.idempotency:
+            return self.call(name, args)
+        with self.lock:
+            cached = self.idempotent.get((name, key))
+        if cached is not None:
+            self.count("idempotent_replay")
+            return cached
+        payload = self.call(name, args)
+        with self.lock:
+            return self.idempotent.setdefault((name, key), payload)
+
+    def tool_result(self, name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        schema = TOOL_SCHEMAS.get(name)
+        if schema is None:
+            payload: Dict[str, Any] = {"success": False, "message": f"unknown tool: {name}"}
+        else:
+            problems = validate_json_schema(schema, args)
+            if problems:
+                payload = {"success": False, "message": "; ".join(problems)}
+            else:
+                payload = self.call_idempotent(name, args)
+        result = {"content": [{"type": "text", "text": json.dumps(payload, ensure_ascii=False)}], "structuredContent": payload}
+        if payload.get("success") is False:
+            result["isError"] = True
+        return result
+
+    def handle_rpc(self, req: Any) -> Optional[Dict[str, Any]]:
+        if not isinstance(req, dict) or req.get("jsonrpc") != "2.0" or not isinstance(req.get("method"), str):
+            return {"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "Invalid Request"}}
+        if "id" not in req:
+            self.count("notification")
+            return None
+        method = req["method"]
+        params = req.get("params") if isinstance(req.get("params"), dict) else {}
+        self.count(method)
+        if method == "initialize":
+            result: Dict[str, Any] = {
+                "protocolVersion": PROTOCOL_VERSION,
+                "capabilities": {"tools": {"listChanged": False}},
+                "serverInfo": {"name": "taopochta-stub", "version": "0.0.2"},
+            }
+            if self.config.idempotency:
+                result["capabilities"]["experimental"] = {"idempotency": {"argument": "idempotency_key"}}
+        elif method == "ping":
+            result = {}
+        elif method == "tools/list":
+            result = {"tools": [{"name": n, "description": f"stub {n}", "inputSchema": s} for n, s in TOOL_SCHEMAS.items()]}
+        elif method == "tools/call":
+            if self.config.rpc_error_rate and self.rng.random() < self.config.rpc_error_rate:
+                self.count("injected_rpc_error")
+                return {"jsonrpc": "2.0", "id": req["id"], "error": {"code": -32000, "message": "injected failure"}}
+            name = str(params.get("name") or "")
+            args = params.get("arguments") if isinstance(params.get("arguments"), dict) else {}
+            self.count(f"tool:{name}")
+            result = self.tool_result(name, args)
+        else:
+            return {"jsonrpc": "2.0", "id": req["id"], "error": {"code": -32601, "message": f"Method not found: {method}"}}
+        return {"jsonrpc": "2.0", "id": req["id"], "result": result}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    backend: StubBackend
+
+    def log_message(self, fmt: str, *args: Any) -> None:
+        pass
+
+    def send_json(self, obj: Any, status: int = 200, extra_headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        gzip_ok = "gzip" in self.headers.get("accept-encoding", "").lower()
+        compress = self.backend.config.gzip and gzip_ok and len(body) >= GZIP_MIN_BYTES
+        if compress:
+            body = gzip.compress(body, compresslevel=5)
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        if compress:
+            self.send_header("content-encoding", "gzip")
+        self.send_header("content-length", str(len(body)))
+        for key, value in (extra_headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def start_event_stream(self, extra_headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("cache-control", "no-cache")
+        self.send_header("transfer-encoding", "chunked")
+        for key, value in (extra_headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+
+    def send_event(self, event_id: str, data: str) -> None:
+        self.write_chunk(f"id: {event_id}\ndata: {data}\n\n".encode("utf-8"))
+
+    def stream_tool_call(self, req: Dict[str, Any]) -> None:
+        # Streamable HTTP: progress notifications, then the response, each as one SSE event.
+        backend = self.backend
+        config = backend.config
+        backend.count("sse_stream")
+        stream_id = backend.new_stream()
+        meta = req["params"].get("_meta") if isinstance(req["params"].get("_meta"), dict) else {}
+        token = meta.get("progressToken")
+        self.start_event_stream()
+        self.write_chunk(b"retry: 100\n\n")
+        for step in range(1, config.sse_steps + 1):
+            time.sleep(config.sse_step_ms / 1000.0)
+            if token is None:
+                continue
+            params = {"progressToken": token, "progress": step, "total": config.sse_steps + 1, "message": f"stub step {step}"}
+            note = json.dumps({"jsonrpc": "2.0", "method": "notifications/progress", "params": params})
+            self.send_event(backend.record_event(stream_id, note), note)
+        data = json.dumps(backend.handle_rpc(req), ensure_ascii=False)
+        event_id = backend.record_event(stream_id, data)
+        if config.sse_drop_rate and backend.rng.random() < config.sse_drop_rate:
+            # Cut the connection without the response event or the terminating chunk.
+            backend.count("sse_dropped")
+            self.close_connection = True
+            return
+        self.send_event(event_id, data)
+        self.write_chunk(b"")
+
+    def send_empty(self, status: int) -> None:
+        self.send_response(status)
+        self.send_header("content-length", "0")
+        self.end_headers()
+
+    def read_body(self) -> Tuple[bool, Any]:
+        length = to_int(self.headers.get("content-length", "0"), 0)
+        raw = self.rfile.read(length) if length > 0 else b""
+        try:
+            return True, json.loads(raw.decode("utf-8")) if raw else None
+        except ValueError:
+            return False, None
+
+    def simulate_network(self) -> bool:
+        config = self.backend.config
+        delay_ms = config.latency_ms + (self.backend.rng.uniform(-1, 1) * config.jitter_ms if config.jitter_ms else 0.0)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000.0)
+        if config.http_error_rate and self.backend.rng.random() < config.http_error_rate:
+            self.backend.count("injected_http_503")
+            self.send_json({"error": "injected overload"}, 503, {"retry-after": "1"})
+            return False
+        return True
+
+    def do_GET(self) -> None:
+        parsed = urllib.parse.urlsplit(self.path)
+        if parsed.path == "/__stats":
+            return self.send_json(self.backend.stats())
+        if not self.simulate_network():
+            return
+        if parsed.path in ("/api/mcp", "/api/mcp/rpc"):
+            last_event_id = self.headers.get("last-event-id", "")
+            events = self.backend.replay(last_event_id) if last_event_id else None
+            if events is None:
+                return self.send_json({"error": "no resumable stream"}, 405 if not last_event_id else 404)
+            self.backend.count("sse_resume")
+            self.start_event_stream()
+            for event_id, data in events:
+                self.send_event(event_id, data)
+            return self.write_chunk(b"")
+        if parsed.path == "/api/products/detail":
+            self.backend.count("products/detail")
+            query = urllib.parse.parse_qs(parsed.query)
+            item_id = (query.get("item_id") or [""])[0]
+            if not item_id:
+                return self.send_json({"success": False, "message": "item_id is required"}, 400)
+            shop_id = str(10**7 + int.from_bytes(item_id.encode("utf-8")[-6:], "big") % (9 * 10**7))
+            return self.send_json({"success": True, "data": {"item_id": item_id, "shop_id": shop_id, "title": "stub item"}})
+        self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self) -> None:
+        path = urllib.parse.urlsplit(self.path).path
+        ok, body = self.read_body()
+        if not self.simulate_network():
+            return
+        if not ok:
+            return self.send_json({"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "Parse error"}})
+
+        if path == "/api/mcp/bootstrap/email/request":
+            self.backend.count("bootstrap/request")
+            if not isinstance(body, dict) or "@" not in str(body.get("email") or ""):
+                return self.send_json({"success": False, "message": "email is required"}, 400)
+            message = "If the email is registered, a bootstrap token has been sent. Please check your inbox."
+            return self.send_json({"success": True, "status": "ok", "message": message})
+        if path == "/api/mcp/bootstrap/email/exchange":
+            self.backend.count("bootstrap/exchange")
+            if not isinstance(body, dict) or not str(body.get("bootstrap_token") or "").startswith("mbt_"):
+                return self.send_json({"success": False, "message": "invalid or expired bootstrap token"}, 401)
+            ttl = to_int(body.get("ttl_sec"), 900) or 900
+            suffix = str(body["bootstrap_token"])[4:]
+            sub = int(suffix) if suffix.isdigit() else STUB_USER_ID
+            return self.send_json(
+                {
+                    "success": True,
+                    "token_type": "Bearer",
+                    "access_token": make_access_token(sub, ttl),
+                    "expires_in": ttl,
+                    "sub": sub,
+                    "scope": "mcp",
+                    "provider": "mcp_email_bootstrap",
+                }
+            )
+        if path not in ("/api/mcp", "/api/mcp/rpc"):
+            return self.send_json({"error": "not found"}, 404)
+
+        authorization = self.headers.get("authorization", "")
+        if self.backend.config.require_auth and not authorization.startswith("Bearer "):
+            return self.send_json({"jsonrpc": "2.0", "id": None, "error": {"code": -32001, "message": "Unauthorized"}}, 401)
+        claims = decode_jwt_claims_unsafe(authorization[7:])
+        if to_float(claims.get("exp"), None) is not None and float(claims["exp"]) < time.time():
+            self.backend.count("auth_expired")
+            return self.send_json({"jsonrpc": "2.0", "id": None, "error": {"code": -32001, "message": "Token expired"}}, 401)
+        sub = str(claims.get("sub", "anonymous"))
+        self.backend.count(f"user:{sub}")
+        if not self.backend.allow_user(sub):
+            self.backend.count("user_rate_limited")
+            error = {"code": -32029, "message": "Per-user rate limit exceeded"}
+            return self.send_json({"jsonrpc": "2.0", "id": None, "error": error}, 429, {"retry-after": "1"})
+        session_id = self.headers.get("mcp-session-id", "")
+        if session_id and session_id not in self.backend.sessions:
+            return self.send_json({"jsonrpc": "2.0", "id": None, "error": {"code": -32001, "message": "Session not found"}}, 404)
+        accepts_sse = "text/event-stream" in self.headers.get("accept", "")
+        if isinstance(body, list):
+            self.backend.count("batch")
+            if not body:
+                return self.send_json({"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "Invalid Request"}})
+            out = [resp for resp in (self.backend.handle_rpc(req) for req in body) if resp is not None]
+            if not out:
+                return self.send_empty(204)
+            initialized = any(isinstance(req, dict) and req.get("method") == "initialize" for req in body)
+            return self.send_json(out, extra_headers=self.new_session() if accepts_sse and initialized else None)
+        if (
+            self.backend.config.sse
+            and accepts_sse
+            and isinstance(body, dict)
+            and body.get("method") == "tools/call"
+            and "id" in body
+            and isinstance(body.get("params"), dict)
+            and body["params"].get("name") in STREAMED_TOOLS
+        ):
+            return self.stream_tool_call(body)
+        resp = self.backend.handle_rpc(body)
+        if resp is None:
+            return self.send_empty(204)
+        if accepts_sse and body.get("method") == "initialize" and "result" in resp:
+            return self.send_json(resp, extra_headers=self.new_session())
+        self.send_json(resp)
+
+    def new_session(self) -> Dict[str, str]:
+        # Streamable-HTTP clients get a session id, which they send back on every request.
+        session_id = uuid.uuid4().hex
+        with self.backend.lock:
+            self.backend.sessions.add(session_id)
+        return {"mcp-session-id": session_id}
+
+
+def start_stub_server(
+    config: Optional[StubConfig] = None,
+    host: str = "127.0.0.1",
+    port: int = 0,
+) -> Tuple[ThreadingHTTPServer, str]:
+    # Starts the stub on a daemon thread; port 0 picks a free port. Returns (server, base_url).
+    handler = type("BoundStubHandler", (StubHandler,), {"backend": StubBackend(config or StubConfig())})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main() -> None:
+    env = StubConfig.from_env()
+    parser = argparse.ArgumentParser(description="Local stub of the Taopochta MCP server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=to_int(os.getenv("STUB_PORT", "18080"), 18080))
+    parser.add_argument("--latency-ms", type=float, default=env.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=env.jitter_ms)
+    parser.add_argument("--items", type=int, default=env.items)
+    parser.add_argument("--pad-bytes", type=int, default=env.pad_bytes)
+    parser.add_argument("--rpc-error-rate", type=float, default=env.rpc_error_rate)
+    parser.add_argument("--http-error-rate", type=float, default=env.http_error_rate)
+    parser.add_argument("--no-auth", action="store_true", help="accept /api/mcp calls without a bearer token")
+    parser.add_argument("--no-gzip", action="store_true", help="never gzip responses, even when the client accepts it")
+    parser.add_argument("--sse", action="store_true", default=env.sse, help="stream escrow/proof tool calls as SSE")
+    parser.add_argument("--sse-steps", type=int, default=env.sse_steps)
+    parser.add_argument("--sse-step-ms", type=float, default=env.sse_step_ms)
+    parser.add_argument("--sse-drop-rate", type=float, default=env.sse_drop_rate)
+    parser.add_argument("--escrow-timeout-sec", type=float, default=env.escrow_timeout_sec)
+    parser.add_argument("--dispute-window-sec", type=float, default=env.dispute_window_sec)
+    parser.add_argument("--user-rate-per-sec", type=float, default=env.user_rate_per_sec)
+    parser.add_argument(
+        "--idempotency", action="store_true", default=env.idempotency, help="replay repeated idempotency keys (stub-only)"
+    )
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        items=args.items,
+        pad_bytes=args.pad_bytes,
+        rpc_error_rate=args.rpc_error_rate,
+        http_error_rate=args.http_error_rate,
+        require_auth=not args.no_auth,
+        gzip=env.gzip and not args.no_gzip,
+        sse=args.sse,
+        sse_steps=args.sse_steps,
+        sse_step_ms=args.sse_step_ms,
+        sse_drop_rate=args.sse_drop_rate,
+        escrow_timeout_sec=args.escrow_timeout_sec,
+        dispute_window_sec=args.dispute_window_sec,
+        user_rate_per_sec=args.user_rate_per_sec,
+        idempotency=args.idempotency,
+    )
+    server, base_url = start_stub_server(config, args.host, args.port)
+    print(f"stub MCP server on {base_url}/api/mcp", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        sys.exit(1)
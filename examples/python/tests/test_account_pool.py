@@ -0,0 +1,94 @@
+import base64
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from account_pool import AccountAuthError, AccountPool, is_auth_error, load_account_specs
+from token_store import TokenStore
+
+
+def jwt(sub: int, exp_in_sec: float = 3600.0) -> str:
+    payload = json.dumps({"sub": str(sub), "exp": time.time() + exp_in_sec}).encode("utf-8")
+    return "e30." + base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=") + ".sig"
+
+
+class LoadAccountSpecsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write(self, text: str) -> str:
+        path = os.path.join(self.dir.name, "accounts.jsonl")
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write(text)
+        return path
+
+    def test_jsonl_with_comments_and_default_names(self) -> None:
+        specs = load_account_specs(self.write('# pool\n{"token": "a"}\n\n{"name": "b", "token": "b"}\n'))
+        self.assertEqual([s["name"] for s in specs], ["account-1", "b"])
+
+    def test_json_list(self) -> None:
+        specs = load_account_specs(self.write('[{"name": "a", "bootstrap_token": "x"}]'))
+        self.assertEqual(specs, [{"name": "a", "bootstrap_token": "x"}])
+
+    def test_duplicate_names_are_rejected(self) -> None:
+        with self.assertRaises(RuntimeError):
+            load_account_specs(self.write('{"name": "a"}\n{"name": "a"}\n'))
+
+    def test_non_object_is_rejected(self) -> None:
+        with self.assertRaises(RuntimeError):
+            load_account_specs(self.write("[1]"))
+
+
+class AccountTokenTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.store = TokenStore(os.path.join(self.dir.name, "tokens.json"))
+        self.pool = self.open("https://taopochta.ru/api/mcp")
+
+    def open(self, endpoint: str) -> AccountPool:
+        pool = AccountPool(endpoint, "", token_store=self.store)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_token_key_is_scoped_to_server_and_credential(self) -> None:
+        a = self.pool.add({"name": "agent", "bootstrap_token": "one"})
+        key = self.pool._token_key(a)
+        self.assertTrue(key.startswith("https://taopochta.ru|account:"))
+        self.assertNotIn("one", key)
+        stub = self.open("http://127.0.0.1:18080/api/mcp")
+        self.assertNotEqual(stub._token_key(stub.add({"name": "agent", "bootstrap_token": "one"})), key)
+        rotated = self.pool.add({"name": "agent", "bootstrap_token": "two"})
+        self.assertNotEqual(self.pool._token_key(rotated), key)
+        self.assertEqual(self.pool._token_key(self.pool.add({"name": "empty"})), "")
+
+    def test_stored_token_is_reused(self) -> None:
+        account = self.pool.add({"name": "agent", "bootstrap_token": "one", "user_id": 7})
+        token = jwt(7)
+        self.store.put(self.pool._token_key(account), token, time.time() + 3600)
+        self.assertEqual(self.pool._new_token(account, ""), token)
+
+    def test_stored_token_for_another_user_is_skipped(self) -> None:
+        account = self.pool.add({"name": "agent", "token": jwt(7), "user_id": 7})
+        self.store.put(self.pool._token_key(account), jwt(8), time.time() + 3600)
+        self.assertEqual(self.pool._new_token(account, ""), account.spec["token"])
+
+    def test_replacement_token_for_another_user_is_rejected(self) -> None:
+        account = self.pool.add({"name": "agent", "token": jwt(8)})
+        account.user_id = 7
+        with self.assertRaises(AccountAuthError):
+            self.pool._new_token(account, "")
+
+    def test_failed_token_is_not_offered_again(self) -> None:
+        token = jwt(7)
+        account = self.pool.add({"name": "agent", "token": token})
+        with self.assertRaises(AccountAuthError) as caught:
+            self.pool._new_token(account, token)
+        self.assertTrue(is_auth_error(caught.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler
+
+from async_client import AsyncHttpPool, AsyncMcpClient
+from stub_server import STUB_USER_ID, StubConfig, make_access_token, start_stub_server
+from tests.test_http_pool import DroppingHandler, serve
+
+
+class InterimHandler(BaseHTTPRequestHandler):
+    # Sends 100 Continue and 103 Early Hints ahead of every real response.
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("content-length") or 0))
+        self.wfile.write(b"HTTP/1.1 100 Continue\r\n\r\nHTTP/1.1 103 Early Hints\r\nlink: </a.css>; rel=preload\r\n\r\n")
+        body = json.dumps({"path": self.path}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class AsyncHttpPoolStubTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.server, self.base_url = start_stub_server(StubConfig(latency_ms=100))
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def client(self, pool: AsyncHttpPool) -> AsyncMcpClient:
+        return AsyncMcpClient(self.base_url + "/api/mcp", make_access_token(STUB_USER_ID, 3600), pool)
+
+    async def test_sequential_calls_reuse_one_connection(self) -> None:
+        pool = AsyncHttpPool()
+        self.addAsyncCleanup(pool.close)
+        mcp = self.client(pool)
+        for _ in range(3):
+            await mcp.call_tool("list_addresses", {})
+        stats = pool.stats()
+        self.assertEqual(stats["connections_created"], 1)
+        self.assertEqual(stats["connections_reused"], 2)
+        self.assertEqual(stats["idle_connections"], 1)
+
+    async def test_per_host_cap_bounds_open_connections(self) -> None:
+        pool = AsyncHttpPool(max_per_host=2)
+        self.addAsyncCleanup(pool.close)
+        mcp = self.client(pool)
+        started = time.monotonic()
+        await asyncio.gather(*(mcp.call_tool("list_addresses", {}) for _ in range(6)))
+        # Six 100 ms calls through two slots take three rounds and never need a third socket.
+        self.assertGreaterEqual(time.monotonic() - started, 0.3 * 0.9)
+        self.assertEqual(pool.stats()["connections_created"], 2)
+        self.assertEqual(pool.stats()["in_flight"], 0)
+
+
+class AsyncResendTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        DroppingHandler.requests = []
+        self.server = serve(DroppingHandler)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api/mcp"
+
+    async def warm(self) -> AsyncHttpPool:
+        pool = AsyncHttpPool()
+        self.addAsyncCleanup(pool.close)
+        self.assertEqual((await pool.request("GET", self.url))[0], 200)
+        return pool
+
+    async def test_get_is_resent_on_a_fresh_connection(self) -> None:
+        pool = await self.warm()
+        self.assertEqual((await pool.request("GET", self.url))[0], 200)
+        self.assertEqual(len(DroppingHandler.requests), 3)
+        self.assertEqual(pool.stats()["connections_created"], 2)
+
+    async def test_post_is_not_resent(self) -> None:
+        pool = await self.warm()
+        with self.assertRaises(ConnectionResetError):
+            await pool.request("POST", self.url, b'{"method": "tools/call"}')
+        self.assertEqual(len(DroppingHandler.requests), 2)
+
+    async def test_post_marked_idempotent_is_resent(self) -> None:
+        pool = await self.warm()
+        self.assertEqual((await pool.request("POST", self.url, b"{}", idempotent=True))[0], 200)
+        self.assertEqual(len(DroppingHandler.requests), 3)
+
+
+class InterimResponseTest(unittest.IsolatedAsyncioTestCase):
+    async def test_1xx_responses_are_skipped(self) -> None:
+        server = serve(InterimHandler)
+        self.addCleanup(server.shutdown)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        pool = AsyncHttpPool()
+        self.addAsyncCleanup(pool.close)
+        for path in ("/first", "/second"):
+            status, headers, body = await pool.request("POST", base_url + path, b"{}")
+            self.assertEqual(status, 200)
+            self.assertEqual(json.loads(body), {"path": path})
+            self.assertIsNone(headers.get("link"))
+        self.assertEqual(pool.stats()["connections_reused"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
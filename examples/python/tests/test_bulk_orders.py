@@ -0,0 +1,107 @@
+import contextlib
+import http.client
+import io
+import json
+import os
+import tempfile
+import unittest
+import urllib.error
+
+from bulk_orders import OrderStateLog, adopt_line_keys, load_manifest, outcome_is_unknown
+from endpoint_guard import CircuitOpenError
+from full_flow import McpClient, initialize_session
+from response_body import BodyDecoder, ResponseBodyError, ResponseTooLarge
+from stub_server import STUB_USER_ID, StubConfig, make_access_token, start_stub_server
+
+
+class LoadManifestKeyTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write(self, name: str, rows: list) -> str:
+        path = os.path.join(self.dir.name, name)
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write("\n".join(json.dumps(row) for row in rows) + "\n")
+        return path
+
+    def keys(self, rows: list) -> list:
+        return [row["_key"] for row in load_manifest(self.write("orders.jsonl", rows))]
+
+    def test_identical_rows_get_distinct_keys(self) -> None:
+        keys = self.keys([{"keyword": "phone"}, {"keyword": "phone"}])
+        self.assertEqual(len(set(keys)), 2)
+        self.assertTrue(keys[0].endswith(":1") and keys[1].endswith(":2"))
+
+    def test_inserting_a_row_keeps_existing_keys(self) -> None:
+        rows = [{"keyword": "phone"}, {"keyword": "case"}, {"keyword": "phone"}]
+        before = self.keys(rows)
+        after = self.keys([{"keyword": "cable"}] + rows)
+        self.assertEqual(after[1:], before)
+
+    def test_empty_fields_do_not_change_the_key(self) -> None:
+        self.assertEqual(self.keys([{"keyword": "phone", "sku_id": ""}]), self.keys([{"keyword": "phone"}]))
+
+    def test_explicit_id_wins(self) -> None:
+        self.assertEqual(self.keys([{"id": "order-7", "keyword": "phone"}]), ["order-7"])
+
+    def test_csv_and_jsonl_rows_key_alike(self) -> None:
+        path = os.path.join(self.dir.name, "orders.csv")
+        with open(path, "w", encoding="utf-8", newline="") as fh:
+            fh.write("keyword,quantity\nphone,2\n")
+        self.assertEqual([r["_key"] for r in load_manifest(path)], self.keys([{"keyword": "phone", "quantity": "2"}]))
+
+    def test_state_with_line_number_keys_is_resumed(self) -> None:
+        rows = load_manifest(self.write("orders.jsonl", [{"keyword": "phone"}, {"keyword": "case"}]))
+        line_key = rows[1]["_line_key"]
+        log = OrderStateLog(os.path.join(self.dir.name, "state.jsonl"))
+        self.addCleanup(log.close)
+        log.append(line_key, "search", "done", {"item_id": "1"})
+        adopt_line_keys(rows, log)
+        self.assertEqual(rows[1]["_key"], line_key)
+        self.assertTrue(rows[0]["_key"].endswith(":1"))
+        self.assertNotIn("_line_key", rows[0])
+
+
+class OutcomeIsUnknownTest(unittest.TestCase):
+    def http_error(self, code: int) -> urllib.error.HTTPError:
+        return urllib.error.HTTPError("http://x", code, "", http.client.HTTPMessage(), io.BytesIO(b""))
+
+    def test_rejections_are_known(self) -> None:
+        self.assertFalse(outcome_is_unknown(RuntimeError("create_order failed: out of stock")))
+        self.assertFalse(outcome_is_unknown(CircuitOpenError("circuit is open")))
+        self.assertFalse(outcome_is_unknown(self.http_error(400)))
+
+    def test_transport_failures_are_unknown(self) -> None:
+        self.assertTrue(outcome_is_unknown(ConnectionResetError()))
+        self.assertTrue(outcome_is_unknown(TimeoutError()))
+        self.assertTrue(outcome_is_unknown(self.http_error(502)))
+
+    def test_unreadable_responses_are_unknown(self) -> None:
+        self.assertTrue(outcome_is_unknown(ResponseTooLarge("too large")))
+        with self.assertRaises(ResponseBodyError) as caught:
+            BodyDecoder("br", 1024)
+        self.assertNotIsInstance(caught.exception, RuntimeError)
+        self.assertTrue(outcome_is_unknown(caught.exception))
+
+
+class FundEscrowKeyTest(unittest.TestCase):
+    def test_resent_fund_escrow_is_deduplicated_under_its_step_key(self) -> None:
+        server, base_url = start_stub_server(StubConfig(idempotency=True))
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        mcp = McpClient(base_url + "/api/mcp", make_access_token(STUB_USER_ID, 3600))
+        with contextlib.redirect_stdout(io.StringIO()):
+            initialize_session(mcp)
+        order = {"shipping_address_id": 1, "shop_id": "1", "item_id": "2", "quantity": 1, "pay_method": "bsc"}
+        order_no = mcp.call_tool("create_order", dict(order, shipping_quote_id="q"))["order_no"]
+        fund_args = {"order_no": order_no, "token_symbol": "USDT"}
+        for _ in range(2):
+            mcp.call_tool("fund_escrow", fund_args, idempotency_key="state|row:1|fund_escrow")
+        counters = json.loads(mcp.pool.request("GET", base_url + "/__stats")[2])["counters"]
+        self.assertEqual(counters["tool:fund_escrow"], 2)
+        self.assertEqual(counters["idempotent_replay"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
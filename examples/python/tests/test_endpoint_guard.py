@@ -0,0 +1,120 @@
+import http.client
+import io
+import time
+import unittest
+import urllib.error
+
+from endpoint_guard import AdaptiveLimiter, CircuitBreaker, CircuitOpenError, EndpointGuard
+from retry_policy import RequestAborted
+
+
+def http_error(code: int) -> urllib.error.HTTPError:
+    return urllib.error.HTTPError("http://x", code, "", http.client.HTTPMessage(), io.BytesIO(b""))
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def opened(self, open_sec: float = 0.02) -> CircuitBreaker:
+        breaker = CircuitBreaker(failure_threshold=2, open_sec=open_sec)
+        breaker.record(failed=True)
+        breaker.record(failed=True)
+        return breaker
+
+    def half_open(self) -> CircuitBreaker:
+        breaker = self.opened()
+        time.sleep(0.03)
+        breaker.allow()
+        self.assertEqual(breaker.status, "half_open")
+        return breaker
+
+    def test_opens_after_consecutive_failures(self) -> None:
+        breaker = CircuitBreaker(failure_threshold=2, open_sec=60.0)
+        breaker.record(failed=True)
+        breaker.record(failed=False)
+        breaker.record(failed=True)
+        self.assertEqual(breaker.status, "closed")
+        breaker.record(failed=True)
+        self.assertEqual(breaker.status, "open")
+        with self.assertRaises(CircuitOpenError):
+            breaker.allow()
+
+    def test_half_open_lets_one_probe_through(self) -> None:
+        breaker = self.half_open()
+        with self.assertRaises(CircuitOpenError):
+            breaker.allow()
+
+    def test_probe_success_closes(self) -> None:
+        breaker = self.half_open()
+        breaker.record(failed=False)
+        self.assertEqual(breaker.status, "closed")
+        breaker.allow()
+        breaker.allow()
+
+    def test_probe_failure_reopens(self) -> None:
+        breaker = self.half_open()
+        breaker.record(failed=True)
+        self.assertEqual(breaker.status, "open")
+        with self.assertRaises(CircuitOpenError):
+            breaker.allow()
+
+    def test_abandoned_probe_hands_over_to_the_next_caller(self) -> None:
+        breaker = self.half_open()
+        breaker.abandon_probe()
+        self.assertEqual(breaker.status, "half_open")
+        self.assertEqual(breaker.consecutive_failures, 2)
+        breaker.allow()
+        with self.assertRaises(CircuitOpenError):
+            breaker.allow()
+
+
+class EndpointGuardTest(unittest.TestCase):
+    def guard(self, queue_timeout_sec: float = 60.0) -> EndpointGuard:
+        limiter = AdaptiveLimiter(initial=1, min_limit=1, max_limit=1, queue_timeout_sec=queue_timeout_sec)
+        return EndpointGuard(limiter, CircuitBreaker(failure_threshold=2, open_sec=0.02))
+
+    def trip(self, guard: EndpointGuard) -> None:
+        for _ in range(2):
+            guard.before()
+            guard.after(ConnectionResetError(), 0.01)
+        self.assertEqual(guard.breaker.status, "open")
+        time.sleep(0.03)
+
+    def test_queue_timeout_does_not_close_the_breaker(self) -> None:
+        guard = self.guard(queue_timeout_sec=0.01)
+        self.trip(guard)
+        guard.limiter.acquire()  # hold the only slot
+        with self.assertRaises(TimeoutError):
+            guard.before()
+        self.assertEqual(guard.breaker.status, "half_open")
+        guard.limiter.release("neutral", 0.0)
+        guard.before()
+        guard.after(None, 0.01)
+        self.assertEqual(guard.breaker.status, "closed")
+
+    def test_aborted_probe_is_abandoned(self) -> None:
+        guard = self.guard()
+        self.trip(guard)
+        guard.before()
+        guard.after(RequestAborted("hedge won"), 0.01)
+        self.assertEqual(guard.breaker.status, "half_open")
+        self.assertEqual(guard.limiter.in_flight, 0)
+        guard.before()
+        guard.after(None, 0.01)
+        self.assertEqual(guard.breaker.status, "closed")
+
+    def test_429_counts_as_a_failure(self) -> None:
+        guard = self.guard()
+        for _ in range(2):
+            guard.before()
+            guard.after(http_error(429), 0.01)
+        self.assertEqual(guard.breaker.status, "open")
+
+    def test_other_4xx_is_a_live_server(self) -> None:
+        guard = self.guard()
+        self.trip(guard)
+        guard.before()
+        guard.after(http_error(400), 0.01)
+        self.assertEqual(guard.breaker.status, "closed")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import tempfile
+import types
+import unittest
+from typing import Any, Dict, List, Optional
+from unittest import mock
+
+from escrow_scheduler import DeadlineScheduler, ScheduleJournal
+
+DEADLINE = 1_000_000.0
+
+
+class FakeEntry:
+    def __init__(self) -> None:
+        self.ok = False
+        self.result: Optional[Dict[str, Any]] = None
+        self.error = ""
+
+
+class FakeServer:
+    # One funded escrow that resolve_timeout releases once the server clock passes DEADLINE.
+    def __init__(self, clock: types.SimpleNamespace, skew_sec: float = 0.0, down_batches: int = 0) -> None:
+        self.clock = clock
+        self.skew_sec = skew_sec
+        self.down_batches = down_batches
+        self.state = "funded"
+        self.calls: List[str] = []
+
+    def batch(self) -> "FakeBatch":
+        return FakeBatch(self)
+
+
+class FakeBatch:
+    def __init__(self, server: FakeServer) -> None:
+        self.server = server
+        self.calls: List[tuple] = []
+
+    def call_tool(self, name: str, arguments: Dict[str, Any]) -> FakeEntry:
+        entry = FakeEntry()
+        self.calls.append((name, entry))
+        return entry
+
+    def send(self) -> None:
+        server = self.server
+        if server.down_batches:
+            server.down_batches -= 1
+            raise ConnectionResetError("connection reset by peer")
+        for name, entry in self.calls:
+            server.calls.append(name)
+            if name == "get_order_proof":
+                entry.ok, entry.result = True, {"escrow_state": server.state, "timeout_at": DEADLINE}
+            elif server.clock.now - server.skew_sec >= DEADLINE:
+                entry.ok, server.state = True, "refunded"
+            else:
+                entry.error = "escrow timeout not reached"
+
+
+class DeadlineSchedulerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.clock = types.SimpleNamespace(now=DEADLINE - 100.0)
+        patcher = mock.patch("escrow_scheduler.time", types.SimpleNamespace(time=lambda: self.clock.now))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def scheduler(self, server: FakeServer, **kwargs) -> DeadlineScheduler:
+        journal = ScheduleJournal(os.path.join(self.dir.name, "schedule.jsonl"))
+        self.addCleanup(journal.close)
+        scheduler = DeadlineScheduler(server, journal, settle_sec=5.0, max_attempts=5, **kwargs)  # type: ignore[arg-type]
+        scheduler.scan(iter(["A1"]))
+        return scheduler
+
+    def run_until_done(self, scheduler: DeadlineScheduler, max_ticks: int = 50) -> None:
+        for _ in range(max_ticks):
+            next_due = scheduler.next_due()
+            if next_due is None:
+                return
+            self.clock.now = max(self.clock.now, next_due)
+            scheduler.tick()
+        self.fail("scheduler did not finish")
+
+    def test_acts_after_the_grace_margin(self) -> None:
+        scheduler = self.scheduler(FakeServer(self.clock), grace_sec=2.0)
+        self.assertEqual(scheduler.next_due(), DEADLINE + 2.0)
+
+    def test_server_clock_behind_is_not_stuck(self) -> None:
+        server = FakeServer(self.clock, skew_sec=25.0)
+        scheduler = self.scheduler(server, grace_sec=0.0)
+        self.run_until_done(scheduler)
+        self.assertEqual(scheduler.journal.finished["A1"], "refunded")
+        stats = scheduler.stats()
+        self.assertGreater(stats["early_rejections"], 0)
+        self.assertEqual(stats["action_errors"], 0)
+
+    def test_late_rejections_still_give_up(self) -> None:
+        server = FakeServer(self.clock, skew_sec=10_000.0)
+        scheduler = self.scheduler(server, grace_sec=0.0, max_skew_sec=30.0)
+        self.run_until_done(scheduler)
+        self.assertEqual(scheduler.journal.finished["A1"], "stuck:funded")
+        self.assertEqual(scheduler.stats()["action_errors"], 5)
+
+    def test_transport_error_keeps_the_order_scheduled(self) -> None:
+        server = FakeServer(self.clock)
+        scheduler = self.scheduler(server, grace_sec=0.0)
+        server.down_batches = 2
+        self.clock.now = DEADLINE
+        scheduler.tick()
+        self.assertEqual(scheduler.pending(), 1)
+        self.assertEqual(scheduler.journal.entries["A1"]["action"], "resolve_timeout")
+        self.assertGreater(scheduler.next_due(), DEADLINE)
+        self.run_until_done(scheduler)
+        self.assertEqual(scheduler.journal.finished["A1"], "refunded")
+        self.assertEqual(scheduler.stats()["transport_errors"], 2)
+
+
+    def test_failed_scan_batch_is_read_again_later(self) -> None:
+        server = FakeServer(self.clock, down_batches=1)
+        journal = ScheduleJournal(os.path.join(self.dir.name, "schedule.jsonl"))
+        self.addCleanup(journal.close)
+        scheduler = DeadlineScheduler(server, journal, settle_sec=5.0, grace_sec=0.0)  # type: ignore[arg-type]
+        scheduler.scan(iter(["A1"]))
+        self.assertFalse(journal.known("A1"))
+        self.assertEqual(scheduler.pending(), 1)
+        self.assertGreater(scheduler.next_due(), self.clock.now)
+        self.run_until_done(scheduler)
+        self.assertEqual(journal.finished["A1"], "refunded")
+        self.assertEqual(scheduler.stats()["transport_errors"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from concurrent.futures import CancelledError
+from typing import Any, Dict, List
+
+from escrow_watch import EscrowTracker
+
+
+class FakeEntry:
+    def __init__(self, order_no: str) -> None:
+        self.order_no = order_no
+        self.ok = True
+        self.result: Dict[str, Any] = {}
+        self.error = ""
+
+
+class FakeBatch:
+    def __init__(self, states: Dict[str, str]) -> None:
+        self.states = states
+        self.entries: List[FakeEntry] = []
+
+    def call_tool(self, name: str, arguments: Dict[str, Any]) -> FakeEntry:
+        entry = FakeEntry(arguments["order_no"])
+        self.entries.append(entry)
+        return entry
+
+    def send(self) -> None:
+        for entry in self.entries:
+            entry.result = {"escrow_state": self.states.get(entry.order_no, "created")}
+
+
+class FakeMcp:
+    def __init__(self) -> None:
+        self.states: Dict[str, str] = {}
+
+    def batch(self) -> FakeBatch:
+        return FakeBatch(self.states)
+
+
+class EscrowTrackerTest(unittest.TestCase):
+    def tracker(self) -> EscrowTracker:
+        mcp = FakeMcp()
+        tracker = EscrowTracker(mcp, base_delay_sec=0.01, max_delay_sec=0.02, max_batches_per_sec=1000.0)  # type: ignore[arg-type]
+        self.addCleanup(tracker.stop)
+        self.mcp = mcp
+        return tracker
+
+    def test_reaches_the_target_state(self) -> None:
+        tracker = self.tracker()
+        self.mcp.states["A"] = "funded"
+        self.assertEqual(tracker.watch("A", "fund").result(timeout=5), {"escrow_state": "funded"})
+
+    def test_cancelled_watch_does_not_kill_the_poller(self) -> None:
+        tracker = self.tracker()
+        futures = []
+
+        def cancel_then_reach(proof) -> bool:
+            # The caller gives up while the poll is in flight, just before the target state shows up.
+            futures[0].cancel()
+            return True
+
+        with tracker._cond:  # keep the poller out until the future is stored
+            futures.append(tracker.watch("A", "fund", until=cancel_then_reach))
+        cancelled = futures[0]
+        self.mcp.states["B"] = "funded"
+        self.assertEqual(tracker.watch("B", "fund").result(timeout=5)["escrow_state"], "funded")
+        with self.assertRaises(CancelledError):
+            cancelled.result(timeout=0)
+
+    def test_failing_callback_and_predicate_do_not_kill_the_poller(self) -> None:
+        tracker = self.tracker()
+        self.mcp.states.update(A="funded", B="funded")
+
+        def explode(watch, proof) -> None:
+            raise ValueError("callback bug")
+
+        def broken(proof) -> bool:
+            raise KeyError("until bug")
+
+        self.assertEqual(tracker.watch("A", "fund", callback=explode).result(timeout=5)["escrow_state"], "funded")
+        with self.assertRaises(KeyError):
+            tracker.watch("C", "fund", until=broken).result(timeout=5)
+        self.assertEqual(tracker.watch("B", "fund").result(timeout=5)["escrow_state"], "funded")
+
+
+if __name__ == "__main__":
+    unittest.main()
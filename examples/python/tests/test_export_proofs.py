@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+from export_proofs import WatermarkIndex, parse_range
+
+
+class ParseRangeTest(unittest.TestCase):
+    def test_keeps_prefix_and_zero_padding(self) -> None:
+        self.assertEqual(list(parse_range("T0098..T0101")), ["T0098", "T0099", "T0100", "T0101"])
+        self.assertEqual(list(parse_range("7..9")), ["7", "8", "9"])
+
+    def test_reversed_range_is_empty(self) -> None:
+        self.assertEqual(list(parse_range("T5..T3")), [])
+
+    def test_bad_specs(self) -> None:
+        for spec in ("T1", "T1..X3", "T1..T", "..T3"):
+            with self.assertRaises(RuntimeError):
+                list(parse_range(spec))
+
+
+class WatermarkIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.path = os.path.join(self.dir.name, "watermarks.jsonl")
+
+    def reopened(self) -> dict:
+        index = WatermarkIndex(self.path)
+        index.close()
+        return index.entries
+
+    def test_changed_and_final(self) -> None:
+        index = WatermarkIndex(self.path)
+        self.addCleanup(index.close)
+        self.assertTrue(index.changed("T1", "h1"))
+        index.record([("T1", "h1", "funded"), ("T2", "h2", "released")])
+        self.assertFalse(index.changed("T1", "h1"))
+        self.assertTrue(index.changed("T1", "h1b"))
+        self.assertFalse(index.is_final("T1"))
+        self.assertTrue(index.is_final("T2"))
+        self.assertFalse(index.is_final("T3"))
+
+    def test_reopen_keeps_the_last_record_and_survives_a_torn_line(self) -> None:
+        index = WatermarkIndex(self.path)
+        index.record([("T1", "h1", "funded")])
+        index.record([("T1", "h2", "released")])
+        index.close()
+        with open(self.path, "a", encoding="utf-8") as fh:
+            fh.write('{"order_no": "T9", "ha')
+        index = WatermarkIndex(self.path)
+        self.addCleanup(index.close)
+        self.assertEqual(index.entries, {"T1": ("h2", "released")})
+        index.record([("T3", "h3", "funded")])
+        self.assertEqual(self.reopened()["T3"], ("h3", "funded"))
+
+    def test_close_compacts_superseded_records(self) -> None:
+        index = WatermarkIndex(self.path)
+        for n in range(1100):
+            index.record([("T1", f"h{n}", "funded")])
+        index.close()
+        with open(self.path, "r", encoding="utf-8") as fh:
+            self.assertEqual(len(fh.readlines()), 1)
+        self.assertEqual(self.reopened(), {"T1": ("h1099", "funded")})
+
+
+if __name__ == "__main__":
+    unittest.main()
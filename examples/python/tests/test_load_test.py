@@ -0,0 +1,77 @@
+import random
+import unittest
+
+from load_test import LogHistogram, iter_arrivals, parse_schedule
+
+
+class IterArrivalsTest(unittest.TestCase):
+    def test_constant_rate(self) -> None:
+        arrivals = list(iter_arrivals([(10.0, 10.0, 2.0)]))
+        self.assertEqual(len(arrivals), 20)
+        for n, t in enumerate(arrivals, 1):
+            self.assertAlmostEqual(t, n / 10.0)
+
+    def test_linear_ramp_follows_the_integral(self) -> None:
+        # rate(t) = 5t, so the n-th arrival is at sqrt(2n / 5).
+        arrivals = list(iter_arrivals([(0.0, 10.0, 2.0)]))
+        self.assertEqual(len(arrivals), 10)
+        for n, t in enumerate(arrivals, 1):
+            self.assertAlmostEqual(t, (2 * n / 5) ** 0.5)
+
+    def test_fractions_carry_over_between_stages(self) -> None:
+        arrivals = list(iter_arrivals([(1.5, 1.5, 1.0), (0.0, 0.0, 5.0), (1.5, 1.5, 1.0)]))
+        self.assertEqual(len(arrivals), 3)
+        self.assertAlmostEqual(arrivals[0], 2 / 3)
+        self.assertAlmostEqual(arrivals[1], 6 + 1 / 3)
+        self.assertAlmostEqual(arrivals[2], 7.0)
+
+    def test_arrivals_are_increasing(self) -> None:
+        arrivals = list(iter_arrivals(parse_schedule(0, 0, "10..100:5,100:2,100..0:3")))
+        self.assertEqual(arrivals, sorted(arrivals))
+        self.assertEqual(len(arrivals), round((10 + 100) / 2 * 5 + 200 + 150))
+
+
+class ParseScheduleTest(unittest.TestCase):
+    def test_forms(self) -> None:
+        self.assertEqual(parse_schedule(20, 30, ""), [(20.0, 20.0, 30.0)])
+        self.assertEqual(parse_schedule(0, 0, "10..50:60, 50:120"), [(10.0, 50.0, 60.0), (50.0, 50.0, 120.0)])
+
+    def test_bad_input(self) -> None:
+        for ramp in ("10..50", "x:10", "10:0", "-5:10"):
+            with self.assertRaises(RuntimeError):
+                parse_schedule(0, 0, ramp)
+        with self.assertRaises(RuntimeError):
+            parse_schedule(0, 10, "")
+
+
+class LogHistogramTest(unittest.TestCase):
+    def test_quantiles_within_precision(self) -> None:
+        rng = random.Random(7)
+        values = sorted(rng.lognormvariate(-4, 1) for _ in range(20000))
+        hist = LogHistogram()
+        for value in values:
+            hist.observe(value)
+        for q in (0.5, 0.9, 0.99, 0.999):
+            exact = values[int(q * len(values)) - 1]
+            self.assertAlmostEqual(hist.quantile(q) / exact, 1.0, delta=0.0101)
+        self.assertEqual(hist.quantile(1.0), values[-1])
+
+    def test_empty_and_tiny_values(self) -> None:
+        hist = LogHistogram()
+        self.assertIsNone(hist.quantile(0.5))
+        self.assertIsNone(hist.summary()["p50_ms"])
+        hist.observe(0.0)
+        self.assertEqual(hist.quantile(0.5), 0.0)
+
+    def test_merge_equals_observing_everything(self) -> None:
+        a, b, both = LogHistogram(), LogHistogram(), LogHistogram()
+        for i in range(1, 500):
+            (a if i % 2 else b).observe(i / 1000)
+            both.observe(i / 1000)
+        a.merge(b)
+        self.assertEqual((a.buckets, a.count, a.max), (both.buckets, both.count, both.max))
+        self.assertAlmostEqual(a.sum, both.sum)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import contextlib
+import io
+import json
+import os
+import threading
+import unittest
+from typing import Any, Dict, List
+from unittest import mock
+
+from full_flow import McpClient, initialize_session
+from mcp_proxy import McpProxy
+from stub_server import STUB_USER_ID, StubConfig, make_access_token, start_stub_server
+
+ADDRESS = {
+    "country_code": "US",
+    "country_name": "United States",
+    "state": "CA",
+    "city": "San Jose",
+    "street_line1": "1 Main St",
+    "recipient_name": "Test Buyer",
+    "recipient_phone": "+1 408 555 0100",
+}
+
+
+class McpProxyTest(unittest.TestCase):
+    def setUp(self) -> None:
+        patcher = mock.patch.dict(os.environ, {"MCP_TOOLS_CACHE_PATH": "off"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.server, self.base_url = start_stub_server(StubConfig(latency_ms=200))
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        mcp = McpClient(self.base_url + "/api/mcp", make_access_token(STUB_USER_ID, 3600))
+        with contextlib.redirect_stdout(io.StringIO()):
+            init = initialize_session(mcp)
+        self.proxy = McpProxy(mcp, self.base_url, init)
+        self.addCleanup(self.proxy.executor.shutdown)
+
+    def counters(self) -> Dict[str, int]:
+        return json.loads(self.proxy.mcp.pool.request("GET", self.base_url + "/__stats")[2])["counters"]
+
+    def concurrently(self, n: int, fn: Any) -> List[Any]:
+        barrier = threading.Barrier(n)
+        results: List[Any] = [None] * n
+
+        def run(i: int) -> None:
+            barrier.wait()
+            results[i] = fn()
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def test_identical_concurrent_reads_are_coalesced(self) -> None:
+        results = self.concurrently(8, lambda: self.proxy.call_tool("search_products", {"keyword": "tea"}))
+        self.assertEqual(self.counters()["tool:search_products"], 1)
+        self.assertTrue(all(r == results[0] for r in results))
+        self.assertEqual(self.proxy.stats()["coalesced"], 7)
+        # Coalescing is not caching: a later identical search goes upstream again.
+        self.proxy.call_tool("search_products", {"keyword": "tea"})
+        self.assertEqual(self.counters()["tool:search_products"], 2)
+
+    def test_different_arguments_are_not_coalesced(self) -> None:
+        keywords = iter(["tea", "cup"])
+        lock = threading.Lock()
+
+        def search() -> Any:
+            with lock:
+                keyword = next(keywords)
+            return self.proxy.call_tool("search_products", {"keyword": keyword})
+
+        self.concurrently(2, search)
+        self.assertEqual(self.counters()["tool:search_products"], 2)
+
+    def test_listing_is_cached_until_a_write_invalidates_it(self) -> None:
+        first = self.proxy.call_tool("list_addresses", {})
+        self.assertEqual(self.proxy.call_tool("list_addresses", {}), first)
+        self.assertEqual(self.counters()["tool:list_addresses"], 1)
+        self.proxy.call_tool("create_address", ADDRESS)
+        after = self.proxy.call_tool("list_addresses", {})
+        self.assertEqual(self.counters()["tool:list_addresses"], 2)
+        self.assertNotEqual(after, first)
+        self.assertEqual(self.proxy.stats()["cache_hits"], 1)
+
+    def test_repeated_setup_calls_are_answered_locally(self) -> None:
+        args = {"user_id": STUB_USER_ID, "user_name": "buyer"}
+        self.proxy.call_tool("create_user", args)
+        self.proxy.call_tool("create_user", dict(reversed(list(args.items()))))
+        self.proxy.call_tool("create_user", dict(args, user_name="other"))
+        self.assertEqual(self.counters()["tool:create_user"], 2)
+
+    def test_product_detail_cache_ignores_parameter_order(self) -> None:
+        first = self.proxy.product_detail("item_id=42&region=US")
+        self.assertEqual(self.proxy.product_detail("region=US&item_id=42"), first)
+        self.assertEqual(self.counters()["products/detail"], 1)
+
+    def test_batch_answers_local_methods_without_upstream(self) -> None:
+        before = self.counters()
+        out = self.proxy.handle_payload(
+            [
+                {"jsonrpc": "2.0", "id": 1, "method": "ping"},
+                {"jsonrpc": "2.0", "id": 2, "method": "tools/list"},
+                {"jsonrpc": "2.0", "method": "notifications/initialized"},
+            ]
+        )
+        self.assertEqual([resp["id"] for resp in out], [1, 2])
+        self.assertIn("create_order", [tool["name"] for tool in out[1]["result"]["tools"]])
+        self.assertEqual(self.counters().get("tools/list"), before.get("tools/list"))
+        self.assertEqual(self.proxy.stats()["forwarded"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
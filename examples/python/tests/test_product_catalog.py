@@ -0,0 +1,66 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from product_catalog import ProductCatalog, open_catalog
+from products import Product
+
+
+def product(item_id: str, title: str, price: float) -> Product:
+    return Product.from_dict({"item_id": item_id, "sku_id": "", "shop_id": "s1", "title": title, "price": price})
+
+
+class ProductCatalogTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.path = os.path.join(self.dir.name, "catalog.sqlite3")
+
+    def open(self, endpoint: str = "http://a.test/api/mcp", **kwargs) -> ProductCatalog:
+        catalog = ProductCatalog(self.path, endpoint, **kwargs)
+        self.addCleanup(catalog.close)
+        return catalog
+
+    def test_pages_are_scoped_to_the_endpoint(self) -> None:
+        a = self.open("http://a.test/api/mcp")
+        b = self.open("http://b.test/api/mcp")
+        a.ingest("Water  Cup", 1, 10, [product("1", "water cup", 9.5)])
+        self.assertIsNone(b.lookup("water cup", 1, 10))
+        self.assertEqual(b.query("water"), [])
+        found = a.lookup("water cup", 1, 10)
+        self.assertIsNotNone(found)
+        self.assertEqual([p.item_id for p in found[0]], ["1"])
+
+    def test_stale_pages_only_when_allowed(self) -> None:
+        catalog = self.open(fresh_sec=0.0, max_stale_sec=3600.0)
+        catalog.ingest("cup", 1, 10, [product("1", "cup", 1.0)])
+        time.sleep(0.01)
+        self.assertIsNone(catalog.lookup("cup", 1, 10, allow_stale=False))
+        products, fresh = catalog.lookup("cup", 1, 10)
+        self.assertFalse(fresh)
+        self.assertEqual(len(products), 1)
+
+    def test_query_is_cheapest_first_with_price_cap(self) -> None:
+        catalog = self.open()
+        catalog.ingest("cup", 1, 10, [product("1", "thermo cup", 30.0), product("2", "glass cup", 5.0), product("3", "mug", 1.0)])
+        self.assertEqual([p.item_id for p in catalog.query("cup")], ["2", "1"])
+        self.assertEqual([p.item_id for p in catalog.query("cup", max_price=10.0)], ["2"])
+
+    def test_reopening_keeps_rows(self) -> None:
+        self.open().ingest("cup", 1, 10, [product("1", "cup", 1.0)])
+        self.assertEqual(len(self.open().lookup("cup", 1, 10)[0]), 1)
+
+
+class OpenCatalogTest(unittest.TestCase):
+    def test_catalog_is_off_unless_a_path_is_set(self) -> None:
+        with mock.patch.dict(os.environ):
+            os.environ.pop("MCP_CATALOG_PATH", None)
+            self.assertIsNone(open_catalog("https://taopochta.ru/api/mcp"))
+            os.environ["MCP_CATALOG_PATH"] = "off"
+            self.assertIsNone(open_catalog("https://taopochta.ru/api/mcp"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import random
+import unittest
+from typing import Any, Dict, List
+
+from products import (
+    INVENTORY_MAX,
+    INVENTORY_MIN,
+    Product,
+    ProductColumns,
+    collect_arrays,
+    get_comparable_price,
+    iter_products,
+    looks_like_product,
+    more_inventory_first,
+    top_k_cheapest,
+)
+
+
+def legacy_products(payload: Any) -> List[Dict[str, Any]]:
+    arrays: List[list] = []
+    collect_arrays(payload, arrays)
+    return [item for arr in arrays for item in arr if looks_like_product(item)]
+
+
+def random_tree(rng: random.Random, depth: int = 0) -> Any:
+    # Products, lists of lists and dicts nested past the walkers' depth limit of 6.
+    roll = rng.random()
+    if depth > 9 or roll < 0.2:
+        return rng.choice([None, 1, "x", {"item_id": str(rng.randint(1, 10**6)), "price": rng.randint(1, 99)}])
+    if roll < 0.6:
+        return [random_tree(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    node: Dict[str, Any] = {f"k{i}": random_tree(rng, depth + 1) for i in range(rng.randint(0, 3))}
+    if rng.random() < 0.3:
+        node.update(item_id=str(rng.randint(1, 10**6)), title="nested product")
+    return node
+
+
+class IterProductsTest(unittest.TestCase):
+    def test_order_matches_the_recursive_walk(self) -> None:
+        rng = random.Random(5)
+        for _ in range(300):
+            payload = random_tree(rng)
+            self.assertEqual([id(p) for p in iter_products(payload)], [id(p) for p in legacy_products(payload)])
+
+    def test_products_inside_products_keep_pre_order(self) -> None:
+        sku = {"item_id": "2", "price": 1}
+        outer = {"item_id": "1", "price": 5, "variants": [sku]}
+        tail = {"item_id": "3", "price": 2}
+        payload = {"data": {"items": [outer, tail]}}
+        self.assertEqual(list(iter_products(payload)), [outer, tail, sku])
+        self.assertEqual(list(iter_products(payload)), legacy_products(payload))
+
+
+class TopKCheapestTest(unittest.TestCase):
+    def products(self) -> List[Dict[str, Any]]:
+        rng = random.Random(11)
+        out = []
+        for i in range(400):
+            price = rng.choice([1, 2, 2, 3, 5, 8])
+            item: Dict[str, Any] = {"item_id": str(i), "price": price, "inventory": rng.randint(0, 3)}
+            if i % 3 == 0:
+                item["coupon_price"] = price - 0.5
+            elif i % 7 == 0:
+                item["coupon_price"] = None
+            if i % 11 == 0:
+                item["price"] = ""
+            out.append(item)
+        return out
+
+    def test_equals_a_full_stable_sort(self) -> None:
+        products = self.products()
+        priced = [p for p in products if get_comparable_price(p) is not None]
+        for k in (0, 1, 5, 37, len(products) + 10):
+            expected = sorted(priced, key=get_comparable_price)[:k]
+            self.assertEqual([id(p) for p in top_k_cheapest(products, k)], [id(p) for p in expected])
+
+    def test_secondary_key_breaks_ties(self) -> None:
+        products = self.products()
+        priced = [p for p in products if get_comparable_price(p) is not None]
+        expected = sorted(priced, key=lambda p: (get_comparable_price(p), more_inventory_first(p)))[:25]
+        got = top_k_cheapest(products, 25, secondary_keys=(more_inventory_first,))
+        self.assertEqual([id(p) for p in got], [id(p) for p in expected])
+
+    def test_missing_coupon_price_falls_back_to_price(self) -> None:
+        products = [{"item_id": "1", "price": "4.00", "coupon_price": None}, {"item_id": "2", "price": "5", "coupon_price": "3"}]
+        self.assertEqual([p["item_id"] for p in top_k_cheapest(products, 2)], ["2", "1"])
+
+
+class ProductColumnsTest(unittest.TestCase):
+    def test_out_of_range_inventory_is_clamped(self) -> None:
+        columns = ProductColumns()
+        for inventory in ("1e30", "-1e30", 2**70, "inf", "nan", "12"):
+            columns.append(Product.from_dict({"item_id": "1", "price": 1, "inventory": inventory}))
+        self.assertEqual(list(columns.inventory), [INVENTORY_MAX, INVENTORY_MIN, INVENTORY_MAX, -1, -1, 12])
+        self.assertEqual(columns.select(min_inventory=100), [0, 2])
+        self.assertEqual(columns.records[0].inventory, int(1e30))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, List, Optional
+from unittest import mock
+
+from full_flow import McpClient
+from http_pool import HttpConnectionPool
+from retry_policy import RetryPolicy, default_retry_policies, is_read_only_rpc
+
+
+class SlowRpcHandler(BaseHTTPRequestHandler):
+    # Answers every JSON-RPC request (or batch) with an empty result after the next queued delay.
+    protocol_version = "HTTP/1.1"
+    delays: List[float] = []
+    bodies: List[Any] = []
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers.get("content-length") or 0)))
+        cls = type(self)
+        cls.bodies.append(body)
+        time.sleep(cls.delays.pop(0) if cls.delays else 0.0)
+        answers = [{"jsonrpc": "2.0", "id": r["id"], "result": {"content": []}} for r in (body if isinstance(body, list) else [body])]
+        data = json.dumps(answers if isinstance(body, list) else answers[0]).encode("utf-8")
+        try:
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except OSError:
+            pass  # the client aborted this attempt
+
+
+class FlakyClient(McpClient):
+    # post() fails with a dropped connection the first `failures` times, then answers.
+    def __init__(self, failures: int, **kwargs: Any) -> None:
+        super().__init__("http://127.0.0.1:9/api/mcp", "token", **kwargs)
+        self.failures = failures
+        self.sent = 0
+
+    def post(self, body: Any, span: Any = None, timeout_sec: Optional[float] = None, headers: Any = None) -> Any:
+        self.sent += 1
+        if self.sent <= self.failures:
+            raise ConnectionResetError("connection reset by peer")
+        return {"jsonrpc": "2.0", "id": body["id"], "result": {}}
+
+
+IDEMPOTENT_SERVER = {"capabilities": {"experimental": {"idempotency": {"argument": "idempotency_key"}}}}
+
+
+class MutatingRetryTest(unittest.TestCase):
+    def setUp(self) -> None:
+        patcher = mock.patch.dict(os.environ, {"MCP_RETRY_MUTATING": "auto"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_order(self, client: FlakyClient) -> None:
+        with mock.patch("retry_policy.random.uniform", return_value=0.0):
+            client.rpc("tools/call", {"name": "create_order", "arguments": {}})
+
+    def test_not_retried_without_server_dedupe(self) -> None:
+        client = FlakyClient(1)
+        client.set_server_capabilities({"capabilities": {}})
+        with self.assertRaises(ConnectionResetError):
+            self.create_order(client)
+        self.assertEqual(client.sent, 1)
+
+    def test_retried_when_the_server_dedupes(self) -> None:
+        client = FlakyClient(1)
+        client.set_server_capabilities(IDEMPOTENT_SERVER)
+        self.create_order(client)
+        self.assertEqual(client.sent, 2)
+        self.assertEqual(client.retry_stats()["retries"], 1)
+
+    def test_off_wins_over_the_server(self) -> None:
+        with mock.patch.dict(os.environ, {"MCP_RETRY_MUTATING": "off"}):
+            client = FlakyClient(1)
+            client.set_server_capabilities(IDEMPOTENT_SERVER)
+            with self.assertRaises(ConnectionResetError):
+                self.create_order(client)
+        self.assertEqual(client.sent, 1)
+
+    def test_read_only_calls_are_always_retried(self) -> None:
+        client = FlakyClient(2, retry_policies={"search_products": RetryPolicy(3, base_delay_sec=0.0)})
+        client.rpc("tools/call", {"name": "search_products", "arguments": {}})
+        self.assertEqual(client.sent, 3)
+
+    def test_default_policies_leave_mutating_tools_out(self) -> None:
+        policies = default_retry_policies()
+        self.assertIn("search_products", policies)
+        self.assertNotIn("create_order", policies)
+        self.assertNotIn("batch", policies)
+
+
+class HedgeTest(unittest.TestCase):
+    def setUp(self) -> None:
+        SlowRpcHandler.delays = []
+        SlowRpcHandler.bodies = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), SlowRpcHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.pool = HttpConnectionPool(pool_size=4)
+        self.addCleanup(self.pool.close)
+        hedged = RetryPolicy(1, hedge=True, hedge_default_delay_sec=0.05)
+        self.mcp = McpClient(
+            f"http://127.0.0.1:{self.server.server_address[1]}/api/mcp",
+            "token",
+            pool=self.pool,
+            retry_policies={"list_addresses": hedged, "batch:read_only": hedged},
+            streamable=False,
+        )
+
+    def test_winning_backup_aborts_the_primary(self) -> None:
+        SlowRpcHandler.delays = [2.0, 0.0]
+        started = time.monotonic()
+        self.mcp.call_tool("list_addresses", {})
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(len(SlowRpcHandler.bodies), 2)
+        stats = self.mcp.retry_stats()
+        self.assertEqual((stats["hedges"], stats["hedge_wins"]), (1, 1))
+        # The aborted primary is no evidence against the server.
+        self.assertIsNotNone(self.mcp.guard)
+        guard = self.mcp.guard.state()
+        self.assertEqual(guard["limiter"]["decreases"], 0)
+        self.assertEqual(guard["limiter"]["in_flight"], 0)
+        self.assertEqual(guard["breaker"]["consecutive_failures"], 0)
+
+    def test_fast_primary_sends_no_backup(self) -> None:
+        self.mcp.call_tool("list_addresses", {})
+        time.sleep(0.1)
+        self.assertEqual(len(SlowRpcHandler.bodies), 1)
+        self.assertEqual(self.mcp.retry_stats()["hedges"], 0)
+
+    def test_mixed_batch_is_never_hedged(self) -> None:
+        SlowRpcHandler.delays = [0.3, 0.3]
+        batch = self.mcp.batch()
+        batch.call_tool("create_user", {"user_id": 1})
+        batch.call_tool("list_addresses", {})
+        self.assertFalse(is_read_only_rpc(batch._requests))
+        batch.send()
+        self.assertEqual(len(SlowRpcHandler.bodies), 1)
+        self.assertEqual(self.mcp.retry_stats()["hedges"], 0)
+
+    def test_read_only_batch_is_hedged(self) -> None:
+        SlowRpcHandler.delays = [0.3, 0.0]
+        batch = self.mcp.batch()
+        batch.call_tool("list_addresses", {})
+        batch.call_tool("list_wallets", {})
+        batch.send()
+        self.assertEqual(self.mcp.retry_stats()["hedges"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import threading
+import time
+import unittest
+from typing import Any, Dict, List, Optional, Tuple
+
+from search_fanout import RateLimiter, SearchFanout, SearchStopRule
+
+
+class FakeSearch:
+    # Stands in for McpClient: search_products pages with a given size, price and delay per (keyword, page).
+    def __init__(
+        self,
+        sizes: Dict[Tuple[str, int], int],
+        price: float = 5.0,
+        delays: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.sizes = sizes
+        self.price = price
+        self.delays = delays or {}
+        self.calls: List[Tuple[str, int]] = []
+        self.sent_at: List[float] = []
+        self._lock = threading.Lock()
+
+    def call_tool(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        keyword, page_no = arguments["keyword"], arguments["page_no"]
+        with self._lock:
+            self.calls.append((keyword, page_no))
+            self.sent_at.append(time.monotonic())
+        time.sleep(self.delays.get(keyword, 0.0))
+        size = self.sizes.get((keyword, page_no), arguments["page_size"])
+        items = [{"item_id": f"{keyword}-{page_no}-{i}", "shop_id": "1", "price": self.price} for i in range(size)]
+        return {"success": True, "data": {"items": items}}
+
+
+class SearchFanoutTest(unittest.TestCase):
+    def test_stop_rule_ends_the_stream_once_enough_candidates_match(self) -> None:
+        mcp = FakeSearch({})
+        rule = SearchStopRule(max_price=10, min_candidates=6)
+        fanout = SearchFanout(mcp, ["case"], pages=20, page_size=4, concurrency=1, stop_rule=rule)
+        products = list(fanout.stream())
+        self.assertEqual(len(products), 6)
+        self.assertEqual(fanout.stop_reason, "enough_candidates")
+        self.assertLess(fanout.requests_sent, 20)
+
+    def test_products_over_the_price_cap_do_not_count(self) -> None:
+        mcp = FakeSearch({}, price=50.0)
+        rule = SearchStopRule(max_price=10, min_candidates=1)
+        fanout = SearchFanout(mcp, ["case"], pages=3, page_size=2, stop_rule=rule)
+        self.assertEqual(len(list(fanout.stream())), 6)
+        self.assertEqual(fanout.stop_reason, "exhausted")
+
+    def test_deadline_stops_waiting_for_slow_pages(self) -> None:
+        mcp = FakeSearch({}, delays={"slow": 0.5})
+        fanout = SearchFanout(mcp, ["slow"], pages=2, page_size=2, stop_rule=SearchStopRule(deadline_sec=0.05))
+        started = time.monotonic()
+        self.assertEqual(list(fanout.stream()), [])
+        self.assertEqual(fanout.stop_reason, "deadline")
+        self.assertLess(time.monotonic() - started, 0.4)
+
+    def test_short_page_cancels_later_pages_of_that_keyword(self) -> None:
+        # One worker: while "slow" page 1 runs, "short" pages 2..4 are still queued when its short page 1 lands.
+        mcp = FakeSearch({("short", 1): 2}, delays={"slow": 0.2})
+        fanout = SearchFanout(mcp, ["short", "slow"], pages=4, page_size=5, concurrency=1)
+        products = list(fanout.stream())
+        self.assertEqual(fanout.stop_reason, "exhausted")
+        self.assertEqual([call for call in mcp.calls if call[0] == "short"], [("short", 1)])
+        self.assertEqual(sorted(call for call in mcp.calls if call[0] == "slow"), [("slow", p) for p in range(1, 5)])
+        self.assertEqual(len(products), 2 + 4 * 5)
+
+    def test_duplicates_across_keywords_are_yielded_once(self) -> None:
+        class SameItems(FakeSearch):
+            def call_tool(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+                return super().call_tool(name, dict(arguments, keyword="same"))
+
+        fanout = SearchFanout(SameItems({}), ["a", "b"], pages=1, page_size=3)
+        self.assertEqual(len(list(fanout.stream())), 3)
+
+    def test_failed_page_is_recorded_and_the_rest_continue(self) -> None:
+        class Failing(FakeSearch):
+            def call_tool(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+                if arguments["page_no"] == 2:
+                    raise ConnectionResetError("reset")
+                return super().call_tool(name, arguments)
+
+        fanout = SearchFanout(Failing({}), ["case"], pages=3, page_size=2)
+        self.assertEqual(len(list(fanout.stream())), 4)
+        self.assertEqual(fanout.errors, ["case page 2: reset"])
+
+    def test_rate_limiter_spaces_the_requests(self) -> None:
+        mcp = FakeSearch({})
+        limiter = RateLimiter(20, burst=2)
+        fanout = SearchFanout(mcp, ["a", "b"], pages=3, page_size=1, concurrency=6, rate_limiter=limiter)
+        list(fanout.stream())
+        self.assertEqual(len(mcp.calls), 6)
+        # Two requests ride the burst, the other four wait 1/20 s each.
+        self.assertGreaterEqual(max(mcp.sent_at) - min(mcp.sent_at), 4 / 20 * 0.9)
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_burst_then_wait(self) -> None:
+        limiter = RateLimiter(10, burst=2)
+        self.assertEqual(limiter.try_acquire(), 0.0)
+        self.assertEqual(limiter.try_acquire(), 0.0)
+        wait_sec = limiter.try_acquire()
+        self.assertGreater(wait_sec, 0.05)
+        self.assertLessEqual(wait_sec, 0.1)
+        time.sleep(wait_sec)
+        self.assertEqual(limiter.try_acquire(), 0.0)
+
+    def test_zero_rate_is_unlimited(self) -> None:
+        limiter = RateLimiter(0)
+        for _ in range(100):
+            self.assertEqual(limiter.try_acquire(), 0.0)
+        self.assertEqual(limiter.available(), float("inf"))
+
+
+if __name__ == "__main__":
+    unittest.main()
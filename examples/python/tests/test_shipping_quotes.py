@@ -0,0 +1,82 @@
+import contextlib
+import io
+import time
+import unittest
+from typing import Any, Dict, List, Tuple
+
+from mcp_common import ToolError
+from shipping_quotes import ShippingQuoteCache, create_order_with_quote
+
+ESTIMATE_ARGS = {"shipping_address_id": 7, "shop_id": "1", "item_id": "2", "sku_id": None, "quantity": 1}
+
+
+class FakeOrders:
+    # create_order answers with the queued outcomes in turn; estimate_shipping hands out fresh quotes.
+    def __init__(self, outcomes: List[BaseException]) -> None:
+        self.outcomes = outcomes
+        self.calls: List[Tuple[str, Dict[str, Any], str]] = []
+
+    def call_tool(self, name: str, arguments: Dict[str, Any], idempotency_key: str = "") -> Dict[str, Any]:
+        self.calls.append((name, arguments, idempotency_key))
+        if name == "estimate_shipping":
+            return {"success": True, "data": {"shipping_quote_id": f"q{len(self.calls)}", "payment_quote": {"expires_in": 600}}}
+        if self.outcomes:
+            raise self.outcomes.pop(0)
+        return {"success": True, "data": {"order_no": "O1"}}
+
+
+def quote_rejected() -> ToolError:
+    return ToolError("create_order failed: shipping quote expired", {"success": False, "message": "shipping quote expired"})
+
+
+class CreateOrderWithQuoteTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cache = ShippingQuoteCache()
+        self.cache.put(ESTIMATE_ARGS, {"shipping_quote_id": "cached", "expires_at": time.time() + 600})
+        self.order_args = dict(ESTIMATE_ARGS, shipping_quote_id="cached", pay_method="bsc")
+
+    def place(self, mcp: FakeOrders, quote_from_cache: bool = True) -> Tuple[Dict[str, Any], str]:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return create_order_with_quote(mcp, self.order_args, ESTIMATE_ARGS, self.cache, quote_from_cache)
+
+    def test_rejected_cached_quote_is_requoted_under_the_same_key(self) -> None:
+        mcp = FakeOrders([quote_rejected()])
+        resp, quote_id = self.place(mcp)
+        self.assertEqual(resp["data"]["order_no"], "O1")
+        self.assertEqual([c[0] for c in mcp.calls], ["create_order", "estimate_shipping", "create_order"])
+        self.assertEqual(quote_id, "q2")
+        self.assertEqual(mcp.calls[2][1]["shipping_quote_id"], "q2")
+        first_key, retry_key = mcp.calls[0][2], mcp.calls[2][2]
+        self.assertTrue(first_key)
+        self.assertEqual(first_key, retry_key)
+        self.assertEqual(self.cache.get(ESTIMATE_ARGS)["data"]["shipping_quote_id"], "q2")
+
+    def test_transport_failure_is_not_requoted(self) -> None:
+        for exc in (TimeoutError("timed out"), ConnectionResetError("reset"), OSError("body unreadable")):
+            mcp = FakeOrders([exc])
+            with self.assertRaises(type(exc)):
+                self.place(mcp)
+            self.assertEqual([c[0] for c in mcp.calls], ["create_order"])
+
+    def test_other_rejections_are_not_requoted(self) -> None:
+        for exc in (ToolError("create_order failed: insufficient inventory", {}), RuntimeError("JSON-RPC -32603: internal")):
+            mcp = FakeOrders([exc])
+            with self.assertRaises(RuntimeError):
+                self.place(mcp)
+            self.assertEqual([c[0] for c in mcp.calls], ["create_order"])
+
+    def test_fresh_quote_is_not_requoted(self) -> None:
+        mcp = FakeOrders([quote_rejected()])
+        with self.assertRaises(ToolError):
+            self.place(mcp, quote_from_cache=False)
+        self.assertEqual(len(mcp.calls), 1)
+
+    def test_caller_key_is_kept(self) -> None:
+        self.order_args["idempotency_key"] = "run-1"
+        mcp = FakeOrders([quote_rejected()])
+        self.place(mcp)
+        self.assertEqual({c[2] for c in mcp.calls if c[0] == "create_order"}, {"run-1"})
+
+
+if __name__ == "__main__":
+    unittest.main()
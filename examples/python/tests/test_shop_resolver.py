@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+import threading
+import types
+import unittest
+import urllib.error
+from typing import Dict, List
+
+from http_pool import HttpConnectionPool
+from shop_resolver import ShopIdResolver
+from stub_server import STUB_USER_ID, StubConfig, make_access_token, start_stub_server
+from ttl_cache import TtlLruCache
+
+
+class ShopIdResolverTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.config = StubConfig(latency_ms=100)
+        self.server, self.base_url = start_stub_server(self.config)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.pool = HttpConnectionPool(pool_size=16)
+        self.addCleanup(self.pool.close)
+        self.mcp = types.SimpleNamespace(token=make_access_token(STUB_USER_ID, 3600), pool=self.pool)
+
+    def resolver(self, disk_path: str = "") -> ShopIdResolver:
+        return ShopIdResolver(self.base_url, self.mcp, cache=TtlLruCache(), disk_path=disk_path)
+
+    def detail_requests(self) -> int:
+        stats = json.loads(self.pool.request("GET", self.base_url + "/__stats")[2])
+        return int(stats["counters"].get("products/detail", 0))
+
+    def test_concurrent_lookups_share_one_request(self) -> None:
+        resolver = self.resolver()
+        results: List[str] = []
+        barrier = threading.Barrier(8)
+
+        def lookup() -> None:
+            barrier.wait()
+            results.append(resolver.resolve("600100200300", "taobao", "en"))
+
+        threads = [threading.Thread(target=lookup) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 8)
+        self.assertEqual(len(set(results)), 1)
+        self.assertTrue(results[0])
+        self.assertEqual(self.detail_requests(), 1)
+        self.assertEqual(resolver.stats()["coalesced"], 7)
+
+    def test_cached_lookup_skips_the_request(self) -> None:
+        resolver = self.resolver()
+        first = resolver.resolve("600100200300", "taobao", "en")
+        self.assertEqual(resolver.resolve("600100200300", "taobao", "en"), first)
+        self.assertTrue(resolver.resolve("600100200300", "1688", "en"))
+        self.assertEqual(self.detail_requests(), 2)
+
+    def test_failed_lookup_is_not_cached(self) -> None:
+        resolver = self.resolver()
+        self.config.http_error_rate = 1.0
+        with self.assertRaises(urllib.error.HTTPError):
+            resolver.resolve("600100200300", "taobao", "en")
+        self.config.http_error_rate = 0.0
+        self.assertTrue(resolver.resolve("600100200300", "taobao", "en"))
+        self.assertEqual(resolver.stats()["remote_fetches"], 2)
+
+    def test_prefetch_dedupes_and_persists_to_disk(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "shop_ids.json")
+            resolved: Dict[str, str] = self.resolver(path).prefetch(["1", "2", "2", ""], "taobao", "en")
+            self.assertEqual(sorted(resolved), ["1", "2"])
+            self.assertEqual(self.detail_requests(), 2)
+            again = self.resolver(path)
+            self.assertEqual(again.resolve("2", "taobao", "en"), resolved["2"])
+            self.assertEqual(again.stats()["disk_hits"], 1)
+            self.assertEqual(self.detail_requests(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+
+from response_body import ResponseTooLarge
+from sse import SseParser
+
+STREAM = (
+    b": keep-alive\r\n"
+    b"retry: 1500\r\n"
+    b"event: notifications/progress\r\n"
+    b"id: 7\r\n"
+    b'data: {"progress": 1,\r\n'
+    b'data:  "total": 2}\r\n'
+    b"\r\n"
+    b"event: ignored-without-data\n"
+    b"\n"
+    b'data: {"result": {}}\n'
+    b"\n"
+)
+
+
+def fields(events: list) -> list:
+    return [(e.event, e.data, e.id) for e in events]
+
+
+class SseParserTest(unittest.TestCase):
+    def test_fields_follow_the_spec(self) -> None:
+        parser = SseParser()
+        events = fields(parser.feed(STREAM))
+        self.assertEqual(
+            events,
+            [
+                ("notifications/progress", '{"progress": 1,\n "total": 2}', "7"),
+                ("message", '{"result": {}}', "7"),
+            ],
+        )
+        self.assertEqual(parser.retry_ms, 1500)
+        self.assertEqual(parser.last_event_id, "7")
+
+    def test_any_chunking_gives_the_same_events(self) -> None:
+        expected = fields(SseParser().feed(STREAM))
+        for size in (1, 2, 3, 7, 64):
+            parser = SseParser()
+            events = []
+            for i in range(0, len(STREAM), size):
+                events.extend(parser.feed(STREAM[i : i + size]))
+            self.assertEqual(fields(events), expected, f"chunk size {size}")
+
+    def test_event_waits_for_the_blank_line(self) -> None:
+        parser = SseParser()
+        self.assertEqual(parser.feed(b"data: a\n"), [])
+        self.assertEqual(fields(parser.feed(b"\n")), [("message", "a", "")])
+
+    def test_empty_data_line_still_dispatches(self) -> None:
+        self.assertEqual(fields(SseParser().feed(b"data\n\n")), [("message", "", "")])
+
+    def test_resumes_from_last_event_id(self) -> None:
+        self.assertEqual(SseParser(last_event_id="41").feed(b"data: x\n\n")[0].id, "41")
+
+    def test_oversized_event_is_rejected(self) -> None:
+        parser = SseParser(max_event_bytes=10)
+        with self.assertRaises(ResponseTooLarge):
+            parser.feed(b"data: 123456\ndata: 789012\n")
+        with self.assertRaises(ResponseTooLarge):
+            SseParser(max_event_bytes=10).feed(b"data: " + b"x" * 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import io
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+
+from step_graph import StepGraph
+
+
+class StepGraphTest(unittest.TestCase):
+    def test_steps_run_after_their_inputs(self) -> None:
+        graph = StepGraph()
+        order = []
+        graph.add("b", lambda v: order.append("b") or {"y": v["x"] + 1}, needs=["x"], provides=["y"])
+        graph.add("a", lambda v: order.append("a") or {"x": 1}, provides=["x"])
+        self.assertEqual(graph.run(), {"x": 1, "y": 2})
+        self.assertEqual(order, ["a", "b"])
+
+    def test_independent_steps_overlap(self) -> None:
+        barrier = threading.Barrier(2, timeout=5)
+
+        def meet(_: dict) -> dict:
+            barrier.wait()  # only passes when both steps are running at once
+            return {}
+
+        graph = StepGraph(max_workers=2)
+        graph.add("a", meet)
+        graph.add("b", meet)
+        graph.run()
+        self.assertEqual({s.status for s in graph.steps.values()}, {"done"})
+
+    def test_failure_cancels_dependents_and_is_raised(self) -> None:
+        graph = StepGraph()
+
+        def fail(_: dict) -> dict:
+            raise ValueError("boom")
+
+        graph.add("a", fail, provides=["x"])
+        graph.add("b", lambda v: {"y": 1}, needs=["x"], provides=["y"])
+        graph.add("c", lambda v: {"z": 1}, needs=["y"], provides=["z"])
+        graph.add("other", lambda v: {"w": 1}, provides=["w"])
+        with self.assertRaises(ValueError):
+            graph.run()
+        status = {name: step.status for name, step in graph.steps.items()}
+        self.assertEqual(status, {"a": "failed", "b": "cancelled", "c": "cancelled", "other": "done"})
+
+    def test_missing_output_is_a_failure(self) -> None:
+        graph = StepGraph()
+        graph.add("a", lambda v: {}, provides=["x"])
+        with self.assertRaisesRegex(RuntimeError, "did not provide x"):
+            graph.run()
+
+    def test_bad_graphs_are_rejected_before_running(self) -> None:
+        graph = StepGraph()
+        graph.add("a", lambda v: {"x": 1}, needs=["y"], provides=["x"])
+        graph.add("b", lambda v: {"y": 1}, needs=["x"], provides=["y"])
+        with self.assertRaisesRegex(RuntimeError, "cycle"):
+            graph.run()
+        graph = StepGraph()
+        graph.add("a", lambda v: {}, needs=["nowhere"])
+        with self.assertRaisesRegex(RuntimeError, "no step provides"):
+            graph.run()
+        with self.assertRaisesRegex(RuntimeError, "provided by both"):
+            graph.add("b", lambda v: {}, provides=["q"])
+            graph.add("c", lambda v: {}, provides=["q"])
+
+    def test_step_output_is_printed_whole(self) -> None:
+        graph = StepGraph(max_workers=4)
+
+        def chatty(name: str):
+            def step(_: dict) -> dict:
+                for i in range(20):
+                    print(f"{name} line {i}")
+                    time.sleep(0.001)
+                return {}
+
+            return step
+
+        for name in ("a", "b", "c"):
+            graph.add(name, chatty(name))
+        out = io.StringIO()
+        with redirect_stdout(out):
+            graph.run()
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 60)
+        blocks = [lines[i : i + 20] for i in range(0, 60, 20)]
+        for block in blocks:
+            self.assertEqual(len({line.split()[0] for line in block}), 1)
+
+    def test_report_follows_the_critical_path(self) -> None:
+        graph = StepGraph()
+        graph.add("slow", lambda v: time.sleep(0.05) or {"x": 1}, provides=["x"])
+        graph.add("fast", lambda v: {"y": 1}, provides=["y"])
+        graph.add("last", lambda v: {}, needs=["x", "y"])
+        graph.run()
+        self.assertEqual(graph.report()["critical_path"], ["slow", "last"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+from typing import Dict
+from unittest import mock
+
+from disk_cache import JsonDiskCache
+from full_flow import McpClient, initialize_session
+from stub_server import STUB_USER_ID, make_access_token, start_stub_server
+from tool_schema import server_fingerprint, validate_json_schema
+
+ADDRESS_SCHEMA = {
+    "type": "object",
+    "required": ["user_id", "phone"],
+    "additionalProperties": False,
+    "properties": {
+        "user_id": {"type": "integer", "minimum": 1},
+        "phone": {"type": "string", "pattern": "^\\+7"},
+        "kind": {"enum": ["home", "office"]},
+        "tags": {"type": "array", "items": {"type": "string"}},
+        "comment": {"type": ["string", "null"]},
+    },
+}
+
+
+class ValidateJsonSchemaTest(unittest.TestCase):
+    def test_valid_arguments_pass(self) -> None:
+        args = {"user_id": 1, "phone": "+79990000000", "kind": "home", "tags": ["a"], "comment": None}
+        self.assertEqual(validate_json_schema(ADDRESS_SCHEMA, args), [])
+
+    def test_bad_input_is_reported_field_by_field(self) -> None:
+        errors = validate_json_schema(
+            ADDRESS_SCHEMA, {"user_id": 0, "phone": "89990000000", "kind": "dacha", "tags": ["a", 2], "extra": 1}
+        )
+        self.assertEqual(
+            sorted(errors),
+            [
+                "arguments.extra is not allowed",
+                "arguments.kind must be one of ['home', 'office']",
+                "arguments.phone does not match ^\\+7",
+                "arguments.tags[1] must be string",
+                "arguments.user_id must be >= 1",
+            ],
+        )
+
+    def test_missing_and_null_required_fields(self) -> None:
+        errors = validate_json_schema(ADDRESS_SCHEMA, {"user_id": None})
+        self.assertEqual(errors, ["arguments.user_id is required", "arguments.phone is required"])
+
+    def test_bool_is_not_an_integer(self) -> None:
+        self.assertEqual(validate_json_schema(ADDRESS_SCHEMA["properties"]["user_id"], True), ["arguments must be integer"])
+        self.assertEqual(validate_json_schema({"type": "number"}, 1), [])
+
+    def test_all_of_is_checked(self) -> None:
+        schema = {"allOf": [{"required": ["a"]}, {"required": ["b"]}]}
+        self.assertEqual(validate_json_schema(schema, {"a": 1}), ["arguments.b is required"])
+
+    def test_unknown_schema_accepts_anything(self) -> None:
+        self.assertEqual(validate_json_schema(None, {"x": 1}), [])
+
+
+class ServerFingerprintTest(unittest.TestCase):
+    def test_ignores_unrelated_fields(self) -> None:
+        init = {"protocolVersion": "2025-03-26", "serverInfo": {"name": "s", "version": "1"}, "capabilities": {}}
+        self.assertEqual(server_fingerprint(init), server_fingerprint(dict(init, instructions="hello")))
+        self.assertNotEqual(server_fingerprint(init), server_fingerprint(dict(init, serverInfo={"name": "s", "version": "2"})))
+
+
+class ToolsCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server, self.base_url = start_stub_server()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.cache_path = os.path.join(self.dir.name, "tools_cache.json")
+        patcher = mock.patch.dict(os.environ, {"MCP_TOOLS_CACHE_PATH": self.cache_path, "MCP_TOOLS_CACHE_TTL_SEC": "3600"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def client(self, path: str = "/api/mcp") -> McpClient:
+        return McpClient(self.base_url + path, make_access_token(STUB_USER_ID, 3600))
+
+    def counters(self) -> Dict[str, int]:
+        return json.loads(self.client().pool.request("GET", self.base_url + "/__stats")[2])["counters"]
+
+    def tools_list_calls(self) -> int:
+        return int(self.counters().get("tools/list", 0))
+
+    def initialize(self, mcp: McpClient) -> None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            initialize_session(mcp)
+
+    def test_tools_list_is_reused_for_the_same_endpoint_and_server(self) -> None:
+        first = self.client()
+        self.initialize(first)
+        second = self.client()
+        self.initialize(second)
+        self.assertEqual(self.tools_list_calls(), 1)
+        self.assertEqual(second.tool_schemas, first.tool_schemas)
+        self.assertIn("create_order", second.tool_schemas)
+
+    def test_cache_key_is_the_endpoint(self) -> None:
+        self.initialize(self.client("/api/mcp"))
+        self.initialize(self.client("/api/mcp/rpc"))
+        self.assertEqual(self.tools_list_calls(), 2)
+        cache = JsonDiskCache(self.cache_path)
+        self.assertIsNotNone(cache.get(self.base_url + "/api/mcp"))
+        self.assertIsNotNone(cache.get(self.base_url + "/api/mcp/rpc"))
+
+    def test_changed_fingerprint_refreshes_the_tools(self) -> None:
+        mcp = self.client()
+        JsonDiskCache(self.cache_path).put_many({mcp.endpoint: ({"fingerprint": "old-build", "tools": []}, time.time() + 60)})
+        self.initialize(mcp)
+        self.assertEqual(self.tools_list_calls(), 1)
+        entry = JsonDiskCache(self.cache_path).get(mcp.endpoint)
+        self.assertNotEqual(entry["fingerprint"], "old-build")
+        self.assertTrue(entry["tools"])
+
+    def test_expired_entry_is_not_reused(self) -> None:
+        with mock.patch.dict(os.environ, {"MCP_TOOLS_CACHE_TTL_SEC": "0"}):
+            self.initialize(self.client())
+        self.initialize(self.client())
+        self.assertEqual(self.tools_list_calls(), 2)
+
+    def test_bad_arguments_are_rejected_before_sending(self) -> None:
+        mcp = self.client()
+        self.initialize(mcp)
+        with self.assertRaises(RuntimeError) as ctx:
+            mcp.call_tool("create_order", {"user_id": "42"})
+        self.assertIn("create_order arguments invalid", str(ctx.exception))
+        self.assertNotIn("tool:create_order", self.counters())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import tempfile
+import time
+import unittest
+
+from tracing import LATENCY_BUCKETS_SEC, LatencyHistogram, Tracer, write_prometheus_textfile
+
+
+class TracerTest(unittest.TestCase):
+    def test_nested_spans_are_recorded_independently(self) -> None:
+        tracer = Tracer()
+        events = []
+        tracer.add_hook(lambda event, span: events.append((event, span.name, span.span_id)))
+        outer = tracer.start("batch:list_addresses+search_products", "batch", 2)
+        inner = tracer.start("search_products", "tools/call")
+        time.sleep(0.01)
+        tracer.finish(inner)
+        tracer.finish(outer, "rpc_error", "1 entries failed")
+        self.assertEqual(
+            events,
+            [
+                ("start", "batch:list_addresses+search_products", 1),
+                ("start", "search_products", 2),
+                ("end", "search_products", 2),
+                ("end", "batch:list_addresses+search_products", 1),
+            ],
+        )
+        self.assertGreaterEqual(outer.duration_sec, inner.duration_sec)
+        summary = tracer.summary()
+        self.assertEqual(summary["search_products"]["count"], 1)
+        self.assertEqual(summary["search_products"]["errors"], 0)
+        self.assertEqual(summary["batch:list_addresses+search_products"]["errors"], 1)
+
+    def test_retry_counts_into_the_span_and_totals(self) -> None:
+        tracer = Tracer()
+        span = tracer.start("search_products", "tools/call")
+        tracer.retry(span, "hedged")
+        tracer.retry(span, "TimeoutError: timed out")
+        tracer.finish(span)
+        self.assertEqual(span.retries, 2)
+        self.assertEqual(span.to_dict()["error"], "TimeoutError: timed out")
+        self.assertEqual(tracer.summary()["search_products"]["retries"], 2)
+
+    def test_failing_hook_does_not_break_the_call(self) -> None:
+        tracer = Tracer()
+        tracer.add_hook(lambda event, span: 1 / 0)
+        span = tracer.start("ping", "ping")
+        tracer.finish(span)
+        self.assertEqual(tracer.summary()["ping"]["count"], 1)
+
+
+class LatencyHistogramTest(unittest.TestCase):
+    def test_bucket_bounds_are_inclusive(self) -> None:
+        hist = LatencyHistogram((0.1, 1.0))
+        hist.observe(0.1)
+        hist.observe(0.1000001)
+        hist.observe(1.0)
+        hist.observe(0.0)
+        self.assertEqual(hist.counts, [2, 2, 0])
+
+    def test_values_above_the_last_bound_go_to_the_overflow_bucket(self) -> None:
+        hist = LatencyHistogram()
+        hist.observe(LATENCY_BUCKETS_SEC[-1] + 1)
+        self.assertEqual(hist.counts[-1], 1)
+        self.assertEqual(len(hist.counts), len(LATENCY_BUCKETS_SEC) + 1)
+        self.assertEqual(hist.quantile(0.99), LATENCY_BUCKETS_SEC[-1])
+
+    def test_quantile_interpolates_inside_the_bucket(self) -> None:
+        hist = LatencyHistogram((0.1, 0.2))
+        self.assertIsNone(hist.quantile(0.5))
+        for _ in range(4):
+            hist.observe(0.15)
+        self.assertAlmostEqual(hist.quantile(0.5), 0.15)
+        self.assertAlmostEqual(hist.quantile(1.0), 0.2)
+
+
+class PrometheusTextTest(unittest.TestCase):
+    def traced(self) -> Tracer:
+        tracer = Tracer()
+        for duration in (0.001, 0.3, 100.0):
+            span = tracer.start('say "hi"', "tools/call")
+            span.start = time.perf_counter() - duration
+            span.response_bytes = 10
+            tracer.finish(span)
+        return tracer
+
+    def test_buckets_are_cumulative_and_end_with_inf(self) -> None:
+        lines = self.traced().prometheus_text().splitlines()
+        self.assertIn("# TYPE mcp_client_request_duration_seconds histogram", lines)
+        buckets = [line for line in lines if line.startswith("mcp_client_request_duration_seconds_bucket")]
+        self.assertEqual(len(buckets), len(LATENCY_BUCKETS_SEC) + 1)
+        self.assertEqual(buckets[0], 'mcp_client_request_duration_seconds_bucket{tool="say \\"hi\\"",le="0.005"} 1')
+        self.assertIn('mcp_client_request_duration_seconds_bucket{tool="say \\"hi\\"",le="0.5"} 2', buckets)
+        self.assertIn('mcp_client_request_duration_seconds_bucket{tool="say \\"hi\\"",le="60.0"} 2', buckets)
+        self.assertEqual(buckets[-1], 'mcp_client_request_duration_seconds_bucket{tool="say \\"hi\\"",le="+Inf"} 3')
+        counts = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+        self.assertEqual(counts, sorted(counts))
+        self.assertIn('mcp_client_request_duration_seconds_count{tool="say \\"hi\\""} 3', lines)
+        self.assertIn('mcp_client_response_bytes_total{tool="say \\"hi\\""} 30', lines)
+
+    def test_textfile_is_replaced_atomically(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "mcp.prom")
+            write_prometheus_textfile(self.traced(), path)
+            self.assertEqual(os.listdir(tmp), ["mcp.prom"])
+            with open(path, encoding="utf-8") as fh:
+                self.assertTrue(fh.read().endswith("\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+"""On-disk access token cache for the MCP examples (stdlib only).
+
+Tokens are kept in a JSON file (MCP_TOKEN_CACHE_PATH, default
+~/.taopochta/mcp_tokens.json, mode 0600) under keys scoped to the server
+they were issued by (normalize_base_url), and are handed out only while
+they stay valid for longer than the caller's margin, so a run can skip the
+bootstrap exchange and refresh before expiry. JWT claims are read without
+verifying the signature; they only decide when to refresh.
+
+Usage:
+from token_store import open_token_store, token_cache_keys
+store = open_token_store()
+token = store.get(token_cache_keys("https://taopochta.ru", "agent@example.com", "")[0], 300)
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from typing import Any, Dict, List, Optional
+
+from disk_cache import announce_cache_file, read_json_file, write_json_file_atomic
+from mcp_common import first_string, parse_timestamp, to_float, trim_slash
+
+
+def decode_jwt_claims_unsafe(token: str) -> Dict[str, Any]:
+    try:
+        parts = str(token or "").split(".")
+        if len(parts) < 2:
+            return {}
+        payload_part = parts[1]
+        padding = "=" * ((4 - len(payload_part) % 4) % 4)
+        payload_json = base64.urlsafe_b64decode((payload_part + padding).encode("utf-8")).decode("utf-8")
+        payload = json.loads(payload_json)
+        return payload if isinstance(payload, dict) else {}
+    except Exception:
+        return {}
+
+
+def decode_jwt_sub_unsafe(token: str) -> Optional[int]:
+    try:
+        sub = decode_jwt_claims_unsafe(token).get("sub")
+        if sub is None:
+            return None
+        return int(sub)
+    except Exception:
+        return None
+
+
+def decode_jwt_exp_unsafe(token: str) -> Optional[float]:
+    return to_float(decode_jwt_claims_unsafe(token).get("exp"), None)
+
+
+def token_expires_at(token: str, exchange_resp: Optional[Dict[str, Any]] = None) -> Optional[float]:
+    exp = decode_jwt_exp_unsafe(token)
+    if exp is not None or not exchange_resp:
+        return exp
+    expires_in = to_float(exchange_resp.get("expires_in"), None)
+    if expires_in is not None:
+        return time.time() + expires_in
+    return parse_timestamp(exchange_resp.get("expires_at"))
+
+
+class TokenStore:
+    # JSON file of {key: {access_token, expires_at, sub}}; re-read only when its mtime changes.
+    def __init__(self, path: str) -> None:
+        self.path = os.path.expanduser(path)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._mtime_ns: Optional[int] = None
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except OSError:
+            self._entries, self._mtime_ns = {}, None
+            return self._entries
+        if mtime_ns != self._mtime_ns:
+            data = read_json_file(self.path)
+            self._entries = data if isinstance(data, dict) else {}
+            self._mtime_ns = mtime_ns
+        return self._entries
+
+    def _save(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        write_json_file_atomic(self.path, entries, 0o600)
+        self._entries, self._mtime_ns = entries, os.stat(self.path).st_mtime_ns
+        announce_cache_file(self.path, "access tokens", "MCP_TOKEN_CACHE_PATH")
+
+    def get(self, key: str, min_ttl_sec: float = 0.0) -> str:
+        with self._lock:
+            entry = self._load().get(key)
+        if not isinstance(entry, dict):
+            return ""
+        expires_at = to_float(entry.get("expires_at"), None)
+        if expires_at is not None and expires_at - time.time() <= min_ttl_sec:
+            return ""
+        return first_string(entry.get("access_token"))
+
+    def put(self, key: str, token: str, expires_at: Optional[float]) -> None:
+        now = time.time()
+        with self._lock:
+            entries = {
+                k: v
+                for k, v in self._load().items()
+                if isinstance(v, dict) and (to_float(v.get("expires_at"), None) or now + 1) > now
+            }
+            entries[key] = {"access_token": token, "expires_at": expires_at, "sub": decode_jwt_sub_unsafe(token)}
+            self._save(entries)
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            entries = dict(self._load())
+            if entries.pop(key, None) is not None:
+                self._save(entries)
+
+
+def open_token_store() -> Optional[TokenStore]:
+    path = os.getenv("MCP_TOKEN_CACHE_PATH", "~/.taopochta/mcp_tokens.json")
+    if not first_string(path) or path.lower() in ("0", "off", "false"):
+        return None
+    return TokenStore(path)
+
+
+def normalize_base_url(url: str) -> str:
+    # Scope for on-disk caches (token keys, catalog rows): the same email, user id or search
+    # on another deployment is different data.
+    parsed = urllib.parse.urlsplit(trim_slash(url))
+    scheme = (parsed.scheme or "https").lower()
+    port = parsed.port
+    netloc = (parsed.hostname or "").lower()
+    if port is not None and port != (443 if scheme == "https" else 80):
+        netloc = f"{netloc}:{port}"
+    return f"{scheme}://{netloc}{trim_slash(parsed.path)}"
+
+
+def token_cache_keys(api_base_url: str, email: str, user_id: str) -> List[str]:
+    scope = normalize_base_url(api_base_url)
+    keys = []
+    if email:
+        keys.append(f"{scope}|email:{email.lower()}")
+    if user_id:
+        keys.append(f"{scope}|user:{user_id}")
+    return keys
+
+
+def remember_token(
+    store: Optional[TokenStore],
+    api_base_url: str,
+    keys: List[str],
+    token: str,
+    exchange_resp: Optional[Dict[str, Any]] = None,
+) -> None:
+    if store is None:
+        return
+    expires_at = token_expires_at(token, exchange_resp)
+    sub = decode_jwt_sub_unsafe(token)
+    for key in keys + ([f"{normalize_base_url(api_base_url)}|user:{sub}"] if sub is not None else []):
+        try:
+            store.put(key, token, expires_at)
+        except OSError as exc:
+            print(f"[auth] token cache not written: {exc}", file=sys.stderr)
+            return
@@ -0,0 +1,84 @@
+"""Tool input schemas: argument validation and the tools/list cache key (stdlib only).
+
+validate_json_schema checks tool arguments against the small JSON-schema
+subset the MCP tools use (type, required, properties, enum, minimum,
+pattern, items, allOf) and returns readable errors instead of raising.
+server_fingerprint hashes the initialize result, so a cached tools/list is
+reused only for the same server build; open_tools_cache opens that cache
+(MCP_TOOLS_CACHE_PATH, "off" disables it).
+
+Usage:
+from tool_schema import validate_json_schema
+errors = validate_json_schema(tool["inputSchema"], {"user_id": 1})
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from disk_cache import JsonDiskCache
+from mcp_common import first_string
+
+
+def _schema_type_matches(expected: str, value: Any) -> bool:
+    if expected == "integer":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if expected == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    types = {"object": dict, "array": list, "string": str, "boolean": bool, "null": type(None)}
+    return expected not in types or isinstance(value, types[expected])
+
+
+def validate_json_schema(schema: Any, value: Any, path: str = "arguments") -> List[str]:
+    # Small JSON-schema subset (type/required/properties/enum/minimum/pattern/items/allOf), enough for tool inputs.
+    if not isinstance(schema, dict):
+        return []
+    errors: List[str] = []
+    for sub in schema.get("allOf") or []:
+        errors.extend(validate_json_schema(sub, value, path))
+    expected = schema.get("type")
+    if expected:
+        options = expected if isinstance(expected, list) else [expected]
+        if not any(_schema_type_matches(t, value) for t in options):
+            return errors + [f"{path} must be {'|'.join(options)}"]
+    if isinstance(schema.get("enum"), list) and value not in schema["enum"]:
+        errors.append(f"{path} must be one of {schema['enum']}")
+    if schema.get("minimum") is not None and isinstance(value, (int, float)) and value < schema["minimum"]:
+        errors.append(f"{path} must be >= {schema['minimum']}")
+    if isinstance(schema.get("pattern"), str) and isinstance(value, str) and not re.search(schema["pattern"], value):
+        errors.append(f"{path} does not match {schema['pattern']}")
+    if isinstance(value, dict):
+        properties = schema.get("properties") if isinstance(schema.get("properties"), dict) else {}
+        for field in schema.get("required") or []:
+            if value.get(field) is None:
+                errors.append(f"{path}.{field} is required")
+        for field, field_value in value.items():
+            # Optional fields sent as null are treated as absent, as the server does.
+            if field in properties and field_value is not None:
+                errors.extend(validate_json_schema(properties[field], field_value, f"{path}.{field}"))
+            elif field not in properties and schema.get("additionalProperties") is False:
+                errors.append(f"{path}.{field} is not allowed")
+    if isinstance(value, list) and isinstance(schema.get("items"), dict):
+        for index, item in enumerate(value):
+            errors.extend(validate_json_schema(schema["items"], item, f"{path}[{index}]"))
+    return errors
+
+
+def server_fingerprint(init_result: Dict[str, Any]) -> str:
+    identity = {
+        "protocolVersion": init_result.get("protocolVersion"),
+        "serverInfo": init_result.get("serverInfo"),
+        "capabilities": init_result.get("capabilities"),
+    }
+    return hashlib.sha256(json.dumps(identity, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def open_tools_cache() -> Optional[JsonDiskCache]:
+    path = os.getenv("MCP_TOOLS_CACHE_PATH", "~/.taopochta/tools_cache.json")
+    if not first_string(path) or path.lower() in ("0", "off", "false"):
+        return None
+    return JsonDiskCache(path, "tools/list cache", "MCP_TOOLS_CACHE_PATH")
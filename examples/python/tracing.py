@@ -0,0 +1,269 @@
+"""Per-call tracing and latency histograms for MCP clients (stdlib only).
+
+A Tracer records one Span per JSON-RPC call (tool name, batch size, bytes,
+status, retries) and keeps a LatencyHistogram per tool with Prometheus
+bucket bounds, so p50/p95 are available without storing every sample.
+Finished spans go to hooks (NdjsonSpanWriter appends them to a file), and
+write_prometheus_textfile dumps the histograms in the node_exporter text
+format. get_default_tracer() is configured by MCP_TRACE, MCP_TRACE_NDJSON
+and MCP_TRACE_PROM and is None when all three are unset.
+
+Usage:
+from tracing import Tracer, write_prometheus_textfile
+tracer = Tracer()
+span = tracer.start("search_products", "tools/call")
+tracer.finish(span, "ok")
+write_prometheus_textfile(tracer, "/tmp/mcp.prom")
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+# Prometheus-style upper bounds (seconds) shared by every latency histogram.
+LATENCY_BUCKETS_SEC = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Span:
+    __slots__ = (
+        "span_id",
+        "name",
+        "method",
+        "batch_size",
+        "started_at",
+        "start",
+        "duration_sec",
+        "request_bytes",
+        "response_bytes",
+        "decode_sec",
+        "http_status",
+        "retries",
+        "status",
+        "error",
+    )
+
+    def __init__(self, span_id: int, name: str, method: str, batch_size: int = 0) -> None:
+        self.span_id = span_id
+        self.name = name
+        self.method = method
+        self.batch_size = batch_size
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration_sec = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.decode_sec = 0.0
+        self.http_status = 0
+        self.retries = 0
+        self.status = "ok"
+        self.error = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "name": self.name,
+            "method": self.method,
+            "batch_size": self.batch_size or None,
+            "ts": datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(),
+            "duration_ms": round(self.duration_sec * 1000, 3),
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+            "decode_ms": round(self.decode_sec * 1000, 3),
+            "http_status": self.http_status or None,
+            "retries": self.retries,
+            "status": self.status,
+            "error": self.error or None,
+        }
+
+
+class LatencyHistogram:
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS_SEC) -> None:
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = 0
+        for bound in self.bounds:
+            if value <= bound:
+                break
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        # Linear interpolation inside the bucket holding the q-th observation (like histogram_quantile).
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.bounds[-1]
+                return lower + (upper - lower) * ((rank - seen) / n)
+            seen += n
+        return self.bounds[-1]
+
+
+class Tracer:
+    # Per-request spans for McpClient.rpc / McpBatch.send. Hooks are callables hook(event, span)
+    # with event in {"start", "retry", "end"}; histograms are keyed by tool name (or JSON-RPC method).
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._next_span_id = 1
+        self.hooks: List[Callable[[str, Span], None]] = []
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.totals: Dict[str, Dict[str, float]] = {}
+
+    def add_hook(self, hook: Callable[[str, Span], None]) -> None:
+        self.hooks.append(hook)
+
+    def _emit(self, event: str, span: Span) -> None:
+        for hook in self.hooks:
+            try:
+                hook(event, span)
+            except Exception as exc:  # noqa: BLE001
+                print(f"[trace] hook failed on {event}: {exc}", file=sys.stderr)
+
+    def start(self, name: str, method: str, batch_size: int = 0) -> Span:
+        with self._lock:
+            span_id = self._next_span_id
+            self._next_span_id += 1
+        span = Span(span_id, name, method, batch_size)
+        if self.hooks:
+            self._emit("start", span)
+        return span
+
+    def retry(self, span: Span, reason: str) -> None:
+        span.retries += 1
+        span.error = reason
+        if self.hooks:
+            self._emit("retry", span)
+
+    def finish(self, span: Span, status: str = "", error: str = "") -> None:
+        span.duration_sec = time.perf_counter() - span.start
+        if status:
+            span.status = status
+        if error:
+            span.error = error
+        with self._lock:
+            hist = self.histograms.get(span.name)
+            if hist is None:
+                hist = self.histograms[span.name] = LatencyHistogram()
+                self.totals[span.name] = {"errors": 0, "retries": 0, "request_bytes": 0, "response_bytes": 0, "decode_sec": 0.0}
+            hist.observe(span.duration_sec)
+            totals = self.totals[span.name]
+            totals["errors"] += span.status != "ok"
+            totals["retries"] += span.retries
+            totals["request_bytes"] += span.request_bytes
+            totals["response_bytes"] += span.response_bytes
+            totals["decode_sec"] += span.decode_sec
+        if self.hooks:
+            self._emit("end", span)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        out: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for name, hist in sorted(self.histograms.items()):
+                totals = self.totals[name]
+                out[name] = {
+                    "count": hist.count,
+                    "errors": int(totals["errors"]),
+                    "retries": int(totals["retries"]),
+                    "mean_ms": round(hist.sum / hist.count * 1000, 2),
+                    "p50_ms": round((hist.quantile(0.5) or 0) * 1000, 2),
+                    "p95_ms": round((hist.quantile(0.95) or 0) * 1000, 2),
+                    "p99_ms": round((hist.quantile(0.99) or 0) * 1000, 2),
+                    "response_bytes": int(totals["response_bytes"]),
+                    "decode_ms": round(totals["decode_sec"] * 1000, 2),
+                }
+        return out
+
+    def prometheus_text(self, prefix: str = "mcp_client") -> str:
+        def label(value: str) -> str:
+            return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        lines = [
+            f"# HELP {prefix}_request_duration_seconds MCP JSON-RPC request latency by tool/method.",
+            f"# TYPE {prefix}_request_duration_seconds histogram",
+        ]
+        with self._lock:
+            items = sorted(self.histograms.items())
+            for name, hist in items:
+                tool = label(name)
+                cumulative = 0
+                for bound, n in zip(hist.bounds, hist.counts):
+                    cumulative += n
+                    lines.append(f'{prefix}_request_duration_seconds_bucket{{tool="{tool}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_request_duration_seconds_bucket{{tool="{tool}",le="+Inf"}} {hist.count}')
+                lines.append(f'{prefix}_request_duration_seconds_sum{{tool="{tool}"}} {hist.sum:.6f}')
+                lines.append(f'{prefix}_request_duration_seconds_count{{tool="{tool}"}} {hist.count}')
+            for metric, key, kind in (
+                ("request_errors_total", "errors", "counter"),
+                ("request_retries_total", "retries", "counter"),
+                ("response_bytes_total", "response_bytes", "counter"),
+                ("json_decode_seconds_total", "decode_sec", "counter"),
+            ):
+                lines.append(f"# TYPE {prefix}_{metric} {kind}")
+                for name, _ in items:
+                    value = self.totals[name][key]
+                    text = f"{value:.6f}" if isinstance(value, float) else str(value)
+                    lines.append(f'{prefix}_{metric}{{tool="{label(name)}"}} {text}')
+        return "\n".join(lines) + "\n"
+
+
+class NdjsonSpanWriter:
+    # Tracer hook that appends one JSON line per finished span.
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._fh = open(path, "a", encoding="utf-8")
+
+    def __call__(self, event: str, span: Span) -> None:
+        if event != "end":
+            return
+        line = json.dumps(span.to_dict(), ensure_ascii=False) + "\n"
+        with self._lock:
+            self._fh.write(line)
+            self._fh.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._fh.close()
+
+
+def write_prometheus_textfile(tracer: Tracer, path: str) -> None:
+    # Atomic replace, so a node_exporter textfile collector never reads a partial file.
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        fh.write(tracer.prometheus_text())
+    os.replace(tmp_path, path)
+
+
+_default_tracer: Optional[Tracer] = None
+_default_tracer_lock = threading.Lock()
+
+
+def get_default_tracer() -> Optional[Tracer]:
+    # None unless MCP_TRACE is on or a span log is configured, so untraced clients skip all span work.
+    global _default_tracer
+    with _default_tracer_lock:
+        if _default_tracer is None:
+            ndjson_path = os.getenv("MCP_TRACE_NDJSON", "").strip()
+            enabled = os.getenv("MCP_TRACE", "").strip().lower() in ("1", "true", "yes", "on")
+            if not (enabled or ndjson_path or os.getenv("MCP_TRACE_PROM", "").strip()):
+                return None
+            _default_tracer = Tracer()
+            if ndjson_path:
+                _default_tracer.add_hook(NdjsonSpanWriter(ndjson_path))
+        return _default_tracer
@@ -0,0 +1,100 @@
+"""In-memory caching primitives shared by the MCP examples (stdlib only).
+
+TtlLruCache is a thread-safe LRU map whose entries also expire after a TTL;
+it counts hits, misses and evictions. SingleFlight collapses concurrent
+calls for the same key into one computation whose result (or exception)
+every waiting caller receives; nothing is remembered once it finishes.
+
+Usage:
+from ttl_cache import SingleFlight, TtlLruCache
+cache = TtlLruCache(max_entries=1024, ttl_sec=3600)
+found, value = cache.get(key)
+value = SingleFlight().do(key, lambda: fetch(key))
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class TtlLruCache:
+    def __init__(self, max_entries: int = 1024, ttl_sec: float = 3600.0) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_sec = float(ttl_sec)
+        self._data: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    def get(self, key: Any) -> Tuple[bool, Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return False, None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return False, None
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return True, value
+
+    def set(self, key: Any, value: Any, ttl_sec: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl_sec if ttl_sec is None else float(ttl_sec))
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def pop(self, key: Any) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def keys(self) -> List[Any]:
+        with self._lock:
+            return list(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            out = dict(self._stats)
+            out["size"] = len(self._data)
+        return out
+
+
+class SingleFlight:
+    # Concurrent callers asking for the same key share one in-flight computation.
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._inflight: Dict[Any, Future] = {}
+        self.coalesced = 0
+
+    def do(self, key: Any, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(fn())
+        except BaseException as exc:
+            future.set_exception(exc)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return future.result()